@@ -0,0 +1,34 @@
+"""
+A stand-in decoder worker speaking the video_index.decode protocol, for
+tests that exercise DecoderPool without PyAV.
+
+Each image is the format name, the requested size and the payload, e.g.
+b"png 320x0 <payload>". Payloads starting with b"fail" get an error
+reply, b"exit" ends the process mid-request and b"sleep" sleeps first.
+"""
+import os
+import struct
+import sys
+import time
+
+REQUEST_HEADER = struct.Struct('<BHHI')
+RESPONSE_HEADER = struct.Struct('<BI')
+FORMATS = {1: b"jpeg", 2: b"png"}
+
+stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+while True:
+    header = stdin.read(REQUEST_HEADER.size)
+    if len(header) < REQUEST_HEADER.size:
+        break
+    code, width, height, length = REQUEST_HEADER.unpack(header)
+    payload = stdin.read(length)
+    if payload.startswith(b"exit"):
+        os._exit(1)
+    if payload.startswith(b"sleep"):
+        time.sleep(float(payload[5:] or 1))
+    if payload.startswith(b"fail"):
+        status, body = 1, b"cannot decode"
+    else:
+        status, body = 0, b"%s %dx%d %s (pid %d)" % (FORMATS[code], width, height, payload, os.getpid())
+    stdout.write(RESPONSE_HEADER.pack(status, len(body)) + body)
+    stdout.flush()
@@ -0,0 +1,112 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+class GcsEmulator:
+    """
+    A minimal fake of the Cloud Storage JSON API for tests: object metadata
+    and media downloads with Range and generation support. Point
+    google-cloud-storage at it with STORAGE_EMULATOR_HOST=emulator.endpoint.
+
+    Every upload keeps the previous generations, as in a versioned bucket.
+    request_count counts object requests, not bucket metadata lookups.
+
+    Args:
+        objects: Optional mapping of (bucket, name) to initial object bytes.
+    """
+
+    def __init__(self, objects=None):
+        self.generations = {}
+        self.request_count = 0
+        self._next_generation = 1000
+        for (bucket, name), data in (objects or {}).items():
+            self.upload(bucket, name, data)
+        emulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def send(self, status, body=b"", content_type="application/json", headers=()):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in headers:
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                match = re.fullmatch(r"/storage/v1/b/([^/]+)", url.path)
+                if match is not None:
+                    # Bucket metadata, fetched by the client in the background
+                    meta = {"kind": "storage#bucket", "name": match.group(1)}
+                    return self.send(200, json.dumps(meta).encode())
+                emulator.request_count += 1
+                match = re.fullmatch(r"(/download)?/storage/v1/b/([^/]+)/o/([^/]+)", url.path)
+                if match is None:
+                    return self.send(404, b'{"error": {"code": 404}}')
+                download, bucket, name = match.group(1), match.group(2), unquote(match.group(3))
+                versions = emulator.generations.get((bucket, name))
+                if not versions:
+                    return self.send(404, b'{"error": {"code": 404, "message": "No such object"}}')
+                generation = int(query["generation"][0]) if "generation" in query else max(versions)
+                data = versions.get(generation)
+                if data is None:
+                    return self.send(404, b'{"error": {"code": 404, "message": "No such generation"}}')
+
+                if not download and query.get("alt") != ["media"]:
+                    meta = {
+                        "kind": "storage#object",
+                        "bucket": bucket,
+                        "name": name,
+                        "generation": str(generation),
+                        "size": str(len(data)),
+                    }
+                    return self.send(200, json.dumps(meta).encode())
+
+                headers = [("x-goog-generation", str(generation))]
+                match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+                if match is None:
+                    return self.send(200, data, "application/octet-stream", headers)
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else len(data) - 1
+                if start >= len(data):
+                    return self.send(416, b'{"error": {"code": 416}}')
+                end = min(end, len(data) - 1)
+                headers.append(("Content-Range", f"bytes {start}-{end}/{len(data)}"))
+                return self.send(206, data[start:end + 1], "application/octet-stream", headers)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def upload(self, bucket, name, data):
+        """Store a new generation of an object and return its number."""
+        self._next_generation += 1
+        self.generations.setdefault((bucket, name), {})[self._next_generation] = data
+        return self._next_generation
+
+    def delete_generation(self, bucket, name, generation):
+        """Remove one generation, as overwriting does in an unversioned bucket."""
+        del self.generations[(bucket, name)][generation]
+
+    @property
+    def endpoint(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
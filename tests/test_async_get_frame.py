@@ -0,0 +1,125 @@
+import utils
+import unittest
+import os
+import tempfile
+import asyncio
+import video_index.async_get_frame
+from video_index.index_cache import IndexCache
+from video_index.frame_index import FrameIndex, IndexHeader, pack_index_v2
+from video_index.async_get_frame import (
+    AsyncFrameClient,
+    async_get_frame_from_urls,
+    async_get_frames_from_urls,
+)
+from utils import make_ivf
+from video_index.benchmark import RangeServer
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.async_get_frame, tests)
+
+
+class TestAsyncGetFrame(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.ivf, self.index, self.payloads = make_ivf([10, 20, 30, 40])
+
+    async def test_async_get_frame_from_urls(self):
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}) as server:
+            async with AsyncFrameClient() as client:
+                for i, payload in enumerate(self.payloads):
+                    data = await async_get_frame_from_urls(
+                        server.url("/v.ivf"), server.url("/v.ivf.idx"), i, client=client
+                    )
+                    self.assertEqual(data, payload)
+
+    async def test_async_get_frames_from_urls(self):
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}) as server:
+            async with AsyncFrameClient() as client:
+                frames = await async_get_frames_from_urls(
+                    server.url("/v.ivf"), server.url("/v.ivf.idx"), [3, 1, 2], max_gap=12, client=client
+                )
+        self.assertEqual(frames, [self.payloads[n] for n in [3, 1, 2]])
+        # Index format probe, one index read and one coalesced frame read
+        self.assertEqual(server.request_count, 3)
+
+    async def test_v2_index(self):
+        positions = FrameIndex.from_bytes(self.index).entries.tolist()
+        index_v2 = pack_index_v2(positions, IndexHeader(0, block_frames=2))
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": index_v2}) as server:
+            async with AsyncFrameClient() as client:
+                video_url, index_url = server.url("/v.ivf"), server.url("/v.ivf.idx")
+                for n, payload in enumerate(self.payloads):
+                    self.assertEqual(await client.get_frame(video_url, index_url, n), payload)
+                frames = await client.get_frames(video_url, index_url, [3, 0])
+        self.assertEqual(frames, [self.payloads[3], self.payloads[0]])
+
+    async def test_concurrent_identical_fetches_share_requests(self):
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}, latency=0.05) as server:
+            for index_cache in [None, IndexCache()]:
+                before = server.request_count
+                async with AsyncFrameClient(index_cache=index_cache) as client:
+                    frames = await asyncio.gather(*(
+                        client.get_frame(server.url("/v.ivf"), server.url("/v.ivf.idx"), 1) for _ in range(32)
+                    ))
+                self.assertEqual(frames, [self.payloads[1]] * 32)
+                # Probe, entry and frame reads, or index download and frame read
+                self.assertEqual(server.request_count - before, 3 if index_cache is None else 2)
+
+    async def test_stats(self):
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}) as server:
+            async with AsyncFrameClient(index_cache=IndexCache()) as client:
+                for n in (1, 2):
+                    await client.get_frame(server.url("/v.ivf"), server.url("/v.ivf.idx"), n)
+                stats = client.stats()
+        self.assertEqual(stats["upstream_requests"], server.request_count)
+        self.assertEqual(stats["upstream_bytes"], len(self.index) + len(self.payloads[1]) + len(self.payloads[2]))
+        self.assertEqual(stats["upstream_in_flight"], 0)
+        self.assertEqual(stats["index_cache"]["hits"], 1)
+        self.assertEqual(stats["index_cache"]["misses"], 1)
+        self.assertIsNone(stats["frame_cache"])
+
+    async def test_local_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            video_path = os.path.join(tmp, "v.ivf")
+            with open(video_path, 'wb') as f:
+                f.write(self.ivf)
+            with open(video_path + ".idx", 'wb') as f:
+                f.write(self.index)
+            async with AsyncFrameClient() as client:
+                self.assertEqual(await client.get_frame(video_path, video_path + ".idx", 2), self.payloads[2])
+                frames = await client.get_frames("file://" + video_path, video_path + ".idx", [3, 0])
+        self.assertEqual(frames, [self.payloads[3], self.payloads[0]])
+
+    async def test_missing_index_raises(self):
+        with RangeServer({"/v.ivf": self.ivf}) as server:
+            async with AsyncFrameClient() as client:
+                with self.assertRaises(RuntimeError):
+                    await client.get_frame(server.url("/v.ivf"), server.url("/missing.idx"), 0)
+
+    async def test_requests_overlap_with_concurrency(self):
+        # With 50ms of simulated upstream latency, requests in flight should
+        # reach the concurrency allowed instead of serializing. QPS itself is
+        # measured by video_index.benchmark, not asserted here.
+        ivf, index, payloads = make_ivf([256] * 64)
+        requests_per_run = 64
+
+        async def run(server, client, video_url, index_url, concurrency):
+            slots = asyncio.Semaphore(concurrency)
+
+            async def one(i):
+                async with slots:
+                    data = await client.get_frame(video_url, index_url, i % len(payloads))
+                    self.assertEqual(data, payloads[i % len(payloads)])
+
+            server.peak_in_flight = 0
+            await asyncio.gather(*(one(i) for i in range(requests_per_run)))
+            return server.peak_in_flight
+
+        with RangeServer({"/v.ivf": ivf, "/v.ivf.idx": index}, latency=0.05) as server:
+            async with AsyncFrameClient() as client:
+                video_url, index_url = server.url("/v.ivf"), server.url("/v.ivf.idx")
+                peaks = {c: await run(server, client, video_url, index_url, c) for c in (1, 4, 16)}
+
+        self.assertEqual(peaks, {1: 1, 4: 4, 16: 16})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import utils
+import unittest
+import json
+import os
+import sys
+import tempfile
+from fractions import Fraction
+from unittest.mock import patch
+import video_index.autotune
+from video_index.autotune import TuneResult, autotune, choose_setting, main
+from video_index.encode_video import EncoderSettings, load_profile
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.autotune, tests)
+
+
+def fake_run_ffmpeg(ffmpeg_cmd, output_path):
+    """Pretend higher cpu-used is faster and larger, and tiles speed up the encode."""
+    cpu_used = int(ffmpeg_cmd[ffmpeg_cmd.index("-cpu-used") + 1])
+    tiles = int(ffmpeg_cmd[ffmpeg_cmd.index("-tile-columns") + 1])
+    frames = int(ffmpeg_cmd[ffmpeg_cmd.index("-frames:v") + 1])
+    return {
+        "frames": frames,
+        "wall_time": frames / (cpu_used * (1 + tiles)),
+        "output_bytes": 32 + frames * (1000 + 100 * cpu_used),
+    }
+
+
+def fake_psnr(encoded_path, input_path, start_time, frames):
+    return 40.0
+
+
+class TestAutotune(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.profile = os.path.join(self.tmp.name, "host.profile.json")
+
+    @patch("video_index.autotune.measure_psnr", side_effect=fake_psnr)
+    @patch("video_index.autotune.run_ffmpeg", side_effect=fake_run_ffmpeg)
+    @patch("video_index.autotune.probe_video", return_value=(Fraction(30), 300))
+    @patch("video_index.autotune.probe_size", return_value=(1280, 720))
+    def test_autotune(self, mock_size, mock_probe, mock_run, mock_psnr):
+        with patch("builtins.print"):
+            best = autotune("in.mp4", self.profile, crf=28, sample_frames=10)
+        # 3 cpu-used values x 3 tile columns x 2 tile rows x thread counts
+        self.assertEqual(mock_run.call_count, 18 * len(video_index.autotune.thread_options()))
+        cmd = mock_run.call_args_list[0].args[0]
+        self.assertEqual(cmd[cmd.index("-ss") + 1], "4.833333")
+        self.assertEqual((best.settings.cpu_used, best.settings.tile_columns, best.settings.crf), (8, 2, 28))
+        self.assertEqual(best.bytes_per_frame, 1800)
+
+        self.assertEqual(load_profile(self.profile), best.settings)
+        with open(self.profile) as f:
+            profile = json.load(f)
+        self.assertEqual((profile["width"], profile["height"]), (1280, 720))
+        self.assertEqual(len(profile["results"]), mock_run.call_count)
+        self.assertTrue(any(r["pareto"] for r in profile["results"]))
+
+        with patch("builtins.print"):
+            smallest = autotune("in.mp4", self.profile, sample_frames=10, start_time=0, objective="size")
+        self.assertEqual(smallest.settings.cpu_used, 4)
+        self.assertEqual(load_profile(self.profile).cpu_used, 4)
+
+    def test_choose_setting_errors(self):
+        results = [TuneResult(EncoderSettings(), 10, 1000, 40, 1)]
+        with self.assertRaises(ValueError):
+            choose_setting(results, objective="quality")
+        with self.assertRaises(ValueError):
+            choose_setting(results, min_fps=11)
+        self.assertEqual(choose_setting(results, max_bytes_per_frame=1000), results[0])
+
+    @patch("video_index.autotune.measure_psnr", side_effect=fake_psnr)
+    @patch("video_index.autotune.run_ffmpeg", side_effect=fake_run_ffmpeg)
+    @patch("video_index.autotune.probe_size", return_value=(3840, 2160))
+    def test_main(self, mock_size, mock_run, mock_psnr):
+        argv = [
+            "autotune", "in.mp4", self.profile, "--start", "0", "--cpu-used", "4,6",
+            "--tile-rows", "0", "--threads", "4", "--objective", "size",
+        ]
+        with patch.object(sys, "argv", argv), patch("builtins.print"):
+            main()
+        # 4K allows up to 8 tile columns
+        self.assertEqual(mock_run.call_count, 2 * 4)
+        self.assertEqual(load_profile(self.profile), EncoderSettings(30, 4, 3, 0, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
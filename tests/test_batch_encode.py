@@ -0,0 +1,100 @@
+import utils
+import unittest
+from unittest.mock import patch
+import json
+import os
+import tempfile
+import video_index.batch_encode
+from video_index.batch_encode import (
+    EncodeJob,
+    find_inputs,
+    plan_jobs,
+    is_complete,
+    run_batch,
+)
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.batch_encode, tests)
+
+
+def fake_encode(input_path, output_path, index_path, *args, **kwargs):
+    ivf, index, _ = utils.make_ivf([10, 20, 30])
+    with open(output_path, 'wb') as f:
+        f.write(ivf)
+    with open(index_path, 'wb') as f:
+        f.write(index)
+    return 3
+
+
+class TestBatchEncode(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = self.tmpdir.name
+        self.input_dir = os.path.join(self.root, "in")
+        os.makedirs(os.path.join(self.input_dir, "day2"))
+        self.inputs = [
+            os.path.join(self.input_dir, "a.mp4"),
+            os.path.join(self.input_dir, "day2", "b.mov"),
+        ]
+        for path in self.inputs + [os.path.join(self.input_dir, "notes.txt")]:
+            with open(path, 'wb') as f:
+                f.write(b'\x00' * 100)
+        self.output_dir = os.path.join(self.root, "out")
+        self.summary = os.path.join(self.root, "summary.jsonl")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_find_inputs(self):
+        self.assertEqual(find_inputs([self.input_dir]), sorted(self.inputs))
+        self.assertEqual(find_inputs([os.path.join(self.input_dir, "*.mp4")]), [self.inputs[0]])
+        manifest = os.path.join(self.root, "manifest.txt")
+        with open(manifest, 'w') as f:
+            f.write(f"# survey\n{self.inputs[1]}\n\n")
+        self.assertEqual(find_inputs(["@" + manifest]), [self.inputs[1]])
+
+    def test_plan_jobs_rejects_collisions(self):
+        with self.assertRaises(ValueError):
+            plan_jobs(["x/a.mp4", "y/a.mov"], self.output_dir)
+
+    def test_is_complete(self):
+        job = plan_jobs(self.inputs, self.output_dir)[0]
+        self.assertFalse(is_complete(job.output_path, job.index_path))
+        os.makedirs(self.output_dir)
+        fake_encode(job.input_path, job.output_path, job.index_path)
+        self.assertTrue(is_complete(job.output_path, job.index_path))
+        # A truncated video no longer matches its index
+        with open(job.output_path, 'r+b') as f:
+            f.truncate(os.path.getsize(job.output_path) - 1)
+        self.assertFalse(is_complete(job.output_path, job.index_path))
+
+    @patch("video_index.batch_encode.encode_av1_intra_indexed", side_effect=fake_encode)
+    def test_run_batch_resumes(self, mock_encode):
+        jobs = plan_jobs(self.inputs, self.output_dir)
+        records = run_batch(jobs, self.summary, max_jobs=2, cpu_budget=8)
+        self.assertEqual([r["status"] for r in records], ["encoded", "encoded"])
+        self.assertEqual(mock_encode.call_args.kwargs["threads"], 4)
+        self.assertEqual(records[0]["frames"], 3)
+
+        records = run_batch(jobs, self.summary, max_jobs=2, cpu_budget=8)
+        self.assertEqual([r["status"] for r in records], ["skipped", "skipped"])
+        self.assertEqual(mock_encode.call_count, 2)
+        with open(self.summary) as f:
+            self.assertEqual(len([json.loads(line) for line in f]), 4)
+
+    @patch("video_index.batch_encode.encode_av1_intra_indexed")
+    def test_failed_job_leaves_no_output(self, mock_encode):
+        def crash(input_path, output_path, index_path, *args, **kwargs):
+            with open(output_path, 'wb') as f:
+                f.write(b'DKIF')
+            raise RuntimeError("ffmpeg died")
+
+        mock_encode.side_effect = crash
+        job = EncodeJob(self.inputs[0], os.path.join(self.root, "a.ivf"), os.path.join(self.root, "a.ivf.idx"))
+        records = run_batch([job], self.summary)
+        self.assertEqual(records[0]["status"], "failed")
+        self.assertIn("ffmpeg died", records[0]["error"])
+        self.assertEqual(sorted(os.listdir(self.root)), ["in", "summary.jsonl"])
+
+if __name__ == "__main__":
+    unittest.main()
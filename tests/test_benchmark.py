@@ -0,0 +1,90 @@
+import utils
+import unittest
+import json
+import os
+import tempfile
+import requests
+import video_index.benchmark
+from video_index.benchmark import (
+    RangeServer,
+    run_benchmarks,
+    synthetic_frame_sizes,
+    synthetic_index,
+    synthetic_ivf,
+)
+from video_index.build_index import build_index, parse_ivf_frame_headers
+from video_index.get_frame import FrameClient
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.benchmark, tests)
+
+
+class TestSyntheticVideo(unittest.TestCase):
+    def test_lognormal_sizes_have_requested_mean(self):
+        sizes = synthetic_frame_sizes(20000, 50000, "lognormal", 0.5, seed=1)
+        self.assertAlmostEqual(sizes.mean() / 50000, 1.0, delta=0.02)
+        self.assertGreater(sizes.max(), 2 * 50000)
+
+    def test_sizes_are_reproducible(self):
+        self.assertEqual(
+            synthetic_frame_sizes(10, 100, seed=3).tolist(),
+            synthetic_frame_sizes(10, 100, seed=3).tolist(),
+        )
+
+    def test_unknown_distribution(self):
+        with self.assertRaises(ValueError):
+            synthetic_frame_sizes(10, 100, "normal")
+
+    def test_index_matches_build_index(self):
+        ivf, positions = synthetic_ivf([10, 0, 300, 7])
+        with tempfile.TemporaryDirectory() as tmp:
+            ivf_path = os.path.join(tmp, "v.ivf")
+            with open(ivf_path, "wb") as f:
+                f.write(ivf)
+            self.assertEqual(parse_ivf_frame_headers(ivf_path), positions)
+            for version in (1, 2):
+                build_index(ivf_path, ivf_path + ".idx", version)
+                with open(ivf_path + ".idx", "rb") as f:
+                    self.assertEqual(f.read(), synthetic_index(positions, len(ivf), version))
+
+    def test_frames_served_by_range_server(self):
+        ivf, positions = synthetic_ivf([5, 6, 7])
+        index = synthetic_index(positions, len(ivf), 2)
+        with RangeServer({"/v.ivf": ivf, "/v.ivf.idx": index}) as server:
+            with FrameClient() as client:
+                data = client.get_frame(server.url("/v.ivf"), server.url("/v.ivf.idx"), 2)
+        self.assertEqual(data, b"\x02" * 7)
+
+
+class TestRangeServer(unittest.TestCase):
+    def test_etag_follows_replaced_objects(self):
+        objects = {"/a": b"one"}
+        with RangeServer(objects) as server:
+            first = requests.get(server.url("/a")).headers["ETag"]
+            self.assertEqual(requests.get(server.url("/a")).headers["ETag"], first)
+            objects["/a"] = b"two"
+            response = requests.get(server.url("/a"), headers={"If-None-Match": first})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], first)
+
+
+class TestRunBenchmarks(unittest.TestCase):
+    def test_reports_every_benchmark(self):
+        results = run_benchmarks(frame_count=50, mean_size=1000, requests=20, concurrency=(1, 4))
+        json.dumps(results)
+        self.assertEqual(results["parse_ivf_frame_headers"]["frames"], 50)
+        self.assertGreater(results["parse_ivf_frame_headers"]["mb_per_s"], 0)
+        self.assertEqual(results["fetch"]["requests"], 20)
+        self.assertLessEqual(results["fetch"]["p50_ms"], results["fetch"]["p99_ms"])
+        self.assertEqual(set(results["server"]), {"1", "4"})
+        for level in results["server"].values():
+            self.assertEqual(level["errors"], 0)
+            self.assertGreater(level["qps"], 0)
+
+    def test_server_benchmark_can_be_skipped(self):
+        results = run_benchmarks(frame_count=10, mean_size=100, requests=5, server=False)
+        self.assertNotIn("server", results)
+
+
+if __name__ == "__main__":
+    unittest.main()
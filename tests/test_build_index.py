@@ -3,8 +3,11 @@ import unittest
 import os
 import tempfile
 import struct
+import threading
+import time
 import video_index.build_index
 from video_index import build_index
+from video_index.frame_index import FrameIndex
 
 def load_tests(loader, tests, ignore):
     return utils.doctests(video_index.build_index, tests)
@@ -23,7 +26,7 @@ class TestBuildIndex(unittest.TestCase):
             struct.pack('<HH', 640, 480) +  # width, height
             struct.pack('<II', 30, 1) +     # framerate numerator/denominator
             struct.pack('<I', 2) +           # frame count
-            b'\x00' * (32 - 4 - 2 - 2 - 4 - 4 - 4)  # padding
+            b'\x00' * (32 - 4 - 2 - 2 - 4 - 4 - 8 - 4)  # padding
         )
         self.temp_ivf.write(header)
         # Frame 1: size=10 bytes, pts=1
@@ -77,6 +80,139 @@ class TestBuildIndex(unittest.TestCase):
         self.assertEqual(offset2, frames[1][0])
         self.assertEqual(length2, frames[1][1])
 
+    def test_parse_ivf_frames(self):
+        frames = build_index.parse_ivf_frames(self.temp_ivf.name)
+        self.assertEqual(frames, [(44, 10, 1), (66, 20, 2)])
+
+    def test_build_index_v2(self):
+        build_index.build_index(self.temp_ivf.name, self.index_path, version=2)
+        index = FrameIndex.from_file(self.index_path)
+        self.assertEqual(index.entries.tolist(), [(44, 10), (66, 20)])
+        self.assertEqual(index.header.frame_count, 2)
+        self.assertEqual((index.header.timebase_num, index.header.timebase_den), (1, 30))
+        self.assertEqual(index.header.source_size, os.path.getsize(self.temp_ivf.name))
+        self.assertEqual(index.pts.tolist(), [1, 2])
+        self.assertEqual(index.frame_at_time(1 / 30), 0)
+        # One block of 4-byte lengths and 8-byte timestamps, plus the header
+        self.assertEqual(os.path.getsize(self.index_path), 64 + 8 + 64 * 4 + 8 + 64 * 8)
+
+    def test_convert_index(self):
+        build_index.build_index(self.temp_ivf.name, self.index_path)
+        with open(self.index_path, 'rb') as f:
+            v1 = f.read()
+        build_index.convert_index(self.temp_ivf.name, self.index_path, version=2)
+        self.assertEqual(FrameIndex.from_file(self.index_path).pts.tolist(), [1, 2])
+        build_index.convert_index(self.temp_ivf.name, self.index_path, version=1)
+        with open(self.index_path, 'rb') as f:
+            self.assertEqual(f.read(), v1)
+        with self.assertRaises(ValueError):
+            build_index.build_index(self.temp_ivf.name, self.index_path, version=3)
+
+    def test_merge_indexes(self):
+        _, full_index, _ = utils.make_ivf([10, 20, 30])
+        _, first, _ = utils.make_ivf([10, 20])
+        _, second, _ = utils.make_ivf([30])
+        paths = []
+        for data in (first, second):
+            fd, path = tempfile.mkstemp()
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            paths.append(path)
+        try:
+            # Second segment's frames start after 2 frames of the first
+            count = build_index.merge_indexes(paths, [0, 12 + 10 + 12 + 20], self.index_path)
+            # Version 2 needs timestamps in the segment indexes
+            with self.assertRaises(ValueError):
+                build_index.merge_indexes(paths, [0, 12 + 10 + 12 + 20], self.index_path, version=2)
+        finally:
+            for path in paths:
+                os.remove(path)
+        self.assertEqual(count, 3)
+        with open(self.index_path, 'rb') as f:
+            self.assertEqual(f.read(), full_index)
+
+
+class TestUpdateIndex(unittest.TestCase):
+    def setUp(self):
+        self.ivf, self.index, _ = utils.make_ivf([10, 0, 300, 7, 4096])
+        self.dir = tempfile.TemporaryDirectory()
+        self.ivf_path = os.path.join(self.dir.name, "live.ivf")
+        self.index_path = self.ivf_path + ".idx"
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write_prefix(self, size):
+        with open(self.ivf_path, 'wb') as f:
+            f.write(self.ivf[:size])
+
+    def read_index(self):
+        with open(self.index_path, 'rb') as f:
+            return f.read()
+
+    def test_appends_only_complete_frames(self):
+        self.write_prefix(20)
+        self.assertEqual(build_index.update_index(self.ivf_path, self.index_path), 0)
+        # Frames 0 and 1 complete, frame 2 only partly written
+        self.write_prefix(32 + 12 + 10 + 12 + 0 + 12 + 100)
+        self.assertEqual(build_index.update_index(self.ivf_path, self.index_path), 2)
+        self.assertEqual(self.read_index(), self.index[:32])
+        self.assertEqual(build_index.update_index(self.ivf_path, self.index_path), 0)
+        self.write_prefix(len(self.ivf))
+        self.assertEqual(build_index.update_index(self.ivf_path, self.index_path), 3)
+        self.assertEqual(self.read_index(), self.index)
+
+    def test_drops_torn_entry(self):
+        self.write_prefix(len(self.ivf))
+        with open(self.index_path, 'wb') as f:
+            f.write(self.index[:16 + 5])
+        self.assertEqual(build_index.update_index(self.ivf_path, self.index_path), 4)
+        self.assertEqual(self.read_index(), self.index)
+
+    def test_rejects_v2_index(self):
+        self.write_prefix(len(self.ivf))
+        build_index.build_index(self.ivf_path, self.index_path, version=2)
+        with self.assertRaises(ValueError):
+            build_index.update_index(self.ivf_path, self.index_path)
+
+    def test_follow_index(self):
+        def record():
+            for size in (10, 60, 400, len(self.ivf)):
+                self.write_prefix(size)
+                time.sleep(0.05)
+
+        writer = threading.Thread(target=record)
+        writer.start()
+        appended = build_index.follow_index(self.ivf_path, self.index_path, interval=0.01, idle_timeout=0.3)
+        writer.join()
+        self.assertEqual(appended, 5)
+        self.assertEqual(self.read_index(), self.index)
+
+
+class TestIvfStreamIndexer(unittest.TestCase):
+    def setUp(self):
+        self.ivf, self.index, _ = utils.make_ivf([10, 0, 300, 7, 4096])
+
+    def test_matches_index_for_any_chunking(self):
+        for chunk_size in (1, 5, 12, 13, 100, len(self.ivf)):
+            indexer = build_index.IvfStreamIndexer()
+            positions = []
+            for pos in range(0, len(self.ivf), chunk_size):
+                positions.extend(indexer.feed(self.ivf[pos:pos + chunk_size]))
+            indexer.finish()
+            self.assertEqual(build_index.pack_index_entries(positions), self.index, chunk_size)
+            self.assertEqual(indexer.frame_count, 5)
+
+    def test_truncated_stream(self):
+        indexer = build_index.IvfStreamIndexer()
+        self.assertEqual(indexer.feed(self.ivf[:-1]), [(44, 10), (66, 0), (78, 300), (390, 7)])
+        with self.assertRaises(ValueError):
+            indexer.finish()
+
+    def test_invalid_stream(self):
+        with self.assertRaises(ValueError):
+            build_index.IvfStreamIndexer().feed(b'RIFF' + b'\x00' * 40)
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -0,0 +1,112 @@
+import utils
+import unittest
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+import video_index.catalog
+from video_index.catalog import Catalog, build_catalog, main, read_manifest
+from video_index.errors import FrameFetchError
+from video_index.frame_index import FrameIndex, IndexHeader, pack_index_v2
+from utils import make_ivf
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.catalog, tests)
+
+
+class TestCatalog(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        _, index_a, _ = make_ivf([10, 20, 30])
+        _, index_b, _ = make_ivf(list(range(1, 151)))
+        positions = FrameIndex.from_bytes(index_b).entries.tolist()
+        header = IndexHeader(0, block_frames=16, timebase_num=1, timebase_den=30)
+        index_b = pack_index_v2(positions, header, [2 * n for n in range(150)])
+        self.positions = {"a": FrameIndex.from_bytes(index_a).entries.tolist(), "b": positions}
+        self.videos = []
+        for video_id, data in (("b", index_b), ("a", index_a), ("empty", b"")):
+            path = os.path.join(self.tmp.name, video_id + ".ivf.idx")
+            with open(path, 'wb') as f:
+                f.write(data)
+            self.videos.append((video_id, f"gs://bucket/{video_id}.ivf", path))
+        self.path = os.path.join(self.tmp.name, "videos.vcat")
+
+    def test_round_trip(self):
+        self.assertEqual(build_catalog(self.videos, self.path), 3)
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+        catalog = Catalog(self.path)
+        self.assertEqual(len(catalog), 3)
+        self.assertEqual(sorted(catalog), ["a", "b", "empty"])
+        self.assertIn("a", catalog)
+        for video_id, positions in self.positions.items():
+            video = catalog.video(video_id)
+            self.assertEqual(video.video_url, f"gs://bucket/{video_id}.ivf")
+            self.assertEqual(len(video), len(positions))
+            self.assertEqual([video.entry(n) for n in range(len(positions))], positions)
+            self.assertEqual(video.index().entries.tolist(), positions)
+        self.assertEqual(len(catalog.video("empty")), 0)
+
+    def test_entries_for(self):
+        build_catalog(self.videos, self.path)
+        video = Catalog(self.path).video("b")
+        frames = [149, 3, 40, 3]
+        self.assertEqual(video.entries_for(frames), [tuple(self.positions["b"][n]) for n in frames])
+        self.assertEqual(video.entries_for([]), [])
+
+    def test_frame_at_time(self):
+        build_catalog(self.videos, self.path)
+        catalog = Catalog(self.path)
+        video = catalog.video("b")
+        # Frame n is shown from tick 2n, at 30 ticks per second
+        self.assertEqual(video.frame_at_time(0), 0)
+        self.assertEqual(video.frame_at_time(1.0), 15)
+        self.assertEqual(video.frame_at_time(1.05), 15)
+        self.assertEqual(video.frame_at_time(100), 149)
+        with self.assertRaises(RuntimeError):
+            catalog.video("a").frame_at_time(0)
+
+    def test_lookup_errors(self):
+        build_catalog(self.videos, self.path)
+        catalog = Catalog(self.path)
+        with self.assertRaises(FrameFetchError) as cm:
+            catalog.video("missing")
+        self.assertTrue(cm.exception.not_found)
+        for video_id, frame_num in (("a", 3), ("b", 150), ("b", -1), ("empty", 0)):
+            with self.assertRaises(FrameFetchError) as cm:
+                catalog.video(video_id).entry(frame_num)
+            self.assertTrue(cm.exception.not_found)
+
+    def test_build_errors(self):
+        with self.assertRaises(ValueError):
+            build_catalog(self.videos + self.videos[:1], self.path)
+        bad_path = os.path.join(self.tmp.name, "bad.idx")
+        with open(bad_path, 'wb') as f:
+            f.write(b"x" * 17)
+        with self.assertRaises(ValueError):
+            build_catalog([("bad", "gs://bucket/bad.ivf", bad_path)], self.path)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+        with self.assertRaises(ValueError):
+            Catalog(bad_path)
+
+    def test_manifest(self):
+        manifest = os.path.join(self.tmp.name, "videos.csv")
+        with open(manifest, 'w') as f:
+            f.write("# id,url,index\n")
+            for video_id, video_url, path in self.videos:
+                f.write(f"{video_id},{video_url},{os.path.basename(path)}\n")
+        self.assertEqual(list(read_manifest(manifest)), self.videos)
+
+    def test_main(self):
+        indexes = [path for _, _, path in self.videos]
+        argv = ["catalog", self.path, *indexes, "--url-prefix", "gs://bucket/"]
+        with patch.object(sys, "argv", argv), patch("builtins.print"):
+            main()
+        catalog = Catalog(self.path)
+        self.assertEqual(catalog.video("a").video_url, "gs://bucket/a.ivf")
+        self.assertEqual(catalog.video("b").entry(7), tuple(self.positions["b"][7]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import utils
+import unittest
+import asyncio
+import os
+import tempfile
+import video_index.clip
+from video_index.async_get_frame import AsyncFrameClient
+from video_index.build_index import parse_ivf_frames
+from video_index.clip import (
+    ClipRewriter,
+    aiter_clip,
+    aopen_clip,
+    iter_clip,
+    open_clip,
+    plan_clip,
+    write_clip,
+)
+from video_index.coalesce import CoalescedRead
+from video_index.errors import FrameFetchError
+from video_index.get_frame import FrameClient
+from video_index.ivf import IVF_HEADER_SIZE, parse_ivf_header
+from utils import make_ivf
+from video_index.benchmark import RangeServer
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.clip, tests)
+
+
+class TestClip(unittest.TestCase):
+    def setUp(self):
+        self.ivf, self.index, self.payloads = make_ivf([10 + n for n in range(20)])
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.video_path = os.path.join(self.tmp.name, "v.ivf")
+        with open(self.video_path, 'wb') as f:
+            f.write(self.ivf)
+        with open(self.video_path + ".idx", 'wb') as f:
+            f.write(self.index)
+
+    def check_clip(self, data, frame_nums):
+        """Check data is an IVF file of frame_nums with timestamps rebased to zero."""
+        path = os.path.join(self.tmp.name, "check.ivf")
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.assertEqual(parse_ivf_header(data).frame_count, len(frame_nums))
+        frames = parse_ivf_frames(path)
+        # make_ivf stamps frame n with pts n
+        self.assertEqual([pts for _, _, pts in frames], [n - frame_nums[0] for n in frame_nums])
+        self.assertEqual([data[o:o + n] for o, n, _ in frames], [self.payloads[n] for n in frame_nums])
+        self.assertEqual(frames[-1][0] + frames[-1][1], len(data))
+
+    def test_write_local_clip(self):
+        output = os.path.join(self.tmp.name, "clip.ivf")
+        self.assertEqual(write_clip(self.video_path, self.video_path + ".idx", output, 3, 9), 7)
+        with open(output, 'rb') as f:
+            self.check_clip(f.read(), list(range(3, 10)))
+
+    def test_step_and_small_chunks(self):
+        clip = open_clip(self.video_path, self.video_path + ".idx", 2, 17, step=5, max_gap=0)
+        self.assertEqual(len(clip.reads), 4)
+        data = b''.join(iter_clip(self.video_path, clip, chunk_size=7))
+        self.assertEqual(len(data), clip.size)
+        self.check_clip(data, [2, 7, 12, 17])
+
+    def test_http_single_read(self):
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}) as server:
+            client = FrameClient()
+            clip = open_clip(server.url("/v.ivf"), server.url("/v.ivf.idx"), 0, 19, client=client)
+            before = server.request_count
+            data = b''.join(iter_clip(server.url("/v.ivf"), clip, client, chunk_size=16))
+            self.assertEqual(server.request_count - before, 1)
+        self.check_clip(data, list(range(20)))
+
+    def test_async_clip(self):
+        async def run(server):
+            async with AsyncFrameClient() as client:
+                clip = await aopen_clip(client, server.url("/v.ivf"), server.url("/v.ivf.idx"), 5, 15, step=2)
+                return b''.join([chunk async for chunk in aiter_clip(client, server.url("/v.ivf"), clip, 9)])
+
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}) as server:
+            data = asyncio.run(run(server))
+        self.check_clip(data, list(range(5, 16, 2)))
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            open_clip(self.video_path, self.video_path + ".idx", 5, 4)
+        with self.assertRaises(FrameFetchError) as cm:
+            open_clip(self.video_path, self.video_path + ".idx", 15, 20)
+        self.assertTrue(cm.exception.not_found)
+        # An index that does not match the video
+        clip = plan_clip(self.ivf[:IVF_HEADER_SIZE], [0], [(IVF_HEADER_SIZE + 12, 11)])
+        with self.assertRaises(FrameFetchError):
+            b''.join(iter_clip(self.video_path, clip))
+
+    def test_rewriter_truncated_read(self):
+        rewriter = ClipRewriter()
+        rewriter.start(CoalescedRead(0, 22, [(0, 0, 22)]))
+        rewriter.feed(self.ivf[IVF_HEADER_SIZE:IVF_HEADER_SIZE + 15])
+        with self.assertRaises(FrameFetchError):
+            rewriter.finish()
+
+
+if __name__ == '__main__':
+    unittest.main()
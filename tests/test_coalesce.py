@@ -0,0 +1,57 @@
+import utils
+import unittest
+import video_index.coalesce
+from video_index.coalesce import (
+    plan_coalesced_reads,
+    split_coalesced_read,
+    parse_frame_list,
+    pack_frame_record,
+    iter_frame_records,
+)
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.coalesce, tests)
+
+
+class TestCoalesce(unittest.TestCase):
+    def test_adjacent_frames_merge(self):
+        # Three back-to-back frames separated only by 12-byte IVF frame headers
+        frames = [(2, 88, 20), (0, 44, 10), (1, 66, 10)]
+        reads = plan_coalesced_reads(frames, max_gap=12)
+        self.assertEqual(len(reads), 1)
+        self.assertEqual((reads[0].start, reads[0].length), (44, 64))
+        self.assertEqual([f[0] for f in reads[0].frames], [0, 1, 2])
+
+    def test_gap_threshold(self):
+        frames = [(0, 0, 10), (1, 20, 10)]
+        self.assertEqual(len(plan_coalesced_reads(frames, max_gap=9)), 2)
+        self.assertEqual(len(plan_coalesced_reads(frames, max_gap=10)), 1)
+
+    def test_max_read(self):
+        frames = [(i, i * 10, 10) for i in range(10)]
+        reads = plan_coalesced_reads(frames, max_gap=0, max_read=30)
+        self.assertEqual([r.length for r in reads], [30, 30, 30, 10])
+
+    def test_duplicates_read_once(self):
+        reads = plan_coalesced_reads([(1, 5, 5), (1, 5, 5)], max_gap=0)
+        self.assertEqual(reads[0].frames, [(1, 5, 5)])
+
+    def test_split_coalesced_read(self):
+        read = plan_coalesced_reads([(0, 2, 3), (1, 7, 2)], max_gap=4)[0]
+        self.assertEqual(list(split_coalesced_read(read, b'abcdefg')), [(0, b'abc'), (1, b'fg')])
+        with self.assertRaises(RuntimeError):
+            list(split_coalesced_read(read, b'abc'))
+
+    def test_parse_frame_list_invalid(self):
+        for spec in ("", "a", "5-3", "-1"):
+            with self.assertRaises(ValueError):
+                parse_frame_list(spec)
+
+    def test_records_round_trip(self):
+        blob = b''.join(pack_frame_record(n, p) + p for n, p in [(1, b'a'), (9, b''), (4, b'xyz')])
+        self.assertEqual(list(iter_frame_records(blob)), [(1, b'a'), (9, b''), (4, b'xyz')])
+        with self.assertRaises(ValueError):
+            list(iter_frame_records(blob[:-1]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import utils
+import unittest
+import asyncio
+import os
+import pickle
+import tempfile
+import video_index.dataset
+from video_index.async_get_frame import AsyncFrameClient
+from video_index.catalog import Catalog, build_catalog
+from video_index.dataset import FrameBatches, FrameDataset, shard_indices
+from video_index.get_frame import FrameClient
+from utils import make_ivf
+from video_index.benchmark import RangeServer
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.dataset, tests)
+
+
+class TestFrameDataset(unittest.TestCase):
+    def setUp(self):
+        self.objects = {}
+        self.payloads = []
+        for name, count in (("a", 7), ("b", 0), ("c", 5)):
+            ivf, index, payloads = make_ivf([10 + n for n in range(count)])
+            self.objects[f"/{name}.ivf"] = ivf
+            self.objects[f"/{name}.ivf.idx"] = index
+            self.payloads.append(payloads)
+        # Dataset item i in the order of (video, frame)
+        self.items = [p for payloads in self.payloads for p in payloads]
+        self.server = RangeServer(self.objects)
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        self.videos = [(self.server.url(f"/{n}.ivf"), self.server.url(f"/{n}.ivf.idx")) for n in "abc"]
+
+    def test_map_style(self):
+        dataset = FrameDataset(self.videos, client=FrameClient())
+        self.assertEqual(dataset.frame_counts.tolist(), [7, 0, 5])
+        self.assertEqual(len(dataset), 12)
+        self.assertEqual(dataset[8], self.items[8])
+        self.assertEqual(dataset[-1], self.items[-1])
+        self.assertEqual(dataset.get_batch([11, 0, 3, 8, 0]), [self.items[n] for n in [11, 0, 3, 8, 0]])
+        with self.assertRaises(IndexError):
+            dataset[12]
+
+    def test_batch_grouped_by_video(self):
+        dataset = FrameDataset(self.videos, frame_counts=[7, 0, 5], client=FrameClient())
+        before = self.server.request_count
+        dataset.get_batch([9, 1, 2, 8, 3])
+        # Per video: index format probe, one index read and one coalesced read
+        self.assertEqual(self.server.request_count - before, 6)
+
+    def test_stride(self):
+        dataset = FrameDataset(self.videos, frame_counts=[7, 0, 5], stride=3, client=FrameClient())
+        self.assertEqual(len(dataset), 5)
+        expected = [self.payloads[0][n] for n in (0, 3, 6)] + [self.payloads[2][n] for n in (0, 3)]
+        self.assertEqual(dataset.get_batch(range(5)), expected)
+
+    def test_order(self):
+        dataset = FrameDataset(self.videos, frame_counts=[7, 0, 5])
+        self.assertEqual(dataset.order(seed=3).tolist(), dataset.order(seed=3).tolist())
+        self.assertNotEqual(dataset.order(seed=3).tolist(), dataset.order(seed=3, epoch=1).tolist())
+        self.assertEqual(dataset.order(shuffle=False).tolist(), list(range(12)))
+        shards = [dataset.order(seed=3, shard=s, num_shards=3) for s in range(3)]
+        self.assertEqual(sorted(n for shard in shards for n in shard.tolist()), list(range(12)))
+        with self.assertRaises(ValueError):
+            shard_indices(12, shard=3, num_shards=3)
+
+    def test_batches(self):
+        dataset = FrameDataset(self.videos, frame_counts=[7, 0, 5], client=FrameClient())
+        batches = list(dataset.batches(5, seed=1, depth=2, workers=4))
+        self.assertEqual([len(b.data) for b in batches], [5, 5, 2])
+        order = dataset.order(seed=1).tolist()
+        self.assertEqual([n for b in batches for n in b.indices.tolist()], order)
+        for batch in batches:
+            self.assertEqual(batch.data, [self.items[n] for n in batch.indices.tolist()])
+        batches = list(dataset.batches(5, shuffle=False, drop_last=True))
+        self.assertEqual([b.indices.tolist() for b in batches], [[0, 1, 2, 3, 4], [5, 6, 7, 8, 9]])
+
+    def test_abatches(self):
+        dataset = FrameDataset(self.videos, frame_counts=[7, 0, 5])
+
+        async def collect():
+            async with AsyncFrameClient() as client:
+                return [batch async for batch in dataset.abatches(client, 4, seed=2, depth=2)]
+
+        batches = asyncio.run(collect())
+        self.assertEqual([n for b in batches for n in b.indices.tolist()], dataset.order(seed=2).tolist())
+        for batch in batches:
+            self.assertEqual(batch.data, [self.items[n] for n in batch.indices.tolist()])
+
+    def test_frame_batches_epochs(self):
+        dataset = FrameDataset(self.videos, frame_counts=[7, 0, 5], client=FrameClient())
+        iterable = FrameBatches(dataset, 12, seed=5)
+        first = next(iter(iterable)).indices.tolist()
+        self.assertEqual(next(iter(iterable)).indices.tolist(), first)
+        iterable.set_epoch(1)
+        self.assertNotEqual(next(iter(iterable)).indices.tolist(), first)
+
+    def test_catalog(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            entries = []
+            for (video_url, _), name in zip(self.videos, "abc"):
+                index_path = os.path.join(tmp, name + ".ivf.idx")
+                with open(index_path, 'wb') as f:
+                    f.write(self.objects[f"/{name}.ivf.idx"])
+                entries.append((name, video_url, index_path))
+            build_catalog(entries, os.path.join(tmp, "videos.vcat"))
+            dataset = FrameDataset.from_catalog(Catalog(os.path.join(tmp, "videos.vcat")), client=FrameClient())
+            self.assertEqual(dataset.videos, ["a", "b", "c"])
+            before = self.server.request_count
+            self.assertEqual(dataset.get_batch([9, 1, 2]), [self.items[n] for n in [9, 1, 2]])
+            # Index entries come from the catalog: one read per video
+            self.assertEqual(self.server.request_count - before, 2)
+
+            copy = pickle.loads(pickle.dumps(dataset))
+            self.assertEqual(copy.get_batch([10]), [self.items[10]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import utils
+import unittest
+import asyncio
+import os
+import sys
+from fractions import Fraction
+import video_index.decode
+from video_index.decode import DecoderBusy, DecoderPool, decode_frame, image_cache_key
+from video_index.frame_cache import FrameCache
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.decode, tests)
+
+
+FAKE_DECODER = [sys.executable, os.path.join(os.path.dirname(__file__), "fake_decoder.py")]
+
+
+def encode_av1_frame():
+    """Encode one small intra frame with PyAV, or return None if it cannot."""
+    try:
+        import av
+        import numpy as np
+        codec = av.CodecContext.create("libsvtav1", "w")
+    except Exception:
+        return None
+    codec.width, codec.height, codec.pix_fmt = 64, 48, "yuv420p"
+    codec.time_base = Fraction(1, 30)
+    codec.options = {"svtav1-params": "keyint=1"}
+    frame = av.VideoFrame.from_ndarray(np.full((48, 64, 3), 128, dtype=np.uint8), format="rgb24")
+    packets = codec.encode(frame.reformat(format="yuv420p")) + codec.encode(None)
+    return bytes(packets[0])
+
+
+class TestDecoderPool(unittest.IsolatedAsyncioTestCase):
+    pool = None
+
+    async def asyncTearDown(self):
+        if self.pool is not None:
+            await self.pool.aclose()
+
+    async def test_workers_are_reused(self):
+        self.pool = DecoderPool(size=1, command=FAKE_DECODER)
+        first = await self.pool.decode(b"a", "png", 320)
+        self.assertTrue(first.startswith(b"png 320x0 a "))
+        second = await self.pool.decode(b"b", "jpeg")
+        self.assertEqual(first.split(b"(")[1], second.split(b"(")[1])
+
+    async def test_failed_decode_keeps_worker(self):
+        self.pool = DecoderPool(size=1, command=FAKE_DECODER)
+        before = await self.pool.decode(b"a", "png")
+        with self.assertRaisesRegex(RuntimeError, "cannot decode"):
+            await self.pool.decode(b"fail", "png")
+        after = await self.pool.decode(b"a", "png")
+        self.assertEqual(before, after)
+
+    async def test_dead_or_slow_worker_is_replaced(self):
+        self.pool = DecoderPool(size=1, timeout=0.5, command=FAKE_DECODER)
+        before = await self.pool.decode(b"a", "png")
+        with self.assertRaises(RuntimeError):
+            await self.pool.decode(b"exit", "png")
+        after = await self.pool.decode(b"a", "png")
+        self.assertNotEqual(before, after)
+        with self.assertRaises(RuntimeError):
+            await self.pool.decode(b"sleep5", "png")
+        self.assertNotEqual(await self.pool.decode(b"a", "png"), after)
+
+    async def test_backpressure(self):
+        self.pool = DecoderPool(size=1, max_waiting=1, command=FAKE_DECODER)
+        busy = asyncio.ensure_future(self.pool.decode(b"sleep0.3", "png"))
+        waiting = asyncio.ensure_future(self.pool.decode(b"a", "png"))
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.pool.waiting, 1)
+        with self.assertRaises(DecoderBusy):
+            await self.pool.decode(b"b", "png")
+        await asyncio.gather(busy, waiting)
+
+    async def test_cache_and_shared_decodes(self):
+        self.pool = DecoderPool(size=2, cache=FrameCache(memory_bytes=2**20), command=FAKE_DECODER)
+        key = image_cache_key("http://v", 44, 10, "png")
+        images = await asyncio.gather(*(self.pool.decode(b"sleep0.1", "png", key=key) for _ in range(4)))
+        self.assertEqual(len(set(images)), 1)
+        self.assertEqual(await self.pool.cached(key), images[0])
+
+    @unittest.skipIf(video_index.decode.av is None, "PyAV is not installed")
+    async def test_decode_av1_frame(self):
+        payload = encode_av1_frame()
+        if payload is None:
+            self.skipTest("No AV1 encoder available to PyAV")
+        self.pool = DecoderPool(size=1)
+        image = await self.pool.decode(payload, "png", 32)
+        self.assertTrue(image.startswith(b"\x89PNG"))
+        self.assertTrue(decode_frame(payload, "jpeg").startswith(b"\xff\xd8"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,22 +2,78 @@ import utils
 import unittest
 from unittest.mock import patch, MagicMock
 import sys
-from io import StringIO
+import os
+import json
+import struct
+import tempfile
+from io import BytesIO, StringIO
+from fractions import Fraction
 import video_index.encode_video
 from video_index import encode_video
+from video_index.build_index import build_index
 
 def load_tests(loader, tests, ignore):
     return utils.doctests(video_index.encode_video, tests)
 
 
+# ffmpeg's stderr with -progress pipe:2 and -benchmark
+PROGRESS_STDERR = b"""Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'input.mp4':
+frame=1
+fps=0.00
+bitrate=N/A
+total_size=44
+out_time_us=0
+speed=N/A
+progress=continue
+[libaom-av1 @ 0x55d] 1 frames left in the queue on closing
+frame=3
+fps=2.50
+bitrate= 640.0kbits/s
+total_size=2242
+out_time_us=100000
+speed=0.083x
+progress=end
+bench: utime=1.500s stime=0.250s rtime=1.200s
+bench: maxrss=51200KiB
+"""
+
+
+def mock_process(mock_popen, stdout=b"", stderr=b"", returncode=0):
+    proc = MagicMock()
+    proc.stdout = BytesIO(stdout)
+    proc.stderr = BytesIO(stderr)
+    proc.wait.return_value = returncode
+    proc.poll.return_value = returncode
+    mock_popen.return_value = proc
+    return proc
+
+
 class TestEncodeVideo(unittest.TestCase):
-    @patch("subprocess.run")
-    def test_encode_av1_intra_success(self, mock_run):
-        mock_result = MagicMock()
-        mock_result.returncode = 0
-        mock_run.return_value = mock_result
+    @patch("subprocess.Popen")
+    def test_encode_av1_intra_success(self, mock_popen):
+        mock_process(mock_popen, stderr=PROGRESS_STDERR)
 
-        try:
+        with tempfile.TemporaryDirectory() as tmp:
+            # Stands in for the file ffmpeg writes
+            output = os.path.join(tmp, "output.ivf")
+            open(output, 'wb').close()
+            try:
+                encode_video.encode_av1_intra(
+                    input_path="input.mp4",
+                    output_path=output,
+                    crf=30,
+                    cpu_used=4,
+                    tune=None,
+                )
+            except Exception:
+                self.fail("encode_av1_intra raised Exception unexpectedly")
+        self.assertIn("-progress", mock_popen.call_args.args[0])
+
+    @patch("subprocess.Popen")
+    def test_encode_av1_intra_failure(self, mock_popen):
+        mock_process(mock_popen, stderr=PROGRESS_STDERR + b"Error\n", returncode=1)
+
+        with self.assertRaises(RuntimeError) as ctx:
             encode_video.encode_av1_intra(
                 input_path="input.mp4",
                 output_path="output.ivf",
@@ -25,27 +81,51 @@ class TestEncodeVideo(unittest.TestCase):
                 cpu_used=4,
                 tune=None,
             )
-        except Exception:
-            self.fail("encode_av1_intra raised Exception unexpectedly")
+        # Only log lines are kept for the report, not progress blocks
+        self.assertIn("Error", str(ctx.exception))
+        self.assertIn("frames left in the queue", str(ctx.exception))
+        self.assertNotIn("progress=", str(ctx.exception))
 
-    @patch("subprocess.run")
-    def test_encode_av1_intra_failure(self, mock_run):
-        mock_result = MagicMock()
-        mock_result.returncode = 1
-        mock_result.stderr = "Error"
-        mock_run.return_value = mock_result
-
-        with self.assertRaises(RuntimeError):
+    @patch("video_index.encode_video.probe_video", return_value=(Fraction(30), 3))
+    @patch("subprocess.Popen")
+    def test_encode_av1_intra_progress(self, mock_popen, mock_probe):
+        mock_process(mock_popen, stderr=PROGRESS_STDERR)
+        reports = []
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "out.ivf")
+            with open(output, 'wb') as f:
+                f.write(b"x" * 2242)
             encode_video.encode_av1_intra(
-                input_path="input.mp4",
-                output_path="output.ivf",
-                crf=30,
-                cpu_used=4,
-                tune=None,
+                "input.mp4", output, progress=reports.append, perf_path=output + ".perf.json"
             )
+            with open(output + ".perf.json") as f:
+                record = json.load(f)
+        self.assertEqual([r.frames for r in reports], [1, 3])
+        self.assertEqual([r.done for r in reports], [False, True])
+        self.assertEqual(reports[0].total_frames, 3)
+        self.assertIsNone(reports[0].bitrate)
+        self.assertEqual((reports[1].bitrate, reports[1].speed, reports[1].eta), (640.0, 0.083, 0.0))
+        self.assertEqual(record["frames"], 3)
+        self.assertEqual(record["output_bytes"], 2242)
+        self.assertEqual((record["user_time"], record["system_time"], record["max_rss_kb"]), (1.5, 0.25, 51200))
+        self.assertEqual(record["command"], mock_popen.call_args.args[0])
+
+    @patch("subprocess.Popen")
+    def test_progress_callback_error(self, mock_popen):
+        mock_process(mock_popen, stderr=PROGRESS_STDERR)
+        calls = []
+
+        def callback(report):
+            calls.append(report)
+            raise ValueError("callback failed")
+
+        with self.assertRaises(ValueError):
+            encode_video.encode_av1_intra("input.mp4", "output.ivf", progress=callback)
+        # stderr is still drained after the callback fails
+        self.assertEqual(len(calls), 1)
 
     @patch("video_index.encode_video.encode_av1_intra")
-    @patch("video_index.build_index.build_index")
+    @patch("video_index.encode_video.build_index")
     def test_main_build_index(self, mock_build_index, mock_encode_av1_intra):
         test_args = [
             "encode_video.py",
@@ -63,6 +143,191 @@ class TestEncodeVideo(unittest.TestCase):
         mock_encode_av1_intra.assert_called_once()
         mock_build_index.assert_called_once()
 
+    @patch("subprocess.run")
+    def test_probe_video(self, mock_run):
+        mock_run.return_value = MagicMock(
+            returncode=0,
+            stdout='{"streams": [{"r_frame_rate": "30000/1001", "duration": "10.01"}], "format": {}}',
+        )
+        frame_rate, frame_count = encode_video.probe_video("input.mp4")
+        self.assertEqual(frame_rate, Fraction(30000, 1001))
+        self.assertEqual(frame_count, 300)
+
+
+class TestEncodeParallel(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.tmpdir.name, "out.ivf")
+        self.index_path = self.output + ".idx"
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_plan_segments(self):
+        self.assertEqual(encode_video.plan_segments(2, 8), [(0, 1), (1, None)])
+        self.assertEqual(encode_video.plan_segments(100, 1), [(0, None)])
+
+    def fake_encode(self, ffmpeg_cmd, output_path, index_path, progress=None, perf_path=None, index_version=1):
+        first = 0
+        if "-ss" in ffmpeg_cmd:
+            first = round(float(ffmpeg_cmd[ffmpeg_cmd.index("-ss") + 1]) * 30 + 0.5)
+        count = len(self.sizes) - first
+        if "-frames:v" in ffmpeg_cmd:
+            count = int(ffmpeg_cmd[ffmpeg_cmd.index("-frames:v") + 1])
+        ivf, index, _ = utils.make_ivf(self.sizes[first:first + count], first_frame=first)
+        with open(output_path, 'wb') as f:
+            f.write(ivf)
+        if index_version == 2:
+            build_index(output_path, index_path, 2)
+        else:
+            with open(index_path, 'wb') as f:
+                f.write(index)
+        if progress:
+            progress(encode_video.EncodeProgress(count, None, 30.0, None, 1.0, 1.0, len(ivf), 1.0, 0.0, True))
+        if perf_path:
+            encode_video.write_perf_record(
+                perf_path, encode_video._perf_record(ffmpeg_cmd, count, len(ivf), 1.0, None, 1.0, 0.5)
+            )
+        return count
+
+    @patch("video_index.encode_video.probe_video")
+    @patch("video_index.encode_video._encode_from_pipe")
+    def test_matches_serial_encode(self, mock_encode, mock_probe):
+        self.sizes = sizes = [5 * (i + 1) for i in range(10)]
+        serial_ivf, serial_index, _ = utils.make_ivf(sizes)
+        mock_probe.return_value = (Fraction(30), len(sizes))
+
+        mock_encode.side_effect = self.fake_encode
+        reports = []
+        perf_path = os.path.join(self.tmpdir.name, "perf.json")
+        frames = encode_video.encode_av1_intra_parallel(
+            "input.mp4", self.output, self.index_path, workers=3, segments=4,
+            progress=reports.append, perf_path=perf_path,
+        )
+        self.assertEqual(frames, len(sizes))
+        self.assertEqual(mock_encode.call_count, 4)
+        self.assertEqual([r.frames for r in reports][-1], len(sizes))
+        self.assertEqual([r.done for r in reports], [False, False, False, True])
+        self.assertEqual(reports[-1].total_frames, len(sizes))
+        with open(perf_path) as f:
+            record = json.load(f)
+        self.assertEqual(record["frames"], len(sizes))
+        self.assertEqual((record["user_time"], record["system_time"]), (4.0, 2.0))
+        self.assertEqual(len(record["segments"]), 4)
+        with open(self.output, 'rb') as f:
+            self.assertEqual(f.read(), serial_ivf)
+        with open(self.index_path, 'rb') as f:
+            self.assertEqual(f.read(), serial_index)
+
+    @patch("video_index.encode_video.build_index")
+    @patch("video_index.encode_video.probe_video")
+    @patch("video_index.encode_video._encode_from_pipe")
+    def test_parallel_index_v2(self, mock_encode, mock_probe, mock_build_index):
+        self.sizes = [5 * (i + 1) for i in range(10)]
+        mock_probe.return_value = (Fraction(30), len(self.sizes))
+        mock_encode.side_effect = self.fake_encode
+        encode_video.encode_av1_intra_parallel(
+            "input.mp4", self.output, self.index_path, workers=2, segments=3, index_version=2
+        )
+        # The merged index matches one built from the joined video, which is not re-read
+        mock_build_index.assert_not_called()
+        expected = os.path.join(self.tmpdir.name, "expected.idx")
+        build_index(self.output, expected, 2)
+        with open(self.index_path, 'rb') as f, open(expected, 'rb') as g:
+            self.assertEqual(f.read(), g.read())
+
+
+class TestEncodeIndexed(unittest.TestCase):
+    def setUp(self):
+        ivf, self.index, _ = utils.make_ivf([100, 50, 2000])
+        # ffmpeg cannot fill in the frame count when writing to a pipe
+        self.expected_ivf = ivf
+        self.piped_ivf = ivf[:24] + struct.pack('<I', 0) + ivf[28:]
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.tmpdir.name, "out.ivf")
+        self.index_path = self.output + ".idx"
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @patch("subprocess.Popen")
+    def test_encode_and_index_in_one_pass(self, mock_popen):
+        mock_process(mock_popen, self.piped_ivf)
+        frames = encode_video.encode_av1_intra_indexed(
+            "input.mp4", self.output, self.index_path, chunk_size=7, perf_path=self.output + ".perf.json"
+        )
+        self.assertEqual(frames, 3)
+        self.assertIn("pipe:1", mock_popen.call_args.args[0])
+        with open(self.output + ".perf.json") as f:
+            record = json.load(f)
+        self.assertEqual((record["frames"], record["output_bytes"]), (3, len(self.expected_ivf)))
+        self.assertEqual(record["bytes_per_frame"], len(self.expected_ivf) / 3)
+        with open(self.output, 'rb') as f:
+            self.assertEqual(f.read(), self.expected_ivf)
+        with open(self.index_path, 'rb') as f:
+            self.assertEqual(f.read(), self.index)
+
+    @patch("subprocess.Popen")
+    def test_encode_and_index_v2_in_one_pass(self, mock_popen):
+        mock_process(mock_popen, self.piped_ivf)
+        frames = encode_video.encode_av1_intra_indexed(
+            "input.mp4", self.output, self.index_path, chunk_size=7, index_version=2
+        )
+        self.assertEqual(frames, 3)
+        expected = os.path.join(self.tmpdir.name, "expected.idx")
+        build_index(self.output, expected, 2)
+        with open(self.index_path, 'rb') as f, open(expected, 'rb') as g:
+            self.assertEqual(f.read(), g.read())
+
+    @patch("subprocess.Popen")
+    def test_encode_failure(self, mock_popen):
+        mock_process(mock_popen, self.piped_ivf[:10], stderr=b"bad input\n", returncode=1)
+        with self.assertRaises(RuntimeError) as ctx:
+            encode_video.encode_av1_intra_indexed("input.mp4", self.output, self.index_path)
+        self.assertIn("bad input", str(ctx.exception))
+
+    @patch("subprocess.Popen")
+    def test_truncated_stream(self, mock_popen):
+        mock_process(mock_popen, self.piped_ivf[:-1])
+        with self.assertRaises(RuntimeError):
+            encode_video.encode_av1_intra_indexed("input.mp4", self.output, self.index_path)
+
+    @patch("video_index.encode_video.encode_av1_intra_indexed")
+    @patch("video_index.encode_video.encode_av1_intra")
+    def test_main_stream(self, mock_encode, mock_indexed):
+        with patch("sys.argv", ["encode_video.py", "in.mp4", "out.ivf", "--build-index", "--stream"]):
+            encode_video.main()
+        mock_encode.assert_not_called()
+        self.assertEqual(mock_indexed.call_args.args[:3], ("in.mp4", "out.ivf", "out.ivf.idx"))
+        with patch("sys.argv", ["encode_video.py", "in.mp4", "out.ivf", "--build-index", "--stream", "--index-version", "2"]):
+            encode_video.main()
+        self.assertEqual(mock_indexed.call_args.kwargs["index_version"], 2)
+
+    @patch("video_index.encode_video.encode_av1_intra_indexed")
+    def test_main_profile(self, mock_indexed):
+        profile = os.path.join(self.tmpdir.name, "host.profile.json")
+        settings = encode_video.EncoderSettings(crf=28, cpu_used=6, tile_columns=2, tile_rows=1, threads=8)
+        encode_video.save_profile(profile, settings, host="test")
+        self.assertEqual(encode_video.load_profile(profile), settings)
+
+        argv = ["encode_video.py", "in.mp4", "out.ivf", "--build-index", "--stream", "--profile", profile, "--crf", "32"]
+        with patch("sys.argv", argv):
+            encode_video.main()
+        self.assertEqual(mock_indexed.call_args.args[3:5], (32, 6))
+        kwargs = mock_indexed.call_args.kwargs
+        self.assertEqual((kwargs["threads"], kwargs["tile_columns"], kwargs["tile_rows"]), (8, 2, 1))
+
+        with open(profile, 'w') as f:
+            f.write("{}")
+        with self.assertRaises(ValueError):
+            encode_video.load_profile(profile)
+
+    def test_ffmpeg_command_tiles(self):
+        cmd = encode_video.ffmpeg_command("in.mp4", "out.ivf", tile_columns=2, tile_rows=1)
+        self.assertEqual(cmd[cmd.index("-tile-columns") + 1], "2")
+        self.assertEqual(cmd[cmd.index("-tile-rows") + 1], "1")
+        self.assertNotIn("-tile-rows", encode_video.ffmpeg_command("in.mp4", "out.ivf"))
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -0,0 +1,42 @@
+import utils
+import unittest
+import os
+import tempfile
+import video_index.errors
+from video_index.errors import FrameFetchError
+from video_index.get_frame import FrameClient
+from utils import make_ivf
+from video_index.benchmark import RangeServer
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.errors, tests)
+
+
+class TestFrameFetchError(unittest.TestCase):
+    def test_missing_objects_are_not_found(self):
+        ivf, index, _ = make_ivf([10, 20])
+        with RangeServer({"/v.ivf": ivf, "/v.ivf.idx": index}) as server:
+            with FrameClient() as client:
+                for video, idx, frame in (("/v.ivf", "/missing.idx", 0), ("/missing.ivf", "/v.ivf.idx", 0), ("/v.ivf", "/v.ivf.idx", 2)):
+                    with self.assertRaises(FrameFetchError) as cm:
+                        client.get_frame(server.url(video), server.url(idx), frame)
+                    self.assertTrue(cm.exception.not_found, (video, idx, frame, cm.exception.status_code))
+
+    def test_local_files(self):
+        with tempfile.TemporaryDirectory() as root:
+            with FrameClient() as client:
+                with self.assertRaises(FrameFetchError) as cm:
+                    client.fetch_index_entry(os.path.join(root, "missing.idx"), 0)
+        self.assertEqual(cm.exception.status_code, 404)
+
+    def test_short_read_is_not_a_missing_frame(self):
+        ivf, index, _ = make_ivf([10, 20])
+        with RangeServer({"/v.ivf": ivf[:-5], "/v.ivf.idx": index}) as server:
+            with FrameClient() as client:
+                with self.assertRaises(FrameFetchError) as cm:
+                    client.get_frame(server.url("/v.ivf"), server.url("/v.ivf.idx"), 1)
+        self.assertIsNone(cm.exception.status_code)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import utils
+import unittest
+import os
+import tempfile
+import shutil
+import threading
+import video_index.frame_cache
+from video_index.frame_cache import FrameCache, DiskTier, frame_cache_key
+from video_index.get_frame import FrameClient
+from utils import make_ivf
+from video_index.benchmark import RangeServer
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.frame_cache, tests)
+
+
+class TestFrameCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_memory_tier_lru(self):
+        cache = FrameCache(memory_bytes=20)
+        a, b, c = (frame_cache_key("v", i * 10, 10) for i in range(3))
+        cache.put(a, b'a' * 10)
+        cache.put(b, b'b' * 10)
+        self.assertEqual(cache.get(a), b'a' * 10)
+        cache.put(c, b'c' * 10)
+        self.assertIsNone(cache.get(b))
+        self.assertEqual(cache.stats()["memory_bytes"], 20)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_disk_tier_shared_between_instances(self):
+        key = frame_cache_key("http://v", 44, 5)
+        FrameCache(memory_bytes=0, disk_dir=self.cache_dir).put(key, b'hello')
+
+        other = FrameCache(memory_bytes=1024, disk_dir=self.cache_dir)
+        self.assertEqual(other.get(key), b'hello')
+        self.assertEqual(other.get(key), b'hello')
+        self.assertEqual(other.stats()["disk_hits"], 1)
+        self.assertEqual(other.stats()["memory_hits"], 1)
+
+    def test_disk_tier_eviction(self):
+        disk = DiskTier(self.cache_dir, max_bytes=100)
+        keys = [frame_cache_key("v", i, 30) for i in range(5)]
+        for i, key in enumerate(keys):
+            disk.put(key, bytes([i]) * 30)
+            # Distinct mtimes so recency order is deterministic
+            os.utime(disk.path(key), (i, i))
+        self.assertLessEqual(disk.nbytes, 100)
+        self.assertIsNone(disk.get(keys[0]))
+        self.assertEqual(disk.get(keys[4]), b'\x04' * 30)
+
+    def test_disk_tier_overwrite_counts_once(self):
+        disk = DiskTier(self.cache_dir, max_bytes=100)
+        key = frame_cache_key("v", 0, 30)
+        for _ in range(5):
+            disk.put(key, b'x' * 30)
+        self.assertEqual(disk.nbytes, 30)
+        self.assertEqual(disk.get(key), b'x' * 30)
+
+    def test_disk_tier_cap_shared_between_instances(self):
+        # One instance per worker process, all on the same directory
+        disks = [DiskTier(self.cache_dir, max_bytes=1000) for _ in range(4)]
+        for i in range(40):
+            disks[i % 4].put(frame_cache_key("v", i, 100), bytes([i]) * 100)
+        on_disk = sum(size for _, _, size in disks[0]._scan())
+        self.assertLessEqual(on_disk, 1000)
+        self.assertEqual(disks[3].nbytes, on_disk)
+        self.assertEqual(DiskTier(self.cache_dir, max_bytes=1000).nbytes, on_disk)
+
+    def test_counts_under_lock(self):
+        cache = FrameCache(disk_dir=self.cache_dir)
+        cache.put(frame_cache_key("v", 0, 5), b'hello')
+
+        def lookups():
+            for _ in range(2000):
+                cache.get(frame_cache_key("v", 0, 5))
+                cache.get(frame_cache_key("v", 8, 5))
+
+        threads = [threading.Thread(target=lookups) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((cache.hits, cache.misses), (16000, 16000))
+
+    def test_client_serves_repeat_frames_from_cache(self):
+        ivf, index, payloads = make_ivf([10, 20])
+        with RangeServer({"/v.ivf": ivf}) as server:
+            cache = FrameCache()
+            client = FrameClient(frame_cache=cache)
+            offset = 32 + 12
+            for _ in range(3):
+                self.assertEqual(client.fetch_frame_data(server.url("/v.ivf"), offset, 10), payloads[0])
+            self.assertEqual(server.request_count, 1)
+            self.assertEqual(cache.stats()["hits"], 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import utils
+import unittest
+import os
+import tempfile
+import numpy as np
+import video_index.frame_index
+from video_index.frame_index import FrameIndex, INDEX_DTYPE, IndexHeader, pack_index_v2, parse_index_header
+from video_index import build_index
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.frame_index, tests)
+
+
+class TestFrameIndex(unittest.TestCase):
+    def setUp(self):
+        self.positions = [(44 + i * 100, 88 + i) for i in range(1000)]
+        fd, self.index_path = tempfile.mkstemp()
+        os.close(fd)
+        build_index.write_binary_index(self.index_path, self.positions)
+
+    def tearDown(self):
+        os.remove(self.index_path)
+
+    def test_from_file_is_memory_mapped(self):
+        index = FrameIndex.from_file(self.index_path)
+        self.assertIsInstance(index.entries, np.memmap)
+        self.assertEqual(len(index), 1000)
+        self.assertEqual(index[0], (44, 88))
+        self.assertEqual(index[-1], self.positions[-1])
+        self.assertIsInstance(index[5][0], int)
+
+    def test_vectorized_lookup(self):
+        index = FrameIndex.from_file(self.index_path)
+        batch = index[np.array([10, 500, 999])]
+        self.assertEqual(batch['offset'].tolist(), [self.positions[i][0] for i in (10, 500, 999)])
+        self.assertEqual(index[100:103]['length'].tolist(), [188, 189, 190])
+        self.assertEqual(int(index.lengths.sum()), sum(length for _, length in self.positions))
+
+    def test_from_bytes_zero_copy(self):
+        with open(self.index_path, 'rb') as f:
+            data = f.read()
+        index = FrameIndex.from_bytes(data)
+        self.assertFalse(index.entries.flags.owndata)
+        self.assertEqual(index[999], self.positions[999])
+        with self.assertRaises(ValueError):
+            FrameIndex.from_bytes(data[:-1])
+
+    def test_entry_out_of_range(self):
+        index = FrameIndex(np.empty(0, dtype=INDEX_DTYPE))
+        with self.assertRaises(RuntimeError):
+            index.entry(0)
+
+    def test_empty_file(self):
+        open(self.index_path, 'wb').close()
+        self.assertEqual(len(FrameIndex.from_file(self.index_path)), 0)
+
+
+class TestFrameIndexV2(unittest.TestCase):
+    def setUp(self):
+        # Contiguous IVF frames, except a gap before frame 128 (a block start)
+        self.positions = []
+        offset = 44
+        for i in range(200):
+            if i == 128:
+                offset += 1000
+            self.positions.append((offset, 50 + i % 7))
+            offset += 50 + i % 7 + 12
+
+    def test_round_trip(self):
+        header = IndexHeader(0, timebase_num=1, timebase_den=30, source_size=123456)
+        data = pack_index_v2(self.positions, header)
+        # Header plus 4 blocks of an 8-byte checkpoint and 64 lengths
+        self.assertEqual(len(data), 64 + 4 * (8 + 64 * 4))
+        index = FrameIndex.from_bytes(data)
+        self.assertEqual(index.entries.tolist(), self.positions)
+        self.assertEqual(index.header, header._replace(frame_count=200))
+        self.assertEqual(parse_index_header(data).source_size, 123456)
+
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        try:
+            self.assertEqual(FrameIndex.from_file(path).entries_for([199, 0, 128]),
+                             [self.positions[n] for n in (199, 0, 128)])
+        finally:
+            os.remove(path)
+
+    def test_rejects_gap_inside_block(self):
+        positions = list(self.positions)
+        positions[10] = (positions[10][0] + 1, positions[10][1])
+        with self.assertRaises(ValueError):
+            pack_index_v2(positions, IndexHeader(0))
+
+    def test_rejects_huge_frame(self):
+        with self.assertRaises(ValueError):
+            pack_index_v2([(44, 2**32)], IndexHeader(0))
+
+    def test_unsupported_version(self):
+        data = bytearray(pack_index_v2(self.positions, IndexHeader(0)))
+        data[4] = 3
+        with self.assertRaises(ValueError):
+            FrameIndex.from_bytes(bytes(data))
+
+    def test_time_lookup_vfr(self):
+        # Timebase of 1/1000 s with irregular frame durations
+        pts = [0, 33, 66, 100, 200, 210, 500] + [1000 + i * 40 for i in range(193)]
+        header = IndexHeader(0, timebase_num=1, timebase_den=1000)
+        index = FrameIndex.from_bytes(pack_index_v2(self.positions, header, pts))
+        self.assertEqual(index.pts.tolist(), pts)
+        self.assertEqual(index.frame_at_time(0), 0)
+        self.assertEqual(index.frame_at_time(0.066), 2)
+        self.assertEqual(index.frame_at_time(0.499), 5)
+        self.assertEqual(index.frame_at_time(1.04), 8)
+        self.assertEqual(index.frame_at_time(3600), 199)
+        self.assertEqual(index.frames_between(0.1, 0.5), range(3, 6))
+        self.assertEqual(index.frames_between(0.3, 0.4), range(6, 6))
+        with self.assertRaises(ValueError):
+            pack_index_v2(self.positions, header, pts[::-1])
+
+    def test_time_lookup_needs_timestamps(self):
+        index = FrameIndex.from_bytes(pack_index_v2(self.positions, IndexHeader(0)))
+        self.assertIsNone(index.pts)
+        with self.assertRaises(RuntimeError):
+            index.frame_at_time(0)
+
+    def test_empty(self):
+        index = FrameIndex.from_bytes(pack_index_v2([], IndexHeader(0)))
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.header.frame_count, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
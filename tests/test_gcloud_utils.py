@@ -0,0 +1,365 @@
+import utils
+import unittest
+import os
+import asyncio
+import tempfile
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+import video_index.gcloud_utils
+from video_index.gcloud_utils import (
+    REQUESTS,
+    STAGE_SECONDS,
+    LocalFrameResponse,
+    app,
+    create_frame_client,
+    get_decoder_pool,
+)
+from video_index.async_get_frame import AsyncFrameClient
+from video_index.build_index import parse_ivf_frames
+from video_index.catalog import build_catalog
+from video_index.ivf import parse_ivf_header
+from video_index.decode import DecoderPool
+from video_index.coalesce import iter_frame_records
+from video_index.frame_index import FrameIndex, IndexHeader, pack_index_v2
+from utils import make_ivf
+from video_index.benchmark import RangeServer
+from test_decode import FAKE_DECODER
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.gcloud_utils, tests)
+
+
+class TestServeFrame(unittest.TestCase):
+    def setUp(self):
+        self.ivf, self.index, self.payloads = make_ivf([10, 20, 30])
+
+    def test_serve_frame(self):
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}) as server:
+            with TestClient(app) as client:
+                resp = client.get("/frame", params={
+                    "video_url": server.url("/v.ivf"),
+                    "index_url": server.url("/v.ivf.idx"),
+                    "frame": 2,
+                })
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.content, self.payloads[2])
+        self.assertEqual(resp.headers["content-type"], "video/AV1")
+
+    def test_serve_frame_by_time(self):
+        positions = FrameIndex.from_bytes(self.index).entries.tolist()
+        header = IndexHeader(0, timebase_num=1, timebase_den=30)
+        index_v2 = pack_index_v2(positions, header, [0, 15, 30])
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": index_v2}) as server:
+            with TestClient(app) as client:
+                params = {"video_url": server.url("/v.ivf"), "index_url": server.url("/v.ivf.idx")}
+                resp = client.get("/frame", params={**params, "t": 0.75})
+                self.assertEqual(resp.status_code, 200)
+                self.assertEqual(resp.content, self.payloads[1])
+                resp = client.get("/frame", params={**params, "t": 0.5, "frame": 1})
+                self.assertEqual(resp.status_code, 422)
+                resp = client.get("/frame", params=params)
+                self.assertEqual(resp.status_code, 422)
+
+    def test_serve_frame_by_time_v1_index(self):
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}) as server:
+            with TestClient(app) as client:
+                resp = client.get("/frame", params={
+                    "video_url": server.url("/v.ivf"),
+                    "index_url": server.url("/v.ivf.idx"),
+                    "t": 0.5,
+                })
+        self.assertEqual(resp.status_code, 422)
+        self.assertEqual(resp.json()["detail"], "Index has no timestamps; rebuild it as version 2")
+
+    def test_serve_local_frame(self):
+        with tempfile.TemporaryDirectory() as root:
+            video_path = os.path.join(root, "v.ivf")
+            with open(video_path, 'wb') as f:
+                f.write(self.ivf)
+            with open(video_path + ".idx", 'wb') as f:
+                f.write(self.index)
+            params = {"video_url": "file://" + video_path, "index_url": video_path + ".idx", "frame": 2}
+            with TestClient(app) as client:
+                resp = client.get("/frame", params=params)
+                self.assertEqual(resp.status_code, 403)
+                with patch.dict(os.environ, {"VIDEO_INDEX_LOCAL_ROOT": root}):
+                    resp = client.get("/frame", params=params)
+                    self.assertEqual(resp.status_code, 200)
+                    self.assertEqual(resp.content, self.payloads[2])
+                    self.assertEqual(resp.headers["content-length"], "30")
+                    etag = resp.headers["etag"]
+                    resp = client.get("/frame", params=params, headers={"If-None-Match": etag})
+                    self.assertEqual(resp.status_code, 304)
+                    resp = client.get("/frame", params=params, headers={"Range": "bytes=-5"})
+                    self.assertEqual((resp.status_code, resp.content), (206, self.payloads[2][-5:]))
+                    resp = client.get("/frame", params={**params, "index_url": "/etc/passwd"})
+                    self.assertEqual(resp.status_code, 403)
+                    resp = client.get("/frames", params={**params, "frames": "0-2"})
+                    self.assertEqual(list(iter_frame_records(resp.content)), list(enumerate(self.payloads)))
+
+    def test_local_frame_response_zerocopysend(self):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(self.ivf)
+            f.flush()
+            messages = []
+
+            async def send(message):
+                messages.append(message)
+
+            scope = {"type": "http", "extensions": {"http.response.zerocopysend": {}}}
+            asyncio.run(LocalFrameResponse(f.name, 66, 20)(scope, None, send))
+        self.assertEqual(messages[1]["type"], "http.response.zerocopysend")
+        self.assertEqual((messages[1]["offset"], messages[1]["count"]), (66, 20))
+
+    def test_warm_index_costs_one_request(self):
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}) as server:
+            with TestClient(app) as client:
+                params = {"video_url": server.url("/v.ivf"), "index_url": server.url("/v.ivf.idx")}
+                client.get("/frame", params={**params, "frame": 0})
+                before = server.request_count
+                # Not the next frame, so no read-ahead is started either
+                resp = client.get("/frame", params={**params, "frame": 2})
+                self.assertEqual(resp.content, self.payloads[2])
+                self.assertEqual(server.request_count - before, 1)
+
+    def test_sequential_frames_read_ahead(self):
+        ivf, index, payloads = make_ivf([10] * 12)
+        with RangeServer({"/v.ivf": ivf, "/v.ivf.idx": index}) as server:
+            with TestClient(app) as client:
+                params = {"video_url": server.url("/v.ivf"), "index_url": server.url("/v.ivf.idx")}
+                for n in range(6):
+                    resp = client.get("/frame", params={**params, "frame": n, "session": "viewer"})
+                    self.assertEqual(resp.content, payloads[n])
+                stats = client.get("/stats").json()["prefetch"]
+        # Frames 0 and 1 establish the run; later ones may be read ahead
+        self.assertEqual(stats["hits"] + stats["misses"], 6)
+        self.assertGreaterEqual(stats["misses"], 2)
+        self.assertEqual(stats["streams"], 1)
+
+    def test_serve_frame_from_catalog(self):
+        ivf, index, payloads = make_ivf([10] * 40)
+        with tempfile.TemporaryDirectory() as root, RangeServer({"/v.ivf": ivf}) as server:
+            index_path = os.path.join(root, "v.ivf.idx")
+            with open(index_path, 'wb') as f:
+                f.write(index)
+            catalog_path = os.path.join(root, "videos.vcat")
+            build_catalog([("v", server.url("/v.ivf"), index_path)], catalog_path)
+            with TestClient(app) as client:
+                resp = client.get("/frame", params={"video_id": "v", "frame": 2})
+                self.assertEqual(resp.status_code, 422)
+                with patch.dict(os.environ, {"VIDEO_INDEX_CATALOG": catalog_path}):
+                    resp = client.get("/frame", params={"video_id": "v", "frame": 2})
+                    self.assertEqual(resp.status_code, 200)
+                    self.assertEqual(resp.content, payloads[2])
+                    # Only the frame itself was read; the index came from the catalog
+                    self.assertEqual(server.request_count, 1)
+                    for n in range(3, 8):
+                        resp = client.get("/frame", params={"video_id": "v", "frame": n, "session": "viewer"})
+                        self.assertEqual(resp.content, payloads[n])
+                    self.assertGreater(client.get("/stats").json()["prefetch"]["hits"], 0)
+                    resp = client.get("/frame", params={"video_id": "w", "frame": 0})
+                    self.assertEqual(resp.status_code, 404)
+                    resp = client.get("/frame", params={"video_id": "v", "frame": 40})
+                    self.assertEqual(resp.status_code, 404)
+                    resp = client.get("/frame", params={"video_id": "v", "video_url": server.url("/v.ivf"), "frame": 0})
+                    self.assertEqual(resp.status_code, 422)
+                    # A v1 index has no timestamps to look t up in
+                    resp = client.get("/frame", params={"video_id": "v", "t": 0.5})
+                    self.assertEqual(resp.status_code, 422)
+
+    def test_metrics(self):
+        requests_before = REQUESTS.value(path="/frame", status="200")
+        index_before = STAGE_SECONDS.count(stage="index")
+        send_before = STAGE_SECONDS.count(stage="send")
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}) as server:
+            with TestClient(app) as client:
+                params = {"video_url": server.url("/v.ivf"), "index_url": server.url("/v.ivf.idx")}
+                for n in (0, 2, 2):
+                    self.assertEqual(client.get("/frame", params={**params, "frame": n}).status_code, 200)
+                self.assertEqual(client.get("/frame", params={**params, "frame": 9}).status_code, 404)
+                resp = client.get("/metrics")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.headers["content-type"].startswith("text/plain; version=0.0.4"))
+        self.assertEqual(REQUESTS.value(path="/frame", status="200") - requests_before, 3)
+        self.assertEqual(STAGE_SECONDS.count(stage="index") - index_before, 4)
+        self.assertEqual(STAGE_SECONDS.count(stage="send") - send_before, 4)
+        text = resp.text
+        self.assertIn('video_index_http_requests_total{path="/frame",status="404"}', text)
+        self.assertIn('video_index_frame_stage_duration_seconds_bucket{stage="data",le="+Inf"}', text)
+        # Downloaded for frame 0, served from the cache for frame 2, and
+        # revalidated for frame 9 in case the index had grown
+        self.assertIn('video_index_cache_hits_total{cache="index"} 2\n', text)
+        self.assertIn('video_index_cache_misses_total{cache="index"} 2\n', text)
+        self.assertIn('video_index_cache_hit_ratio{cache="index"} 0.5\n', text)
+        self.assertIn('video_index_http_requests_in_flight{path="/frame"} 0\n', text)
+        upstream = [line for line in text.splitlines() if line.startswith("video_index_upstream_bytes_total ")]
+        self.assertEqual(len(upstream), 1)
+        self.assertGreater(int(upstream[0].split()[1]), len(self.index))
+
+    def test_prefetch_disabled(self):
+        with patch.dict(os.environ, {"VIDEO_INDEX_PREFETCH_FRAMES": "0"}):
+            with TestClient(app) as client:
+                self.assertIsNone(client.get("/stats").json()["prefetch"])
+
+    def test_frame_caching_headers(self):
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}) as server:
+            with TestClient(app) as client:
+                params = {"video_url": server.url("/v.ivf"), "index_url": server.url("/v.ivf.idx"), "frame": 1}
+                resp = client.get("/frame", params=params)
+                self.assertEqual(resp.content, self.payloads[1])
+                self.assertEqual(resp.headers["content-length"], "20")
+                self.assertIn("immutable", resp.headers["cache-control"])
+                etag = resp.headers["etag"]
+                before = server.request_count
+                resp = client.get("/frame", params=params, headers={"If-None-Match": etag})
+                self.assertEqual(resp.status_code, 304)
+                # Answered from the cached index without reading the frame
+                self.assertEqual(server.request_count, before)
+                resp = client.get("/frame", params={**params, "frame": 2}, headers={"If-None-Match": etag})
+                self.assertEqual(resp.status_code, 200)
+                self.assertNotEqual(resp.headers["etag"], etag)
+
+    def test_frame_byte_range(self):
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}) as server:
+            for stream_min in ["1", str(2**20)]:
+                with patch.dict(os.environ, {"VIDEO_INDEX_STREAM_MIN_BYTES": stream_min}):
+                    with TestClient(app) as client:
+                        params = {"video_url": server.url("/v.ivf"), "index_url": server.url("/v.ivf.idx"), "frame": 2}
+                        resp = client.get("/frame", params=params)
+                        self.assertEqual(resp.content, self.payloads[2])
+                        self.assertEqual(resp.headers["content-length"], "30")
+                        etag = resp.headers["etag"]
+                        resp = client.get("/frame", params=params, headers={"Range": "bytes=25-"})
+                        self.assertEqual(resp.status_code, 206)
+                        self.assertEqual(resp.content, self.payloads[2][25:])
+                        self.assertEqual(resp.headers["content-range"], "bytes 25-29/30")
+                        resp = client.get("/frame", params=params, headers={"Range": "bytes=0-1", "If-Range": '"old"'})
+                        self.assertEqual((resp.status_code, resp.content), (200, self.payloads[2]))
+                        resp = client.get("/frame", params=params, headers={"Range": "bytes=0-1", "If-Range": etag})
+                        self.assertEqual((resp.status_code, resp.content), (206, self.payloads[2][:2]))
+                        resp = client.get("/frame", params=params, headers={"Range": "bytes=30-"})
+                        self.assertEqual(resp.status_code, 416)
+                        self.assertEqual(resp.headers["content-range"], "bytes */30")
+
+    def test_serve_frame_as_image(self):
+        pool = DecoderPool(size=1, command=FAKE_DECODER)
+        app.dependency_overrides[get_decoder_pool] = lambda: pool
+        try:
+            with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}) as server:
+                with TestClient(app) as client:
+                    params = {"video_url": server.url("/v.ivf"), "index_url": server.url("/v.ivf.idx"), "frame": 1}
+                    resp = client.get("/frame", params={**params, "format": "png", "width": 320})
+                    self.assertEqual(resp.status_code, 200)
+                    self.assertEqual(resp.headers["content-type"], "image/png")
+                    self.assertTrue(resp.content.startswith(b"png 320x0 " + self.payloads[1]))
+                    raw_etag = client.get("/frame", params=params).headers["etag"]
+                    self.assertNotEqual(resp.headers["etag"], raw_etag)
+                    # Served from the image cache by the same worker
+                    again = client.get("/frame", params={**params, "format": "png", "width": 320})
+                    self.assertEqual(again.content, resp.content)
+                    resp = client.get("/frame", params={**params, "format": "png"}, headers={"If-None-Match": resp.headers["etag"]})
+                    self.assertEqual(resp.status_code, 200)
+                    resp = client.get("/frame", params={**params, "width": 320})
+                    self.assertEqual(resp.status_code, 422)
+                    resp = client.get("/frame", params={**params, "format": "gif"})
+                    self.assertEqual(resp.status_code, 422)
+        finally:
+            del app.dependency_overrides[get_decoder_pool]
+
+    def test_serve_frame_upstream_error(self):
+        with RangeServer({}) as server:
+            with TestClient(app) as client:
+                resp = client.get("/frame", params={
+                    "video_url": server.url("/v.ivf"),
+                    "index_url": server.url("/v.ivf.idx"),
+                    "frame": 0,
+                })
+        self.assertEqual(resp.status_code, 404)
+
+    def test_serve_frame_error_statuses(self):
+        # A video cut short mid-frame is an upstream inconsistency (502);
+        # a frame past the end of the index does not exist (404)
+        with RangeServer({"/v.ivf": self.ivf[:-5], "/v.ivf.idx": self.index}) as server:
+            with TestClient(app) as client:
+                params = {"video_url": server.url("/v.ivf"), "index_url": server.url("/v.ivf.idx")}
+                self.assertEqual(client.get("/frame", params={**params, "frame": 2}).status_code, 502)
+                self.assertEqual(client.get("/frame", params={**params, "frame": 3}).status_code, 404)
+                self.assertEqual(client.get("/frames", params={**params, "frames": "5-6"}).status_code, 404)
+
+    def test_serve_frame_upstream_timeout(self):
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}, latency=0.5) as server:
+            with patch.dict(os.environ, {"VIDEO_INDEX_PREFETCH_FRAMES": "0"}):
+                with TestClient(app) as client:
+                    with patch.object(video_index.gcloud_utils, "create_frame_client",
+                                      lambda: AsyncFrameClient(timeout=0.1, max_retries=0)):
+                        resp = client.get("/frame", params={
+                            "video_url": server.url("/v.ivf"),
+                            "index_url": server.url("/v.ivf.idx"),
+                            "frame": 0,
+                        })
+        self.assertEqual(resp.status_code, 504)
+
+    def test_serve_clip(self):
+        ivf, index, payloads = make_ivf([10 + n for n in range(10)])
+        with tempfile.TemporaryDirectory() as root, RangeServer({"/v.ivf": ivf, "/v.ivf.idx": index}) as server:
+            params = {"video_url": server.url("/v.ivf"), "index_url": server.url("/v.ivf.idx")}
+            with TestClient(app) as client:
+                resp = client.get("/clip", params={**params, "start": 2, "end": 8, "step": 3})
+                self.assertEqual(resp.status_code, 200)
+                self.assertEqual(resp.headers["content-type"], "video/x-ivf")
+                self.assertEqual(int(resp.headers["content-length"]), len(resp.content))
+                clip_path = os.path.join(root, "clip.ivf")
+                with open(clip_path, 'wb') as f:
+                    f.write(resp.content)
+                frames = parse_ivf_frames(clip_path)
+                self.assertEqual([resp.content[o:o + n] for o, n, _ in frames], [payloads[n] for n in (2, 5, 8)])
+                self.assertEqual([pts for _, _, pts in frames], [0, 3, 6])
+
+                resp = client.get("/clip", params={**params, "start": 8, "end": 10})
+                self.assertEqual(resp.status_code, 404)
+                resp = client.get("/clip", params={**params, "start": 5, "end": 4})
+                self.assertEqual(resp.status_code, 422)
+
+                index_path = os.path.join(root, "v.ivf.idx")
+                with open(index_path, 'wb') as f:
+                    f.write(index)
+                catalog_path = os.path.join(root, "videos.vcat")
+                build_catalog([("v", server.url("/v.ivf"), index_path)], catalog_path)
+                with patch.dict(os.environ, {"VIDEO_INDEX_CATALOG": catalog_path}):
+                    resp = client.get("/clip", params={"video_id": "v", "start": 0, "end": 9})
+                    self.assertEqual(resp.status_code, 200)
+                    self.assertEqual(parse_ivf_header(resp.content).frame_count, 10)
+
+    def test_serve_frames(self):
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}) as server:
+            with TestClient(app) as client:
+                resp = client.get("/frames", params={
+                    "video_url": server.url("/v.ivf"),
+                    "index_url": server.url("/v.ivf.idx"),
+                    "frames": "2,0-1",
+                })
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(list(iter_frame_records(resp.content)), list(enumerate(self.payloads)))
+
+    def test_serve_frames_invalid(self):
+        with TestClient(app) as client:
+            resp = client.get("/frames", params={
+                "video_url": "http://v", "index_url": "http://i", "frames": "3-1",
+            })
+        self.assertEqual(resp.status_code, 422)
+
+    def test_create_frame_client_from_env(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            env = {
+                "VIDEO_INDEX_INDEX_CACHE_BYTES": "0",
+                "VIDEO_INDEX_FRAME_CACHE_BYTES": "1024",
+                "VIDEO_INDEX_FRAME_CACHE_DIR": cache_dir,
+            }
+            with patch.dict(os.environ, env):
+                client = create_frame_client()
+            self.assertIsNone(client.index_cache)
+            self.assertEqual(client.frame_cache.memory.max_bytes, 1024)
+            self.assertEqual(client.frame_cache.disk.directory, cache_dir)
+
+if __name__ == "__main__":
+    unittest.main()
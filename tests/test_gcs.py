@@ -0,0 +1,97 @@
+import utils
+import unittest
+import os
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+import video_index.gcs
+from video_index.gcs import GcsBackend, parse_gcs_url
+from video_index.get_frame import FrameClient
+from video_index.async_get_frame import AsyncFrameClient
+from video_index.gcloud_utils import app
+from video_index.index_cache import IndexCache
+from utils import make_ivf
+from gcs_emulator import GcsEmulator
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.gcs, tests)
+
+
+class TestGcs(unittest.TestCase):
+    def setUp(self):
+        self.ivf, self.index, self.payloads = make_ivf([10, 20, 30])
+        self.emulator = GcsEmulator({("bucket", "videos/v.ivf"): self.ivf, ("bucket", "videos/v.ivf.idx"): self.index})
+        self.emulator.__enter__()
+        self.env = patch.dict(os.environ, {"STORAGE_EMULATOR_HOST": self.emulator.endpoint})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.emulator.__exit__(None, None, None)
+
+    def test_parse_gcs_url(self):
+        self.assertEqual(parse_gcs_url("gs://bucket/a/b.ivf"), ("bucket", "a/b.ivf", None))
+        with self.assertRaises(ValueError):
+            parse_gcs_url("gs://bucket")
+
+    def test_get_frames(self):
+        with FrameClient() as client:
+            self.assertEqual(client.get_frame("gs://bucket/videos/v.ivf", "gs://bucket/videos/v.ivf.idx", 1), self.payloads[1])
+            frames = client.get_frames("gs://bucket/videos/v.ivf", "gs://bucket/videos/v.ivf.idx", [2, 0], max_gap=12)
+            self.assertEqual(frames, [self.payloads[2], self.payloads[0]])
+            with self.assertRaises(RuntimeError):
+                client.get_frame("gs://bucket/videos/missing.ivf", "gs://bucket/videos/v.ivf.idx", 0)
+
+    def test_reads_stay_pinned(self):
+        backend = GcsBackend(index_cache=IndexCache(ttl=3600))
+        self.assertEqual(backend.read_range("gs://bucket/videos/v.ivf", 44, 10), self.payloads[0])
+        first = backend.generation("gs://bucket/videos/v.ivf")
+        # An overwrite is not seen while the pin is fresh
+        self.emulator.upload("bucket", "videos/v.ivf", b"x" * len(self.ivf))
+        self.assertEqual(backend.read_range("gs://bucket/videos/v.ivf", 44, 10), self.payloads[0])
+        self.assertEqual(backend.generation("gs://bucket/videos/v.ivf"), first)
+        # Once the pinned generation is gone the pin is dropped
+        self.emulator.delete_generation("bucket", "videos/v.ivf", first)
+        with self.assertRaises(RuntimeError):
+            backend.read_range("gs://bucket/videos/v.ivf", 44, 10)
+        self.assertEqual(backend.read_range("gs://bucket/videos/v.ivf", 44, 10), b"x" * 10)
+
+    def test_index_revalidated_by_generation(self):
+        backend = GcsBackend(index_cache=IndexCache(ttl=0))
+        self.assertEqual(len(backend.open_index("gs://bucket/videos/v.ivf.idx")), 3)
+        before = self.emulator.request_count
+        self.assertEqual(len(backend.open_index("gs://bucket/videos/v.ivf.idx")), 3)
+        # Only a metadata request, the index is not downloaded again
+        self.assertEqual(self.emulator.request_count - before, 1)
+        self.emulator.upload("bucket", "videos/v.ivf.idx", self.index[:16])
+        self.assertEqual(len(backend.open_index("gs://bucket/videos/v.ivf.idx")), 1)
+
+    def test_server_bucket_allowlist(self):
+        params = {"video_url": "gs://bucket/videos/v.ivf", "index_url": "gs://bucket/videos/v.ivf.idx", "frame": 1}
+        with TestClient(app) as client:
+            # No buckets are served unless allowlisted
+            self.assertEqual(client.get("/frame", params=params).status_code, 403)
+            with patch.dict(os.environ, {"VIDEO_INDEX_GCS_BUCKETS": "other, bucket"}):
+                resp = client.get("/frame", params=params)
+                self.assertEqual((resp.status_code, resp.content), (200, self.payloads[1]))
+                resp = client.get("/frames", params={**params, "frames": "0-2"})
+                self.assertEqual(resp.status_code, 200)
+                resp = client.get("/frame", params={**params, "index_url": "gs://private/v.ivf.idx"})
+                self.assertEqual(resp.status_code, 403)
+            with patch.dict(os.environ, {"VIDEO_INDEX_GCS_BUCKETS": "other"}):
+                for path in ("/frame", "/frames", "/clip"):
+                    resp = client.get(path, params={**params, "frames": "0", "start": 0, "end": 1})
+                    self.assertEqual(resp.status_code, 403)
+
+
+class TestAsyncGcs(unittest.IsolatedAsyncioTestCase):
+    async def test_get_frames(self):
+        ivf, index, payloads = make_ivf([10, 20, 30])
+        with GcsEmulator({("bucket", "v.ivf"): ivf, ("bucket", "v.ivf.idx"): index}) as emulator:
+            with patch.dict(os.environ, {"STORAGE_EMULATOR_HOST": emulator.endpoint}):
+                async with AsyncFrameClient() as client:
+                    self.assertEqual(await client.get_frame("gs://bucket/v.ivf", "gs://bucket/v.ivf.idx", 2), payloads[2])
+                    frames = await client.get_frames("gs://bucket/v.ivf", "gs://bucket/v.ivf.idx", [1, 0])
+        self.assertEqual(frames, [payloads[1], payloads[0]])
+
+if __name__ == "__main__":
+    unittest.main()
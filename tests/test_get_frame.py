@@ -2,12 +2,24 @@ import utils
 import unittest
 from unittest.mock import patch, MagicMock
 import struct
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 import video_index.get_frame
+from video_index.frame_cache import FrameCache, frame_cache_key
+from video_index.coalesce import plan_coalesced_reads
+from video_index.index_cache import IndexCache
+from video_index.frame_index import IndexHeader, pack_index_v2, FrameIndex
+from utils import make_ivf
+from video_index.benchmark import RangeServer
 from video_index.get_frame import (
     parse_frame_from_url,
     fetch_frame_index_entry,
     fetch_frame_data,
     get_frame_from_urls,
+    get_frames_from_urls,
+    FrameClient,
+    RETRY_STATUSES,
 )
 
 def load_tests(loader, tests, ignore):
@@ -15,6 +27,10 @@ def load_tests(loader, tests, ignore):
 
 
 class TestGetFrame(unittest.TestCase):
+    def setUp(self):
+        # The default client remembers index formats between tests
+        video_index.get_frame.set_default_client(None)
+
     def test_parse_frame_from_url_fragment(self):
         url = "https://example.com/video.ivf#frame=123"
         frame = parse_frame_from_url(url)
@@ -30,7 +46,7 @@ class TestGetFrame(unittest.TestCase):
         frame = parse_frame_from_url(url)
         self.assertIsNone(frame)
 
-    @patch("video_index.get_frame.requests.get")
+    @patch("video_index.get_frame.requests.Session.get")
     def test_fetch_frame_index_entry(self, mock_get):
         # Mock 16 bytes of binary data for offset=1000, length=500
         mock_response = MagicMock()
@@ -42,7 +58,7 @@ class TestGetFrame(unittest.TestCase):
         self.assertEqual(offset, 1000)
         self.assertEqual(length, 500)
 
-    @patch("video_index.get_frame.requests.get")
+    @patch("video_index.get_frame.requests.Session.get")
     def test_fetch_frame_data(self, mock_get):
         frame_bytes = b"frame_data"
         mock_response = MagicMock()
@@ -53,24 +69,185 @@ class TestGetFrame(unittest.TestCase):
         data = fetch_frame_data("http://fakevideo", 1000, len(frame_bytes))
         self.assertEqual(data, frame_bytes)
 
-    @patch("video_index.get_frame.requests.get")
+    @patch("video_index.get_frame.requests.Session.get")
     def test_get_frame_from_urls(self, mock_get):
         # Mock index response for frame offset and length
         mock_index_resp = MagicMock()
         mock_index_resp.status_code = 206
-        mock_index_resp.content = struct.pack('<QQ', 1000, 9)
+        mock_index_resp.content = struct.pack('<QQ', 1000, 10)
 
         # Mock frame data response
         mock_frame_resp = MagicMock()
         mock_frame_resp.status_code = 206
         mock_frame_resp.content = b"frame_data"
 
-        # requests.get will be called twice: once for index, once for frame data
-        mock_get.side_effect = [mock_index_resp, mock_frame_resp]
+        # requests.get will be called three times: to detect the index format,
+        # for the index entry, and for the frame data
+        mock_get.side_effect = [mock_index_resp, mock_index_resp, mock_frame_resp]
 
         frame_bytes = get_frame_from_urls("http://video", "http://index", 7)
         self.assertEqual(frame_bytes, b"frame_data")
 
+    def test_frame_client_pool_and_retry(self):
+        with FrameClient(pool_maxsize=7, max_retries=5) as client:
+            adapter = client.session.get_adapter("https://storage.googleapis.com")
+            self.assertEqual(adapter._pool_maxsize, 7)
+            self.assertEqual(adapter.max_retries.total, 5)
+            self.assertEqual(set(adapter.max_retries.status_forcelist), set(RETRY_STATUSES))
+
+    @patch("video_index.get_frame.requests.Session.get")
+    def test_frame_client_reuses_session(self, mock_get):
+        mock_index_resp = MagicMock()
+        mock_index_resp.status_code = 206
+        mock_index_resp.content = struct.pack('<QQ', 44, 4)
+        mock_frame_resp = MagicMock()
+        mock_frame_resp.status_code = 206
+        mock_frame_resp.content = b"AV01"
+        mock_get.side_effect = [mock_index_resp, mock_index_resp, mock_frame_resp, mock_index_resp, mock_frame_resp]
+
+        client = FrameClient(timeout=5)
+        frame_bytes = get_frame_from_urls("http://video", "http://index", 3, client=client)
+        self.assertEqual(frame_bytes, b"AV01")
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(mock_get.call_args_list[0].kwargs["headers"], {'Range': 'bytes=0-63'})
+        self.assertEqual(mock_get.call_args_list[1].kwargs["headers"], {'Range': 'bytes=48-63'})
+        self.assertEqual(mock_get.call_args_list[2].kwargs["headers"], {'Range': 'bytes=44-47'})
+        self.assertEqual(mock_get.call_args_list[2].kwargs["timeout"], 5)
+
+        # The index format is only probed once
+        get_frame_from_urls("http://video", "http://index", 3, client=client)
+        self.assertEqual(mock_get.call_count, 5)
+
+    def test_get_frames_from_urls_coalesces(self):
+        ivf, index, payloads = make_ivf([10, 20, 30, 40, 50, 60])
+        with RangeServer({"/v.ivf": ivf, "/v.ivf.idx": index}) as server:
+            client = FrameClient()
+            frames = get_frames_from_urls(
+                server.url("/v.ivf"), server.url("/v.ivf.idx"), [4, 0, 1, 2, 1], max_gap=12, client=client
+            )
+            self.assertEqual(frames, [payloads[n] for n in [4, 0, 1, 2, 1]])
+            # Index format probe, one index read, one read for frames 0-2
+            # (12-byte IVF frame headers between them) and one for frame 4
+            self.assertEqual(server.request_count, 4)
+
+            frames = get_frames_from_urls(
+                server.url("/v.ivf"), server.url("/v.ivf.idx"), [0, 5], max_gap=1000, client=client
+            )
+            self.assertEqual(frames, [payloads[0], payloads[5]])
+            self.assertEqual(server.request_count, 6)
+
+    def test_get_frames_uses_frame_cache(self):
+        ivf, index, payloads = make_ivf([10, 20, 30])
+        with RangeServer({"/v.ivf": ivf, "/v.ivf.idx": index}) as server:
+            client = FrameClient(frame_cache=FrameCache())
+            client.get_frames(server.url("/v.ivf"), server.url("/v.ivf.idx"), [0, 1])
+            before = server.request_count
+            frames = client.get_frames(server.url("/v.ivf"), server.url("/v.ivf.idx"), [0, 1, 2])
+            self.assertEqual(frames, payloads)
+            # Index read plus a read for frame 2 only
+            self.assertEqual(server.request_count - before, 2)
+
+    def test_read_coalesced_splits_and_caches(self):
+        ivf, index, payloads = make_ivf([10, 20, 30])
+        frames = [(0, 44, 10), (1, 66, 20)]
+        read = plan_coalesced_reads(frames, max_gap=12)[0]
+        with RangeServer({"/v.ivf": ivf}) as server:
+            client = FrameClient(frame_cache=FrameCache())
+            fetched = client.read_coalesced(server.url("/v.ivf"), read)
+            self.assertEqual(fetched, {0: payloads[0], 1: payloads[1]})
+            self.assertEqual(server.request_count, 1)
+            for frame_num, offset, length in frames:
+                key = frame_cache_key(server.url("/v.ivf"), offset, length)
+                self.assertEqual(client.frame_cache.get(key), payloads[frame_num])
+
+    def test_v2_index(self):
+        ivf, index, payloads = make_ivf([10, 20, 30, 40, 50])
+        positions = FrameIndex.from_bytes(index).entries.tolist()
+        index_v2 = pack_index_v2(positions, IndexHeader(0, block_frames=2))
+        with RangeServer({"/v.ivf": ivf, "/v.ivf.idx": index_v2}) as server:
+            client = FrameClient()
+            video_url, index_url = server.url("/v.ivf"), server.url("/v.ivf.idx")
+            for n in range(5):
+                self.assertEqual(client.get_frame(video_url, index_url, n), payloads[n])
+            self.assertEqual(client.index_header(index_url).frame_count, 5)
+            self.assertEqual(client.get_frames(video_url, index_url, [4, 1, 2]), [payloads[n] for n in [4, 1, 2]])
+            with self.assertRaises(RuntimeError):
+                client.fetch_index_entry(index_url, 5)
+
+    def test_frame_count(self):
+        ivf, index, payloads = make_ivf([10, 20, 30, 40, 50])
+        positions = FrameIndex.from_bytes(index).entries.tolist()
+        index_v2 = pack_index_v2(positions, IndexHeader(0, block_frames=2))
+        objects = {"/v1.idx": index, "/v2.idx": index_v2, "/empty.idx": b""}
+        with RangeServer(objects) as server:
+            for client in (FrameClient(), FrameClient(index_cache=IndexCache())):
+                counts = [client.frame_count(server.url(path)) for path in objects]
+                self.assertEqual(counts, [5, 5, 0])
+            with self.assertRaises(RuntimeError):
+                FrameClient().frame_count(server.url("/missing.idx"))
+
+    def test_frame_at_time(self):
+        ivf, index, payloads = make_ivf([10] * 100)
+        positions = FrameIndex.from_bytes(index).entries.tolist()
+        header = IndexHeader(0, block_frames=16, timebase_num=1, timebase_den=30)
+        index_v2 = pack_index_v2(positions, header, range(100))
+        with RangeServer({"/v.ivf.idx": index_v2, "/v1.idx": index}) as server:
+            index_url = server.url("/v.ivf.idx")
+            client = FrameClient()
+            self.assertEqual(client.frame_at_time(index_url, 0), 0)
+            before = server.request_count
+            self.assertEqual(client.frame_at_time(index_url, 2.0), 60)
+            # Per-block timestamp table and one block of timestamps
+            self.assertEqual(server.request_count - before, 2)
+            self.assertEqual(client.frame_at_time(index_url, 99 / 30 + 1), 99)
+
+            cached = FrameClient(index_cache=IndexCache())
+            self.assertEqual(cached.frame_at_time(index_url, 1.0), 30)
+            with self.assertRaises(RuntimeError):
+                client.frame_at_time(server.url("/v1.idx"), 1.0)
+
+    def test_cached_index_refreshes_for_new_frames(self):
+        ivf, index, payloads = make_ivf([10, 20, 30, 40])
+        objects = {"/v.ivf": ivf, "/v.ivf.idx": index[:32]}
+        with RangeServer(objects) as server:
+            client = FrameClient(index_cache=IndexCache(ttl=3600))
+            video_url, index_url = server.url("/v.ivf"), server.url("/v.ivf.idx")
+            self.assertEqual(client.get_frame(video_url, index_url, 1), payloads[1])
+            # The recording grows; a frame past the cached index revalidates it
+            objects["/v.ivf.idx"] = index
+            self.assertEqual(client.get_frame(video_url, index_url, 3), payloads[3])
+            with self.assertRaises(RuntimeError):
+                client.get_frame(video_url, index_url, 4)
+
+    def test_concurrent_identical_fetches_share_requests(self):
+        ivf, index, payloads = make_ivf([10, 20, 30])
+        with RangeServer({"/v.ivf": ivf, "/v.ivf.idx": index}, latency=0.05) as server:
+            client = FrameClient()
+            video_url, index_url = server.url("/v.ivf"), server.url("/v.ivf.idx")
+            with ThreadPoolExecutor(16) as pool:
+                frames = list(pool.map(lambda _: client.get_frame(video_url, index_url, 2), range(16)))
+        self.assertEqual(frames, [payloads[2]] * 16)
+        # Index format probe, one index entry read and one frame read
+        self.assertEqual(server.request_count, 3)
+
+    def test_local_files(self):
+        ivf, index, payloads = make_ivf([10, 20, 30])
+        with tempfile.TemporaryDirectory() as tmp:
+            video_path = os.path.join(tmp, "v.ivf")
+            with open(video_path, 'wb') as f:
+                f.write(ivf)
+            with open(video_path + ".idx", 'wb') as f:
+                f.write(index)
+            client = FrameClient()
+            self.assertEqual(client.get_frame(video_path, video_path + ".idx", 1), payloads[1])
+            self.assertEqual(
+                client.get_frames("file://" + video_path, "file://" + video_path + ".idx", [2, 0], max_gap=12),
+                [payloads[2], payloads[0]],
+            )
+            with self.assertRaises(RuntimeError):
+                client.get_frame(video_path, video_path + ".idx", 3)
+
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -0,0 +1,85 @@
+import utils
+import unittest
+import struct
+import threading
+import video_index.index_cache
+from video_index.index_cache import CachedIndex, IndexCache
+from video_index.get_frame import FrameClient
+from utils import make_ivf
+from video_index.benchmark import RangeServer
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.index_cache, tests)
+
+
+class TestIndexCache(unittest.TestCase):
+    def setUp(self):
+        self.ivf, self.index, self.payloads = make_ivf([10, 20, 30, 40, 50])
+
+    def test_lru_eviction_by_bytes(self):
+        cache = IndexCache(max_bytes=64)
+        cache.store("a", CachedIndex(b'\x00' * 32))
+        cache.store("b", CachedIndex(b'\x00' * 32))
+        cache.lookup("a")  # a becomes most recently used
+        cache.store("c", CachedIndex(b'\x00' * 32))
+        self.assertIsNotNone(cache.lookup("a"))
+        self.assertIsNone(cache.lookup("b"))
+        self.assertEqual(cache.nbytes, 64)
+        # Oversized indexes are returned but never cached
+        cache.store("d", CachedIndex(b'\x00' * 80))
+        self.assertIsNone(cache.lookup("d"))
+
+    def test_lookup_counts_under_lock(self):
+        cache = IndexCache()
+        cache.store("a", CachedIndex(b'\x00' * 32))
+
+        def lookups():
+            for _ in range(2000):
+                cache.lookup("a")
+                cache.lookup("a", min_frames=3)
+
+        threads = [threading.Thread(target=lookups) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((cache.hits, cache.misses), (16000, 16000))
+
+    def test_entry_out_of_range(self):
+        cached = CachedIndex(struct.pack('<QQ', 44, 10))
+        self.assertEqual(cached.entry(0), (44, 10))
+        with self.assertRaises(RuntimeError):
+            cached.entry(1)
+
+    def test_chunked_load_and_warm_lookup(self):
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}) as server:
+            client = FrameClient(index_cache=IndexCache(chunk_size=32))
+            index_url = server.url("/v.ivf.idx")
+            cached = client.load_index(index_url)
+            self.assertEqual(cached.data, self.index)
+            # 80 bytes of index in 32-byte chunks
+            self.assertEqual(server.request_count, 3)
+
+            for i, payload in enumerate(self.payloads):
+                self.assertEqual(client.get_frame(server.url("/v.ivf"), index_url, i), payload)
+            # Warm index: exactly one upstream request per frame
+            self.assertEqual(server.request_count, 3 + len(self.payloads))
+
+    def test_revalidation(self):
+        objects = {"/v.ivf.idx": self.index}
+        with RangeServer(objects) as server:
+            cache = IndexCache(ttl=0)
+            client = FrameClient(index_cache=cache)
+            index_url = server.url("/v.ivf.idx")
+            first = client.load_index(index_url)
+            # Stale but unchanged: 304 keeps the same entry
+            self.assertIs(client.load_index(index_url), first)
+            self.assertEqual(server.request_count, 2)
+
+            objects["/v.ivf.idx"] = self.index[:32]
+            second = client.load_index(index_url)
+            self.assertIsNot(second, first)
+            self.assertEqual(len(second), 2)
+
+if __name__ == "__main__":
+    unittest.main()
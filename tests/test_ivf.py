@@ -0,0 +1,52 @@
+import utils
+import unittest
+import os
+import tempfile
+import video_index.ivf
+from video_index.ivf import concat_ivf_files, parse_ivf_header
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.ivf, tests)
+
+
+class TestIvf(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, name, data):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_concat_matches_single_stream(self):
+        sizes = [10, 20, 30, 40, 50, 60, 70]
+        expected, _, _ = utils.make_ivf(sizes)
+        # Each segment starts its timestamps at zero, as a seeked encode does
+        paths = [
+            self.write(f"s{i}.ivf", utils.make_ivf(sizes[first:last], first_frame=first)[0])
+            for i, (first, last) in enumerate([(0, 3), (3, 4), (4, 7)])
+        ]
+        output = os.path.join(self.tmpdir.name, "out.ivf")
+        self.assertEqual(concat_ivf_files(paths, output), 7)
+        with open(output, 'rb') as f:
+            data = f.read()
+        self.assertEqual(data, expected)
+        self.assertEqual(parse_ivf_header(data).frame_count, 7)
+
+    def test_concat_rejects_mismatched_stream(self):
+        ivf, _, _ = utils.make_ivf([10])
+        other = ivf[:12] + b'\x00\x01' + ivf[14:]  # different width
+        paths = [self.write("a.ivf", ivf), self.write("b.ivf", other)]
+        with self.assertRaises(ValueError):
+            concat_ivf_files(paths, os.path.join(self.tmpdir.name, "out.ivf"))
+
+    def test_parse_invalid_header(self):
+        with self.assertRaises(ValueError):
+            parse_ivf_header(b'DKIF')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import utils
+import unittest
+import os
+import tempfile
+import time
+import video_index.local_file
+from video_index.local_file import open_local_index, read_local_range
+from utils import make_ivf
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.local_file, tests)
+
+
+class TestLocalFile(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.ivf, self.index, self.payloads = make_ivf([10, 20, 30])
+        self.ivf_path = os.path.join(self.dir.name, "v.ivf")
+        self.index_path = self.ivf_path + ".idx"
+        with open(self.ivf_path, 'wb') as f:
+            f.write(self.ivf)
+        with open(self.index_path, 'wb') as f:
+            f.write(self.index[:32])
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_read_local_range(self):
+        self.assertEqual(read_local_range(self.ivf_path, 44, 10), self.payloads[0])
+        self.assertEqual(read_local_range(self.ivf_path, len(self.ivf) - 5, 10), self.payloads[2][:5])
+        with self.assertRaises(RuntimeError):
+            read_local_range(os.path.join(self.dir.name, "missing.ivf"), 0, 1)
+
+    def test_open_local_index_reused_until_changed(self):
+        index = open_local_index(self.index_path)
+        self.assertEqual(len(index), 2)
+        self.assertIs(open_local_index(self.index_path), index)
+        time.sleep(0.01)
+        with open(self.index_path, 'ab') as f:
+            f.write(self.index[32:])
+        self.assertEqual(open_local_index(self.index_path).entry(2), (98, 30))
+
+    def test_open_local_index_missing(self):
+        with self.assertRaises(RuntimeError):
+            open_local_index(os.path.join(self.dir.name, "missing.idx"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import utils
+import unittest
+import video_index.metrics
+from video_index.metrics import Counter, Gauge, Histogram, Registry
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.metrics, tests)
+
+
+class TestMetrics(unittest.TestCase):
+    def test_labels_must_match(self):
+        counter = Counter("c_total", "C.", ["path"])
+        with self.assertRaises(ValueError):
+            counter.inc()
+        with self.assertRaises(ValueError):
+            counter.inc(route="/frame")
+
+    def test_histogram_bucket_bounds_are_inclusive(self):
+        histogram = Histogram("h_seconds", "H.", ["stage"], buckets=(0.1, 1.0))
+        for value in (0.1, 0.2, 1.0, 3.0):
+            histogram.observe(value, stage="data")
+        text = histogram.render()
+        self.assertIn('h_seconds_bucket{stage="data",le="0.1"} 1\n', text)
+        self.assertIn('h_seconds_bucket{stage="data",le="1"} 3\n', text)
+        self.assertIn('h_seconds_bucket{stage="data",le="+Inf"} 4\n', text)
+        self.assertIn('h_seconds_count{stage="data"} 4\n', text)
+        self.assertEqual(histogram.count(stage="data"), 4)
+
+    def test_histogram_time(self):
+        histogram = Histogram("t_seconds", "T.")
+        with self.assertRaises(KeyError):
+            with histogram.time():
+                raise KeyError("failed blocks are timed too")
+        self.assertEqual(histogram.count(), 1)
+
+    def test_gauge(self):
+        gauge = Gauge("g", "G.")
+        gauge.inc(3)
+        gauge.dec()
+        self.assertEqual(gauge.value(), 2)
+
+    def test_registry(self):
+        registry = Registry()
+        Counter("a_total", "A.", registry=registry)
+        with self.assertRaises(ValueError):
+            Gauge("a_total", "Again.", registry=registry)
+        self.assertEqual(registry.render(), "# HELP a_total A.\n# TYPE a_total counter\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import utils
+import unittest
+import asyncio
+import video_index.prefetch
+from video_index.async_get_frame import AsyncFrameClient
+from video_index.prefetch import Prefetcher
+from utils import make_ivf
+from video_index.benchmark import RangeServer
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.prefetch, tests)
+
+
+async def settle(prefetcher):
+    """Wait for every stream's read-ahead to finish."""
+    tasks = [s.task for s in prefetcher._streams.values() if s.task is not None]
+    if tasks:
+        await asyncio.wait(tasks)
+
+
+class TestPrefetcher(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.ivf, self.index, self.payloads = make_ivf([10] * 20)
+
+    async def test_forward_run(self):
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}) as server:
+            async with AsyncFrameClient() as client:
+                prefetcher = Prefetcher(client, depth=4)
+                urls = server.url("/v.ivf"), server.url("/v.ivf.idx")
+                for n in range(2):
+                    self.assertEqual(await prefetcher.get_frame(*urls, n), self.payloads[n])
+                await settle(prefetcher)
+                before = server.request_count
+                for n in range(2, 6):
+                    self.assertEqual(await prefetcher.get_frame(*urls, n), self.payloads[n])
+                await settle(prefetcher)
+        # Frames 2-5 came from read-ahead, which has moved on to frames 6-9
+        self.assertEqual(prefetcher.hits, 4)
+        self.assertEqual(prefetcher.misses, 2)
+        self.assertEqual(server.request_count - before, 2)
+        self.assertEqual(sorted(prefetcher._streams[urls + ("",)].frames), [6, 7, 8, 9])
+        self.assertEqual(prefetcher.nbytes, 40)
+
+    async def test_backward_run_stops_at_zero(self):
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}) as server:
+            async with AsyncFrameClient() as client:
+                prefetcher = Prefetcher(client, depth=8)
+                urls = server.url("/v.ivf"), server.url("/v.ivf.idx")
+                for n in [5, 4]:
+                    await prefetcher.get_frame(*urls, n)
+                await settle(prefetcher)
+                for n in [3, 2, 1, 0]:
+                    self.assertEqual(await prefetcher.get_frame(*urls, n), self.payloads[n])
+        self.assertEqual(prefetcher.hits, 4)
+        self.assertEqual(prefetcher.stats()["hit_rate"], 4 / 6)
+
+    async def test_broken_run_drops_read_ahead(self):
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}) as server:
+            async with AsyncFrameClient() as client:
+                prefetcher = Prefetcher(client, depth=4)
+                urls = server.url("/v.ivf"), server.url("/v.ivf.idx")
+                for n in [0, 1]:
+                    await prefetcher.get_frame(*urls, n)
+                await settle(prefetcher)
+                self.assertEqual(await prefetcher.get_frame(*urls, 15), self.payloads[15])
+        self.assertEqual(prefetcher.wasted, 4)
+        self.assertEqual(prefetcher.nbytes, 0)
+
+    async def test_sessions_and_budget(self):
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}) as server:
+            async with AsyncFrameClient() as client:
+                # Room for one stream's read-ahead only
+                prefetcher = Prefetcher(client, depth=4, max_bytes=40)
+                urls = server.url("/v.ivf"), server.url("/v.ivf.idx")
+                for n in [0, 1]:
+                    await prefetcher.get_frame(*urls, n, session="a")
+                    await prefetcher.get_frame(*urls, 10 + n, session="b")
+                await settle(prefetcher)
+                stats = prefetcher.stats()
+                self.assertEqual(stats["streams"], 2)
+                self.assertLessEqual(stats["bytes"], 40)
+                # The older stream "a" gave way to "b"
+                self.assertEqual(await prefetcher.get_frame(*urls, 12, session="b"), self.payloads[12])
+                self.assertEqual(prefetcher.hits, 1)
+                prefetcher.close()
+        self.assertEqual(prefetcher.nbytes, 0)
+
+    async def test_end_of_video(self):
+        with RangeServer({"/v.ivf": self.ivf, "/v.ivf.idx": self.index}) as server:
+            async with AsyncFrameClient() as client:
+                prefetcher = Prefetcher(client, depth=4)
+                urls = server.url("/v.ivf"), server.url("/v.ivf.idx")
+                for n in [18, 19]:
+                    self.assertEqual(await prefetcher.get_frame(*urls, n), self.payloads[n])
+                await settle(prefetcher)
+        self.assertEqual(prefetcher.errors, 1)
+        self.assertEqual(prefetcher.nbytes, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import utils
+import unittest
+import asyncio
+import threading
+import video_index.singleflight
+from video_index.singleflight import SingleFlight, AsyncSingleFlight
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.singleflight, tests)
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_callers_share_one_call(self):
+        flights = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            release.wait()
+            return b"frame"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flights.do("k", fetch))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        while flights.shared < 7:
+            threading.Event().wait(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [b"frame"] * 8)
+        self.assertEqual(len(calls), 1)
+        # Finished calls are not remembered
+        self.assertEqual(flights.do("k", lambda: b"new"), b"new")
+
+    def test_error_is_shared(self):
+        flights = SingleFlight()
+        with self.assertRaises(RuntimeError):
+            flights.do("k", lambda: (_ for _ in ()).throw(RuntimeError("upstream")))
+        self.assertEqual(flights.do("k", lambda: 1), 1)
+
+
+class TestAsyncSingleFlight(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_callers_share_one_call(self):
+        flights = AsyncSingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return b"frame"
+
+        results = await asyncio.gather(*(flights.do("k", fetch) for _ in range(8)))
+        self.assertEqual(results, [b"frame"] * 8)
+        self.assertEqual((len(calls), flights.shared), (1, 7))
+
+    async def test_cancelled_caller_does_not_cancel_others(self):
+        flights = AsyncSingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            return 42
+
+        first = asyncio.ensure_future(flights.do("k", fetch))
+        second = asyncio.ensure_future(flights.do("k", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        self.assertEqual(await second, 42)
+
+    async def test_error_is_shared(self):
+        flights = AsyncSingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream")
+
+        results = await asyncio.gather(flights.do("k", fail), flights.do("k", fail), return_exceptions=True)
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+
+if __name__ == "__main__":
+    unittest.main()
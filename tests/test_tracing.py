@@ -0,0 +1,92 @@
+import utils
+import unittest
+import asyncio
+from contextlib import contextmanager
+import video_index.tracing
+from video_index.async_get_frame import AsyncFrameClient
+from video_index.get_frame import FrameClient
+from video_index.tracing import set_tracer, span, traced
+from utils import make_ivf
+from video_index.benchmark import RangeServer
+
+def load_tests(loader, tests, ignore):
+    return utils.doctests(video_index.tracing, tests)
+
+
+class FakeOtelTracer:
+    """Records spans through the OpenTelemetry start_as_current_span API."""
+
+    def __init__(self):
+        self.spans = []
+
+    @contextmanager
+    def start_as_current_span(self, name, attributes=None):
+        attributes = dict(attributes or {})
+        self.spans.append((name, attributes))
+        yield FakeSpan(attributes)
+
+
+class FakeSpan:
+    def __init__(self, attributes):
+        self.attributes = attributes
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        set_tracer(lambda name, attributes, seconds, error: self.calls.append((name, dict(attributes), error)))
+        self.addCleanup(set_tracer, None)
+
+    def test_disabled_span_is_shared(self):
+        set_tracer(None)
+        self.assertIs(span("a", x=1), span("b"))
+
+    def test_error_is_reported(self):
+        @traced("video_index.fail")
+        def fail(frame_num):
+            raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            fail(3)
+        (name, attributes, error), = self.calls
+        self.assertEqual((name, attributes), ("video_index.fail", {"frame_num": 3}))
+        self.assertIsInstance(error, RuntimeError)
+
+    def test_client_calls_are_traced(self):
+        ivf, index, payloads = make_ivf([10, 20, 30])
+        with RangeServer({"/v.ivf": ivf, "/v.ivf.idx": index}) as server:
+            video_url, index_url = server.url("/v.ivf"), server.url("/v.ivf.idx")
+            with FrameClient() as client:
+                client.get_frame(video_url, index_url, 1)
+
+            async def run():
+                async with AsyncFrameClient() as client:
+                    await client.get_frame(video_url, index_url, 2)
+
+            asyncio.run(run())
+        names = [name for name, _, _ in self.calls]
+        self.assertEqual(names, [
+            "video_index.fetch_index_entry", "video_index.fetch_frame_data", "video_index.get_frame",
+        ] * 2)
+        _, attributes, error = self.calls[-1]
+        self.assertEqual(attributes, {"video_url": video_url, "index_url": index_url, "frame_num": 2, "bytes": 30})
+        self.assertIsNone(error)
+
+    def test_opentelemetry_tracer(self):
+        tracer = FakeOtelTracer()
+        set_tracer(tracer)
+
+        @traced("video_index.read")
+        async def read(url, frames):
+            return b"abc"
+
+        self.assertEqual(asyncio.run(read("http://v", frames=[1, 2])), b"abc")
+        # Only attribute types OpenTelemetry accepts are passed on
+        self.assertEqual(tracer.spans, [("video_index.read", {"url": "http://v", "bytes": 3})])
+
+
+if __name__ == "__main__":
+    unittest.main()
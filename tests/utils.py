@@ -1,4 +1,5 @@
 import doctest
+import struct
 
 def doctests(module, tests):
     """
@@ -12,4 +13,35 @@ def doctests(module, tests):
         A combined TestSuite with doctests added.
     """
     tests.addTests(doctest.DocTestSuite(module))
-    return tests
\ No newline at end of file
+    return tests
+
+
+def make_ivf(frame_sizes, first_frame=0):
+    """
+    Build an in-memory IVF file and its binary index.
+
+    Args:
+        frame_sizes: Payload size of each frame in bytes.
+        first_frame: Frame number of the first frame. Payloads are filled
+            with their frame number; timestamps always start at zero, as in
+            the output of a seeked encode.
+
+    Returns:
+        (ivf_bytes, index_bytes, payloads)
+    """
+    header = (
+        b'DKIF' + struct.pack('<HH', 0, 32) + b'AV01' +
+        struct.pack('<HHIII', 640, 480, 30, 1, len(frame_sizes)) + b'\x00' * 4
+    )
+    parts = [header]
+    index = []
+    payloads = []
+    offset = len(header)
+    for i, size in enumerate(frame_sizes):
+        payload = bytes([(first_frame + i) % 256]) * size
+        parts.append(struct.pack('<IQ', size, i))
+        parts.append(payload)
+        index.append(struct.pack('<QQ', offset + 12, size))
+        payloads.append(payload)
+        offset += 12 + size
+    return b''.join(parts), b''.join(index), payloads
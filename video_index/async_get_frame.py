@@ -0,0 +1,833 @@
+# video_index/async_get_frame.py
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+from urllib.parse import urlparse
+
+import httpx
+
+from .get_frame import (
+    RETRY_STATUSES,
+    DEFAULT_TIMEOUT,
+    decode_index_entries,
+    index_entries_range,
+    index_time_ticks,
+    locate_block,
+    locate_frame_in_block,
+    parse_index_probe,
+    unpack_index_entry,
+    check_frame_data,
+)
+from .coalesce import (
+    DEFAULT_MAX_GAP,
+    CoalescedRead,
+    plan_coalesced_reads,
+    split_coalesced_read,
+)
+from .errors import FrameFetchError
+from .frame_cache import FrameCache, FrameKey, frame_cache_key
+from .frame_index import INDEX_V2_HEADER_SIZE, IndexHeader
+from .index_cache import (
+    CachedIndex,
+    IndexCache,
+    IndexFormats,
+    ObjectValidators,
+    content_range_total,
+    is_unchanged,
+    object_validator,
+    remaining_chunks,
+    response_validators,
+    revalidation_headers,
+)
+from .gcs import GcsBackend, is_gcs_url
+from .local_file import is_local_url, local_path, open_local_index, read_local_range
+from .singleflight import AsyncSingleFlight
+from .tracing import traced
+
+
+class AsyncFrameClient:
+    """
+    Asyncio-native client for fetching frames over HTTP Range requests.
+
+    All requests share one ``httpx.AsyncClient`` connection pool, and the
+    number of requests in flight to any single upstream host is bounded by a
+    per-host semaphore, so a single event loop can keep hundreds of range
+    reads outstanding without overwhelming one bucket endpoint.
+
+    ``file://`` URLs and plain paths are read straight from disk instead:
+    frame data with ``os.pread`` in a worker thread and indexes through a
+    memory map.
+
+    Parameters
+    ----------
+    max_connections : int, optional
+        Maximum number of open connections across all hosts, by default 256
+    max_keepalive_connections : int, optional
+        Maximum number of idle connections kept alive, by default 64
+    max_per_host : int, optional
+        Maximum number of concurrent requests to one host, by default 128
+    timeout : float or Tuple[float, float], optional
+        Request timeout in seconds, either a single value or a
+        (connect, read) tuple, by default (3.05, 30.0)
+    max_retries : int, optional
+        Number of retries on connection errors and retryable statuses,
+        by default 3
+    backoff_factor : float, optional
+        Backoff factor between retries, by default 0.2
+    http2 : bool, optional
+        Negotiate HTTP/2 where the upstream supports it (requires the
+        ``h2`` package), by default False
+    index_cache : Optional[IndexCache], optional
+        Cache of whole index files; when given, index entries are served
+        from the cached index instead of a Range read per frame,
+        by default None
+    frame_cache : Optional[FrameCache], optional
+        Cache of frame payloads consulted before reading from upstream,
+        by default None
+    gcs : Optional[GcsBackend], optional
+        Backend for ``gs://`` URLs, by default one created on first use
+        that shares index_cache
+
+    Notes
+    -----
+    Without an index cache, the first lookup in each index reads its first
+    64 bytes to tell version 1 indexes from version 2; the result is
+    remembered per index URL.
+
+    Concurrent calls needing the same index download, index entry or
+    frame payload share one upstream request rather than each making
+    their own, whether or not a cache is configured.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 256,
+        max_keepalive_connections: int = 64,
+        max_per_host: int = 128,
+        timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+        max_retries: int = 3,
+        backoff_factor: float = 0.2,
+        http2: bool = False,
+        index_cache: Optional[IndexCache] = None,
+        frame_cache: Optional[FrameCache] = None,
+        gcs: Optional[GcsBackend] = None,
+    ) -> None:
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            timeout = httpx.Timeout(read, connect=connect)
+        self.index_cache = index_cache
+        self.frame_cache = frame_cache
+        self.index_formats = IndexFormats()
+        self.object_validators = ObjectValidators()
+        self._gcs = gcs
+        self._flights = AsyncSingleFlight()
+        self.max_per_host = max_per_host
+        self.max_retries = max_retries
+        self.upstream_requests = 0
+        self.upstream_bytes = 0
+        self.upstream_in_flight = 0
+        self.backoff_factor = backoff_factor
+        self.http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+            timeout=timeout,
+            http2=http2,
+        )
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def gcs(self) -> GcsBackend:
+        """Backend for ``gs://`` URLs, created on first use."""
+        if self._gcs is None:
+            self._gcs = GcsBackend(index_cache=self.index_cache)
+        return self._gcs
+
+    async def aclose(self) -> None:
+        """Close all pooled connections."""
+        await self.http.aclose()
+        if self._gcs is not None:
+            self._gcs.close()
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Return the client's counters.
+
+        Returns
+        -------
+        Dict[str, object]
+            upstream_requests, upstream_bytes and upstream_in_flight for
+            HTTP and ``gs://`` reads (local files are not counted); shared,
+            the number of calls that joined an identical call in flight;
+            and the index_cache and frame_cache stats, or None for a
+            cache the client does not have.
+        """
+        return {
+            "upstream_requests": self.upstream_requests,
+            "upstream_bytes": self.upstream_bytes,
+            "upstream_in_flight": self.upstream_in_flight,
+            "shared": self._flights.shared,
+            "index_cache": self.index_cache.stats() if self.index_cache is not None else None,
+            "frame_cache": self.frame_cache.stats() if self.frame_cache is not None else None,
+        }
+
+    async def __aenter__(self) -> "AsyncFrameClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.max_per_host)
+        return slot
+
+    async def _cache_get(self, key: FrameKey) -> Optional[bytes]:
+        # Only the disk tier blocks; keep memory-only lookups on the event loop
+        if self.frame_cache.disk is None:
+            return self.frame_cache.get(key)
+        return await asyncio.to_thread(self.frame_cache.get, key)
+
+    async def _cache_put(self, key: FrameKey, data: bytes) -> None:
+        if self.frame_cache.disk is None:
+            self.frame_cache.put(key, data)
+        else:
+            await asyncio.to_thread(self.frame_cache.put, key, data)
+
+    async def get_range(
+        self, url: str, byte_start: int, byte_end: int, headers: Optional[dict] = None
+    ) -> httpx.Response:
+        """
+        Issue a GET for the inclusive byte range [byte_start, byte_end] of url.
+
+        Connection errors and retryable statuses (429 and 5xx) are retried
+        with exponential backoff, honouring ``Retry-After`` when present.
+
+        Parameters
+        ----------
+        url : str
+            URL of the object to read.
+        byte_start : int
+            First byte to read.
+        byte_end : int
+            Last byte to read (inclusive).
+        headers : Optional[dict], optional
+            Extra request headers, by default None
+
+        Returns
+        -------
+        httpx.Response
+            The upstream response, with its body read.
+        """
+        async with self.open_range(url, byte_start, byte_end, headers) as resp:
+            await resp.aread()
+        return resp
+
+    @asynccontextmanager
+    async def open_range(
+        self, url: str, byte_start: int, byte_end: int, headers: Optional[dict] = None
+    ) -> AsyncIterator[httpx.Response]:
+        """
+        Like get_range, but without reading the body, so it can be passed on
+        in chunks with ``resp.aiter_bytes()``. The response is closed, and
+        the host's request slot released, when the context exits.
+
+        Retries happen before the body is streamed, on connection errors
+        and retryable statuses only.
+        """
+        headers = {**(headers or {}), 'Range': f'bytes={byte_start}-{byte_end}'}
+        async with self._host_slot(url):
+            self.upstream_in_flight += 1
+            try:
+                for attempt in range(self.max_retries + 1):
+                    last_attempt = attempt == self.max_retries
+                    self.upstream_requests += 1
+                    try:
+                        resp = await self.http.send(self.http.build_request("GET", url, headers=headers), stream=True)
+                    except httpx.TransportError:
+                        if last_attempt:
+                            raise
+                        await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+                        continue
+                    if resp.status_code in RETRY_STATUSES and not last_attempt:
+                        await resp.aclose()
+                        retry_after = resp.headers.get('Retry-After', '')
+                        delay = float(retry_after) if retry_after.isdigit() else self.backoff_factor * (2 ** attempt)
+                        await asyncio.sleep(delay)
+                        continue
+                    try:
+                        yield resp
+                    finally:
+                        self.upstream_bytes += resp.num_bytes_downloaded
+                        await resp.aclose()
+                    return
+            finally:
+                self.upstream_in_flight -= 1
+
+    async def load_index(self, index_url: str, min_frames: int = 0) -> CachedIndex:
+        """
+        Load a whole index file through the client's index cache.
+
+        A fresh cached index is returned without contacting upstream. A stale
+        one, or one with fewer than min_frames entries (an index that may
+        have grown since, such as a live recording's), is revalidated with a
+        conditional request and only downloaded again if it changed. Large
+        indexes are downloaded in chunk_size Range requests pinned to the
+        first response's ETag.
+
+        Parameters
+        ----------
+        index_url : str
+            URL to the binary index file.
+        min_frames : int, optional
+            Number of entries the caller needs, by default 0
+
+        Returns
+        -------
+        CachedIndex
+            The current index.
+
+        Raises
+        ------
+        RuntimeError
+            If the client has no index cache, or the index cannot be fetched.
+        """
+        cache = self.index_cache
+        if cache is None:
+            raise RuntimeError("AsyncFrameClient has no index cache")
+        cached = cache.lookup(index_url, min_frames)
+        if cache.is_usable(cached, min_frames):
+            return cached
+        return await self._flights.do(("index", index_url), lambda: self._load_index(index_url, cached))
+
+    @traced("video_index.load_index")
+    async def _load_index(self, index_url: str, cached: Optional[CachedIndex]) -> CachedIndex:
+        cache = self.index_cache
+        resp = await self.get_range(index_url, 0, cache.chunk_size - 1, headers=revalidation_headers(cached))
+        if resp.status_code == 304 or (resp.status_code in (200, 206) and is_unchanged(cached, resp.headers)):
+            cache.mark_validated(cached)
+            return cached
+        if resp.status_code == 200:
+            data = resp.content
+        elif resp.status_code == 206:
+            etag, _ = response_validators(resp.headers)
+            pin = {'If-Match': etag} if etag else None
+            total = content_range_total(resp.headers.get('Content-Range'))
+            if total is None:
+                raise RuntimeError("Index response is missing the object size")
+            chunks = [resp.content]
+            for byte_start, byte_end in remaining_chunks(len(resp.content), total, cache.chunk_size):
+                part = await self.get_range(index_url, byte_start, byte_end, headers=pin)
+                if part.status_code != 206:
+                    raise FrameFetchError(f"Failed to fetch index range bytes: {part.status_code}", part.status_code)
+                chunks.append(part.content)
+            data = b''.join(chunks)
+        elif resp.status_code == 416:
+            # An empty index has no satisfiable range
+            data = b''
+        else:
+            raise FrameFetchError(f"Failed to fetch index: {resp.status_code}", resp.status_code)
+
+        etag, generation = response_validators(resp.headers)
+        return cache.store(index_url, CachedIndex(data, etag, generation))
+
+    async def index_header(self, index_url: str) -> Optional[IndexHeader]:
+        """
+        Return the version 2 header of an index, or None for version 1,
+        probing upstream the first time index_url is seen.
+
+        Parameters
+        ----------
+        index_url : str
+            URL to the binary index file.
+
+        Returns
+        -------
+        Optional[IndexHeader]
+            The header, or None for a version 1 index.
+
+        Raises
+        ------
+        RuntimeError
+            If the probe fails.
+        """
+        if is_local_url(index_url):
+            return open_local_index(local_path(index_url)).header
+        if is_gcs_url(index_url):
+            return (await asyncio.to_thread(self.gcs.open_index, index_url)).header
+        known, header = self.index_formats.lookup(index_url)
+        if not known:
+            header = await self._flights.do(("probe", index_url), lambda: self._probe_index(index_url))
+        return header
+
+    async def _probe_index(self, index_url: str) -> Optional[IndexHeader]:
+        resp = await self.get_range(index_url, 0, INDEX_V2_HEADER_SIZE - 1)
+        header = parse_index_probe(resp.status_code, resp.content)
+        self.index_formats.store(index_url, header)
+        return header
+
+    @traced("video_index.fetch_index_entry")
+    async def fetch_index_entry(self, index_url: str, frame_num: int) -> Tuple[int, int]:
+        """
+        Fetch the binary index entry (offset, length) for the given frame number.
+
+        Parameters
+        ----------
+        index_url : str
+            URL to the binary index file.
+        frame_num : int
+            Frame number to fetch.
+
+        Returns
+        -------
+        Tuple[int, int]
+            (offset, length) of the frame in bytes.
+
+        Raises
+        ------
+        RuntimeError
+            If unable to fetch or parse the index entry.
+        """
+        if is_local_url(index_url):
+            return open_local_index(local_path(index_url)).entry(frame_num)
+        return await self._flights.do(
+            ("entry", index_url, frame_num), lambda: self._fetch_index_entry(index_url, frame_num)
+        )
+
+    async def _fetch_index_entry(self, index_url: str, frame_num: int) -> Tuple[int, int]:
+        if is_gcs_url(index_url):
+            return (await asyncio.to_thread(self.gcs.open_index, index_url, frame_num + 1)).entry(frame_num)
+        if self.index_cache is not None:
+            return (await self.load_index(index_url, frame_num + 1)).entry(frame_num)
+
+        header = await self.index_header(index_url)
+        byte_start, byte_end = index_entries_range(header, frame_num, frame_num)
+        resp = await self.get_range(index_url, byte_start, byte_end)
+        if resp.status_code != 206:
+            raise FrameFetchError(f"Failed to fetch index range bytes: {resp.status_code}", resp.status_code)
+
+        if header is None:
+            return unpack_index_entry(resp.content)
+        return decode_index_entries(header, resp.content, frame_num, [frame_num])[0]
+
+    @traced("video_index.frame_at_time")
+    async def frame_at_time(self, index_url: str, t: float) -> int:
+        """
+        Find the frame displayed at time t from a version 2 index with timestamps.
+
+        With an index cache the lookup is a binary search of the cached
+        index; without one it costs two small Range reads: the timestamp of
+        each block's first frame, then the timestamps of one block.
+
+        Parameters
+        ----------
+        index_url : str
+            URL to the binary index file.
+        t : float
+            Time in seconds.
+
+        Returns
+        -------
+        int
+            The last frame whose timestamp is at or before t.
+
+        Raises
+        ------
+        RuntimeError
+            If the index has no timestamps, t is before the first frame,
+            or the index cannot be fetched.
+        """
+        if is_local_url(index_url):
+            return open_local_index(local_path(index_url)).frame_at_time(t)
+        if is_gcs_url(index_url):
+            return (await asyncio.to_thread(self.gcs.open_index, index_url)).frame_at_time(t)
+        if self.index_cache is not None:
+            return (await self.load_index(index_url)).index.frame_at_time(t)
+
+        header = await self.index_header(index_url)
+        ticks = index_time_ticks(header, t)
+        resp = await self.get_range(index_url, *header.pts_table_range())
+        if resp.status_code != 206:
+            raise FrameFetchError(f"Failed to fetch index range bytes: {resp.status_code}", resp.status_code)
+        block = locate_block(resp.content, ticks, t)
+        resp = await self.get_range(index_url, *header.pts_range(block, block))
+        if resp.status_code != 206:
+            raise FrameFetchError(f"Failed to fetch index range bytes: {resp.status_code}", resp.status_code)
+        return locate_frame_in_block(header, resp.content, block, ticks)
+
+    @traced("video_index.fetch_frame_data")
+    async def fetch_frame_data(self, video_url: str, offset: int, length: int) -> bytes:
+        """
+        Fetch the frame bytes from the video using HTTP Range requests.
+
+        Parameters
+        ----------
+        video_url : str
+            URL to the video file.
+        offset : int
+            Byte offset where the frame starts.
+        length : int
+            Length in bytes of the frame.
+
+        Returns
+        -------
+        bytes
+            The raw frame bytes.
+
+        Raises
+        ------
+        RuntimeError
+            If the request fails or returns incomplete data.
+        """
+        if is_local_url(video_url):
+            data = await asyncio.to_thread(read_local_range, local_path(video_url), offset, length)
+            return check_frame_data(data, length)
+        key = frame_cache_key(video_url, offset, length)
+        if self.frame_cache is not None:
+            cached = await self._cache_get(key)
+            if cached is not None:
+                return cached
+        return await self._flights.do(("frame",) + key, lambda: self._fetch_frame_data(video_url, offset, length))
+
+    async def _fetch_frame_data(self, video_url: str, offset: int, length: int) -> bytes:
+        if is_gcs_url(video_url):
+            content = await self._read_gcs(video_url, offset, length)
+            content = check_frame_data(content, length)
+        else:
+            resp = await self.get_range(video_url, offset, offset + length - 1)
+            if resp.status_code != 206:
+                raise FrameFetchError(f"Failed to fetch frame bytes: {resp.status_code}", resp.status_code)
+            self.object_validators.store(video_url, object_validator(resp.headers))
+            content = check_frame_data(resp.content, length)
+        if self.frame_cache is not None:
+            await self._cache_put(frame_cache_key(video_url, offset, length), content)
+        return content
+
+    async def _read_gcs(self, url: str, offset: int, length: int) -> bytes:
+        self.upstream_requests += 1
+        self.upstream_in_flight += 1
+        try:
+            data = await asyncio.to_thread(self.gcs.read_range, url, offset, length)
+        finally:
+            self.upstream_in_flight -= 1
+        self.upstream_bytes += len(data)
+        return data
+
+    async def cached_frame_data(self, video_url: str, offset: int, length: int) -> Optional[bytes]:
+        """
+        Return a frame's bytes from the frame cache, or None if it is not
+        cached or the client has no frame cache.
+        """
+        if self.frame_cache is None:
+            return None
+        return await self._cache_get(frame_cache_key(video_url, offset, length))
+
+    async def object_validator(self, url: str) -> Optional[str]:
+        """
+        Return a string identifying the version of the object at url:
+        its generation for ``gs://`` URLs, its size and modification time
+        for local files, and for other URLs the generation or ETag of the
+        last response read from it, or None if none was read yet.
+        """
+        if is_local_url(url):
+            stat = await asyncio.to_thread(os.stat, local_path(url))
+            return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        if is_gcs_url(url):
+            return str(await asyncio.to_thread(self.gcs.generation, url))
+        return self.object_validators.lookup(url)
+
+    @traced("video_index.get_frame")
+    async def get_frame(self, video_url: str, index_url: str, frame_num: int) -> bytes:
+        """
+        Get a frame's raw bytes from a video and its index URL.
+
+        Parameters
+        ----------
+        video_url : str
+            URL to the AV1 intra-only video file.
+        index_url : str
+            URL to the binary index file.
+        frame_num : int
+            The frame number to fetch.
+
+        Returns
+        -------
+        bytes
+            Raw frame bytes.
+        """
+        offset, length = await self.fetch_index_entry(index_url, frame_num)
+        return await self.fetch_frame_data(video_url, offset, length)
+
+    @traced("video_index.fetch_index_entries")
+    async def fetch_index_entries(self, index_url: str, frame_nums: Sequence[int]) -> List[Tuple[int, int]]:
+        """
+        Fetch the index entries for several frames with a single Range read.
+
+        Parameters
+        ----------
+        index_url : str
+            URL to the binary index file.
+        frame_nums : Sequence[int]
+            Frame numbers to fetch.
+
+        Returns
+        -------
+        List[Tuple[int, int]]
+            (offset, length) for each of frame_nums, in the same order.
+
+        Raises
+        ------
+        RuntimeError
+            If unable to fetch or parse the index entries.
+        """
+        if not frame_nums:
+            return []
+        if is_local_url(index_url):
+            return open_local_index(local_path(index_url)).entries_for(frame_nums)
+        if is_gcs_url(index_url):
+            index = await asyncio.to_thread(self.gcs.open_index, index_url, max(frame_nums) + 1)
+            return index.entries_for(frame_nums)
+        if self.index_cache is not None:
+            cached = await self.load_index(index_url, max(frame_nums) + 1)
+            return cached.index.entries_for(frame_nums)
+
+        header = await self.index_header(index_url)
+        first, last = min(frame_nums), max(frame_nums)
+        resp = await self.get_range(index_url, *index_entries_range(header, first, last))
+        if resp.status_code != 206:
+            raise FrameFetchError(f"Failed to fetch index range bytes: {resp.status_code}", resp.status_code)
+        return decode_index_entries(header, resp.content, first, frame_nums)
+
+    @traced("video_index.read_coalesced")
+    async def read_coalesced(self, video_url: str, read: CoalescedRead) -> Dict[int, bytes]:
+        """
+        Fetch one planned coalesced read and split it into frames.
+
+        Parameters
+        ----------
+        video_url : str
+            URL to the video file.
+        read : CoalescedRead
+            The planned read.
+
+        Returns
+        -------
+        Dict[int, bytes]
+            Raw frame bytes keyed by frame number.
+        """
+        if is_local_url(video_url):
+            data = await asyncio.to_thread(read_local_range, local_path(video_url), read.start, read.length)
+            return dict(split_coalesced_read(read, data))
+        if is_gcs_url(video_url):
+            data = await self._read_gcs(video_url, read.start, read.length)
+        else:
+            resp = await self.get_range(video_url, read.start, read.start + read.length - 1)
+            if resp.status_code != 206:
+                raise FrameFetchError(f"Failed to fetch frame bytes: {resp.status_code}", resp.status_code)
+            self.object_validators.store(video_url, object_validator(resp.headers))
+            data = resp.content
+        frames = dict(split_coalesced_read(read, data))
+        if self.frame_cache is not None:
+            for frame_num, offset, length in read.frames:
+                await self._cache_put(frame_cache_key(video_url, offset, length), frames[frame_num])
+        return frames
+
+    async def iter_frames(
+        self,
+        video_url: str,
+        index_url: str,
+        frame_nums: Sequence[int],
+        max_gap: int = DEFAULT_MAX_GAP,
+        read_ahead: int = 4,
+    ) -> AsyncIterator[Tuple[int, bytes]]:
+        """
+        Fetch several frames, coalescing nearby frames into shared Range reads.
+
+        Frames are yielded in ascending byte offset order and each distinct
+        frame number is yielded once. Up to read_ahead coalesced reads are
+        kept in flight ahead of the consumer.
+
+        Parameters
+        ----------
+        video_url : str
+            URL to the AV1 intra-only video file.
+        index_url : str
+            URL to the binary index file.
+        frame_nums : Sequence[int]
+            Frame numbers to fetch.
+        max_gap : int, optional
+            Largest number of unwanted bytes to read between two frames
+            rather than issuing a separate request, by default 1 MiB
+        read_ahead : int, optional
+            Number of coalesced reads to keep in flight, by default 4
+
+        Yields
+        ------
+        Tuple[int, bytes]
+            (frame_num, raw frame bytes).
+        """
+        entries = await self.fetch_index_entries(index_url, frame_nums)
+        frames = sorted(
+            {(n, offset, length) for n, (offset, length) in zip(frame_nums, entries)},
+            key=lambda f: (f[1], f[0]),
+        )
+        cached: Dict[int, bytes] = {}
+        if self.frame_cache is not None:
+            for frame_num, offset, length in frames:
+                data = await self._cache_get(frame_cache_key(video_url, offset, length))
+                if data is not None:
+                    cached[frame_num] = data
+        reads = plan_coalesced_reads([f for f in frames if f[0] not in cached], max_gap)
+
+        tasks: List[asyncio.Task] = []
+        next_read = 0
+        fetched: Dict[int, bytes] = {}
+        try:
+            for frame_num, _, _ in frames:
+                if frame_num in cached:
+                    yield frame_num, cached[frame_num]
+                    continue
+                while next_read < len(reads) and len(tasks) < read_ahead:
+                    tasks.append(asyncio.ensure_future(self.read_coalesced(video_url, reads[next_read])))
+                    next_read += 1
+                if frame_num not in fetched:
+                    # Reads are planned in offset order, so the oldest task holds this frame
+                    fetched = await tasks.pop(0)
+                yield frame_num, fetched[frame_num]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def get_frames(
+        self,
+        video_url: str,
+        index_url: str,
+        frame_nums: Sequence[int],
+        max_gap: int = DEFAULT_MAX_GAP,
+    ) -> List[bytes]:
+        """
+        Fetch several frames, coalescing nearby frames into shared Range reads.
+
+        Parameters
+        ----------
+        video_url : str
+            URL to the AV1 intra-only video file.
+        index_url : str
+            URL to the binary index file.
+        frame_nums : Sequence[int]
+            Frame numbers to fetch.
+        max_gap : int, optional
+            Largest number of unwanted bytes to read between two frames
+            rather than issuing a separate request, by default 1 MiB
+
+        Returns
+        -------
+        List[bytes]
+            Raw frame bytes for each of frame_nums, in the same order.
+        """
+        frames = {n: data async for n, data in self.iter_frames(video_url, index_url, frame_nums, max_gap)}
+        return [frames[frame_num] for frame_num in frame_nums]
+
+
+_default_client: Optional[AsyncFrameClient] = None
+
+
+def get_default_async_client() -> AsyncFrameClient:
+    """
+    Return the module-level AsyncFrameClient, creating it on first use.
+
+    The client must only be used from the event loop it was first used on.
+
+    Returns
+    -------
+    AsyncFrameClient
+        The shared client used by async_get_frame_from_urls.
+    """
+    global _default_client
+    if _default_client is None:
+        _default_client = AsyncFrameClient()
+    return _default_client
+
+
+def set_default_async_client(client: Optional[AsyncFrameClient]) -> None:
+    """
+    Replace the module-level AsyncFrameClient.
+
+    Parameters
+    ----------
+    client : Optional[AsyncFrameClient]
+        The client to use from now on, or None to lazily create a new
+        default client on next use.
+    """
+    global _default_client
+    _default_client = client
+
+
+async def async_get_frame_from_urls(
+    video_url: str,
+    index_url: str,
+    frame_num: int,
+    client: Optional[AsyncFrameClient] = None,
+) -> bytes:
+    """
+    Get a frame's raw bytes from a video and its index URL without blocking
+    the event loop.
+
+    frame_bytes = await async_get_frame_from_urls(video_url, index_url, 123)
+
+    Parameters
+    ----------
+    video_url : str
+        URL to the AV1 intra-only video file.
+    index_url : str
+        URL to the binary index file.
+    frame_num : int
+        The frame number to fetch.
+    client : Optional[AsyncFrameClient], optional
+        Client to fetch with, by default the module-level client
+
+    Returns
+    -------
+    bytes
+        Raw frame bytes.
+    """
+    client = client or get_default_async_client()
+    return await client.get_frame(video_url, index_url, frame_num)
+
+
+async def async_get_frames_from_urls(
+    video_url: str,
+    index_url: str,
+    frame_nums: Sequence[int],
+    max_gap: int = DEFAULT_MAX_GAP,
+    client: Optional[AsyncFrameClient] = None,
+) -> List[bytes]:
+    """
+    Get several frames' raw bytes from a video and its index URL without
+    blocking the event loop.
+
+    Parameters
+    ----------
+    video_url : str
+        URL to the AV1 intra-only video file.
+    index_url : str
+        URL to the binary index file.
+    frame_nums : Sequence[int]
+        The frame numbers to fetch.
+    max_gap : int, optional
+        Largest number of unwanted bytes to read between two frames rather
+        than issuing a separate request, by default 1 MiB
+    client : Optional[AsyncFrameClient], optional
+        Client to fetch with, by default the module-level client
+
+    Returns
+    -------
+    List[bytes]
+        Raw frame bytes for each of frame_nums, in the same order.
+    """
+    client = client or get_default_async_client()
+    return await client.get_frames(video_url, index_url, list(frame_nums), max_gap)
@@ -0,0 +1,445 @@
+# video_index/autotune.py
+import argparse
+import itertools
+import json
+import os
+import re
+import socket
+import subprocess
+import tempfile
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from .encode_video import EncoderSettings, ffmpeg_command, probe_video, run_ffmpeg, save_profile
+from .ivf import IVF_HEADER_SIZE
+
+# Tiles narrower or shorter than this cost compression for little extra
+# parallelism, so the default grid stops splitting there
+MIN_TILE_SIZE = 256
+
+DEFAULT_CPU_USED = (4, 6, 8)
+DEFAULT_SAMPLE_FRAMES = 30
+OBJECTIVES = ("fps", "size")
+
+PSNR_AVERAGE = re.compile(r"PSNR .*average:(\S+)")
+
+
+class TuneResult(NamedTuple):
+    """
+    Measured speed, size and quality of one encoder setting on the sample.
+    """
+    settings: EncoderSettings
+    fps: float
+    bytes_per_frame: float
+    psnr: float  # average over the sample, in dB
+    wall_time: float
+
+
+def probe_size(input_path: str) -> Tuple[int, int]:
+    """
+    Read the width and height of a video's first video stream.
+
+    Raises
+    ------
+    RuntimeError
+        If ffprobe fails or the file has no video stream.
+    """
+    ffprobe_cmd = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "stream=width,height",
+        "-of", "json",
+        input_path,
+    ]
+    result = subprocess.run(ffprobe_cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe failed with code {result.returncode}:\n{result.stderr}")
+    streams = json.loads(result.stdout).get("streams")
+    if not streams:
+        raise RuntimeError(f"No video stream in {input_path}")
+    return int(streams[0]["width"]), int(streams[0]["height"])
+
+
+def tile_options(size: int, max_log2: int = 6) -> List[int]:
+    """
+    log2 tile counts that keep tiles at least MIN_TILE_SIZE pixels across.
+
+    Examples
+    --------
+    >>> tile_options(3840)
+    [0, 1, 2, 3]
+    >>> tile_options(480)
+    [0]
+    """
+    return [n for n in range(max_log2 + 1) if n == 0 or size >> n >= MIN_TILE_SIZE]
+
+
+def thread_options(cpu_count: Optional[int] = None) -> List[int]:
+    """
+    Default thread counts to try: all CPUs and half of them.
+
+    Examples
+    --------
+    >>> thread_options(16)
+    [8, 16]
+    >>> thread_options(1)
+    [1]
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    return sorted({max(1, cpu_count // 2), cpu_count})
+
+
+def settings_grid(
+    width: int,
+    height: int,
+    crf: int = 30,
+    cpu_used: Sequence[int] = DEFAULT_CPU_USED,
+    tile_columns: Optional[Sequence[int]] = None,
+    tile_rows: Optional[Sequence[int]] = None,
+    threads: Optional[Sequence[int]] = None,
+) -> List[EncoderSettings]:
+    """
+    Every combination of the settings to try.
+
+    Parameters
+    ----------
+    width, height : int
+        Frame size of the input, which bounds the default tile splits.
+    crf : int, optional
+        Constant Rate Factor used for every setting, by default 30
+    cpu_used : Sequence[int], optional
+        cpu-used values, by default DEFAULT_CPU_USED
+    tile_columns, tile_rows : Optional[Sequence[int]], optional
+        log2 tile counts, by default tile_options of the width and height
+        (rows limited to 0 and 1)
+    threads : Optional[Sequence[int]], optional
+        Thread counts, by default thread_options()
+
+    Returns
+    -------
+    List[EncoderSettings]
+        The grid, in order.
+
+    Examples
+    --------
+    >>> [s[1:4] for s in settings_grid(1280, 720, cpu_used=[6], threads=[4])]
+    [(6, 0, 0), (6, 0, 1), (6, 1, 0), (6, 1, 1), (6, 2, 0), (6, 2, 1)]
+    """
+    tile_columns = tile_options(width) if tile_columns is None else tile_columns
+    tile_rows = tile_options(height)[:2] if tile_rows is None else tile_rows
+    threads = thread_options() if threads is None else threads
+    return [
+        EncoderSettings(crf, c, tc, tr, t)
+        for c, tc, tr, t in itertools.product(cpu_used, tile_columns, tile_rows, threads)
+    ]
+
+
+def parse_psnr(stderr: str) -> float:
+    """
+    Read the average PSNR from the output of ffmpeg's psnr filter.
+
+    Examples
+    --------
+    >>> parse_psnr("[Parsed_psnr_0 @ 0x5] PSNR y:41.20 u:44.02 v:44.51 average:42.05 min:40.87 max:43.99")
+    42.05
+    """
+    matches = PSNR_AVERAGE.findall(stderr)
+    if not matches:
+        raise RuntimeError(f"No PSNR in ffmpeg output:\n{stderr[-2000:]}")
+    return float(matches[-1])
+
+
+def measure_psnr(encoded_path: str, input_path: str, start_time: Optional[float], frames: int) -> float:
+    """
+    Average PSNR of an encoded sample against the input frames it came from.
+
+    Raises
+    ------
+    RuntimeError
+        If ffmpeg fails or reports no PSNR.
+    """
+    ffmpeg_cmd = ["ffmpeg", "-nostats", "-hide_banner", "-i", encoded_path]
+    if start_time is not None:
+        ffmpeg_cmd.extend(["-ss", f"{start_time:.6f}"])
+    ffmpeg_cmd.extend([
+        "-i", input_path,
+        "-lavfi", "[0:v][1:v]psnr",
+        "-frames:v", str(frames),
+        "-f", "null", "-",
+    ])
+    result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg PSNR failed with code {result.returncode}:\n{result.stderr[-2000:]}")
+    return parse_psnr(result.stderr)
+
+
+def measure_setting(
+    input_path: str,
+    sample_path: str,
+    settings: EncoderSettings,
+    start_time: Optional[float],
+    frames: int,
+) -> TuneResult:
+    """
+    Encode the sample with settings and measure its speed, size and quality.
+    """
+    ffmpeg_cmd = ffmpeg_command(
+        input_path, sample_path, settings.crf, settings.cpu_used,
+        start_time=start_time, max_frames=frames, threads=settings.threads,
+        tile_columns=settings.tile_columns, tile_rows=settings.tile_rows,
+    )
+    record = run_ffmpeg(ffmpeg_cmd, sample_path)
+    encoded = record["frames"] or frames
+    return TuneResult(
+        settings=settings,
+        fps=encoded / record["wall_time"],
+        bytes_per_frame=(record["output_bytes"] - IVF_HEADER_SIZE) / encoded,
+        psnr=measure_psnr(sample_path, input_path, start_time, encoded),
+        wall_time=record["wall_time"],
+    )
+
+
+def pareto_front(results: Iterable[TuneResult]) -> List[TuneResult]:
+    """
+    Results no other result beats on fps, size and PSNR at once.
+
+    Examples
+    --------
+    >>> s = EncoderSettings()
+    >>> results = [TuneResult(s, 10, 1000, 40, 1), TuneResult(s, 20, 1100, 40, 1),
+    ...            TuneResult(s, 10, 1200, 39, 1), TuneResult(s, 5, 900, 40, 1)]
+    >>> [r.fps for r in pareto_front(results)]
+    [10, 20, 5]
+    """
+    results = list(results)
+
+    def dominates(a: TuneResult, b: TuneResult) -> bool:
+        no_worse = a.fps >= b.fps and a.bytes_per_frame <= b.bytes_per_frame and a.psnr >= b.psnr
+        better = a.fps > b.fps or a.bytes_per_frame < b.bytes_per_frame or a.psnr > b.psnr
+        return no_worse and better
+
+    return [r for r in results if not any(dominates(other, r) for other in results)]
+
+
+def choose_setting(
+    results: Iterable[TuneResult],
+    objective: str = "fps",
+    min_psnr: Optional[float] = None,
+    max_bytes_per_frame: Optional[float] = None,
+    min_fps: Optional[float] = None,
+) -> TuneResult:
+    """
+    Pick the Pareto-optimal result that best meets a target.
+
+    Parameters
+    ----------
+    results : Iterable[TuneResult]
+        Measured settings.
+    objective : str, optional
+        "fps" for the fastest encode or "size" for the smallest output, by
+        default "fps"
+    min_psnr : Optional[float], optional
+        Lowest acceptable average PSNR in dB, by default None
+    max_bytes_per_frame : Optional[float], optional
+        Largest acceptable output size per frame, by default None
+    min_fps : Optional[float], optional
+        Lowest acceptable encode speed, by default None
+
+    Returns
+    -------
+    TuneResult
+        The chosen result. Ties go to higher PSNR.
+
+    Raises
+    ------
+    ValueError
+        If the objective is unknown or no result meets the constraints.
+
+    Examples
+    --------
+    >>> s = EncoderSettings()
+    >>> results = [TuneResult(s, 10, 1000, 40, 1), TuneResult(s, 20, 1100, 39, 1)]
+    >>> choose_setting(results).fps, choose_setting(results, "size").fps
+    (20, 10)
+    >>> choose_setting(results, min_psnr=39.5).fps
+    10
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective {objective!r}, expected one of {OBJECTIVES}")
+    candidates = [
+        r for r in pareto_front(results)
+        if (min_psnr is None or r.psnr >= min_psnr)
+        and (max_bytes_per_frame is None or r.bytes_per_frame <= max_bytes_per_frame)
+        and (min_fps is None or r.fps >= min_fps)
+    ]
+    if not candidates:
+        raise ValueError("No encoder setting meets the target")
+    if objective == "fps":
+        return max(candidates, key=lambda r: (r.fps, r.psnr))
+    return min(candidates, key=lambda r: (r.bytes_per_frame, -r.psnr))
+
+
+def autotune(
+    input_path: str,
+    profile_path: str,
+    crf: int = 30,
+    sample_frames: int = DEFAULT_SAMPLE_FRAMES,
+    start_time: Optional[float] = None,
+    grid: Optional[Sequence[EncoderSettings]] = None,
+    objective: str = "fps",
+    min_psnr: Optional[float] = None,
+    max_bytes_per_frame: Optional[float] = None,
+    min_fps: Optional[float] = None,
+) -> TuneResult:
+    """
+    Measure encoder settings on a sample of a video and save the best as a profile.
+
+    The sample is encoded once per setting, one at a time so each has the
+    host to itself, and compared against the input frames for PSNR. The
+    Pareto-optimal setting best meeting the target is saved with
+    save_profile along with every measurement, the host and the input
+    resolution; ``encode_video --profile`` loads it.
+
+    Parameters
+    ----------
+    input_path : str
+        A video representative of what will be encoded.
+    profile_path : str
+        Where to write the profile.
+    crf : int, optional
+        Constant Rate Factor used throughout, by default 30
+    sample_frames : int, optional
+        Frames encoded per setting, by default DEFAULT_SAMPLE_FRAMES
+    start_time : Optional[float], optional
+        Sample start in seconds, by default the middle of the video
+    grid : Optional[Sequence[EncoderSettings]], optional
+        Settings to try, by default settings_grid for the input resolution
+    objective, min_psnr, max_bytes_per_frame, min_fps
+        The target, as for choose_setting.
+
+    Returns
+    -------
+    TuneResult
+        The chosen setting and its measurements.
+
+    Raises
+    ------
+    RuntimeError
+        If probing, encoding or PSNR measurement fails.
+    ValueError
+        If no setting meets the target.
+    """
+    width, height = probe_size(input_path)
+    if start_time is None:
+        frame_rate, frame_count = probe_video(input_path)
+        start_time = float(max(0, frame_count - sample_frames) // 2 / frame_rate)
+    if grid is None:
+        grid = settings_grid(width, height, crf)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sample_path = os.path.join(tmp_dir, "sample.ivf")
+        for i, settings in enumerate(grid):
+            result = measure_setting(input_path, sample_path, settings, start_time, sample_frames)
+            results.append(result)
+            print(
+                f"[{i + 1}/{len(grid)}] cpu_used={settings.cpu_used} tile_columns={settings.tile_columns} "
+                f"tile_rows={settings.tile_rows} threads={settings.threads}: {result.fps:.2f} fps, "
+                f"{result.bytes_per_frame:.0f} bytes/frame, {result.psnr:.2f} dB"
+            )
+
+    best = choose_setting(results, objective, min_psnr, max_bytes_per_frame, min_fps)
+    front = pareto_front(results)
+    save_profile(
+        profile_path,
+        best.settings,
+        target={
+            "objective": objective,
+            "min_psnr": min_psnr,
+            "max_bytes_per_frame": max_bytes_per_frame,
+            "min_fps": min_fps,
+        },
+        host=socket.gethostname(),
+        cpu_count=os.cpu_count(),
+        input=input_path,
+        width=width,
+        height=height,
+        sample_frames=sample_frames,
+        start_time=start_time,
+        results=[
+            {**r._replace(settings=r.settings._asdict())._asdict(), "pareto": r in front}
+            for r in results
+        ],
+    )
+    return best
+
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",")]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Find the encoder settings with the best speed, size and quality tradeoff on this host."
+    )
+    parser.add_argument("input", help="Input video to sample")
+    parser.add_argument("profile", help="Profile JSON to write, for encode_video --profile")
+    parser.add_argument("--crf", type=int, default=30, help="Constant Rate Factor (quality, lower better)")
+    parser.add_argument(
+        "--sample-frames", type=int, default=DEFAULT_SAMPLE_FRAMES, help="Frames encoded per setting"
+    )
+    parser.add_argument(
+        "--start", type=float, default=None, help="Sample start time in seconds (default: middle of the video)"
+    )
+    parser.add_argument(
+        "--cpu-used",
+        type=_ints,
+        default=list(DEFAULT_CPU_USED),
+        help="Comma-separated cpu-used values to try",
+    )
+    parser.add_argument(
+        "--tile-columns",
+        type=_ints,
+        default=None,
+        help="Comma-separated log2 tile column counts (default: by input width)",
+    )
+    parser.add_argument(
+        "--tile-rows",
+        type=_ints,
+        default=None,
+        help="Comma-separated log2 tile row counts (default: 0,1 where the height allows)",
+    )
+    parser.add_argument(
+        "--threads",
+        type=_ints,
+        default=None,
+        help="Comma-separated thread counts (default: all CPUs and half of them)",
+    )
+    parser.add_argument("--objective", choices=OBJECTIVES, default="fps", help="Maximize fps or minimize size")
+    parser.add_argument("--min-psnr", type=float, default=None, help="Lowest acceptable average PSNR in dB")
+    parser.add_argument(
+        "--max-bytes-per-frame", type=float, default=None, help="Largest acceptable encoded frame size"
+    )
+    parser.add_argument("--min-fps", type=float, default=None, help="Lowest acceptable encode speed")
+    args = parser.parse_args()
+
+    width, height = probe_size(args.input)
+    grid = settings_grid(
+        width, height, args.crf, args.cpu_used, args.tile_columns, args.tile_rows, args.threads
+    )
+    best = autotune(
+        args.input, args.profile, args.crf, args.sample_frames, args.start, grid,
+        args.objective, args.min_psnr, args.max_bytes_per_frame, args.min_fps,
+    )
+    print(
+        f"Chose {best.settings._asdict()}: {best.fps:.2f} fps, {best.bytes_per_frame:.0f} bytes/frame, "
+        f"{best.psnr:.2f} dB; wrote {args.profile}"
+    )
+
+
+if __name__ == "__main__":
+    '''
+    python -m video_index.autotune sample_4k.mp4 host.profile.json --min-psnr 40
+    python -m video_index.encode_video input.mp4 output.ivf --profile host.profile.json
+    '''
+
+    main()
@@ -0,0 +1,318 @@
+# video_index/batch_encode.py
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, NamedTuple, Optional
+
+from .encode_video import encode_av1_intra_indexed
+from .frame_index import FrameIndex
+from .ivf import IVF_HEADER_SIZE, parse_ivf_header
+
+DEFAULT_PATTERNS = ("*.mp4", "*.mov", "*.mkv", "*.avi", "*.mts")
+
+# Suffix of files being written; renamed into place once complete
+PARTIAL_SUFFIX = ".partial"
+
+
+class EncodeJob(NamedTuple):
+    """
+    One input video and the IVF and index files it is encoded to.
+    """
+    input_path: str
+    output_path: str
+    index_path: str
+
+
+def find_inputs(sources: Iterable[str], patterns: Iterable[str] = DEFAULT_PATTERNS) -> List[str]:
+    """
+    Expand directories, glob patterns and manifests into input video paths.
+
+    Parameters
+    ----------
+    sources : Iterable[str]
+        Each is a directory (searched recursively for patterns), a glob
+        pattern, a manifest prefixed with ``@`` listing one input per line
+        (blank lines and ``#`` comments ignored), or a plain file path.
+    patterns : Iterable[str], optional
+        File name patterns matched inside directories, by default common
+        video extensions
+
+    Returns
+    -------
+    List[str]
+        Input paths, sorted and de-duplicated.
+    """
+    inputs = set()
+    for source in sources:
+        if source.startswith("@"):
+            with open(source[1:]) as f:
+                lines = (line.strip() for line in f)
+                inputs.update(line for line in lines if line and not line.startswith("#"))
+        elif os.path.isdir(source):
+            for pattern in patterns:
+                inputs.update(glob.glob(os.path.join(source, "**", pattern), recursive=True))
+        elif glob.has_magic(source):
+            inputs.update(glob.glob(source, recursive=True))
+        else:
+            inputs.add(source)
+    return sorted(inputs)
+
+
+def plan_jobs(inputs: Iterable[str], output_dir: str) -> List[EncodeJob]:
+    """
+    Map each input to ``<output_dir>/<name>.ivf`` and its ``.ivf.idx``.
+
+    Parameters
+    ----------
+    inputs : Iterable[str]
+        Input video paths.
+    output_dir : str
+        Directory for encoded outputs.
+
+    Returns
+    -------
+    List[EncodeJob]
+        One job per input.
+
+    Raises
+    ------
+    ValueError
+        If two inputs would be written to the same output.
+    """
+    jobs = []
+    seen = {}
+    for input_path in inputs:
+        name = os.path.splitext(os.path.basename(input_path))[0]
+        output_path = os.path.join(output_dir, name + ".ivf")
+        if output_path in seen:
+            raise ValueError(f"{input_path} and {seen[output_path]} both map to {output_path}")
+        seen[output_path] = input_path
+        jobs.append(EncodeJob(input_path, output_path, output_path + ".idx"))
+    return jobs
+
+
+def is_complete(output_path: str, index_path: str) -> bool:
+    """
+    Check that an encode finished: the IVF header is valid, the index has one
+    entry per frame in the header, and the last frame ends at end of file.
+
+    Parameters
+    ----------
+    output_path : str
+        Path to the IVF video.
+    index_path : str
+        Path to its binary index.
+
+    Returns
+    -------
+    bool
+        True if both files are complete and consistent.
+    """
+    try:
+        ivf_size = os.path.getsize(output_path)
+        with open(output_path, 'rb') as f:
+            header = parse_ivf_header(f.read(IVF_HEADER_SIZE))
+        index = FrameIndex.from_file(index_path)
+        if len(index) != header.frame_count:
+            return False
+        if header.frame_count == 0:
+            return ivf_size == IVF_HEADER_SIZE
+        offset, length = index[len(index) - 1]
+        return offset + length == ivf_size
+    except (OSError, ValueError):
+        return False
+
+
+def run_job(
+    job: EncodeJob,
+    crf: int = 30,
+    cpu_used: int = 4,
+    tune: Optional[str] = None,
+    threads: Optional[int] = None,
+) -> dict:
+    """
+    Encode and index one job unless its outputs are already complete.
+
+    Outputs are written under a ``.partial`` suffix and renamed into place
+    once finished, index last, so an interrupted job is never mistaken for
+    a complete one and is simply redone on the next run.
+
+    Parameters
+    ----------
+    job : EncodeJob
+        The job to run.
+    crf : int, optional
+        Constant Rate Factor for quality (lower is better quality), by default 30
+    cpu_used : int, optional
+        Speed/quality tradeoff, lower is slower/better, by default 4
+    tune : Optional[str], optional
+        Tune preset string for encoder (e.g., 'psnr'), by default None
+    threads : Optional[int], optional
+        Encoder thread count, by default None (ffmpeg's choice)
+
+    Returns
+    -------
+    dict
+        Summary record with status ("encoded", "skipped" or "failed"),
+        frame count, wall time, frames per second and input throughput.
+    """
+    record = {"input": job.input_path, "output": job.output_path, "index": job.index_path}
+    if is_complete(job.output_path, job.index_path):
+        return {**record, "status": "skipped"}
+
+    os.makedirs(os.path.dirname(os.path.abspath(job.output_path)), exist_ok=True)
+    partial_output = job.output_path + PARTIAL_SUFFIX
+    partial_index = job.index_path + PARTIAL_SUFFIX
+    start = time.perf_counter()
+    try:
+        frames = encode_av1_intra_indexed(
+            job.input_path, partial_output, partial_index, crf, cpu_used, tune, threads=threads
+        )
+        os.replace(partial_output, job.output_path)
+        os.replace(partial_index, job.index_path)
+    except Exception as e:
+        for path in (partial_output, partial_index):
+            if os.path.exists(path):
+                os.remove(path)
+        return {**record, "status": "failed", "error": str(e), "wall_time": time.perf_counter() - start}
+
+    wall_time = time.perf_counter() - start
+    input_bytes = os.path.getsize(job.input_path)
+    return {
+        **record,
+        "status": "encoded",
+        "frames": frames,
+        "wall_time": wall_time,
+        "fps": frames / wall_time if wall_time else None,
+        "input_bytes": input_bytes,
+        "output_bytes": os.path.getsize(job.output_path),
+        "input_mb_per_s": input_bytes / 1e6 / wall_time if wall_time else None,
+    }
+
+
+def run_batch(
+    jobs: List[EncodeJob],
+    summary_path: str,
+    max_jobs: int = 1,
+    cpu_budget: Optional[int] = None,
+    crf: int = 30,
+    cpu_used: int = 4,
+    tune: Optional[str] = None,
+) -> List[dict]:
+    """
+    Run encode jobs concurrently within a total CPU budget.
+
+    Up to max_jobs ffmpeg processes run at once and the CPU budget is split
+    evenly between them as encoder threads. Each finished job's summary is
+    appended to summary_path as a JSON line straight away, so progress
+    survives a crash; rerunning the same batch skips completed outputs.
+
+    Parameters
+    ----------
+    jobs : List[EncodeJob]
+        Jobs to run.
+    summary_path : str
+        JSON Lines file to append per-job summaries to.
+    max_jobs : int, optional
+        Maximum number of concurrent encodes, by default 1
+    cpu_budget : Optional[int], optional
+        Total encoder threads across all jobs, by default the CPU count
+    crf : int, optional
+        Constant Rate Factor for quality (lower is better quality), by default 30
+    cpu_used : int, optional
+        Speed/quality tradeoff, lower is slower/better, by default 4
+    tune : Optional[str], optional
+        Tune preset string for encoder (e.g., 'psnr'), by default None
+
+    Returns
+    -------
+    List[dict]
+        Summary records in job order.
+    """
+    cpu_budget = cpu_budget or os.cpu_count() or 1
+    max_jobs = max(1, min(max_jobs, cpu_budget))
+    threads = max(1, cpu_budget // max_jobs)
+    summary_lock = threading.Lock()
+
+    def run(job: EncodeJob) -> dict:
+        record = run_job(job, crf, cpu_used, tune, threads)
+        with summary_lock, open(summary_path, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"[{record['status']}] {job.input_path}")
+        return record
+
+    with ThreadPoolExecutor(max_workers=max_jobs) as pool:
+        return list(pool.map(run, jobs))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Encode many videos to AV1 intra-only IVF with frame indexes, resuming where a previous run stopped."
+    )
+    parser.add_argument(
+        "sources",
+        nargs="+",
+        help="Input directories, glob patterns, files, or @manifest files listing one input per line",
+    )
+    parser.add_argument("--output-dir", required=True, help="Directory for IVF and index outputs")
+    parser.add_argument(
+        "--pattern",
+        action="append",
+        default=None,
+        help="File pattern to match inside directories (repeatable, default: common video extensions)",
+    )
+    parser.add_argument("--jobs", type=int, default=1, help="Number of concurrent encodes")
+    parser.add_argument(
+        "--cpu-budget",
+        type=int,
+        default=None,
+        help="Total encoder threads shared by all jobs (default: CPU count)",
+    )
+    parser.add_argument(
+        "--summary",
+        default=None,
+        help="JSON Lines file for per-job summaries (default: <output-dir>/batch_summary.jsonl)",
+    )
+    parser.add_argument(
+        "--crf", type=int, default=30, help="Constant Rate Factor (quality, lower better)"
+    )
+    parser.add_argument(
+        "--cpu-used",
+        type=int,
+        default=4,
+        help="CPU usage level for encoder speed/quality tradeoff (0-8)",
+    )
+    parser.add_argument(
+        "--tune", default=None, help="Tune preset for encoder (e.g., psnr)"
+    )
+
+    args = parser.parse_args()
+
+    inputs = find_inputs(args.sources, args.pattern or DEFAULT_PATTERNS)
+    jobs = plan_jobs(inputs, args.output_dir)
+    os.makedirs(args.output_dir, exist_ok=True)
+    summary_path = args.summary or os.path.join(args.output_dir, "batch_summary.jsonl")
+    print(f"Scheduling {len(jobs)} jobs")
+
+    records = run_batch(
+        jobs, summary_path, args.jobs, args.cpu_budget, args.crf, args.cpu_used, args.tune
+    )
+    failed = [r for r in records if r["status"] == "failed"]
+    print(
+        f"{sum(r['status'] == 'encoded' for r in records)} encoded, "
+        f"{sum(r['status'] == 'skipped' for r in records)} skipped, {len(failed)} failed"
+    )
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    '''
+    python -m video_index.batch_encode /data/survey --output-dir /data/ivf --jobs 8 --cpu-budget 64
+    '''
+
+    main()
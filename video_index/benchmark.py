@@ -0,0 +1,567 @@
+# video_index/benchmark.py
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .build_index import pack_index_entries, parse_ivf_frame_headers
+from .frame_index import IndexHeader, pack_index_v2
+from .get_frame import FrameClient
+from .ivf import IVF_FRAME_HEADER_SIZE, IVF_HEADER_SIZE, IvfHeader, pack_ivf_frame_header, pack_ivf_header
+
+# Frame size distributions understood by synthetic_frame_sizes.
+SIZE_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+
+def synthetic_frame_sizes(
+    frame_count: int,
+    mean_size: int,
+    distribution: str = "lognormal",
+    spread: float = 0.5,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Draw frame payload sizes for a synthetic video.
+
+    Parameters
+    ----------
+    frame_count : int
+        Number of frames.
+    mean_size : int
+        Mean payload size in bytes.
+    distribution : str, optional
+        ``fixed`` (every frame is mean_size), ``uniform`` (within
+        mean_size * (1 ± spread)) or ``lognormal`` (with spread as the
+        sigma of the underlying normal, giving the long tail of real
+        intra frames), by default ``lognormal``
+    spread : float, optional
+        Width of the distribution, by default 0.5
+    seed : int, optional
+        Random seed, by default 0
+
+    Returns
+    -------
+    np.ndarray
+        frame_count sizes of at least 1 byte.
+
+    Raises
+    ------
+    ValueError
+        If distribution is unknown.
+
+    Examples
+    --------
+    >>> synthetic_frame_sizes(3, 100, "fixed").tolist()
+    [100, 100, 100]
+    >>> sizes = synthetic_frame_sizes(1000, 100, "uniform", 0.5)
+    >>> bool(sizes.min() >= 50 and sizes.max() <= 150)
+    True
+    """
+    rng = np.random.default_rng(seed)
+    if distribution == "fixed":
+        sizes = np.full(frame_count, mean_size, dtype=np.float64)
+    elif distribution == "uniform":
+        sizes = rng.uniform(mean_size * (1 - spread), mean_size * (1 + spread), frame_count)
+    elif distribution == "lognormal":
+        # Choose mu so the mean of the distribution is mean_size
+        sizes = rng.lognormal(np.log(mean_size) - spread**2 / 2, spread, frame_count)
+    else:
+        raise ValueError(f"Unknown size distribution {distribution!r}, expected one of {SIZE_DISTRIBUTIONS}")
+    return np.maximum(np.rint(sizes), 1).astype(np.int64)
+
+
+def synthetic_ivf(
+    frame_sizes: Sequence[int], width: int = 1920, height: int = 1080, fps: int = 30
+) -> Tuple[bytes, List[Tuple[int, int]]]:
+    """
+    Build an IVF file whose frames have the given payload sizes.
+
+    Payloads are filler rather than AV1 (frame n is filled with the byte
+    n % 256), which is all that indexing and fetching look at.
+
+    Parameters
+    ----------
+    frame_sizes : Sequence[int]
+        Payload size of each frame in bytes.
+    width, height : int, optional
+        Frame size recorded in the header, by default 1920x1080
+    fps : int, optional
+        Frame rate of the timestamps, by default 30
+
+    Returns
+    -------
+    Tuple[bytes, List[Tuple[int, int]]]
+        The file contents and the (offset, length) of each frame.
+
+    Examples
+    --------
+    >>> data, positions = synthetic_ivf([3, 5])
+    >>> len(data), positions
+    (64, [(44, 3), (59, 5)])
+    """
+    parts = [pack_ivf_header(IvfHeader(b'AV01', width, height, fps, 1, len(frame_sizes)))]
+    positions = []
+    offset = IVF_HEADER_SIZE
+    for i, size in enumerate(frame_sizes):
+        size = int(size)
+        parts.append(pack_ivf_frame_header(size, i))
+        parts.append(bytes([i % 256]) * size)
+        positions.append((offset + IVF_FRAME_HEADER_SIZE, size))
+        offset += IVF_FRAME_HEADER_SIZE + size
+    return b''.join(parts), positions
+
+
+def synthetic_index(positions: List[Tuple[int, int]], source_size: int, version: int = 1, fps: int = 30) -> bytes:
+    """
+    Build the index of a synthetic_ivf file.
+
+    Parameters
+    ----------
+    positions : List[Tuple[int, int]]
+        (offset, length) of each frame.
+    source_size : int
+        Size of the IVF file in bytes.
+    version : int, optional
+        Index format, 1 or 2, by default 1
+    fps : int, optional
+        Frame rate of the IVF file, by default 30
+
+    Returns
+    -------
+    bytes
+        The index file contents.
+    """
+    if version == 1:
+        return pack_index_entries(positions)
+    header = IndexHeader(
+        frame_count=0,
+        frame_header_size=IVF_FRAME_HEADER_SIZE,
+        timebase_num=1,
+        timebase_den=fps,
+        source_size=source_size,
+    )
+    return pack_index_v2(positions, header, timestamps=range(len(positions)))
+
+
+class RangeServer:
+    """
+    Local HTTP server serving in-memory objects with Range, ETag and
+    conditional request support, standing in for a storage bucket.
+
+    Use as a context manager; each request is answered on its own thread.
+    request_count counts requests and peak_in_flight is the most that were
+    being answered at once, a deterministic check that clients overlap
+    their requests.
+
+    Parameters
+    ----------
+    objects : Mapping[str, bytes]
+        Object contents by path, e.g. ``/video.ivf``.
+    latency : float, optional
+        Seconds to sleep before answering each request, to stand in for
+        the round trip to a remote bucket, by default 0
+
+    Examples
+    --------
+    >>> import requests
+    >>> with RangeServer({"/a": b"0123456789"}) as server:
+    ...     requests.get(server.url("/a"), headers={"Range": "bytes=2-4"}).content
+    b'234'
+    """
+
+    def __init__(self, objects: Mapping[str, bytes], latency: float = 0.0) -> None:
+        self.objects = objects
+        self.latency = latency
+        self.request_count = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+        self._etags: Dict[str, Tuple[bytes, str]] = {}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server._lock:
+                    server.request_count += 1
+                    server.in_flight += 1
+                    server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+                try:
+                    self.respond()
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def respond(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                path = self.path.split("?", 1)[0]
+                data = server.objects.get(path)
+                if data is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                etag = server.etag(path, data)
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                if self.headers.get("If-Match", etag) != etag:
+                    self.send_response(412)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+                if match is None:
+                    self.send_response(200)
+                    body = data
+                else:
+                    start = int(match.group(1))
+                    end = int(match.group(2)) if match.group(2) else len(data) - 1
+                    if start >= len(data):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(data)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    end = min(end, len(data) - 1)
+                    body = data[start:end + 1]
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 1024
+
+            def handle_error(self, request, client_address):
+                # Clients hanging up mid-response (timeouts, abandoned
+                # streams) are expected; report anything else
+                if not isinstance(sys.exc_info()[1], ConnectionError):
+                    super().handle_error(request, client_address)
+
+        self.httpd = Server(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def etag(self, path: str, data: bytes) -> str:
+        """
+        Return the ETag of the object at path, hashing it only when it
+        has been replaced since the last request.
+        """
+        cached = self._etags.get(path)
+        if cached is None or cached[0] is not data:
+            cached = self._etags[path] = (data, '"%s"' % hashlib.md5(data).hexdigest())
+        return cached[1]
+
+    def url(self, path: str) -> str:
+        """
+        Return the URL of the object at path.
+        """
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}{path}"
+
+    def __enter__(self) -> "RangeServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def percentiles(samples: Sequence[float], qs: Sequence[float] = (50, 99)) -> Dict[str, float]:
+    """
+    Summarize latency samples in seconds as milliseconds.
+
+    Examples
+    --------
+    >>> percentiles([0.001, 0.002, 0.003])
+    {'p50_ms': 2.0, 'p99_ms': 2.98}
+    """
+    values = np.percentile(np.asarray(samples, dtype=np.float64) * 1000, qs)
+    return {f"p{q:g}_ms": round(float(v), 3) for q, v in zip(qs, values)}
+
+
+def bench_parse_headers(ivf_path: str, repeat: int = 5) -> Dict[str, float]:
+    """
+    Measure parse_ivf_frame_headers throughput on a file.
+
+    The best of repeat runs is reported, so the file is read from the page
+    cache and the figure reflects parsing rather than the disk.
+
+    Returns
+    -------
+    Dict[str, float]
+        frames, bytes, best seconds and MB/s (10**6 bytes per second).
+    """
+    size = os.path.getsize(ivf_path)
+    best = float("inf")
+    frames = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        frames = len(parse_ivf_frame_headers(ivf_path))
+        best = min(best, time.perf_counter() - start)
+    return {
+        "frames": frames,
+        "bytes": size,
+        "seconds": round(best, 6),
+        "mb_per_s": round(size / best / 1e6, 1),
+        "frames_per_s": round(frames / best, 1),
+    }
+
+
+def bench_fetch(video_url: str, index_url: str, frame_count: int, requests: int = 200, seed: int = 0) -> Dict[str, float]:
+    """
+    Measure per-frame fetch latency of FrameClient.get_frame for random
+    frames, one at a time, after a first request loads the index.
+
+    Returns
+    -------
+    Dict[str, float]
+        Number of requests, p50/p99 latency in milliseconds and mean
+        bytes per frame.
+    """
+    rng = np.random.default_rng(seed)
+    frame_nums = rng.integers(0, frame_count, requests).tolist()
+    samples = []
+    nbytes = 0
+    with FrameClient() as client:
+        client.get_frame(video_url, index_url, 0)
+        for frame_num in frame_nums:
+            start = time.perf_counter()
+            nbytes += len(client.get_frame(video_url, index_url, frame_num))
+            samples.append(time.perf_counter() - start)
+    return {"requests": requests, **percentiles(samples), "mean_bytes": round(nbytes / requests, 1)}
+
+
+class _AppServer:
+    """
+    Runs the frame server app with uvicorn on a background thread.
+    """
+
+    def __init__(self) -> None:
+        import uvicorn
+
+        from .gcloud_utils import app
+
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> str:
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("Frame server failed to start")
+            time.sleep(0.01)
+        host, port = self.server.servers[0].sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def __exit__(self, *exc_info) -> None:
+        self.server.should_exit = True
+        self.thread.join()
+
+
+async def _load(base_url: str, params: List[Dict[str, Any]], concurrency: int) -> Dict[str, float]:
+    import httpx
+
+    slots = asyncio.Semaphore(concurrency)
+    samples = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as http:
+
+        async def one(query: Dict[str, Any]) -> None:
+            nonlocal errors
+            async with slots:
+                start = time.perf_counter()
+                response = await http.get("/frame", params=query)
+                samples.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        # Warm up connections and the server's index cache
+        await one(params[0])
+        samples.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*(one(query) for query in params))
+        elapsed = time.perf_counter() - start
+    return {"requests": len(params), "errors": errors, "qps": round(len(params) / elapsed, 1), **percentiles(samples)}
+
+
+def bench_server(
+    video_url: str,
+    index_url: str,
+    frame_count: int,
+    concurrency: Sequence[int] = (1, 8, 32),
+    requests: int = 200,
+    seed: int = 0,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Measure /frame QPS of the frame server at each level of concurrency.
+
+    The server is started in this process with its configuration taken
+    from the ``VIDEO_INDEX_*`` environment variables as usual, and asked
+    for random frames so read-ahead does not hide upstream latency.
+
+    Returns
+    -------
+    Dict[str, Dict[str, float]]
+        For each concurrency level, QPS, errors (non-200 responses) and
+        p50/p99 latency in milliseconds.
+    """
+    rng = np.random.default_rng(seed)
+    results = {}
+    with _AppServer() as base_url:
+        for level in concurrency:
+            params = [
+                {"video_url": video_url, "index_url": index_url, "frame": int(n)}
+                for n in rng.integers(0, frame_count, requests)
+            ]
+            results[str(level)] = asyncio.run(_load(base_url, params, level))
+    return results
+
+
+def run_benchmarks(
+    frame_count: int = 1000,
+    mean_size: int = 64 * 1024,
+    distribution: str = "lognormal",
+    spread: float = 0.5,
+    latency: float = 0.0,
+    index_version: int = 1,
+    requests: int = 200,
+    concurrency: Sequence[int] = (1, 8, 32),
+    seed: int = 0,
+    server: bool = True,
+) -> Dict[str, Any]:
+    """
+    Generate a synthetic video, serve it from a local RangeServer and run
+    every benchmark against it.
+
+    Parameters
+    ----------
+    frame_count : int, optional
+        Frames in the video, by default 1000
+    mean_size : int, optional
+        Mean frame size in bytes, by default 64 KiB
+    distribution, spread : optional
+        Frame size distribution, see synthetic_frame_sizes
+    latency : float, optional
+        Seconds of simulated upstream latency per request, by default 0
+    index_version : int, optional
+        Index format served, by default 1
+    requests : int, optional
+        Frame requests per fetch and server benchmark, by default 200
+    concurrency : Sequence[int], optional
+        Concurrency levels of the server benchmark, by default (1, 8, 32)
+    seed : int, optional
+        Random seed for frame sizes and requested frames, by default 0
+    server : bool, optional
+        Whether to run the /frame server benchmark, by default True
+
+    Returns
+    -------
+    Dict[str, Any]
+        The parameters, environment and results, ready to be written as
+        JSON.
+    """
+    sizes = synthetic_frame_sizes(frame_count, mean_size, distribution, spread, seed)
+    ivf, positions = synthetic_ivf(sizes)
+    index = synthetic_index(positions, len(ivf), index_version)
+    results: Dict[str, Any] = {
+        "params": {
+            "frame_count": frame_count,
+            "mean_size": mean_size,
+            "distribution": distribution,
+            "spread": spread,
+            "latency": latency,
+            "index_version": index_version,
+            "requests": requests,
+            "concurrency": list(concurrency),
+            "seed": seed,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        ivf_path = os.path.join(tmp, "bench.ivf")
+        with open(ivf_path, 'wb') as f:
+            f.write(ivf)
+        results["parse_ivf_frame_headers"] = bench_parse_headers(ivf_path)
+
+    with RangeServer({"/bench.ivf": ivf, "/bench.ivf.idx": index}, latency=latency) as range_server:
+        video_url, index_url = range_server.url("/bench.ivf"), range_server.url("/bench.ivf.idx")
+        results["fetch"] = bench_fetch(video_url, index_url, frame_count, requests, seed)
+        if server:
+            results["server"] = bench_server(video_url, index_url, frame_count, concurrency, requests, seed)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark indexing, frame fetches and the frame server on a synthetic video.")
+    parser.add_argument("--frames", type=int, default=1000, help="Frames in the synthetic video")
+    parser.add_argument("--mean-size", type=int, default=64 * 1024, help="Mean frame size in bytes")
+    parser.add_argument("--distribution", choices=SIZE_DISTRIBUTIONS, default="lognormal", help="Frame size distribution")
+    parser.add_argument("--spread", type=float, default=0.5, help="Width of the frame size distribution")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of simulated upstream latency per request")
+    parser.add_argument("--index-version", type=int, choices=(1, 2), default=1, help="Index format to serve")
+    parser.add_argument("--requests", type=int, default=200, help="Frame requests per benchmark")
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Concurrency levels for the /frame benchmark"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--no-server", action="store_true", help="Skip the /frame server benchmark")
+    parser.add_argument("--output", default=None, help="Write results to this JSON file instead of stdout")
+    args = parser.parse_args()
+
+    results = run_benchmarks(
+        frame_count=args.frames,
+        mean_size=args.mean_size,
+        distribution=args.distribution,
+        spread=args.spread,
+        latency=args.latency,
+        index_version=args.index_version,
+        requests=args.requests,
+        concurrency=args.concurrency,
+        seed=args.seed,
+        server=not args.no_server,
+    )
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    '''
+    python -m video_index.benchmark --latency 0.02 --output bench.json
+    '''
+
+    main()
@@ -1,6 +1,53 @@
 # video_index/build_index.py
+import argparse
+import os
 import struct
-from typing import List, Tuple
+import threading
+import time
+from array import array
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .frame_index import DEFAULT_BLOCK_FRAMES, INDEX_V2_MAGIC, FrameIndex, IndexHeader, pack_index_v2
+from .ivf import (
+    IVF_FRAME_HEADER,
+    IVF_FRAME_HEADER_SIZE,
+    IVF_HEADER_SIZE,
+    IvfHeader,
+    parse_ivf_header,
+)
+
+
+def parse_ivf_frames(ivf_path: str) -> List[Tuple[int, int, int]]:
+    """
+    Parse the IVF file to extract frame offsets, lengths and timestamps.
+
+    Parameters
+    ----------
+    ivf_path : str
+        Path to the IVF video file.
+
+    Returns
+    -------
+    List[Tuple[int, int, int]]
+        (offset, length, pts) of each frame, where pts is the presentation
+        timestamp in units of the IVF header's timebase.
+    """
+    frames = []
+    with open(ivf_path, 'rb') as f:
+        parse_ivf_header(f.read(IVF_HEADER_SIZE))
+        offset = IVF_HEADER_SIZE
+        while True:
+            frame_header = f.read(IVF_FRAME_HEADER_SIZE)
+            if len(frame_header) < IVF_FRAME_HEADER_SIZE:
+                break  # EOF
+            frame_size, pts = IVF_FRAME_HEADER.unpack(frame_header)
+            frames.append((offset + IVF_FRAME_HEADER_SIZE, frame_size, pts))
+            f.seek(frame_size, 1)
+            offset += IVF_FRAME_HEADER_SIZE + frame_size
+    return frames
+
 
 def parse_ivf_frame_headers(ivf_path: str) -> List[Tuple[int, int]]:
     """
@@ -59,14 +106,89 @@ def write_binary_index(index_path: str, frame_positions: List[Tuple[int, int]])
         List of (offset, length) for each frame.
     """
     with open(index_path, 'wb') as f:
-        for offset, length in frame_positions:
-            # Pack as two little-endian uint64 (16 bytes per frame)
-            f.write(struct.pack('<QQ', offset, length))
+        f.write(pack_index_entries(frame_positions))
+
+
+def pack_index_entries(frame_positions: List[Tuple[int, int]]) -> bytes:
+    """
+    Serialize frame positions as fixed-width binary index entries.
+
+    Parameters
+    ----------
+    frame_positions : List[Tuple[int, int]]
+        List of (offset, length) for each frame.
+
+    Returns
+    -------
+    bytes
+        16 bytes per frame.
+
+    Examples
+    --------
+    >>> len(pack_index_entries([(44, 10), (66, 20)]))
+    32
+    """
+    # Pack as two little-endian uint64 (16 bytes per frame)
+    return b''.join(struct.pack('<QQ', offset, length) for offset, length in frame_positions)
+
+
+def write_binary_index_v2(
+    index_path: str,
+    frame_positions,
+    ivf_header: Optional[IvfHeader] = None,
+    source_size: int = 0,
+    block_frames: int = DEFAULT_BLOCK_FRAMES,
+    timestamps: Optional[Sequence[int]] = None,
+) -> None:
+    """
+    Write the frame positions to a compact version 2 index file.
+
+    Version 2 stores a header with the frame count, timebase and source
+    size, then 4-byte frame lengths with an absolute offset checkpoint every
+    block_frames frames, about a quarter the size of version 1, and
+    optionally each frame's presentation timestamp for lookups by time.
+
+    Parameters
+    ----------
+    index_path : str
+        Path to write the index file.
+    frame_positions : Sequence[Tuple[int, int]] or np.ndarray
+        (offset, length) for each frame.
+    ivf_header : Optional[IvfHeader], optional
+        Header of the IVF file, for its timebase, by default None
+    source_size : int, optional
+        Size of the IVF file in bytes, by default 0 (unknown)
+    block_frames : int, optional
+        Frames per checkpoint block, by default 64
+    timestamps : Optional[Sequence[int]], optional
+        Presentation timestamp of each frame, by default None (not stored)
+    """
+    with open(index_path, 'wb') as f:
+        f.write(pack_index_v2(frame_positions, _index_header(ivf_header, source_size, block_frames), timestamps))
 
 
-def build_index(ivf_path: str, index_path: str) -> None:
+def _index_header(ivf_header: Optional[IvfHeader], source_size: int, block_frames: int) -> IndexHeader:
+    return IndexHeader(
+        frame_count=0,
+        block_frames=block_frames,
+        frame_header_size=IVF_FRAME_HEADER_SIZE,
+        timebase_num=ivf_header.timebase_num if ivf_header else 0,
+        timebase_den=ivf_header.timebase_den if ivf_header else 0,
+        source_size=source_size,
+    )
+
+
+def read_ivf_header(ivf_path: str) -> IvfHeader:
+    """
+    Read and parse the header of an IVF file.
+    """
+    with open(ivf_path, 'rb') as f:
+        return parse_ivf_header(f.read(IVF_HEADER_SIZE))
+
+
+def build_index(ivf_path: str, index_path: str, version: int = 1) -> None:
     """
-    Parse IVF video and build the 128-bit frame index file.
+    Parse IVF video and build the frame index file.
 
     Parameters
     ----------
@@ -74,7 +196,446 @@ def build_index(ivf_path: str, index_path: str) -> None:
         Path to the IVF video file.
     index_path : str
         Path where to save the binary index file.
+    version : int, optional
+        Index format: 1 for the fixed-width 128-bit entries, 2 for the
+        compact format with a header and frame timestamps, by default 1
+
+    Raises
+    ------
+    ValueError
+        If version is not 1 or 2.
+    """
+    if version not in (1, 2):
+        raise ValueError(f"Unsupported index version {version}")
+    if version == 1:
+        write_binary_index(index_path, parse_ivf_frame_headers(ivf_path))
+    else:
+        frames = parse_ivf_frames(ivf_path)
+        write_binary_index_v2(
+            index_path,
+            [(offset, length) for offset, length, _ in frames],
+            read_ivf_header(ivf_path),
+            os.path.getsize(ivf_path),
+            timestamps=[pts for _, _, pts in frames],
+        )
+
+
+def convert_index(ivf_path: str, index_path: str, version: int = 2) -> None:
+    """
+    Rewrite an existing index of either version in the given version.
+
+    The IVF file supplies the timebase, size and frame timestamps for
+    version 2; only its frame headers are read.
+
+    Parameters
+    ----------
+    ivf_path : str
+        Path to the IVF video file the index describes.
+    index_path : str
+        Path to the index file, replaced in place.
+    version : int, optional
+        Index format to write, by default 2
+
+    Raises
+    ------
+    ValueError
+        If version is not 1 or 2, or the index does not match the IVF file.
+    """
+    if version not in (1, 2):
+        raise ValueError(f"Unsupported index version {version}")
+    entries = np.array(FrameIndex.from_file(index_path).entries)
+    tmp_path = index_path + ".tmp"
+    if version == 1:
+        with open(tmp_path, 'wb') as f:
+            f.write(entries.tobytes())
+    else:
+        timestamps = [pts for _, _, pts in parse_ivf_frames(ivf_path)]
+        if len(timestamps) != len(entries):
+            raise ValueError(f"Index has {len(entries)} frames but {ivf_path} has {len(timestamps)}")
+        positions = np.stack([entries['offset'], entries['length']], axis=1)
+        write_binary_index_v2(
+            tmp_path, positions, read_ivf_header(ivf_path), os.path.getsize(ivf_path), timestamps=timestamps
+        )
+    os.replace(tmp_path, index_path)
+
+
+def merge_indexes(
+    index_paths: Sequence[str],
+    shifts: Sequence[int],
+    index_path: str,
+    version: int = 1,
+    ivf_header: Optional[IvfHeader] = None,
+    source_size: int = 0,
+) -> int:
+    """
+    Merge per-segment binary indexes into one, rebasing frame offsets.
+
+    For version 2 the segment indexes must store timestamps, which are
+    rebased the way concat_ivf_files rebases the frames: each segment
+    starts one frame duration after the previous one ends. The merged
+    index then matches the joined IVF file without reading it.
+
+    Parameters
+    ----------
+    index_paths : Sequence[str]
+        Index files of each segment, in order.
+    shifts : Sequence[int]
+        Amount to add to every offset in the matching segment's index,
+        i.e. where the segment's frame data starts in the joined file minus
+        where it started in the segment file.
+    index_path : str
+        Path to write the merged index.
+    version : int, optional
+        Index format to write, by default 1
+    ivf_header : Optional[IvfHeader], optional
+        Header of the joined IVF file, for a version 2 timebase, by default None
+    source_size : int, optional
+        Size of the joined IVF file, for a version 2 header, by default 0
+
+    Returns
+    -------
+    int
+        Number of entries written.
+
+    Raises
+    ------
+    ValueError
+        If version is not 1 or 2, or version 2 is asked for and a segment
+        index has no timestamps.
+    """
+    if version not in (1, 2):
+        raise ValueError(f"Unsupported index version {version}")
+    if version == 2:
+        positions = [np.zeros((0, 2), dtype=np.uint64)]
+        timestamps = [np.zeros(0, dtype=np.int64)]
+        pts_base = 0
+        for segment_path, shift in zip(index_paths, shifts):
+            index = FrameIndex.from_file(segment_path)
+            if index.pts is None:
+                raise ValueError(f"Index {segment_path} has no timestamps to merge")
+            entries = np.array(index.entries)
+            positions.append(np.stack([entries['offset'] + np.uint64(shift), entries['length']], axis=1))
+            pts = index.pts.astype(np.int64)
+            if len(pts):
+                timestamps.append(pts - pts[0] + pts_base)
+                frame_duration = int(pts[-1] - pts[-2]) if len(pts) > 1 else 1
+                pts_base += int(pts[-1] - pts[0]) + frame_duration
+        positions = np.concatenate(positions)
+        write_binary_index_v2(index_path, positions, ivf_header, source_size, timestamps=np.concatenate(timestamps))
+        return len(positions)
+
+    count = 0
+    with open(index_path, 'wb') as f:
+        for segment_path, shift in zip(index_paths, shifts):
+            entries = np.array(FrameIndex.from_file(segment_path).entries)
+            entries['offset'] += np.uint64(shift)
+            f.write(entries.tobytes())
+            count += len(entries)
+    return count
+
+
+def update_index(ivf_path: str, index_path: str) -> int:
+    """
+    Bring a version 1 index up to date with an IVF file that is still growing.
+
+    Parsing resumes where the index ends: the last entry's offset plus its
+    length is where the next frame header starts, so no separate state is
+    kept and the index itself is the checkpoint. Only frames whose payload
+    is completely on disk are appended; a trailing partial frame is left
+    for a later call. A torn trailing entry from an interrupted update is
+    dropped first.
+
+    Parameters
+    ----------
+    ivf_path : str
+        Path to the IVF video file being recorded.
+    index_path : str
+        Path to its version 1 index, created if missing.
+
+    Returns
+    -------
+    int
+        Number of entries appended.
+
+    Raises
+    ------
+    ValueError
+        If the IVF header is invalid or the index is version 2, which
+        cannot be appended to.
+    """
+    ivf_size = os.path.getsize(ivf_path)
+    if ivf_size < IVF_HEADER_SIZE:
+        return 0  # header not written yet
+
+    with open(ivf_path, 'rb') as ivf, open(index_path, 'ab+') as index_file:
+        parse_ivf_header(ivf.read(IVF_HEADER_SIZE))
+        index_file.seek(0)
+        if index_file.read(4) == INDEX_V2_MAGIC:
+            raise ValueError("Incremental updates need a version 1 index")
+        index_size = index_file.seek(0, os.SEEK_END)
+        if index_size % 16:
+            index_size -= index_size % 16
+            index_file.truncate(index_size)
+        pos = IVF_HEADER_SIZE
+        if index_size:
+            index_file.seek(index_size - 16)
+            offset, length = struct.unpack('<QQ', index_file.read(16))
+            pos = offset + length
+
+        positions = []
+        ivf.seek(pos)
+        while pos + IVF_FRAME_HEADER_SIZE <= ivf_size:
+            frame_size, _ = IVF_FRAME_HEADER.unpack(ivf.read(IVF_FRAME_HEADER_SIZE))
+            if pos + IVF_FRAME_HEADER_SIZE + frame_size > ivf_size:
+                break  # payload still being written
+            positions.append((pos + IVF_FRAME_HEADER_SIZE, frame_size))
+            pos += IVF_FRAME_HEADER_SIZE + frame_size
+            ivf.seek(pos)
+
+        if positions:
+            # Opened for appending, so this writes at the end
+            index_file.write(pack_index_entries(positions))
+    return len(positions)
+
+
+def follow_index(
+    ivf_path: str,
+    index_path: str,
+    interval: float = 1.0,
+    idle_timeout: Optional[float] = None,
+    stop: Optional[threading.Event] = None,
+) -> int:
+    """
+    Keep a version 1 index up to date while an IVF file is being recorded.
+
+    The file size is polled every interval seconds and update_index runs
+    whenever it has grown, so new frames become fetchable within about one
+    interval of being written.
+
+    Parameters
+    ----------
+    ivf_path : str
+        Path to the IVF video file being recorded.
+    index_path : str
+        Path to its version 1 index.
+    interval : float, optional
+        Seconds between polls, by default 1.0
+    idle_timeout : Optional[float], optional
+        Return once the file has not grown for this many seconds,
+        by default None (follow until stopped)
+    stop : Optional[threading.Event], optional
+        Return when this event is set, by default None
+
+    Returns
+    -------
+    int
+        Total number of entries appended.
     """
-    frame_positions = parse_ivf_frame_headers(ivf_path)
-    write_binary_index(index_path, frame_positions)
+    appended = 0
+    last_size = -1
+    last_growth = time.monotonic()
+    while stop is None or not stop.is_set():
+        try:
+            size = os.path.getsize(ivf_path)
+        except FileNotFoundError:
+            size = -1  # recording has not started yet
+        if size != last_size:
+            last_size = size
+            last_growth = time.monotonic()
+            if size >= 0:
+                appended += update_index(ivf_path, index_path)
+        elif idle_timeout is not None and time.monotonic() - last_growth >= idle_timeout:
+            break
+        if stop is not None:
+            stop.wait(interval)
+        else:
+            time.sleep(interval)
+    return appended
+
+
+class IvfStreamIndexer:
+    """
+    Incrementally parse an IVF byte stream as it is produced.
+
+    Feed the stream in chunks of any size; each call returns the (offset,
+    length) positions of frames whose payload has been fully received.
+    Only the current partial 32- or 12-byte header is buffered, so memory
+    use does not depend on frame or file size.
+
+    A version 2 index needs the frame count in its header, so it cannot be
+    written as frames arrive. With keep_frames the indexer also keeps each
+    frame's offset, length and timestamp (24 bytes per frame) and
+    pack_index_v2 serializes them once the stream has finished.
+
+    Parameters
+    ----------
+    keep_frames : bool, optional
+        Keep frame positions and timestamps for pack_index_v2, by default False
+
+    Examples
+    --------
+    >>> from .ivf import pack_ivf_header, pack_ivf_frame_header
+    >>> data = pack_ivf_header(IvfHeader(b'AV01', 64, 64, 30, 1, 1)) + pack_ivf_frame_header(3, 0) + b'abc'
+    >>> indexer = IvfStreamIndexer(keep_frames=True)
+    >>> indexer.feed(data[:40]), indexer.feed(data[40:])
+    ([], [(44, 3)])
+    >>> indexer.finish()
+    >>> FrameIndex.from_bytes(indexer.pack_index_v2(len(data))).entries.tolist()
+    [(44, 3)]
+    """
+
+    def __init__(self, keep_frames: bool = False) -> None:
+        self.header: Optional[IvfHeader] = None
+        self.frame_count = 0
+        # Flattened (offset, length) pairs and timestamps, if keep_frames
+        self._positions = array('Q') if keep_frames else None
+        self._timestamps = array('q') if keep_frames else None
+        self._offset = 0  # stream position of the next header to parse
+        self._pending = b''
+        self._skip = 0  # payload bytes of the current frame still to come
+        self._current: Optional[Tuple[int, int]] = None
+
+    def feed(self, chunk: bytes) -> List[Tuple[int, int]]:
+        """
+        Consume the next chunk of the stream.
+
+        Parameters
+        ----------
+        chunk : bytes
+            Bytes following everything fed so far.
+
+        Returns
+        -------
+        List[Tuple[int, int]]
+            (offset, length) of each frame completed by this chunk.
+
+        Raises
+        ------
+        ValueError
+            If the stream does not start with a valid IVF header.
+        """
+        completed = []
+        pos = 0
+        size = len(chunk)
+        while pos < size:
+            if self._skip:
+                take = min(self._skip, size - pos)
+                self._skip -= take
+                pos += take
+                if not self._skip:
+                    completed.append(self._current)
+                continue
+
+            target = IVF_HEADER_SIZE if self.header is None else IVF_FRAME_HEADER_SIZE
+            piece = chunk[pos:pos + target - len(self._pending)]
+            self._pending += piece
+            pos += len(piece)
+            if len(self._pending) < target:
+                break
+
+            if self.header is None:
+                self.header = parse_ivf_header(self._pending)
+                self._offset = IVF_HEADER_SIZE
+            else:
+                frame_size, pts = IVF_FRAME_HEADER.unpack(self._pending)
+                self._current = (self._offset + IVF_FRAME_HEADER_SIZE, frame_size)
+                if self._positions is not None:
+                    self._positions.extend(self._current)
+                    self._timestamps.append(pts)
+                self._offset += IVF_FRAME_HEADER_SIZE + frame_size
+                self.frame_count += 1
+                self._skip = frame_size
+                if not frame_size:
+                    completed.append(self._current)
+            self._pending = b''
+        return completed
+
+    def finish(self) -> None:
+        """
+        Check that the stream ended on a frame boundary.
+
+        Raises
+        ------
+        ValueError
+            If the stream was empty or ended inside a header or frame.
+        """
+        if self.header is None:
+            raise ValueError("Not a valid IVF file")
+        if self._pending or self._skip:
+            raise ValueError("IVF stream ended inside a frame")
+
+    def pack_index_v2(self, source_size: int = 0, block_frames: int = DEFAULT_BLOCK_FRAMES) -> bytes:
+        """
+        Serialize the frames seen as a version 2 index with timestamps.
+
+        Parameters
+        ----------
+        source_size : int, optional
+            Size of the IVF file in bytes, by default 0 (unknown)
+        block_frames : int, optional
+            Frames per checkpoint block, by default 64
+
+        Raises
+        ------
+        ValueError
+            If the indexer was made without keep_frames, or the frames
+            cannot be stored in a version 2 index.
+        """
+        if self._positions is None:
+            raise ValueError("IvfStreamIndexer needs keep_frames=True for a version 2 index")
+        positions = np.frombuffer(self._positions, dtype=np.uint64).reshape(-1, 2)
+        timestamps = np.frombuffer(self._timestamps, dtype=np.int64)
+        return pack_index_v2(positions, _index_header(self.header, source_size, block_frames), timestamps)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or update the frame index of an IVF file.")
+    parser.add_argument("ivf", help="IVF video path")
+    parser.add_argument("--index", default=None, help="Index path (default: <ivf>.idx)")
+    parser.add_argument(
+        "--index-version",
+        type=int,
+        choices=(1, 2),
+        default=1,
+        help="Index format for a full build (--update and --follow need version 1)",
+    )
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Append only frames added since the index was last updated",
+    )
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        help="Keep updating the index while the IVF file grows",
+    )
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between polls with --follow")
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=None,
+        help="With --follow, stop once the file has not grown for this many seconds",
+    )
+
+    args = parser.parse_args()
+    index_path = args.index or args.ivf + ".idx"
+
+    if args.follow:
+        print(f"Following {args.ivf}, index at {index_path}")
+        try:
+            appended = follow_index(args.ivf, index_path, args.interval, args.idle_timeout)
+        except KeyboardInterrupt:
+            return
+        print(f"Appended {appended} frames")
+    elif args.update:
+        print(f"Appended {update_index(args.ivf, index_path)} frames to {index_path}")
+    else:
+        build_index(args.ivf, index_path, args.index_version)
+
+
+if __name__ == "__main__":
+    '''
+    python -m video_index.build_index recording.ivf --follow --interval 0.5
+    '''
 
+    main()
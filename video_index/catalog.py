@@ -0,0 +1,386 @@
+# video_index/catalog.py
+import argparse
+import csv
+import mmap
+import os
+import struct
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .errors import FrameFetchError
+from .frame_index import INDEX_DTYPE, FrameIndex, IndexHeader, parse_index_header
+from .get_frame import (
+    decode_index_entries,
+    index_entries_range,
+    index_time_ticks,
+    locate_block,
+    locate_frame_in_block,
+)
+
+# Catalog file layout:
+#
+#   header (64 bytes): magic, version, flags (unused), video count, and the
+#       byte offsets of the directory, the string table and the index
+#       region, reserved
+#   index region: each video's index file (version 1 or 2) copied
+#       unchanged, each starting on an 8-byte boundary
+#   directory: one CATALOG_ENTRY_DTYPE record per video, sorted by id,
+#       locating its id and video URL in the string table and its index in
+#       the index region
+#   string table: UTF-8 video ids and URLs
+#
+# The file is memory-mapped, so a frame lookup reads its video's directory
+# record and one entry (version 1) or one block (version 2) of its index,
+# without copying the index or fetching it from storage.
+CATALOG_MAGIC = b'VCAT'
+CATALOG_HEADER = struct.Struct('<4sHHQQQQ24x')
+CATALOG_HEADER_SIZE = CATALOG_HEADER.size
+CATALOG_ENTRY_DTYPE = np.dtype([
+    ('id_offset', '<u8'), ('id_length', '<u4'),
+    ('url_offset', '<u8'), ('url_length', '<u4'),
+    ('frame_count', '<u8'),
+    ('index_offset', '<u8'), ('index_length', '<u8'),
+])
+
+# Alignment of each index in the index region.
+INDEX_ALIGNMENT = 8
+
+
+class CatalogVideo:
+    """
+    One video of a Catalog: its location, frame count and index, read in
+    place from the catalog's mapping.
+
+    Lookups decode only the entries they need, so they cost the same for
+    version 1 and version 2 indexes regardless of the video's length.
+
+    Parameters
+    ----------
+    video_id : str
+        The video's id in the catalog.
+    video_url : str
+        URL of the video file.
+    frame_count : int
+        Number of frames in the index.
+    data : memoryview
+        The video's index file contents.
+    """
+
+    __slots__ = ("video_id", "video_url", "frame_count", "header", "data")
+
+    def __init__(self, video_id: str, video_url: str, frame_count: int, data: memoryview) -> None:
+        self.video_id = video_id
+        self.video_url = video_url
+        self.frame_count = frame_count
+        self.header: Optional[IndexHeader] = parse_index_header(data)
+        self.data = data
+
+    def __len__(self) -> int:
+        return self.frame_count
+
+    def index(self) -> FrameIndex:
+        """
+        Return the whole index as a FrameIndex, wrapping the mapping for
+        version 1 and decoding every entry for version 2.
+        """
+        return FrameIndex.from_bytes(self.data)
+
+    def entry(self, frame_num: int) -> Tuple[int, int]:
+        """
+        Look up the (offset, length) of one frame in the video.
+
+        Raises
+        ------
+        RuntimeError
+            If the frame number is outside the index.
+        """
+        return self.entries_for([frame_num])[0]
+
+    def entries_for(self, frame_nums: Sequence[int]) -> List[Tuple[int, int]]:
+        """
+        Look up the (offset, length) entries for a batch of frames.
+
+        Parameters
+        ----------
+        frame_nums : Sequence[int]
+            Frame numbers to look up.
+
+        Returns
+        -------
+        List[Tuple[int, int]]
+            (offset, length) for each of frame_nums, in the same order.
+
+        Raises
+        ------
+        RuntimeError
+            If any frame number is outside the index.
+        """
+        if not len(frame_nums):
+            return []
+        for frame_num in frame_nums:
+            if not 0 <= frame_num < self.frame_count:
+                raise FrameFetchError(
+                    f"Frame {frame_num} out of range for index of {self.frame_count} frames", 404
+                )
+        first, last = min(frame_nums), max(frame_nums)
+        start, end = index_entries_range(self.header, first, last)
+        return decode_index_entries(self.header, self.data[start:end + 1], first, frame_nums)
+
+    def frame_at_time(self, t: float) -> int:
+        """
+        Find the frame displayed at time t from a version 2 index with
+        timestamps, reading the per-block timestamp table and the
+        timestamps of one block.
+
+        Raises
+        ------
+        RuntimeError
+            If the index has no timestamps, or t is before the first frame.
+        """
+        header = self.header
+        ticks = index_time_ticks(header, t)
+        start, end = header.pts_table_range()
+        block = locate_block(self.data[start:end + 1], ticks, t)
+        start, end = header.pts_range(block, block)
+        return locate_frame_in_block(header, self.data[start:end + 1], block, ticks)
+
+
+class Catalog:
+    """
+    A memory-mapped catalog of many videos and their frame indexes,
+    written by build_catalog.
+
+    Opening it maps the file and builds a dictionary from video id to
+    directory record, so resolving a video costs one dictionary lookup and
+    resolving a frame a few reads of the mapping. Indexes are paged in
+    from the file as they are used and shared between processes mapping
+    the same catalog.
+
+    Parameters
+    ----------
+    path : str
+        Path to the catalog file.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a catalog.
+
+    Examples
+    --------
+    >>> import tempfile
+    >>> from video_index.build_index import write_binary_index
+    >>> with tempfile.TemporaryDirectory() as tmp:
+    ...     index_path = os.path.join(tmp, "a.ivf.idx")
+    ...     write_binary_index(index_path, [(44, 10), (66, 20)])
+    ...     catalog_path = os.path.join(tmp, "videos.vcat")
+    ...     build_catalog([("a", "gs://bucket/a.ivf", index_path)], catalog_path)
+    ...     catalog = Catalog(catalog_path)
+    ...     video = catalog.video("a")
+    ...     video.video_url, len(video), video.entry(1)
+    1
+    ('gs://bucket/a.ivf', 2, (66, 20))
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data = memoryview(self._mmap)
+        if len(data) < CATALOG_HEADER_SIZE or data[:4] != CATALOG_MAGIC:
+            raise ValueError(f"{path} is not a video catalog")
+        _, version, _, count, directory_offset, strings_offset, _ = CATALOG_HEADER.unpack_from(data)
+        if version != 1:
+            raise ValueError(f"Unsupported catalog version {version}")
+        self._data = data
+        self._directory = np.frombuffer(data, dtype=CATALOG_ENTRY_DTYPE, count=count, offset=directory_offset)
+        self._strings = strings_offset
+        ids = zip(self._directory['id_offset'].tolist(), self._directory['id_length'].tolist())
+        self._rows: Dict[str, int] = {self._string(*id_range): row for row, id_range in enumerate(ids)}
+
+    def __reduce__(self):
+        # Mappings cannot be pickled; another process maps the file itself
+        return Catalog, (self.path,)
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._strings + offset
+        return str(self._data[start:start + length], 'utf-8')
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, video_id: str) -> bool:
+        return video_id in self._rows
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+
+    def video(self, video_id: str) -> CatalogVideo:
+        """
+        Resolve a video by id.
+
+        Raises
+        ------
+        RuntimeError
+            If the catalog has no video video_id.
+        """
+        row = self._rows.get(video_id)
+        if row is None:
+            raise FrameFetchError(f"Unknown video {video_id}", 404)
+        record = self._directory[row]
+        video_url = self._string(int(record['url_offset']), int(record['url_length']))
+        start = int(record['index_offset'])
+        data = self._data[start:start + int(record['index_length'])]
+        return CatalogVideo(video_id, video_url, int(record['frame_count']), data)
+
+
+def _index_frame_count(data: bytes, index_path: str) -> int:
+    header = parse_index_header(data)
+    if header is not None:
+        return header.frame_count
+    if len(data) % INDEX_DTYPE.itemsize:
+        raise ValueError(f"{index_path}: index size {len(data)} is not a multiple of {INDEX_DTYPE.itemsize}")
+    return len(data) // INDEX_DTYPE.itemsize
+
+
+def build_catalog(videos: Iterable[Tuple[str, str, str]], catalog_path: str) -> int:
+    """
+    Write a catalog of videos in one pass over their index files.
+
+    Each index is copied into the catalog unchanged; the file is written
+    next to catalog_path and moved into place once complete, so servers
+    never map a partial catalog.
+
+    Parameters
+    ----------
+    videos : Iterable[Tuple[str, str, str]]
+        (video_id, video_url, index_path) of each video, with index_path a
+        version 1 or 2 index written by build_index.
+    catalog_path : str
+        Path of the catalog to write.
+
+    Returns
+    -------
+    int
+        Number of videos written.
+
+    Raises
+    ------
+    ValueError
+        If a video id appears twice or an index is invalid.
+    """
+    rows = []
+    strings = bytearray()
+    seen = set()
+    tmp_path = catalog_path + ".tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(bytes(CATALOG_HEADER_SIZE))
+            position = CATALOG_HEADER_SIZE
+            for video_id, video_url, index_path in videos:
+                if video_id in seen:
+                    raise ValueError(f"Video {video_id} is listed twice")
+                seen.add(video_id)
+                with open(index_path, 'rb') as index_file:
+                    data = index_file.read()
+                frame_count = _index_frame_count(data, index_path)
+                f.write(data)
+                id_bytes, url_bytes = video_id.encode('utf-8'), video_url.encode('utf-8')
+                rows.append((
+                    id_bytes, len(strings), len(id_bytes), len(strings) + len(id_bytes), len(url_bytes),
+                    frame_count, position, len(data),
+                ))
+                strings += id_bytes + url_bytes
+                position += len(data)
+                padding = -position % INDEX_ALIGNMENT
+                f.write(bytes(padding))
+                position += padding
+
+            rows.sort()
+            directory = np.array([row[1:] for row in rows], dtype=CATALOG_ENTRY_DTYPE)
+            directory_offset = position
+            strings_offset = directory_offset + directory.nbytes
+            f.write(directory.tobytes())
+            f.write(strings)
+            f.seek(0)
+            f.write(CATALOG_HEADER.pack(
+                CATALOG_MAGIC, 1, 0, len(rows), directory_offset, strings_offset, CATALOG_HEADER_SIZE
+            ))
+        os.replace(tmp_path, catalog_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(rows)
+
+
+def read_manifest(manifest_path: str) -> Iterator[Tuple[str, str, str]]:
+    """
+    Read (video_id, video_url, index_path) rows from a CSV file without a
+    header. Relative index paths are taken relative to the manifest.
+    """
+    base = os.path.dirname(manifest_path)
+    with open(manifest_path, newline='') as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith('#'):
+                continue
+            if len(row) != 3:
+                raise ValueError(f"Expected video_id,video_url,index_path in {manifest_path}, got {row}")
+            video_id, video_url, index_path = (value.strip() for value in row)
+            yield video_id, video_url, os.path.join(base, index_path)
+
+
+def videos_from_indexes(index_paths: Iterable[str], url_prefix: Optional[str] = None) -> Iterator[Tuple[str, str, str]]:
+    """
+    Describe videos by the indexes build_index wrote next to them.
+
+    An index ``<name>.ivf.idx`` gives the video id ``<name>`` and the
+    video URL url_prefix + ``<name>.ivf``, or the local video path
+    without a prefix.
+
+    Examples
+    --------
+    >>> list(videos_from_indexes(["/data/cam1.ivf.idx"], "gs://bucket/videos/"))
+    [('cam1', 'gs://bucket/videos/cam1.ivf', '/data/cam1.ivf.idx')]
+    """
+    for index_path in index_paths:
+        video_path = index_path[:-len(".idx")] if index_path.endswith(".idx") else index_path
+        video_name = os.path.basename(video_path)
+        video_id = os.path.splitext(video_name)[0]
+        video_url = url_prefix + video_name if url_prefix is not None else os.path.abspath(video_path)
+        yield video_id, video_url, index_path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build a catalog of many videos and their frame indexes.")
+    parser.add_argument("catalog", help="Catalog path to write")
+    parser.add_argument("indexes", nargs="*", help="Index files written by build_index, named <video>.idx")
+    parser.add_argument(
+        "--url-prefix",
+        default=None,
+        help="Prefix of the video URLs of the indexes given, e.g. gs://bucket/videos/ (default: local paths)",
+    )
+    parser.add_argument(
+        "--manifest",
+        default=None,
+        help="CSV file of video_id,video_url,index_path rows, instead of or as well as indexes",
+    )
+    args = parser.parse_args()
+    if not args.indexes and not args.manifest:
+        parser.error("Give index files or --manifest")
+
+    def videos():
+        if args.manifest:
+            yield from read_manifest(args.manifest)
+        yield from videos_from_indexes(args.indexes, args.url_prefix)
+
+    print(f"Wrote {build_catalog(videos(), args.catalog)} videos to {args.catalog}")
+
+
+if __name__ == "__main__":
+    '''
+    python -m video_index.catalog videos.vcat indexes/*.ivf.idx --url-prefix gs://bucket/videos/
+    '''
+
+    main()
@@ -0,0 +1,421 @@
+# video_index/clip.py
+import argparse
+import asyncio
+from typing import Any, AsyncIterator, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from .async_get_frame import AsyncFrameClient
+from .coalesce import DEFAULT_MAX_GAP, CoalescedRead, plan_coalesced_reads
+from .errors import FrameFetchError
+from .get_frame import FrameClient, get_default_client
+from .gcs import is_gcs_url
+from .ivf import (
+    IVF_FRAME_HEADER,
+    IVF_FRAME_HEADER_SIZE,
+    IVF_HEADER_SIZE,
+    pack_ivf_frame_header,
+    pack_ivf_header,
+    parse_ivf_header,
+)
+from .local_file import is_local_url, local_path, read_local_range
+
+# Size of the chunks a clip is read from upstream and passed on in.
+CLIP_CHUNK_SIZE = 256 * 2**10
+
+
+class Clip(NamedTuple):
+    """
+    A planned clip: its 32-byte IVF file header and the Range reads of the
+    source that supply its frames. Each planned frame spans the source
+    frame header as well as the payload, so reads carry the original
+    timestamps.
+    """
+    header: bytes
+    reads: List[CoalescedRead]
+    frame_count: int
+
+    @property
+    def size(self) -> int:
+        """Size in bytes of the clip file."""
+        return len(self.header) + sum(length for read in self.reads for _, _, length in read.frames)
+
+
+def clip_frame_numbers(start: int, end: int, step: int = 1) -> range:
+    """
+    Return the frame numbers of a clip from start to end inclusive, taking
+    every step-th frame.
+
+    Raises
+    ------
+    ValueError
+        If the range is empty or step is not positive.
+
+    Examples
+    --------
+    >>> list(clip_frame_numbers(10, 20, 5))
+    [10, 15, 20]
+    """
+    if step < 1:
+        raise ValueError(f"step must be at least 1, got {step}")
+    if start < 0 or end < start:
+        raise ValueError(f"Invalid clip range {start}-{end}")
+    return range(start, end + 1, step)
+
+
+def plan_clip(
+    source_header: bytes,
+    frame_nums: Sequence[int],
+    entries: Sequence[Tuple[int, int]],
+    max_gap: int = DEFAULT_MAX_GAP,
+) -> Clip:
+    """
+    Plan a clip of frames of a source IVF file.
+
+    The clip's header is the source header with the frame count replaced.
+    Frames are read along with their source frame headers; consecutive
+    frames are contiguous in the source, so a clip without a step is a
+    single Range read.
+
+    Parameters
+    ----------
+    source_header : bytes
+        The first 32 bytes of the source.
+    frame_nums : Sequence[int]
+        Frame numbers of the clip, in ascending order.
+    entries : Sequence[Tuple[int, int]]
+        (offset, length) of each of frame_nums from the source's index.
+    max_gap : int, optional
+        Largest gap in bytes between two frames read together,
+        by default 1 MiB
+
+    Returns
+    -------
+    Clip
+        The plan.
+
+    Raises
+    ------
+    ValueError
+        If source_header is not an IVF header.
+
+    Examples
+    --------
+    >>> from .ivf import IvfHeader
+    >>> header = pack_ivf_header(IvfHeader(b'AV01', 64, 64, 30, 1, 3))
+    >>> clip = plan_clip(header, [1, 2], [(66, 20), (98, 30)])
+    >>> [(read.start, read.length) for read in clip.reads], clip.frame_count, clip.size
+    ([(54, 74)], 2, 106)
+    """
+    header = parse_ivf_header(source_header)
+    frames = [
+        (n, offset - IVF_FRAME_HEADER_SIZE, length + IVF_FRAME_HEADER_SIZE)
+        for n, (offset, length) in zip(frame_nums, entries)
+    ]
+    max_read = max(1, sum(length for _, _, length in frames))
+    reads = plan_coalesced_reads(frames, max_gap, max_read)
+    return Clip(pack_ivf_header(header._replace(frame_count=len(frames))), reads, len(frames))
+
+
+class ClipRewriter:
+    """
+    Rewrites the bytes of a clip's source reads into its frames.
+
+    Each frame's source header is re-emitted with its timestamp rebased
+    so the clip starts at zero, its payload is passed on as it arrives,
+    and bytes between frames are dropped. At most one frame header is held
+    back at a time, so memory does not grow with the clip.
+
+    Examples
+    --------
+    >>> read = CoalescedRead(0, 17, [(0, 0, 15)])
+    >>> rewriter = ClipRewriter()
+    >>> rewriter.start(read)
+    >>> data = pack_ivf_frame_header(3, 7) + b'abc' + b'xy'
+    >>> rewriter.feed(data[:5]), rewriter.feed(data[5:])
+    ([], [b'\\x03\\x00\\x00\\x00\\x00\\x00\\x00\\x00\\x00\\x00\\x00\\x00', b'abc'])
+    >>> rewriter.finish()
+    """
+
+    def __init__(self) -> None:
+        self.pts_base: Optional[int] = None
+        self.frame_count = 0
+        self._frames: Iterator[Tuple[int, int, int]] = iter(())
+        self._frame: Optional[Tuple[int, int, int]] = None
+        self._pos = 0
+        self._end = 0
+        self._header = b''
+
+    def _next_frame(self) -> None:
+        self._frame = next(self._frames, None)
+        self._header = b''
+
+    def start(self, read: CoalescedRead) -> None:
+        """
+        Begin the next read of the clip.
+        """
+        self._frames = iter(read.frames)
+        self._pos = read.start
+        self._end = read.start + read.length
+        self._next_frame()
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """
+        Consume the next chunk of the current read.
+
+        Returns
+        -------
+        List[bytes]
+            Clip bytes completed by this chunk.
+
+        Raises
+        ------
+        RuntimeError
+            If a source frame header does not match the index.
+        """
+        out = []
+        view = memoryview(chunk)
+        while view and self._frame is not None:
+            _, frame_start, frame_length = self._frame
+            payload_start = frame_start + IVF_FRAME_HEADER_SIZE
+            if self._pos < frame_start:
+                take = min(len(view), frame_start - self._pos)
+            elif self._pos < payload_start:
+                take = min(len(view), payload_start - self._pos)
+                self._header += view[:take]
+                if len(self._header) == IVF_FRAME_HEADER_SIZE:
+                    size, pts = IVF_FRAME_HEADER.unpack(self._header)
+                    if size != frame_length - IVF_FRAME_HEADER_SIZE:
+                        raise FrameFetchError(
+                            f"Frame size mismatch at offset {payload_start}: "
+                            f"index says {frame_length - IVF_FRAME_HEADER_SIZE}, video says {size}"
+                        )
+                    if self.pts_base is None:
+                        self.pts_base = pts
+                    out.append(pack_ivf_frame_header(size, pts - self.pts_base))
+            else:
+                take = min(len(view), frame_start + frame_length - self._pos)
+                out.append(bytes(view[:take]))
+            view = view[take:]
+            self._pos += take
+            if self._pos == frame_start + frame_length:
+                self.frame_count += 1
+                self._next_frame()
+        self._pos += len(view)
+        return out
+
+    def finish(self) -> None:
+        """
+        Check that the current read was complete.
+
+        Raises
+        ------
+        RuntimeError
+            If the read ended early.
+        """
+        if self._frame is not None or self._pos != self._end:
+            raise FrameFetchError(f"Clip read ended early at byte {self._pos} of {self._end}")
+
+
+def _read_chunks(client: FrameClient, video_url: str, read: CoalescedRead, chunk_size: int) -> Iterator[bytes]:
+    end = read.start + read.length
+    if is_local_url(video_url) or is_gcs_url(video_url):
+        path = local_path(video_url) if is_local_url(video_url) else None
+        for pos in range(read.start, end, chunk_size):
+            length = min(chunk_size, end - pos)
+            data = read_local_range(path, pos, length) if path else client.gcs.read_range(video_url, pos, length)
+            if not data:
+                return
+            yield data
+        return
+    with client.get_range(video_url, read.start, end - 1, stream=True) as resp:
+        if resp.status_code != 206:
+            raise FrameFetchError(f"Failed to fetch frame bytes: {resp.status_code}", resp.status_code)
+        yield from resp.iter_content(chunk_size)
+
+
+def open_clip(
+    video_url: str,
+    index_url: str,
+    start: int,
+    end: int,
+    step: int = 1,
+    client: Optional[FrameClient] = None,
+    max_gap: int = DEFAULT_MAX_GAP,
+    index: Any = None,
+) -> Clip:
+    """
+    Plan a clip of frames start to end (inclusive) of a video, taking
+    every step-th frame, by reading the index entries and the source
+    header.
+
+    Parameters
+    ----------
+    video_url : str
+        URL to the AV1 intra-only IVF video file.
+    index_url : str
+        URL to the binary index file.
+    start : int
+        First frame of the clip.
+    end : int
+        Last frame of the clip, included if step lands on it.
+    step : int, optional
+        Take every step-th frame, by default 1
+    client : Optional[FrameClient], optional
+        Client to fetch with, by default the module-level client
+    max_gap : int, optional
+        Largest gap in bytes between two frames read together,
+        by default 1 MiB
+    index : Any, optional
+        An index at hand (anything with ``entries_for``, such as a
+        CatalogVideo) used instead of reading index_url, by default None
+
+    Returns
+    -------
+    Clip
+        The plan, to pass to iter_clip.
+
+    Raises
+    ------
+    ValueError
+        If the range is invalid or the video is not an IVF file.
+    RuntimeError
+        If a frame is past the end of the index or a read fails.
+    """
+    client = client or get_default_client()
+    frame_nums = clip_frame_numbers(start, end, step)
+    if index is not None:
+        entries = index.entries_for(frame_nums)
+    else:
+        entries = client.fetch_index_entries(index_url, frame_nums)
+    source_header = client.fetch_frame_data(video_url, 0, IVF_HEADER_SIZE)
+    return plan_clip(source_header, frame_nums, entries, max_gap)
+
+
+def iter_clip(
+    video_url: str, clip: Clip, client: Optional[FrameClient] = None, chunk_size: int = CLIP_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Yield the bytes of a planned clip as a valid IVF file, streaming the
+    source in chunk_size pieces so memory use does not depend on the
+    clip's length.
+
+    Raises
+    ------
+    RuntimeError
+        If a read fails or the source does not match its index.
+    """
+    client = client or get_default_client()
+    yield clip.header
+    rewriter = ClipRewriter()
+    for read in clip.reads:
+        rewriter.start(read)
+        for chunk in _read_chunks(client, video_url, read, chunk_size):
+            yield from rewriter.feed(chunk)
+        rewriter.finish()
+
+
+def write_clip(
+    video_url: str,
+    index_url: str,
+    output_path: str,
+    start: int,
+    end: int,
+    step: int = 1,
+    client: Optional[FrameClient] = None,
+    max_gap: int = DEFAULT_MAX_GAP,
+) -> int:
+    """
+    Write frames start to end (inclusive) of a video, every step-th
+    frame, to a new IVF file without re-encoding. See open_clip.
+
+    Returns
+    -------
+    int
+        Number of frames written.
+    """
+    clip = open_clip(video_url, index_url, start, end, step, client, max_gap)
+    with open(output_path, 'wb') as f:
+        for chunk in iter_clip(video_url, clip, client):
+            f.write(chunk)
+    return clip.frame_count
+
+
+async def _aread_chunks(
+    client: AsyncFrameClient, video_url: str, read: CoalescedRead, chunk_size: int
+) -> AsyncIterator[bytes]:
+    end = read.start + read.length
+    if is_local_url(video_url) or is_gcs_url(video_url):
+        path = local_path(video_url) if is_local_url(video_url) else None
+        for pos in range(read.start, end, chunk_size):
+            length = min(chunk_size, end - pos)
+            if path:
+                data = await asyncio.to_thread(read_local_range, path, pos, length)
+            else:
+                data = await asyncio.to_thread(client.gcs.read_range, video_url, pos, length)
+            if not data:
+                return
+            yield data
+        return
+    async with client.open_range(video_url, read.start, end - 1) as resp:
+        if resp.status_code != 206:
+            raise FrameFetchError(f"Failed to fetch frame bytes: {resp.status_code}", resp.status_code)
+        async for chunk in resp.aiter_bytes(chunk_size):
+            yield chunk
+
+
+async def aopen_clip(
+    client: AsyncFrameClient,
+    video_url: str,
+    index_url: str,
+    start: int,
+    end: int,
+    step: int = 1,
+    max_gap: int = DEFAULT_MAX_GAP,
+    index: Any = None,
+) -> Clip:
+    """
+    Plan a clip with an AsyncFrameClient. See open_clip.
+    """
+    frame_nums = clip_frame_numbers(start, end, step)
+    if index is not None:
+        entries = index.entries_for(frame_nums)
+    else:
+        entries = await client.fetch_index_entries(index_url, frame_nums)
+    source_header = await client.fetch_frame_data(video_url, 0, IVF_HEADER_SIZE)
+    return plan_clip(source_header, frame_nums, entries, max_gap)
+
+
+async def aiter_clip(
+    client: AsyncFrameClient, video_url: str, clip: Clip, chunk_size: int = CLIP_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """
+    Yield the bytes of a planned clip with an AsyncFrameClient. See iter_clip.
+    """
+    yield clip.header
+    rewriter = ClipRewriter()
+    for read in clip.reads:
+        rewriter.start(read)
+        async for chunk in _aread_chunks(client, video_url, read, chunk_size):
+            for piece in rewriter.feed(chunk):
+                yield piece
+        rewriter.finish()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cut frames of an indexed IVF video into a new IVF file.")
+    parser.add_argument("video", help="Video URL or path")
+    parser.add_argument("output", help="IVF path to write")
+    parser.add_argument("--index", default=None, help="Index URL or path (default: <video>.idx)")
+    parser.add_argument("--start", type=int, required=True, help="First frame")
+    parser.add_argument("--end", type=int, required=True, help="Last frame, inclusive")
+    parser.add_argument("--step", type=int, default=1, help="Take every step-th frame")
+    args = parser.parse_args()
+    frame_count = write_clip(args.video, args.index or args.video + ".idx", args.output, args.start, args.end, args.step)
+    print(f"Wrote {frame_count} frames to {args.output}")
+
+
+if __name__ == "__main__":
+    '''
+    python -m video_index.clip gs://bucket/video.ivf review.ivf --start 1200 --end 1500
+    '''
+
+    main()
@@ -0,0 +1,203 @@
+# video_index/coalesce.py
+import struct
+from typing import Iterator, List, NamedTuple, Sequence, Tuple
+
+from .errors import FrameFetchError
+
+# Frames separated by at most this many bytes are fetched in one Range read;
+# re-reading a small gap is cheaper than another upstream round trip.
+DEFAULT_MAX_GAP = 1 * 2**20
+
+# Upper bound on the size of a single coalesced Range read.
+DEFAULT_MAX_READ = 64 * 2**20
+
+# Each record in a frames container is a 16-byte header of two little-endian
+# uint64 (frame number, payload length) followed by the payload.
+RECORD_HEADER = struct.Struct('<QQ')
+
+
+class CoalescedRead(NamedTuple):
+    """
+    A single Range read covering one or more frames.
+
+    Attributes
+    ----------
+    start : int
+        First byte of the read.
+    length : int
+        Number of bytes to read.
+    frames : List[Tuple[int, int, int]]
+        (frame_num, offset, length) of each frame served by this read, in
+        ascending offset order.
+    """
+    start: int
+    length: int
+    frames: List[Tuple[int, int, int]]
+
+
+def plan_coalesced_reads(
+    frames: Sequence[Tuple[int, int, int]],
+    max_gap: int = DEFAULT_MAX_GAP,
+    max_read: int = DEFAULT_MAX_READ,
+) -> List[CoalescedRead]:
+    """
+    Merge frames that are adjacent or close together into as few Range reads
+    as possible.
+
+    Parameters
+    ----------
+    frames : Sequence[Tuple[int, int, int]]
+        (frame_num, offset, length) of each frame to fetch. Duplicate frame
+        numbers are read once.
+    max_gap : int, optional
+        Largest number of unwanted bytes allowed between two frames in the
+        same read, by default 1 MiB
+    max_read : int, optional
+        Largest read to plan, unless a single frame is bigger,
+        by default 64 MiB
+
+    Returns
+    -------
+    List[CoalescedRead]
+        Reads in ascending offset order.
+
+    Examples
+    --------
+    >>> reads = plan_coalesced_reads([(0, 44, 10), (1, 66, 20), (9, 1000, 5)], max_gap=12)
+    >>> [(r.start, r.length, [f[0] for f in r.frames]) for r in reads]
+    [(44, 42, [0, 1]), (1000, 5, [9])]
+    """
+    unique = sorted(set(frames), key=lambda f: (f[1], f[0]))
+    reads: List[CoalescedRead] = []
+    for frame in unique:
+        _, offset, length = frame
+        if reads:
+            start, read_length, members = reads[-1]
+            end = start + read_length
+            new_end = max(end, offset + length)
+            if offset - end <= max_gap and new_end - start <= max_read:
+                members.append(frame)
+                reads[-1] = CoalescedRead(start, new_end - start, members)
+                continue
+        reads.append(CoalescedRead(offset, length, [frame]))
+    return reads
+
+
+def split_coalesced_read(read: CoalescedRead, data: bytes) -> Iterator[Tuple[int, bytes]]:
+    """
+    Slice the payload of each frame out of a coalesced read.
+
+    Parameters
+    ----------
+    read : CoalescedRead
+        The planned read.
+    data : bytes
+        The bytes returned for it.
+
+    Yields
+    ------
+    Tuple[int, bytes]
+        (frame_num, payload) in ascending offset order.
+
+    Raises
+    ------
+    RuntimeError
+        If data is shorter than the planned read.
+    """
+    if len(data) != read.length:
+        raise FrameFetchError(f"Frame data size mismatch: expected {read.length} got {len(data)}")
+    view = memoryview(data)
+    for frame_num, offset, length in read.frames:
+        rel = offset - read.start
+        yield frame_num, bytes(view[rel:rel + length])
+
+
+def parse_frame_list(spec: str) -> List[int]:
+    """
+    Parse a comma-separated list of frame numbers and inclusive ranges.
+
+    Parameters
+    ----------
+    spec : str
+        Frame list such as ``"1,5,10-12"``.
+
+    Returns
+    -------
+    List[int]
+        The frame numbers, in the order given.
+
+    Raises
+    ------
+    ValueError
+        If spec is malformed.
+
+    Examples
+    --------
+    >>> parse_frame_list("1,5,10-12")
+    [1, 5, 10, 11, 12]
+    """
+    frame_nums: List[int] = []
+    for part in spec.split(','):
+        part = part.strip()
+        if '-' in part:
+            first, last = (int(p) for p in part.split('-', 1))
+            if first < 0 or last < first:
+                raise ValueError(f"Invalid frame range: {part}")
+            frame_nums.extend(range(first, last + 1))
+        else:
+            frame_num = int(part)
+            if frame_num < 0:
+                raise ValueError(f"Invalid frame number: {part}")
+            frame_nums.append(frame_num)
+    return frame_nums
+
+
+def pack_frame_record(frame_num: int, payload: bytes) -> bytes:
+    """
+    Return the container header for one frame record.
+
+    The payload itself is not copied; write it after the header.
+
+    Examples
+    --------
+    >>> pack_frame_record(3, b'abc')
+    b'\\x03\\x00\\x00\\x00\\x00\\x00\\x00\\x00\\x03\\x00\\x00\\x00\\x00\\x00\\x00\\x00'
+    """
+    return RECORD_HEADER.pack(frame_num, len(payload))
+
+
+def iter_frame_records(data: bytes) -> Iterator[Tuple[int, bytes]]:
+    """
+    Parse a length-prefixed frames container as returned by ``/frames``.
+
+    Parameters
+    ----------
+    data : bytes
+        The whole container.
+
+    Yields
+    ------
+    Tuple[int, bytes]
+        (frame_num, payload) for each record.
+
+    Raises
+    ------
+    ValueError
+        If the container is truncated.
+
+    Examples
+    --------
+    >>> blob = pack_frame_record(7, b'xy') + b'xy'
+    >>> list(iter_frame_records(blob))
+    [(7, b'xy')]
+    """
+    pos = 0
+    while pos < len(data):
+        if pos + RECORD_HEADER.size > len(data):
+            raise ValueError("Truncated frame record header")
+        frame_num, length = RECORD_HEADER.unpack_from(data, pos)
+        pos += RECORD_HEADER.size
+        if pos + length > len(data):
+            raise ValueError("Truncated frame record payload")
+        yield frame_num, data[pos:pos + length]
+        pos += length
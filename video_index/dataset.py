@@ -0,0 +1,478 @@
+# video_index/dataset.py
+import asyncio
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .async_get_frame import AsyncFrameClient
+from .catalog import Catalog
+from .coalesce import DEFAULT_MAX_GAP, plan_coalesced_reads
+from .get_frame import FrameClient, get_default_client
+
+# A video given as (video_url, index_url), or its id in a catalog.
+VideoSpec = Union[Tuple[str, str], str]
+
+
+class FrameBatch(NamedTuple):
+    """
+    A batch of frames from FrameDataset.batches, in sampling order: the
+    dataset index of each frame, the position of its video in
+    FrameDataset.videos, its frame number in the video, and its raw bytes.
+    """
+    indices: np.ndarray
+    videos: np.ndarray
+    frames: np.ndarray
+    data: List[bytes]
+
+
+def worker_shard() -> Tuple[int, int]:
+    """
+    Return (worker id, number of workers) inside a PyTorch DataLoader
+    worker process, or (0, 1) elsewhere.
+
+    PyTorch is only consulted if the caller has already imported it.
+    """
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        info = torch.utils.data.get_worker_info()
+        if info is not None:
+            return info.id, info.num_workers
+    return 0, 1
+
+
+def shard_indices(
+    length: int, shuffle: bool = True, seed: int = 0, epoch: int = 0, shard: int = 0, num_shards: int = 1
+) -> np.ndarray:
+    """
+    Return this shard's dataset indices in sampling order.
+
+    Every shard computes the same permutation from (seed, epoch) and takes
+    every num_shards-th index of it, so shards are disjoint, together
+    cover the dataset, and the order does not depend on timing.
+
+    Parameters
+    ----------
+    length : int
+        Number of items in the dataset.
+    shuffle : bool, optional
+        Sample in a random order rather than in index order, by default True
+    seed : int, optional
+        Seed of the shuffle, by default 0
+    epoch : int, optional
+        Epoch number, mixed into the seed so each epoch has its own order,
+        by default 0
+    shard : int, optional
+        This shard's number, by default 0
+    num_shards : int, optional
+        Number of shards, by default 1
+
+    Returns
+    -------
+    np.ndarray
+        int64 dataset indices.
+
+    Raises
+    ------
+    ValueError
+        If shard is not in range(num_shards).
+
+    Examples
+    --------
+    >>> shard_indices(10, shuffle=False, shard=1, num_shards=3).tolist()
+    [1, 4, 7]
+    >>> a, b = shard_indices(10, seed=7, shard=0, num_shards=2), shard_indices(10, seed=7, shard=1, num_shards=2)
+    >>> sorted(a.tolist() + b.tolist()) == list(range(10))
+    True
+    """
+    if not 0 <= shard < num_shards:
+        raise ValueError(f"Shard {shard} is not in range({num_shards})")
+    if shuffle:
+        order = np.random.default_rng([seed, epoch]).permutation(length)
+    else:
+        order = np.arange(length)
+    return order[shard::num_shards].astype(np.int64)
+
+
+class FrameDataset:
+    """
+    Map-style dataset of the frames of many indexed videos, for sampling
+    frames at random in training.
+
+    Item i is the raw bytes of one frame. Items are numbered video by
+    video, with every stride-th frame of each video (frames 0, stride,
+    2 * stride...). Batches are fetched by grouping their frames by video,
+    so each video's index entries are read together and nearby frames
+    share coalesced Range reads.
+
+    Besides ``dataset[i]`` and ``dataset.get_batch(indices)`` (also
+    available as ``__getitems__``, which PyTorch's DataLoader uses for
+    batched map-style datasets), batches can be streamed in a
+    deterministic shuffled or sequential order with ``batches``, which
+    fetches several batches ahead on a thread pool, or ``abatches`` with an
+    AsyncFrameClient.
+
+    Parameters
+    ----------
+    videos : Sequence[VideoSpec]
+        Videos as (video_url, index_url) pairs, or as video ids when
+        catalog is given.
+    catalog : Optional[Catalog], optional
+        Catalog the video ids are resolved in; index entries then come
+        from the catalog rather than from storage, by default None
+    frame_counts : Optional[Sequence[int]], optional
+        Number of frames in each video, by default read from the catalog
+        or the indexes (see FrameClient.frame_count)
+    stride : int, optional
+        Use every stride-th frame of each video, by default 1
+    client : Optional[FrameClient], optional
+        Client to fetch with, by default the module-level client
+    max_gap : int, optional
+        Largest gap in bytes between two frames of a batch read together,
+        by default 1 MiB
+    workers : int, optional
+        Number of threads reading frame counts, by default 16
+
+    Notes
+    -----
+    A dataset pickled to another process, such as a DataLoader worker,
+    fetches with that process's module-level client and reopens its
+    catalog there.
+
+    Examples
+    --------
+    >>> dataset = FrameDataset([("gs://b/a.ivf", "gs://b/a.ivf.idx"), ("gs://b/b.ivf", "gs://b/b.ivf.idx")],
+    ...                        frame_counts=[5, 3], stride=2)
+    >>> len(dataset)
+    5
+    >>> videos, frames = dataset.locate([0, 2, 3, 4])
+    >>> videos.tolist(), frames.tolist()
+    ([0, 0, 1, 1], [0, 4, 0, 2])
+    """
+
+    def __init__(
+        self,
+        videos: Sequence[VideoSpec],
+        catalog: Optional[Catalog] = None,
+        frame_counts: Optional[Sequence[int]] = None,
+        stride: int = 1,
+        client: Optional[FrameClient] = None,
+        max_gap: int = DEFAULT_MAX_GAP,
+        workers: int = 16,
+    ) -> None:
+        if stride < 1:
+            raise ValueError(f"stride must be at least 1, got {stride}")
+        self.videos = list(videos)
+        self.catalog = catalog
+        self.stride = stride
+        self.max_gap = max_gap
+        self._client = client
+        if frame_counts is None:
+            if catalog is not None:
+                frame_counts = [len(catalog.video(video_id)) for video_id in self.videos]
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    frame_counts = list(pool.map(lambda v: self.client.frame_count(v[1]), self.videos))
+        if len(frame_counts) != len(self.videos):
+            raise ValueError(f"Got {len(frame_counts)} frame counts for {len(self.videos)} videos")
+        self.frame_counts = np.asarray(frame_counts, dtype=np.int64)
+        sizes = -(-self.frame_counts // stride)
+        self._starts = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+
+    @classmethod
+    def from_catalog(cls, catalog: Catalog, video_ids: Optional[Sequence[str]] = None, **kwargs) -> "FrameDataset":
+        """
+        Create a dataset of the videos of a catalog, by default all of
+        them in id order. Other arguments are as for FrameDataset.
+        """
+        if video_ids is None:
+            video_ids = sorted(catalog)
+        return cls(video_ids, catalog=catalog, **kwargs)
+
+    @property
+    def client(self) -> FrameClient:
+        """Client used for fetches."""
+        return self._client or get_default_client()
+
+    def __getstate__(self) -> dict:
+        # Clients hold sessions and locks that cannot cross processes
+        return {**self.__dict__, "_client": None}
+
+    def __len__(self) -> int:
+        return int(self._starts[-1])
+
+    def locate(self, indices: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Map dataset indices to (video position, frame number) arrays.
+
+        Raises
+        ------
+        IndexError
+            If an index is out of range.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        bad = (indices < 0) | (indices >= len(self))
+        if bad.any():
+            raise IndexError(f"Index {int(indices[bad][0])} out of range for dataset of {len(self)} frames")
+        videos = np.searchsorted(self._starts, indices, side='right') - 1
+        frames = (indices - self._starts[videos]) * self.stride
+        return videos, frames
+
+    def _groups(self, videos: np.ndarray, frames: np.ndarray) -> List[Tuple[int, List[int]]]:
+        """
+        Group a batch's frames by video: (video position, frame numbers).
+        """
+        order = np.argsort(videos, kind='stable')
+        positions, starts = np.unique(videos[order], return_index=True)
+        groups = np.split(frames[order], starts[1:])
+        return [(int(v), group.tolist()) for v, group in zip(positions, groups)]
+
+    def _source(self, video: int):
+        """
+        Return (video_url, index_url, catalog video or None) of a video.
+        """
+        spec = self.videos[video]
+        if self.catalog is not None:
+            catalog_video = self.catalog.video(spec)
+            return catalog_video.video_url, None, catalog_video
+        video_url, index_url = spec
+        return video_url, index_url, None
+
+    def fetch_video_frames(self, video: int, frame_nums: Sequence[int]) -> Dict[int, bytes]:
+        """
+        Fetch frames of one video with one index read and coalesced Range
+        reads.
+
+        Parameters
+        ----------
+        video : int
+            Position of the video in videos.
+        frame_nums : Sequence[int]
+            Frame numbers to fetch.
+
+        Returns
+        -------
+        Dict[int, bytes]
+            Raw bytes by frame number.
+        """
+        client = self.client
+        video_url, index_url, catalog_video = self._source(video)
+        if catalog_video is not None:
+            entries = catalog_video.entries_for(frame_nums)
+        else:
+            entries = client.fetch_index_entries(index_url, frame_nums)
+        frames = sorted({(n, offset, length) for n, (offset, length) in zip(frame_nums, entries)}, key=lambda f: f[1])
+        data: Dict[int, bytes] = {}
+        for read in plan_coalesced_reads(frames, self.max_gap):
+            data.update(client.read_coalesced(video_url, read))
+        return data
+
+    async def afetch_video_frames(
+        self, client: AsyncFrameClient, video: int, frame_nums: Sequence[int]
+    ) -> Dict[int, bytes]:
+        """
+        Fetch frames of one video with an AsyncFrameClient, issuing its
+        coalesced reads concurrently. See fetch_video_frames.
+        """
+        video_url, index_url, catalog_video = self._source(video)
+        if catalog_video is not None:
+            entries = catalog_video.entries_for(frame_nums)
+        else:
+            entries = await client.fetch_index_entries(index_url, frame_nums)
+        frames = sorted({(n, offset, length) for n, (offset, length) in zip(frame_nums, entries)}, key=lambda f: f[1])
+        reads = plan_coalesced_reads(frames, self.max_gap)
+        data: Dict[int, bytes] = {}
+        for payloads in await asyncio.gather(*(client.read_coalesced(video_url, read) for read in reads)):
+            data.update(payloads)
+        return data
+
+    def get_batch(self, indices: Sequence[int]) -> List[bytes]:
+        """
+        Fetch the frames at several dataset indices, grouped by video.
+
+        Returns
+        -------
+        List[bytes]
+            Raw bytes of each frame, in the order of indices.
+        """
+        videos, frames = self.locate(indices)
+        fetched = {
+            video: self.fetch_video_frames(video, frame_nums) for video, frame_nums in self._groups(videos, frames)
+        }
+        return [fetched[v][n] for v, n in zip(videos.tolist(), frames.tolist())]
+
+    __getitems__ = get_batch
+
+    def __getitem__(self, index: int) -> bytes:
+        if index < 0:
+            index += len(self)
+        return self.get_batch([index])[0]
+
+    def order(
+        self, shuffle: bool = True, seed: int = 0, epoch: int = 0, shard: int = 0, num_shards: int = 1
+    ) -> np.ndarray:
+        """
+        Return the dataset indices a process samples, in order.
+
+        The dataset is split into num_shards shards (such as one per
+        distributed training process) with shard_indices, and a shard is
+        further split between the DataLoader worker processes it runs, if
+        any (see worker_shard).
+        """
+        indices = shard_indices(len(self), shuffle, seed, epoch, shard, num_shards)
+        worker, workers = worker_shard()
+        return indices[worker::workers]
+
+    def _batch_indices(self, batch_size: int, drop_last: bool, **order_args) -> Iterator[np.ndarray]:
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be at least 1, got {batch_size}")
+        indices = self.order(**order_args)
+        for start in range(0, len(indices), batch_size):
+            batch = indices[start:start + batch_size]
+            if drop_last and len(batch) < batch_size:
+                return
+            yield batch
+
+    def _assemble(self, indices: np.ndarray, videos: np.ndarray, frames: np.ndarray, fetched: dict) -> FrameBatch:
+        data = [fetched[v][n] for v, n in zip(videos.tolist(), frames.tolist())]
+        return FrameBatch(indices, videos, frames, data)
+
+    def batches(
+        self,
+        batch_size: int,
+        shuffle: bool = True,
+        seed: int = 0,
+        epoch: int = 0,
+        shard: int = 0,
+        num_shards: int = 1,
+        depth: int = 4,
+        workers: int = 8,
+        drop_last: bool = False,
+    ) -> Iterator[FrameBatch]:
+        """
+        Stream batches of frames, fetching up to depth batches ahead of the
+        caller on a pool of workers threads.
+
+        Each batch's per-video fetches run concurrently; batches are yielded
+        in sampling order regardless of which finishes first.
+
+        Parameters
+        ----------
+        batch_size : int
+            Frames per batch.
+        shuffle, seed, epoch, shard, num_shards
+            Sampling order, see order.
+        depth : int, optional
+            Number of batches being fetched at once, by default 4
+        workers : int, optional
+            Number of fetch threads, by default 8
+        drop_last : bool, optional
+            Leave out a final batch smaller than batch_size, by default False
+
+        Yields
+        ------
+        FrameBatch
+            The next batch.
+        """
+        batches = self._batch_indices(
+            batch_size, drop_last, shuffle=shuffle, seed=seed, epoch=epoch, shard=shard, num_shards=num_shards
+        )
+        pool = ThreadPoolExecutor(max_workers=workers)
+        pending = deque()
+
+        def submit(indices: np.ndarray) -> None:
+            videos, frames = self.locate(indices)
+            futures = {
+                video: pool.submit(self.fetch_video_frames, video, frame_nums)
+                for video, frame_nums in self._groups(videos, frames)
+            }
+            pending.append((indices, videos, frames, futures))
+
+        try:
+            for indices in batches:
+                submit(indices)
+                if len(pending) >= max(1, depth):
+                    indices, videos, frames, futures = pending.popleft()
+                    yield self._assemble(indices, videos, frames, {v: f.result() for v, f in futures.items()})
+            while pending:
+                indices, videos, frames, futures = pending.popleft()
+                yield self._assemble(indices, videos, frames, {v: f.result() for v, f in futures.items()})
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def abatches(
+        self,
+        client: AsyncFrameClient,
+        batch_size: int,
+        shuffle: bool = True,
+        seed: int = 0,
+        epoch: int = 0,
+        shard: int = 0,
+        num_shards: int = 1,
+        depth: int = 4,
+        drop_last: bool = False,
+    ) -> AsyncIterator[FrameBatch]:
+        """
+        Stream batches of frames with an AsyncFrameClient, fetching up to
+        depth batches ahead of the caller. The client's per-host limit
+        bounds the requests in flight. Parameters are as for batches.
+        """
+        batches = self._batch_indices(
+            batch_size, drop_last, shuffle=shuffle, seed=seed, epoch=epoch, shard=shard, num_shards=num_shards
+        )
+
+        async def fetch(indices: np.ndarray) -> FrameBatch:
+            videos, frames = self.locate(indices)
+            groups = self._groups(videos, frames)
+            results = await asyncio.gather(*(self.afetch_video_frames(client, v, nums) for v, nums in groups))
+            return self._assemble(indices, videos, frames, {v: r for (v, _), r in zip(groups, results)})
+
+        pending = deque()
+        try:
+            for indices in batches:
+                pending.append(asyncio.ensure_future(fetch(indices)))
+                if len(pending) >= max(1, depth):
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+class FrameBatches:
+    """
+    Iterable of a FrameDataset's batches, for use as an iterable-style
+    dataset (for example a PyTorch DataLoader with ``batch_size=None``).
+
+    Each iteration yields the batches of one epoch from
+    FrameDataset.batches; call set_epoch between epochs for a new order.
+    Inside DataLoader worker processes each worker yields its own part of
+    the shard.
+
+    Parameters
+    ----------
+    dataset : FrameDataset
+        The frames.
+    batch_size : int
+        Frames per batch.
+    **kwargs
+        Other arguments of FrameDataset.batches, other than epoch.
+    """
+
+    def __init__(self, dataset: FrameDataset, batch_size: int, **kwargs) -> None:
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.kwargs = kwargs
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int) -> None:
+        """
+        Set the epoch whose order the next iteration follows.
+        """
+        self.epoch = epoch
+
+    def __iter__(self) -> Iterator[FrameBatch]:
+        return self.dataset.batches(self.batch_size, epoch=self.epoch, **self.kwargs)
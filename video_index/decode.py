@@ -0,0 +1,397 @@
+# video_index/decode.py
+import asyncio
+import os
+import struct
+import sys
+from fractions import Fraction
+from typing import BinaryIO, Callable, Dict, List, Optional, Set, Tuple
+
+try:
+    import av
+except ImportError:  # pragma: no cover - decoding is optional
+    av = None
+
+from .frame_cache import FrameCache, FrameKey
+from .singleflight import AsyncSingleFlight
+
+# Image formats a frame can be decoded to, with their wire codes and
+# response content types.
+IMAGE_FORMATS = {"jpeg": 1, "png": 2}
+MEDIA_TYPES = {"jpeg": "image/jpeg", "png": "image/png"}
+
+# A request to a decoder worker is a header of (format code, width, height,
+# payload length) followed by the AV1 frame; width and height are 0 to
+# keep the decoded size. The reply is a header of (status, body length)
+# followed by the image, or by an error message if status is not 0.
+REQUEST_HEADER = struct.Struct('<BHHI')
+RESPONSE_HEADER = struct.Struct('<BI')
+
+# Largest output width or height.
+MAX_IMAGE_SIZE = 8192
+
+
+class DecoderBusy(RuntimeError):
+    """
+    Raised when a DecoderPool already has as many requests waiting for a
+    worker as it allows.
+    """
+
+
+def pack_request(payload: bytes, format: str, width: int = 0, height: int = 0) -> bytes:
+    """
+    Build the message asking a decoder worker to decode payload.
+
+    Examples
+    --------
+    >>> pack_request(b'obu', 'png', 320)
+    b'\\x02@\\x01\\x00\\x00\\x03\\x00\\x00\\x00obu'
+    """
+    return REQUEST_HEADER.pack(IMAGE_FORMATS[format], width, height, len(payload)) + payload
+
+
+def scaled_size(src_width: int, src_height: int, width: int = 0, height: int = 0) -> Tuple[int, int]:
+    """
+    Output size for a frame of src_width x src_height resized to width x
+    height, where a 0 keeps the aspect ratio from the other dimension (or
+    the source size if both are 0). Sizes are rounded to even numbers, as
+    4:2:0 chroma needs.
+
+    Examples
+    --------
+    >>> scaled_size(1920, 1080, 640), scaled_size(1920, 1080, 0, 0), scaled_size(1920, 1080, 0, 101)
+    ((640, 360), (1920, 1080), (180, 100))
+    """
+    if not width and not height:
+        width, height = src_width, src_height
+    elif not height:
+        height = round(src_height * width / src_width)
+    elif not width:
+        width = round(src_width * height / src_height)
+    return max(2, width - width % 2), max(2, height - height % 2)
+
+
+def _av1_decoder() -> str:
+    # FFmpeg's native av1 decoder only drives hardware decoders
+    for name in ("libdav1d", "libaom-av1"):
+        if name in av.codecs_available:
+            return name
+    return "av1"
+
+
+def decode_frame(payload: bytes, format: str, width: int = 0, height: int = 0) -> bytes:
+    """
+    Decode one AV1 intra frame and encode it as an image with PyAV.
+
+    Parameters
+    ----------
+    payload : bytes
+        The frame's OBUs, as stored in the IVF file.
+    format : str
+        ``jpeg`` or ``png``.
+    width, height : int, optional
+        Output size, see scaled_size; by default the decoded size.
+
+    Returns
+    -------
+    bytes
+        The encoded image.
+
+    Raises
+    ------
+    RuntimeError
+        If PyAV is not installed or the frame cannot be decoded.
+    """
+    if av is None:
+        raise RuntimeError("Decoding frames requires PyAV (pip install av)")
+    # Intra frames decode on their own, so each gets a fresh decoder that
+    # is flushed to return its frame without pipeline delay
+    decoder = av.CodecContext.create(_av1_decoder(), "r")
+    try:
+        frames = decoder.decode(av.Packet(payload)) + decoder.decode(None)
+    except av.error.FFmpegError as e:
+        raise RuntimeError(f"Failed to decode frame: {e}") from e
+    if not frames:
+        raise RuntimeError("Frame did not decode to a picture")
+    frame = frames[0]
+    width, height = scaled_size(frame.width, frame.height, width, height)
+    pix_fmt = "rgb24" if format == "png" else "yuvj420p"
+    encoder = av.CodecContext.create("png" if format == "png" else "mjpeg", "w")
+    encoder.width, encoder.height, encoder.pix_fmt = width, height, pix_fmt
+    encoder.time_base = Fraction(1, 1)
+    image = frame.reformat(width=width, height=height, format=pix_fmt)
+    packets = encoder.encode(image) + encoder.encode(None)
+    return b''.join(bytes(packet) for packet in packets)
+
+
+def serve_worker(
+    stdin: BinaryIO, stdout: BinaryIO, decode: Callable[[bytes, str, int, int], bytes] = decode_frame
+) -> None:
+    """
+    Answer decode requests read from stdin on stdout until stdin closes.
+
+    A request that fails is answered with its error message, and the
+    worker carries on with the next one.
+    """
+    names = {code: name for name, code in IMAGE_FORMATS.items()}
+    while True:
+        header = stdin.read(REQUEST_HEADER.size)
+        if len(header) < REQUEST_HEADER.size:
+            return
+        code, width, height, length = REQUEST_HEADER.unpack(header)
+        payload = stdin.read(length)
+        try:
+            if len(payload) < length:
+                raise RuntimeError("Truncated request")
+            status, body = 0, decode(payload, names[code], width, height)
+        except Exception as e:
+            status, body = 1, str(e).encode()
+        stdout.write(RESPONSE_HEADER.pack(status, len(body)))
+        stdout.write(body)
+        stdout.flush()
+
+
+def main() -> None:
+    """Run a decoder worker on stdin and stdout."""
+    serve_worker(sys.stdin.buffer, sys.stdout.buffer)
+
+
+def _worker_env() -> Dict[str, str]:
+    """
+    Return the environment for default workers, with this package's parent
+    directory on PYTHONPATH so "-m video_index.decode" resolves even when the
+    package is not installed and the current directory is elsewhere.
+    """
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    paths = [root] + [p for p in env.get("PYTHONPATH", "").split(os.pathsep) if p]
+    env["PYTHONPATH"] = os.pathsep.join(paths)
+    return env
+
+
+class _Worker:
+    """
+    One decoder worker process, answering one request at a time.
+    """
+
+    def __init__(self, proc: asyncio.subprocess.Process) -> None:
+        self.proc = proc
+
+    async def request(self, message: bytes) -> Tuple[int, bytes]:
+        self.proc.stdin.write(message)
+        await self.proc.stdin.drain()
+        status, length = RESPONSE_HEADER.unpack(await self.proc.stdout.readexactly(RESPONSE_HEADER.size))
+        return status, await self.proc.stdout.readexactly(length)
+
+    async def stop(self) -> None:
+        if self.proc.returncode is None:
+            self.proc.kill()
+        await self.proc.wait()
+
+
+class DecoderPool:
+    """
+    Pool of long-lived decoder worker processes turning AV1 frames into
+    JPEG or PNG images, so no process is started per frame and decoding
+    runs outside the server's event loop.
+
+    Workers are started on first use, each handles one request at a time,
+    and a worker that dies, times out or is interrupted mid-request is
+    replaced. Requests wait for a free worker; once max_waiting are
+    waiting, further requests fail with DecoderBusy so load is shed
+    instead of queued without bound.
+
+    Decoded images are stored in cache when one is given, and identical
+    concurrent requests share one decode.
+
+    Parameters
+    ----------
+    size : Optional[int], optional
+        Number of worker processes, by default the number of CPUs
+    max_waiting : Optional[int], optional
+        Number of requests allowed to wait for a worker, by default
+        8 per worker
+    cache : Optional[FrameCache], optional
+        Cache of decoded images, by default None
+    timeout : float, optional
+        Seconds a decode may take before its worker is replaced,
+        by default 30
+    command : Optional[List[str]], optional
+        Command starting a worker, by default this module run with the
+        current interpreter
+    """
+
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        max_waiting: Optional[int] = None,
+        cache: Optional[FrameCache] = None,
+        timeout: float = 30.0,
+        command: Optional[List[str]] = None,
+    ) -> None:
+        self.size = size or os.cpu_count() or 1
+        self.max_waiting = 8 * self.size if max_waiting is None else max_waiting
+        self.cache = cache
+        self.timeout = timeout
+        self.command = command or [sys.executable, "-m", "video_index.decode"]
+        self.env = None if command else _worker_env()
+        self.waiting = 0
+        self._idle: Optional[asyncio.Queue] = None
+        self._workers: Set[_Worker] = set()
+        self._stopping: Set[asyncio.Task] = set()
+        self._flights = AsyncSingleFlight()
+        self._closed = False
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Return the pool's counters.
+
+        Returns
+        -------
+        Dict[str, object]
+            Running workers, requests waiting for one, decodes shared
+            between identical concurrent requests, and the image cache
+            stats (None without a cache).
+        """
+        return {
+            "workers": len(self._workers),
+            "waiting": self.waiting,
+            "shared": self._flights.shared,
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
+
+    async def cached(self, key: FrameKey) -> Optional[bytes]:
+        """
+        Return the cached image for key (see image_cache_key), if any.
+        """
+        if self.cache is None:
+            return None
+        # Only the disk tier blocks; keep memory-only lookups on the event loop
+        if self.cache.disk is None:
+            return self.cache.get(key)
+        return await asyncio.to_thread(self.cache.get, key)
+
+    async def decode(
+        self, payload: bytes, format: str, width: int = 0, height: int = 0, key: Optional[FrameKey] = None
+    ) -> bytes:
+        """
+        Decode an AV1 frame to an image in a worker process.
+
+        Parameters
+        ----------
+        payload : bytes
+            The frame's OBUs.
+        format : str
+            ``jpeg`` or ``png``.
+        width, height : int, optional
+            Output size, see scaled_size; by default the decoded size.
+        key : Optional[FrameKey], optional
+            Identifies the image (see image_cache_key) for caching and
+            sharing concurrent decodes, by default None
+
+        Returns
+        -------
+        bytes
+            The encoded image.
+
+        Raises
+        ------
+        DecoderBusy
+            If too many requests are already waiting for a worker.
+        RuntimeError
+            If the frame cannot be decoded.
+        """
+        if format not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format: {format}")
+        if key is None:
+            return await self._run(pack_request(payload, format, width, height))
+        cached = await self.cached(key)
+        if cached is not None:
+            return cached
+        return await self._flights.do(key, lambda: self._decode_and_store(key, pack_request(payload, format, width, height)))
+
+    async def _decode_and_store(self, key: FrameKey, message: bytes) -> bytes:
+        image = await self._run(message)
+        if self.cache is not None and self.cache.disk is None:
+            self.cache.put(key, image)
+        elif self.cache is not None:
+            await asyncio.to_thread(self.cache.put, key, image)
+        return image
+
+    async def _run(self, message: bytes) -> bytes:
+        if self._closed:
+            raise RuntimeError("DecoderPool is closed")
+        if self._idle is None:
+            # Created here so it belongs to the running event loop; None
+            # entries stand for workers not started yet
+            self._idle = asyncio.Queue()
+            for _ in range(self.size):
+                self._idle.put_nowait(None)
+        if self._idle.empty() and self.waiting >= self.max_waiting:
+            raise DecoderBusy(f"{self.waiting} decode requests already waiting")
+        self.waiting += 1
+        try:
+            worker = await self._idle.get()
+        finally:
+            self.waiting -= 1
+        if self._closed:
+            self._idle.put_nowait(worker)
+            raise RuntimeError("DecoderPool is closed")
+        try:
+            if worker is None:
+                worker = await self._start()
+            status, body = await asyncio.wait_for(worker.request(message), self.timeout)
+        except BaseException as e:
+            # The worker's pipes may be mid-message; replace it
+            if worker is not None:
+                self._discard(worker)
+            self._idle.put_nowait(None)
+            if isinstance(e, (OSError, EOFError, asyncio.TimeoutError)):
+                raise RuntimeError(f"Decoder worker failed: {e!r}") from e
+            raise
+        if self._closed:
+            self._discard(worker)
+            worker = None
+        self._idle.put_nowait(worker)
+        if status != 0:
+            raise RuntimeError(body.decode(errors="replace"))
+        return body
+
+    async def _start(self) -> _Worker:
+        proc = await asyncio.create_subprocess_exec(
+            *self.command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, env=self.env
+        )
+        worker = _Worker(proc)
+        self._workers.add(worker)
+        return worker
+
+    def _discard(self, worker: _Worker) -> None:
+        self._workers.discard(worker)
+        task = asyncio.ensure_future(worker.stop())
+        self._stopping.add(task)
+        task.add_done_callback(self._stopping.discard)
+
+    async def aclose(self) -> None:
+        """
+        Stop all worker processes and wait for them to exit.
+        """
+        self._closed = True
+        for worker in list(self._workers):
+            self._discard(worker)
+        await asyncio.gather(*self._stopping, return_exceptions=True)
+
+
+def image_cache_key(video_url: str, offset: int, length: int, format: str, width: int = 0, height: int = 0) -> FrameKey:
+    """
+    Build the cache key of a frame decoded to an image of the given format
+    and requested size.
+
+    Examples
+    --------
+    >>> image_cache_key("http://v", 44, 10, "png", 320)
+    ('http://v#png-320x0', 44, 10)
+    """
+    return (f"{video_url}#{format}-{width}x{height}", offset, length)
+
+
+if __name__ == "__main__":
+    main()
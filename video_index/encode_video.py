@@ -1,65 +1,905 @@
 # video_index/encode_video.py
+import json
+import os
+import re
+import socket
 import subprocess
 import sys
-from typing import Optional
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
 import argparse
 from pathlib import Path
 
-from .build_index import build_index
+from .build_index import build_index, merge_indexes, pack_index_entries, read_ivf_header, IvfStreamIndexer
+from .ivf import IVF_FRAME_COUNT_OFFSET, IVF_HEADER_SIZE, concat_ivf_files
 
+# Lines of ffmpeg stderr kept for error reports
+STDERR_TAIL_LINES = 200
 
-def encode_av1_intra(
+# A key=value line of ffmpeg's -progress stream; some values are padded,
+# e.g. "bitrate= 800.0kbits/s"
+PROGRESS_LINE = re.compile(r"^(\w+)=\s*(\S*)$")
+# A field of the "bench:" lines ffmpeg prints at exit with -benchmark
+BENCH_FIELD = re.compile(r"(\w+)=([\d.]+)")
+
+
+class EncodeProgress(NamedTuple):
+    """
+    A snapshot of a running encode, reported each time ffmpeg ends a
+    ``-progress`` block.
+    """
+    frames: int
+    total_frames: Optional[int]  # expected frames, if known
+    fps: float
+    bitrate: Optional[float]  # kbit/s of the output so far
+    speed: Optional[float]  # media seconds encoded per wall second
+    out_time: Optional[float]  # seconds of output encoded
+    total_size: Optional[int]  # bytes of output so far
+    elapsed: float  # wall seconds since the encode started
+    eta: Optional[float]  # wall seconds left, if total_frames is known
+    done: bool
+
+
+def _number(value: Optional[str], kind: type = float):
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ProgressParser:
+    """
+    Incremental parser for the ``-progress`` stream ffmpeg writes to stderr.
+
+    ffmpeg writes blocks of ``key=value`` lines, each ended by
+    ``progress=continue`` or ``progress=end``. Lines are fed one at a time;
+    at the end of each block an EncodeProgress is built, kept as last and
+    passed to callback. The ``bench:`` lines printed with ``-benchmark`` are
+    collected into bench (user and system CPU seconds, peak RSS).
+
+    Parameters
+    ----------
+    callback : Optional[Callable[[EncodeProgress], None]], optional
+        Called with each snapshot, by default None
+    total_frames : Optional[int], optional
+        Expected number of frames, used for the ETA, by default None
+    clock : Callable[[], float], optional
+        Wall clock in seconds, by default time.perf_counter
+
+    Examples
+    --------
+    >>> parser = ProgressParser(total_frames=100, clock=iter([0.0, 2.0]).__next__)
+    >>> lines = ["frame=25", "fps=12.50", "bitrate= 800.0kbits/s", "total_size=50000",
+    ...          "out_time_us=1000000", "speed=0.5x", "progress=continue"]
+    >>> [parser.feed(line) for line in lines + ["Some warning"]][-2:]
+    [True, False]
+    >>> parser.last.frames, parser.last.bitrate, parser.last.speed, parser.last.eta
+    (25, 800.0, 0.5, 6.0)
+    """
+
+    def __init__(
+        self,
+        callback: Optional[Callable[[EncodeProgress], None]] = None,
+        total_frames: Optional[int] = None,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.callback = callback
+        self.total_frames = total_frames
+        self.clock = clock
+        self.start = clock()
+        self.fields: Dict[str, str] = {}
+        self.bench: Dict[str, float] = {}
+        self.last: Optional[EncodeProgress] = None
+
+    def feed(self, line: str) -> bool:
+        """
+        Parse one stderr line, returning False if it is not progress output.
+        """
+        line = line.strip()
+        if line.startswith("bench:"):
+            self.bench.update((key, float(value)) for key, value in BENCH_FIELD.findall(line))
+            return True
+        match = PROGRESS_LINE.match(line)
+        if not match:
+            return False
+        key, value = match.groups()
+        if key != "progress":
+            self.fields[key] = value
+            return True
+        self.last = self._snapshot(value == "end")
+        if self.callback is not None:
+            self.callback(self.last)
+        return True
+
+    def _snapshot(self, done: bool) -> EncodeProgress:
+        elapsed = self.clock() - self.start
+        fields = self.fields
+        frames = _number(fields.get("frame"), int) or 0
+        fps = _number(fields.get("fps")) or (frames / elapsed if elapsed > 0 else 0.0)
+        out_time_us = _number(fields.get("out_time_us"), int)
+        eta = None
+        if done:
+            eta = 0.0
+        elif self.total_frames is not None and fps > 0:
+            eta = max(0.0, (self.total_frames - frames) / fps)
+        return EncodeProgress(
+            frames=frames,
+            total_frames=self.total_frames,
+            fps=fps,
+            bitrate=_number(fields.get("bitrate", "").replace("kbits/s", "")),
+            speed=_number(fields.get("speed", "").rstrip("x")),
+            out_time=out_time_us / 1e6 if out_time_us is not None and out_time_us >= 0 else None,
+            total_size=_number(fields.get("total_size"), int),
+            elapsed=elapsed,
+            eta=eta,
+            done=done,
+        )
+
+
+def format_progress(progress: EncodeProgress) -> str:
+    """
+    Format a progress snapshot as a one-line status.
+
+    Examples
+    --------
+    >>> format_progress(EncodeProgress(25, 100, 12.5, 800.0, 0.5, 1.0, 50000, 2.0, 66.0, False))
+    'frame 25/100 (25.0%) 12.5 fps 0.50x 800 kbit/s ETA 0:01:06'
+    """
+    parts = [f"frame {progress.frames}"]
+    if progress.total_frames:
+        parts[0] += f"/{progress.total_frames} ({100 * progress.frames / progress.total_frames:.1f}%)"
+    parts.append(f"{progress.fps:.1f} fps")
+    if progress.speed is not None:
+        parts.append(f"{progress.speed:.2f}x")
+    if progress.bitrate is not None:
+        parts.append(f"{progress.bitrate:.0f} kbit/s")
+    if progress.eta is not None:
+        minutes, seconds = divmod(round(progress.eta), 60)
+        parts.append(f"ETA {minutes // 60}:{minutes % 60:02d}:{seconds:02d}")
+    return " ".join(parts)
+
+
+def _write_json(path: str, data: dict) -> None:
+    # Readers never see a partly written file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+
+def write_perf_record(path: str, record: dict) -> None:
+    """
+    Write a performance record as JSON, replacing path atomically.
+    """
+    _write_json(path, record)
+
+
+class EncoderSettings(NamedTuple):
+    """
+    libaom-av1 settings trading encode speed against size and quality,
+    as saved in a profile by ``video_index.autotune``.
+    """
+    crf: int = 30
+    cpu_used: int = 4
+    tile_columns: int = 0  # log2 of the number of tile columns
+    tile_rows: int = 0  # log2 of the number of tile rows
+    threads: Optional[int] = None  # None for ffmpeg's choice
+
+
+def save_profile(path: str, settings: EncoderSettings, **details) -> None:
+    """
+    Save encoder settings as a JSON profile.
+
+    Parameters
+    ----------
+    path : str
+        Profile path, replaced atomically.
+    settings : EncoderSettings
+        The settings to save, under "settings".
+    **details
+        Other JSON-serializable fields to record alongside, e.g. how the
+        settings were measured.
+    """
+    _write_json(path, {**details, "settings": settings._asdict()})
+
+
+def load_profile(path: str) -> EncoderSettings:
+    """
+    Load encoder settings saved by save_profile.
+
+    Settings missing from the profile take their EncoderSettings defaults.
+
+    Raises
+    ------
+    ValueError
+        If the file is not an encoder profile.
+    """
+    with open(path) as f:
+        profile = json.load(f)
+    settings = profile.get("settings") if isinstance(profile, dict) else None
+    if not isinstance(settings, dict):
+        raise ValueError(f"{path} is not an encoder profile")
+    return EncoderSettings(**{name: settings[name] for name in EncoderSettings._fields if name in settings})
+
+
+class _FfmpegProcess:
+    """
+    A running ffmpeg whose stderr is drained on a background thread.
+
+    Progress lines go to a ProgressParser and everything else to a bounded
+    tail kept for error reports, so memory stays flat however long the
+    encode runs and ffmpeg never blocks on a full pipe.
+    """
+
+    def __init__(
+        self,
+        ffmpeg_cmd: List[str],
+        stdout=None,
+        progress: Optional[Callable[[EncodeProgress], None]] = None,
+        total_frames: Optional[int] = None,
+    ):
+        print("Running ffmpeg:", " ".join(ffmpeg_cmd))
+        self.command = ffmpeg_cmd
+        self.parser = ProgressParser(progress, total_frames)
+        self.stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+        self.callback_error: Optional[BaseException] = None
+        self.wall_time: Optional[float] = None
+        self.proc = subprocess.Popen(ffmpeg_cmd, stdout=stdout, stderr=subprocess.PIPE)
+        self.thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self.thread.start()
+
+    def _drain_stderr(self) -> None:
+        for raw in self.proc.stderr:
+            line = raw.decode(errors="replace")
+            try:
+                is_progress = self.parser.feed(line)
+            except Exception as e:
+                # Keep draining: a failing callback must not stall ffmpeg
+                self.parser.callback = None
+                self.callback_error = e
+                is_progress = True
+            if not is_progress:
+                self.stderr_tail.append(line)
+
+    def wait(self) -> None:
+        """
+        Wait for ffmpeg to exit, raising RuntimeError with the stderr tail on failure.
+        """
+        returncode = self.proc.wait()
+        self.thread.join()
+        self.wall_time = self.parser.clock() - self.parser.start
+        if returncode != 0:
+            raise RuntimeError(
+                f"FFmpeg encoding failed with code {returncode}:\n{''.join(self.stderr_tail)}"
+            )
+        if self.callback_error is not None:
+            raise self.callback_error
+
+    def kill(self) -> None:
+        if self.proc.poll() is None:
+            self.proc.kill()
+            self.proc.wait()
+
+    def record(self, frames: Optional[int], output_bytes: int) -> dict:
+        """
+        Summarize the finished encode for a performance record.
+        """
+        if frames is None and self.parser.last is not None:
+            frames = self.parser.last.frames
+        return _perf_record(
+            self.command,
+            frames,
+            output_bytes,
+            self.wall_time,
+            self.parser.last.speed if self.parser.last else None,
+            self.parser.bench.get("utime"),
+            self.parser.bench.get("stime"),
+            self.parser.bench.get("maxrss"),
+        )
+
+
+def _perf_record(
+    command: Optional[Sequence[str]],
+    frames: Optional[int],
+    output_bytes: int,
+    wall_time: float,
+    speed: Optional[float] = None,
+    user_time: Optional[float] = None,
+    system_time: Optional[float] = None,
+    max_rss_kb: Optional[float] = None,
+) -> dict:
+    cpu_time = user_time + system_time if user_time is not None and system_time is not None else None
+    return {
+        "command": list(command) if command is not None else None,
+        "host": socket.gethostname(),
+        "cpu_count": os.cpu_count(),
+        "finished_at": time.time(),
+        "frames": frames,
+        "wall_time": wall_time,
+        "fps": frames / wall_time if frames is not None and wall_time else None,
+        "output_bytes": output_bytes,
+        "bytes_per_frame": output_bytes / frames if frames else None,
+        "speed": speed,
+        "user_time": user_time,
+        "system_time": system_time,
+        "cpu_utilization": cpu_time / wall_time if cpu_time is not None and wall_time else None,
+        "max_rss_kb": max_rss_kb,
+    }
+
+
+def _expected_frames(input_path: str) -> Optional[int]:
+    # Only used for the ETA, so an input ffprobe cannot read is not an error here
+    try:
+        return probe_video(input_path)[1]
+    except (RuntimeError, OSError, ValueError, KeyError):
+        return None
+
+
+def ffmpeg_command(
     input_path: str,
     output_path: str,
     crf: int = 30,
     cpu_used: int = 4,
     tune: Optional[str] = None,
-) -> None:
+    start_time: Optional[float] = None,
+    max_frames: Optional[int] = None,
+    threads: Optional[int] = None,
+    tile_columns: int = 0,
+    tile_rows: int = 0,
+) -> List[str]:
     """
-    Encode a video to AV1 intra-only IVF format using FFmpeg and libaom-av1.
+    Build the ffmpeg command line for an AV1 intra-only IVF encode.
 
     Parameters
     ----------
     input_path : str
         Path to the input video file.
     output_path : str
-        Path to save the encoded AV1 IVF video.
+        Path to save the encoded AV1 IVF video, or ``pipe:1`` for stdout.
     crf : int, optional
         Constant Rate Factor for quality (lower is better quality), by default 30
     cpu_used : int, optional
         Speed/quality tradeoff, lower is slower/better, by default 4
     tune : Optional[str], optional
         Tune preset string for encoder (e.g., 'psnr'), by default None
+    start_time : Optional[float], optional
+        Seek to this input time in seconds before encoding, by default None
+    max_frames : Optional[int], optional
+        Stop after encoding this many frames, by default None
+    threads : Optional[int], optional
+        Encoder thread count, by default None (ffmpeg's choice)
+    tile_columns : int, optional
+        log2 of the number of tile columns, by default 0 (one tile)
+    tile_rows : int, optional
+        log2 of the number of tile rows, by default 0 (one tile)
 
-    Raises
-    ------
-    RuntimeError
-        If the encoding process fails.
+    Returns
+    -------
+    List[str]
+        The command and its arguments.
     """
     ffmpeg_cmd = [
-        "ffmpeg",
-        "-y",  # overwrite output
+        "ffmpeg", "-y",  # overwrite output
+        # Machine-readable progress on stderr instead of the stats line,
+        # and CPU time and peak memory at exit
+        "-nostats", "-progress", "pipe:2", "-benchmark",
+    ]
+    if start_time is not None:
+        ffmpeg_cmd.extend(["-ss", f"{start_time:.6f}"])
+    ffmpeg_cmd.extend([
         "-i", input_path,
         "-c:v", "libaom-av1",
         "-g", "1",  # GOP size 1 = intra-only
         "-cpu-used", str(cpu_used),
         "-crf", str(crf),
         "-row-mt", "1",  # enable row-based multi-threading for speed
-        "-tile-columns", "0",  # single tile for intra-only
-        "-f", "ivf",
-        output_path,
-    ]
+        "-tile-columns", str(tile_columns),
+    ])
 
+    if tile_rows:
+        ffmpeg_cmd.extend(["-tile-rows", str(tile_rows)])
     if tune:
         ffmpeg_cmd.extend(["-tune", tune])
+    if threads:
+        ffmpeg_cmd.extend(["-threads", str(threads)])
+    if max_frames is not None:
+        ffmpeg_cmd.extend(["-frames:v", str(max_frames)])
+
+    ffmpeg_cmd.extend(["-f", "ivf", output_path])
+    return ffmpeg_cmd
+
+
+def encode_av1_intra(
+    input_path: str,
+    output_path: str,
+    crf: int = 30,
+    cpu_used: int = 4,
+    tune: Optional[str] = None,
+    progress: Optional[Callable[[EncodeProgress], None]] = None,
+    perf_path: Optional[str] = None,
+    threads: Optional[int] = None,
+    tile_columns: int = 0,
+    tile_rows: int = 0,
+) -> None:
+    """
+    Encode a video to AV1 intra-only IVF format using FFmpeg and libaom-av1.
+
+    ffmpeg's stderr is read as it is written: progress reports go to the
+    progress callback and only the last STDERR_TAIL_LINES other lines are
+    kept for the error message.
+
+    Parameters
+    ----------
+    input_path : str
+        Path to the input video file.
+    output_path : str
+        Path to save the encoded AV1 IVF video.
+    crf : int, optional
+        Constant Rate Factor for quality (lower is better quality), by default 30
+    cpu_used : int, optional
+        Speed/quality tradeoff, lower is slower/better, by default 4
+    tune : Optional[str], optional
+        Tune preset string for encoder (e.g., 'psnr'), by default None
+    progress : Optional[Callable[[EncodeProgress], None]], optional
+        Called from a background thread with each progress report (the
+        input is probed for its frame count to estimate the ETA), by
+        default None
+    perf_path : Optional[str], optional
+        Write a JSON performance record of the finished encode (frames,
+        wall time, fps, output size, CPU time) here, by default None
+    threads : Optional[int], optional
+        Encoder thread count, by default None (ffmpeg's choice)
+    tile_columns : int, optional
+        log2 of the number of tile columns, by default 0
+    tile_rows : int, optional
+        log2 of the number of tile rows, by default 0
+
+    Raises
+    ------
+    RuntimeError
+        If the encoding process fails.
+    """
+    ffmpeg_cmd = ffmpeg_command(
+        input_path, output_path, crf, cpu_used, tune,
+        threads=threads, tile_columns=tile_columns, tile_rows=tile_rows,
+    )
+    total_frames = _expected_frames(input_path) if progress else None
+    record = run_ffmpeg(ffmpeg_cmd, output_path, progress, total_frames)
+    if perf_path:
+        write_perf_record(perf_path, record)
+
+
+def run_ffmpeg(
+    ffmpeg_cmd: List[str],
+    output_path: str,
+    progress: Optional[Callable[[EncodeProgress], None]] = None,
+    total_frames: Optional[int] = None,
+) -> dict:
+    """
+    Run an ffmpeg encode to a file, streaming its progress.
+
+    Parameters
+    ----------
+    ffmpeg_cmd : List[str]
+        Command from ffmpeg_command.
+    output_path : str
+        The file the command writes.
+    progress : Optional[Callable[[EncodeProgress], None]], optional
+        Called from a background thread with each progress report, by
+        default None
+    total_frames : Optional[int], optional
+        Expected number of frames, for the ETA, by default None
+
+    Returns
+    -------
+    dict
+        Performance record of the encode, as written by perf_path.
+
+    Raises
+    ------
+    RuntimeError
+        If the encoding process fails.
+    """
+    process = _FfmpegProcess(ffmpeg_cmd, progress=progress, total_frames=total_frames)
+    try:
+        process.wait()
+    finally:
+        process.kill()
+    return process.record(None, os.path.getsize(output_path))
+
+
+def encode_av1_intra_indexed(
+    input_path: str,
+    output_path: str,
+    index_path: str,
+    crf: int = 30,
+    cpu_used: int = 4,
+    tune: Optional[str] = None,
+    chunk_size: int = 1 << 20,
+    threads: Optional[int] = None,
+    progress: Optional[Callable[[EncodeProgress], None]] = None,
+    perf_path: Optional[str] = None,
+    tile_columns: int = 0,
+    tile_rows: int = 0,
+    index_version: int = 1,
+) -> int:
+    """
+    Encode a video to AV1 intra-only IVF and build its frame index in one pass.
 
-    print("Running ffmpeg:", " ".join(ffmpeg_cmd))
-    result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True)
+    ffmpeg writes the IVF stream to a pipe. Each chunk is written to
+    output_path and parsed on the fly, and index entries are appended to
+    index_path as frames complete, so both files are finished when the
+    encode ends without re-reading the video. Memory use is bounded by
+    chunk_size for a version 1 index; a version 2 index also keeps 24
+    bytes per frame until the encode ends, when its header is known.
 
+    Parameters
+    ----------
+    input_path : str
+        Path to the input video file.
+    output_path : str
+        Path to save the encoded AV1 IVF video.
+    index_path : str
+        Path to save the binary index file.
+    crf : int, optional
+        Constant Rate Factor for quality (lower is better quality), by default 30
+    cpu_used : int, optional
+        Speed/quality tradeoff, lower is slower/better, by default 4
+    tune : Optional[str], optional
+        Tune preset string for encoder (e.g., 'psnr'), by default None
+    chunk_size : int, optional
+        Bytes read from ffmpeg at a time, by default 1 MiB
+    threads : Optional[int], optional
+        Encoder thread count, by default None (ffmpeg's choice)
+    progress : Optional[Callable[[EncodeProgress], None]], optional
+        Called from a background thread with each progress report, by
+        default None
+    perf_path : Optional[str], optional
+        Write a JSON performance record of the finished encode here, by
+        default None
+    tile_columns : int, optional
+        log2 of the number of tile columns, by default 0
+    tile_rows : int, optional
+        log2 of the number of tile rows, by default 0
+    index_version : int, optional
+        Index format: 1 for fixed-width 128-bit entries, 2 for the compact
+        format with a header and timestamps, by default 1
+
+    Returns
+    -------
+    int
+        Number of frames encoded.
+
+    Raises
+    ------
+    RuntimeError
+        If the encoding process fails or produces a truncated stream.
+    ValueError
+        If index_version is not 1 or 2.
+    """
+    ffmpeg_cmd = ffmpeg_command(
+        input_path, "pipe:1", crf, cpu_used, tune,
+        threads=threads, tile_columns=tile_columns, tile_rows=tile_rows,
+    )
+    total_frames = _expected_frames(input_path) if progress else None
+    return _encode_from_pipe(
+        ffmpeg_cmd, output_path, index_path, chunk_size,
+        progress=progress, total_frames=total_frames, perf_path=perf_path, index_version=index_version,
+    )
+
+
+def _encode_from_pipe(
+    ffmpeg_cmd: List[str],
+    output_path: str,
+    index_path: str,
+    chunk_size: int = 1 << 20,
+    progress: Optional[Callable[[EncodeProgress], None]] = None,
+    total_frames: Optional[int] = None,
+    perf_path: Optional[str] = None,
+    index_version: int = 1,
+) -> int:
+    if index_version not in (1, 2):
+        raise ValueError(f"Unsupported index version {index_version}")
+    process = _FfmpegProcess(ffmpeg_cmd, subprocess.PIPE, progress, total_frames)
+
+    # Version 1 entries are appended as frames complete; version 2 needs the
+    # frame count up front, so it is written from the kept frames at the end
+    indexer = IvfStreamIndexer(keep_frames=index_version == 2)
+    try:
+        with open(output_path, 'wb') as video_file, open(index_path, 'wb') as index_file:
+            while True:
+                chunk = process.proc.stdout.read(chunk_size)
+                if not chunk:
+                    break
+                video_file.write(chunk)
+                completed = indexer.feed(chunk)
+                if index_version == 1:
+                    index_file.write(pack_index_entries(completed))
+            process.wait()
+            try:
+                indexer.finish()
+                if index_version == 2:
+                    index_file.write(indexer.pack_index_v2(video_file.tell()))
+            except ValueError as e:
+                raise RuntimeError(f"FFmpeg produced an invalid IVF stream: {e}")
+
+            # ffmpeg cannot seek back on a pipe, so fill in the frame count here
+            video_file.seek(IVF_FRAME_COUNT_OFFSET)
+            video_file.write(indexer.frame_count.to_bytes(4, 'little'))
+    finally:
+        process.kill()
+
+    if perf_path:
+        write_perf_record(perf_path, process.record(indexer.frame_count, os.path.getsize(output_path)))
+    return indexer.frame_count
+
+
+def probe_video(input_path: str) -> Tuple[Fraction, int]:
+    """
+    Read the frame rate and frame count of a video's first video stream.
+
+    Parameters
+    ----------
+    input_path : str
+        Path to the input video file.
+
+    Returns
+    -------
+    Tuple[Fraction, int]
+        (frame rate in frames per second, number of frames). The frame count
+        is estimated from the duration when the container does not record it.
+
+    Raises
+    ------
+    RuntimeError
+        If ffprobe fails or the file has no video stream.
+    """
+    ffprobe_cmd = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "stream=r_frame_rate,nb_frames,duration:format=duration",
+        "-of", "json",
+        input_path,
+    ]
+    result = subprocess.run(ffprobe_cmd, capture_output=True, text=True)
     if result.returncode != 0:
-        raise RuntimeError(
-            f"FFmpeg encoding failed with code {result.returncode}:\n{result.stderr}"
+        raise RuntimeError(f"ffprobe failed with code {result.returncode}:\n{result.stderr}")
+
+    info = json.loads(result.stdout)
+    if not info.get("streams"):
+        raise RuntimeError(f"No video stream in {input_path}")
+    stream = info["streams"][0]
+    frame_rate = Fraction(stream["r_frame_rate"])
+    nb_frames = str(stream.get("nb_frames", ""))
+    if nb_frames.isdigit():
+        return frame_rate, int(nb_frames)
+    duration = float(stream.get("duration") or info.get("format", {})["duration"])
+    return frame_rate, round(duration * frame_rate)
+
+
+def plan_segments(frame_count: int, segments: int) -> List[Tuple[int, Optional[int]]]:
+    """
+    Split a stream into contiguous runs of frames of near-equal length.
+
+    Parameters
+    ----------
+    frame_count : int
+        Number of frames in the stream (may be an estimate).
+    segments : int
+        Number of segments wanted.
+
+    Returns
+    -------
+    List[Tuple[int, Optional[int]]]
+        (first frame, frame count) per segment. The last segment's count is
+        None, meaning it runs to the end of the input, so an inexact
+        frame_count never drops trailing frames.
+
+    Examples
+    --------
+    >>> plan_segments(10, 3)
+    [(0, 3), (3, 3), (6, None)]
+    """
+    segments = max(1, min(segments, frame_count))
+    bounds = [frame_count * i // segments for i in range(segments + 1)]
+    plan = [(bounds[i], bounds[i + 1] - bounds[i]) for i in range(segments)]
+    plan[-1] = (plan[-1][0], None)
+    return plan
+
+
+def encode_av1_intra_parallel(
+    input_path: str,
+    output_path: str,
+    index_path: str,
+    crf: int = 30,
+    cpu_used: int = 4,
+    tune: Optional[str] = None,
+    workers: Optional[int] = None,
+    segments: Optional[int] = None,
+    progress: Optional[Callable[[EncodeProgress], None]] = None,
+    perf_path: Optional[str] = None,
+    tile_columns: int = 0,
+    tile_rows: int = 0,
+    index_version: int = 1,
+) -> int:
+    """
+    Encode a video to AV1 intra-only IVF in parallel time segments.
+
+    Every frame is a keyframe, so segments encode independently. The input
+    is split into frame-accurate segments, each encoded and indexed by its
+    own ffmpeg process (up to workers at a time, sharing the CPUs between
+    them), and the segment IVF payloads are joined under one header with
+    the frame count fixed up and timestamps rebased. The segment indexes are
+    merged with their offsets rebased, so the IVF and index have the same
+    structure as a serial encode.
+
+    Parameters
+    ----------
+    input_path : str
+        Path to the input video file.
+    output_path : str
+        Path to save the encoded AV1 IVF video.
+    index_path : str
+        Path to save the binary index file.
+    crf : int, optional
+        Constant Rate Factor for quality (lower is better quality), by default 30
+    cpu_used : int, optional
+        Speed/quality tradeoff, lower is slower/better, by default 4
+    tune : Optional[str], optional
+        Tune preset string for encoder (e.g., 'psnr'), by default None
+    workers : Optional[int], optional
+        Number of concurrent ffmpeg processes, by default the CPU count
+    segments : Optional[int], optional
+        Number of segments to split the input into, by default workers
+    progress : Optional[Callable[[EncodeProgress], None]], optional
+        Called from background threads with progress summed over all
+        segments, by default None
+    perf_path : Optional[str], optional
+        Write a JSON performance record of the whole encode here, with the
+        per-segment records under "segments", by default None
+    tile_columns : int, optional
+        log2 of the number of tile columns, by default 0
+    tile_rows : int, optional
+        log2 of the number of tile rows, by default 0
+    index_version : int, optional
+        Index format: 1 for fixed-width 128-bit entries, 2 for the compact
+        format with a header and timestamps, by default 1. Segments are
+        indexed with timestamps for version 2, which merge_indexes rebases
+        with the frames, so neither format re-reads the joined video.
+
+    Returns
+    -------
+    int
+        Number of frames encoded.
+
+    Raises
+    ------
+    RuntimeError
+        If probing or any segment encode fails.
+    ValueError
+        If index_version is not 1 or 2.
+    """
+    if index_version not in (1, 2):
+        raise ValueError(f"Unsupported index version {index_version}")
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    frame_rate, frame_count = probe_video(input_path)
+    plan = plan_segments(frame_count, segments or workers)
+    threads = max(1, (os.cpu_count() or 1) // min(workers, len(plan)))
+
+    segment_progress: Dict[int, EncodeProgress] = {}
+    progress_lock = threading.Lock()
+
+    def report(i: int, segment: EncodeProgress) -> None:
+        with progress_lock:
+            segment_progress[i] = segment
+            total = _sum_progress(list(segment_progress.values()), time.perf_counter() - start, frame_count)
+            progress(total._replace(done=total.done and len(segment_progress) == len(plan)))
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_path))) as tmp_dir:
+        segment_paths = [os.path.join(tmp_dir, f"segment{i:05d}.ivf") for i in range(len(plan))]
+        segment_perf_paths = [path + ".perf.json" if perf_path else None for path in segment_paths]
+
+        def encode_segment(i: int) -> int:
+            first_frame, max_frames = plan[i]
+            # Seek half a frame early: accurate seeking drops frames timestamped
+            # before the seek point, so this keeps first_frame and nothing earlier
+            start_time = float((first_frame - Fraction(1, 2)) / frame_rate) if first_frame else None
+            ffmpeg_cmd = ffmpeg_command(
+                input_path, "pipe:1", crf, cpu_used, tune,
+                start_time=start_time, max_frames=max_frames, threads=threads,
+                tile_columns=tile_columns, tile_rows=tile_rows,
+            )
+            return _encode_from_pipe(
+                ffmpeg_cmd, segment_paths[i], segment_paths[i] + ".idx",
+                progress=(lambda segment: report(i, segment)) if progress else None,
+                perf_path=segment_perf_paths[i],
+                index_version=index_version,
+            )
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(encode_segment, range(len(plan))))
+
+        total = concat_ivf_files(segment_paths, output_path)
+
+        # Each segment's frames follow its own 32-byte header
+        shifts = []
+        position = IVF_HEADER_SIZE
+        for path in segment_paths:
+            shifts.append(position - IVF_HEADER_SIZE)
+            position += os.path.getsize(path) - IVF_HEADER_SIZE
+        merge_indexes(
+            [path + ".idx" for path in segment_paths], shifts, index_path, index_version,
+            read_ivf_header(output_path), os.path.getsize(output_path),
+        )
+
+        if perf_path:
+            segment_records = []
+            for path in segment_perf_paths:
+                with open(path) as f:
+                    segment_records.append(json.load(f))
+
+    if perf_path:
+        def cpu_sum(key: str) -> Optional[float]:
+            values = [record[key] for record in segment_records]
+            return None if None in values else sum(values)
+
+        # The ffmpeg command of each segment is in its own record
+        record = _perf_record(
+            None,
+            total,
+            os.path.getsize(output_path),
+            time.perf_counter() - start,
+            user_time=cpu_sum("user_time"),
+            system_time=cpu_sum("system_time"),
         )
+        record["segments"] = segment_records
+        write_perf_record(perf_path, record)
+    return total
+
+
+def _sum_progress(segments: List[EncodeProgress], elapsed: float, total_frames: int) -> EncodeProgress:
+    """
+    Combine progress of segments encoding side by side into one report.
+
+    Examples
+    --------
+    >>> a = EncodeProgress(10, None, 5.0, 800.0, 0.25, 0.5, 50000, 2.0, 4.0, True)
+    >>> b = EncodeProgress(30, None, 15.0, None, 0.75, 1.5, 150000, 2.0, 1.0, False)
+    >>> total = _sum_progress([a, b], 2.0, 60)
+    >>> total.frames, total.fps, total.bitrate, total.speed, total.eta, total.done
+    (40, 20.0, 800.0, 1.0, 1.0, False)
+    """
+    frames = sum(s.frames for s in segments)
+    fps = frames / elapsed if elapsed > 0 else 0.0
+    sizes = [s.total_size for s in segments]
+    out_times = [s.out_time for s in segments]
+    size = None if None in sizes else sum(sizes)
+    out_time = None if None in out_times else sum(out_times)
+    return EncodeProgress(
+        frames=frames,
+        total_frames=total_frames,
+        fps=fps,
+        bitrate=size * 8 / out_time / 1000 if size is not None and out_time else None,
+        speed=out_time / elapsed if out_time is not None and elapsed > 0 else None,
+        out_time=out_time,
+        total_size=size,
+        elapsed=elapsed,
+        eta=max(0.0, (total_frames - frames) / fps) if fps > 0 else None,
+        done=all(s.done for s in segments),
+    )
+
+
+def _print_progress(progress: EncodeProgress) -> None:
+    # Rewrite one status line in place, ending it once the encode is done
+    end = "\n" if progress.done else ""
+    print("\r" + format_progress(progress), end=end, file=sys.stderr, flush=True)
 
 
 def main() -> None:
@@ -69,13 +909,27 @@ def main() -> None:
     parser.add_argument("input", help="Input video path")
     parser.add_argument("output", help="Output IVF video path")
     parser.add_argument(
-        "--crf", type=int, default=30, help="Constant Rate Factor (quality, lower better)"
+        "--profile",
+        default=None,
+        help="Encoder settings profile written by video_index.autotune; the options below override it",
+    )
+    parser.add_argument(
+        "--crf", type=int, default=None, help="Constant Rate Factor (quality, lower better, default 30)"
     )
     parser.add_argument(
         "--cpu-used",
         type=int,
-        default=4,
-        help="CPU usage level for encoder speed/quality tradeoff (0-8)",
+        default=None,
+        help="CPU usage level for encoder speed/quality tradeoff (0-8, default 4)",
+    )
+    parser.add_argument(
+        "--tile-columns", type=int, default=None, help="log2 of the number of tile columns (default 0)"
+    )
+    parser.add_argument(
+        "--tile-rows", type=int, default=None, help="log2 of the number of tile rows (default 0)"
+    )
+    parser.add_argument(
+        "--threads", type=int, default=None, help="Encoder threads (default: ffmpeg's choice)"
     )
     parser.add_argument(
         "--tune", default=None, help="Tune preset for encoder (e.g., psnr)"
@@ -85,20 +939,87 @@ def main() -> None:
         action="store_true",
         help="Build the 128-bit frame index file after encoding",
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="With --build-index, build the index while ffmpeg is writing instead of re-reading the IVF",
+    )
+    parser.add_argument(
+        "--index-version",
+        type=int,
+        choices=(1, 2),
+        default=1,
+        help="Index format: 1 for fixed-width 128-bit entries, 2 for the compact format with a header",
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Encode time segments in this many parallel ffmpeg processes (builds the index)",
+    )
+    parser.add_argument(
+        "--segments",
+        type=int,
+        default=None,
+        help="Number of segments for a parallel encode (default: --workers)",
+    )
+
+    parser.add_argument(
+        "--progress",
+        action="store_true",
+        help="Show frames encoded, fps, speed, bitrate and ETA while encoding",
+    )
+    parser.add_argument(
+        "--perf-json",
+        default=None,
+        help="Write a JSON performance record (frames, wall time, fps, size, CPU time) when the encode finishes",
+    )
 
     args = parser.parse_args()
 
-    encode_av1_intra(args.input, args.output, args.crf, args.cpu_used, args.tune)
+    output_path = Path(args.output)
+    index_path = output_path.with_suffix(output_path.suffix + ".idx")
+    progress = _print_progress if args.progress else None
+
+    settings = load_profile(args.profile) if args.profile else EncoderSettings()
+    overrides = {name: getattr(args, name) for name in EncoderSettings._fields}
+    settings = settings._replace(**{name: value for name, value in overrides.items() if value is not None})
+    tiles = {"tile_columns": settings.tile_columns, "tile_rows": settings.tile_rows}
+
+    if args.workers > 1:
+        # Each segment's thread count comes from the CPUs per worker instead
+        print(f"Encoding in parallel with {args.workers} workers, index at {index_path}")
+        encode_av1_intra_parallel(
+            args.input, args.output, str(index_path), settings.crf, settings.cpu_used, args.tune,
+            workers=args.workers, segments=args.segments,
+            progress=progress, perf_path=args.perf_json, index_version=args.index_version, **tiles,
+        )
+        return
+
+    if args.build_index and args.stream:
+        print(f"Encoding and building index at {index_path}")
+        encode_av1_intra_indexed(
+            args.input, args.output, str(index_path), settings.crf, settings.cpu_used, args.tune,
+            threads=settings.threads, progress=progress, perf_path=args.perf_json,
+            index_version=args.index_version, **tiles,
+        )
+        return
+
+    encode_av1_intra(
+        args.input, args.output, settings.crf, settings.cpu_used, args.tune,
+        progress=progress, perf_path=args.perf_json, threads=settings.threads, **tiles,
+    )
 
     if args.build_index:
-        index_path = Path(args.output).with_suffix(args.output.suffix + ".idx")
         print(f"Building index at {index_path}")
-        build_index(args.output, str(index_path))
+        build_index(args.output, str(index_path), args.index_version)
 
 
 if __name__ == "__main__":
     '''
     python -m video_index.encode_video input.mp4 output.ivf --crf 28 --cpu-used 4 --build-index
+    python -m video_index.encode_video input.mp4 output.ivf --profile host.profile.json --build-index --stream
     '''
     
     main()
@@ -0,0 +1,33 @@
+# video_index/errors.py
+from typing import Optional
+
+
+class FrameFetchError(RuntimeError):
+    """
+    Raised when a frame, index or video cannot be read, with the HTTP
+    status that describes the failure.
+
+    status_code is the upstream response's status when storage refused a
+    read, 404 when the frame or object does not exist, 422 when the request
+    cannot be answered from this video (such as a time lookup on an index
+    without timestamps), and None when the read failed some other way (such
+    as a short or inconsistent response).
+
+    Examples
+    --------
+    >>> e = FrameFetchError("Failed to fetch frame bytes: 403", 403)
+    >>> e.status_code, str(e), isinstance(e, RuntimeError)
+    (403, 'Failed to fetch frame bytes: 403', True)
+    """
+
+    def __init__(self, message: str, status_code: Optional[int] = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+    @property
+    def not_found(self) -> bool:
+        """
+        Whether the frame or object does not exist, including frames past
+        the end of the index (an unsatisfiable Range).
+        """
+        return self.status_code in (404, 410, 416)
@@ -0,0 +1,291 @@
+# video_index/frame_cache.py
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+FrameKey = Tuple[str, int, int]
+
+
+def frame_cache_key(video_url: str, offset: int, length: int) -> FrameKey:
+    """
+    Build the cache key identifying a frame payload.
+
+    Parameters
+    ----------
+    video_url : str
+        URL to the video file.
+    offset : int
+        Byte offset where the frame starts.
+    length : int
+        Length in bytes of the frame.
+
+    Returns
+    -------
+    FrameKey
+        (video_url, offset, length)
+    """
+    return (video_url, offset, length)
+
+
+class MemoryTier:
+    """
+    In-memory LRU of frame payloads bounded by their total size in bytes.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Total size of cached payloads.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries: "OrderedDict[FrameKey, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: FrameKey) -> Optional[bytes]:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key: FrameKey, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= len(old)
+            self._entries[key] = data
+            self.nbytes += len(data)
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+
+class DiskTier:
+    """
+    On-disk cache of frame payloads shared by every process using directory.
+
+    Each payload is stored in its own file named by the SHA-256 digest of its
+    key, written to a temporary file and atomically renamed into place, so
+    readers in other processes never see a partial file. File modification
+    times record recency: a hit touches the file, and eviction removes the
+    least recently used files under an exclusive lock until the directory is
+    back below low_water of max_bytes. The directory's total size is kept in
+    a shared file updated under the same lock, so the cap holds across every
+    process writing to it, not just per process.
+
+    Parameters
+    ----------
+    directory : str
+        Directory holding cached payloads; created if missing.
+    max_bytes : int
+        Size cap for the directory.
+    low_water : float, optional
+        Fraction of max_bytes to evict down to, by default 0.9
+    """
+
+    def __init__(self, directory: str, max_bytes: int, low_water: float = 0.9) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        os.makedirs(directory, exist_ok=True)
+        self._lock_path = os.path.join(directory, ".lock")
+        self._size_path = os.path.join(directory, ".size")
+        self._thread_lock = threading.Lock()
+        with self._locked():
+            # Resync the shared size with what is actually on disk
+            self.nbytes = sum(size for _, _, size in self._scan())
+            self._write_size(self.nbytes)
+
+    def path(self, key: FrameKey) -> str:
+        """
+        Return the file path a payload is stored at.
+        """
+        digest = hashlib.sha256("\0".join(map(str, key)).encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def get(self, key: FrameKey) -> Optional[bytes]:
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            # Missing, or evicted by another process between open and utime
+            return None
+        if len(data) != key[2]:
+            return None
+        return data
+
+    def put(self, key: FrameKey, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            with self._locked():
+                try:
+                    replaced = os.path.getsize(path)
+                except FileNotFoundError:
+                    replaced = 0
+                os.replace(tmp_path, path)
+                self.nbytes = self._read_size() + len(data) - replaced
+                if self.nbytes > self.max_bytes:
+                    self._evict()
+                else:
+                    self._write_size(self.nbytes)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    @contextmanager
+    def _locked(self):
+        # Every change to the directory's files and its shared size happens
+        # under this lock, across threads and across processes
+        with self._thread_lock, open(self._lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _read_size(self) -> int:
+        try:
+            with open(self._size_path) as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return sum(size for _, _, size in self._scan())
+
+    def _write_size(self, nbytes: int) -> None:
+        with open(self._size_path, 'w') as f:
+            f.write(str(nbytes))
+
+    def _scan(self):
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.startswith(".tmp-"):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield entry.path, st.st_mtime, st.st_size
+
+    def _evict(self) -> None:
+        # Called under _locked; rescan since other processes add files too
+        entries = sorted(self._scan(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * self.low_water
+        for path, _, size in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.nbytes = total
+        self._write_size(total)
+
+
+class FrameCache:
+    """
+    Two-tier cache of frame payloads keyed by (video_url, offset, length).
+
+    Lookups check the in-memory LRU first and then the optional disk tier;
+    disk hits are promoted into memory. Hit and miss counts are kept per tier
+    and updated under a lock, since clients share one cache between threads.
+
+    Parameters
+    ----------
+    memory_bytes : int, optional
+        Byte budget of the in-memory tier, by default 128 MiB
+    disk_dir : Optional[str], optional
+        Directory for the on-disk tier, by default None (memory only)
+    disk_bytes : int, optional
+        Size cap of the on-disk tier, by default 10 GiB
+    """
+
+    def __init__(
+        self,
+        memory_bytes: int = 128 * 2**20,
+        disk_dir: Optional[str] = None,
+        disk_bytes: int = 10 * 2**30,
+    ) -> None:
+        self.memory = MemoryTier(memory_bytes)
+        self.disk = DiskTier(disk_dir, disk_bytes) if disk_dir else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    def get(self, key: FrameKey) -> Optional[bytes]:
+        """
+        Return the cached payload for key, or None on a miss.
+        """
+        data = self.memory.get(key)
+        if data is not None:
+            with self._lock:
+                self.memory_hits += 1
+            return data
+        if self.disk is not None:
+            data = self.disk.get(key)
+            if data is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self.memory.put(key, data)
+                return data
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: FrameKey, data: bytes) -> None:
+        """
+        Store a payload in every tier.
+        """
+        self.memory.put(key, data)
+        if self.disk is not None:
+            self.disk.put(key, data)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return hit/miss counters and tier sizes.
+
+        Returns
+        -------
+        Dict[str, int]
+            Counters keyed by name.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "memory_bytes": self.memory.nbytes,
+            "disk_bytes": self.disk.nbytes if self.disk is not None else 0,
+        }
@@ -0,0 +1,539 @@
+# video_index/frame_index.py
+import math
+import os
+import struct
+from fractions import Fraction
+from typing import List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .errors import FrameFetchError
+
+# One index entry: two little-endian uint64 (offset, length), 16 bytes per frame
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('length', '<u8')])
+
+# Version 2 index layout:
+#
+#   header (64 bytes): magic, version, flags, frame count, frames per block,
+#       bytes between the end of one frame and the start of the next (the
+#       container's per-frame header size, 12 for IVF), timebase numerator
+#       and denominator, source file size, reserved
+#   blocks: each holds the absolute offset of its first frame as a uint64
+#       (a checkpoint), then the uint32 lengths of up to block_frames frames.
+#       The last block is zero-padded to full size.
+#
+# Any frame's offset is its block's checkpoint plus the lengths and frame
+# header sizes of the frames before it in the block, so a single Range read
+# of one block resolves a frame. Version 1 files have no header and start
+# with the first frame's uint64 offset, which can never equal the magic.
+#
+# With INDEX_FLAG_PTS set, the blocks are followed by the int64 presentation
+# timestamp of the first frame of each block, then the int64 timestamps of
+# every frame (zero-padded to whole blocks). A time lookup reads the small
+# per-block table, then the timestamps of one block.
+INDEX_V2_MAGIC = b'VIDX'
+INDEX_V2_HEADER = struct.Struct('<4sHHQIIIIQ24x')
+INDEX_V2_HEADER_SIZE = INDEX_V2_HEADER.size
+DEFAULT_BLOCK_FRAMES = 64
+INDEX_FLAG_PTS = 0x1
+PTS_DTYPE = np.dtype('<i8')
+
+
+class IndexHeader(NamedTuple):
+    """
+    Fields of a version 2 index header.
+
+    Timestamps are in units of timebase_num / timebase_den seconds; for a
+    constant frame rate stream the frame rate is timebase_den / timebase_num.
+    """
+    frame_count: int
+    block_frames: int = DEFAULT_BLOCK_FRAMES
+    frame_header_size: int = 12
+    timebase_num: int = 0
+    timebase_den: int = 0
+    source_size: int = 0
+    version: int = 2
+    flags: int = 0
+
+    @property
+    def block_size(self) -> int:
+        """Size in bytes of one block."""
+        return 8 + 4 * self.block_frames
+
+    @property
+    def block_count(self) -> int:
+        """Number of blocks, including a final partial one."""
+        return -(-self.frame_count // self.block_frames)
+
+    @property
+    def has_pts(self) -> bool:
+        """Whether the index stores presentation timestamps."""
+        return bool(self.flags & INDEX_FLAG_PTS)
+
+    def block_range(self, first_block: int, last_block: int) -> Tuple[int, int]:
+        """
+        Inclusive byte range covering blocks first_block..last_block.
+        """
+        start = INDEX_V2_HEADER_SIZE + first_block * self.block_size
+        return start, INDEX_V2_HEADER_SIZE + (last_block + 1) * self.block_size - 1
+
+    def pts_table_range(self) -> Tuple[int, int]:
+        """
+        Inclusive byte range of the timestamps of each block's first frame.
+        """
+        start = INDEX_V2_HEADER_SIZE + self.block_count * self.block_size
+        return start, start + self.block_count * PTS_DTYPE.itemsize - 1
+
+    def pts_range(self, first_block: int, last_block: int) -> Tuple[int, int]:
+        """
+        Inclusive byte range of the frame timestamps in blocks first_block..last_block.
+        """
+        base = self.pts_table_range()[1] + 1
+        size = self.block_frames * PTS_DTYPE.itemsize
+        return base + first_block * size, base + (last_block + 1) * size - 1
+
+
+def parse_index_header(data: bytes) -> Optional[IndexHeader]:
+    """
+    Parse the header of a version 2 index.
+
+    Parameters
+    ----------
+    data : bytes
+        At least the first 64 bytes of the index, or the whole index if it
+        is shorter.
+
+    Returns
+    -------
+    Optional[IndexHeader]
+        The header, or None if data is a version 1 index.
+
+    Raises
+    ------
+    ValueError
+        If data has the version 2 magic but an unsupported version or a
+        truncated header.
+    """
+    if data[:4] != INDEX_V2_MAGIC:
+        return None
+    if len(data) < INDEX_V2_HEADER_SIZE:
+        raise ValueError("Truncated index header")
+    (_, version, flags, frame_count, block_frames, frame_header_size,
+     timebase_num, timebase_den, source_size) = INDEX_V2_HEADER.unpack_from(data)
+    if version != 2:
+        raise ValueError(f"Unsupported index version {version}")
+    return IndexHeader(
+        frame_count, block_frames, frame_header_size,
+        timebase_num, timebase_den, source_size, version, flags,
+    )
+
+
+def _block_dtype(header: IndexHeader) -> np.dtype:
+    return np.dtype([('offset', '<u8'), ('lengths', '<u4', (header.block_frames,))])
+
+
+def decode_blocks(header: IndexHeader, data: bytes, first_block: int = 0) -> np.ndarray:
+    """
+    Decode consecutive version 2 blocks into (offset, length) entries.
+
+    Parameters
+    ----------
+    header : IndexHeader
+        The index header.
+    data : bytes
+        Whole blocks, starting with block first_block.
+    first_block : int, optional
+        Number of the first block in data, by default 0
+
+    Returns
+    -------
+    np.ndarray
+        Entries with dtype INDEX_DTYPE for the frames in those blocks,
+        excluding padding past the end of the index.
+    """
+    block_count = len(data) // header.block_size
+    blocks = np.frombuffer(data, dtype=_block_dtype(header), count=block_count)
+    first_frame = first_block * header.block_frames
+    count = max(0, min(block_count * header.block_frames, header.frame_count - first_frame))
+
+    lengths = blocks['lengths'].reshape(-1)[:count].astype('<u8')
+    step = lengths + np.uint64(header.frame_header_size)
+    before = np.cumsum(step) - step  # bytes from the first frame of the data
+    block_of = np.arange(count) // header.block_frames
+    # Position within each block: subtract what precedes the block's first frame
+    offsets = blocks['offset'][block_of] + before - before[block_of * header.block_frames]
+
+    entries = np.empty(count, dtype=INDEX_DTYPE)
+    entries['offset'] = offsets
+    entries['length'] = lengths
+    return entries
+
+
+def pack_index_v2(frame_positions, header: IndexHeader, timestamps: Optional[Sequence[int]] = None) -> bytes:
+    """
+    Serialize frame positions as a version 2 index.
+
+    Parameters
+    ----------
+    frame_positions : Sequence[Tuple[int, int]] or np.ndarray
+        (offset, length) of each frame.
+    header : IndexHeader
+        Header fields; frame_count is taken from frame_positions, and the
+        timestamp flag from timestamps.
+    timestamps : Optional[Sequence[int]], optional
+        Presentation timestamp of each frame in timebase units, in
+        non-decreasing order, by default None (not stored)
+
+    Returns
+    -------
+    bytes
+        The index file contents.
+
+    Raises
+    ------
+    ValueError
+        If a frame is 4 GiB or larger, a frame does not start exactly
+        frame_header_size bytes after the previous one ends, or the
+        timestamps do not match the frames or go backwards.
+
+    Examples
+    --------
+    >>> positions = [(44, 10), (66, 20), (98, 30)]
+    >>> data = pack_index_v2(positions, IndexHeader(0, block_frames=2))
+    >>> len(data)
+    96
+    >>> FrameIndex.from_bytes(data).entries.tolist() == positions
+    True
+    """
+    entries = np.asarray(frame_positions, dtype=np.uint64).reshape(-1, 2)
+    offsets, lengths = entries[:, 0], entries[:, 1]
+    if len(lengths) and lengths.max() > 0xFFFFFFFF:
+        raise ValueError("Frames of 4 GiB or more need a version 1 index")
+
+    k = header.block_frames
+    expected = offsets[:-1] + lengths[:-1] + np.uint64(header.frame_header_size)
+    gaps = np.nonzero(expected != offsets[1:])[0] + 1
+    if np.any(gaps % k):
+        raise ValueError(f"Frame {int(gaps[gaps % k != 0][0])} is not contiguous with the previous frame")
+
+    flags = header.flags & ~INDEX_FLAG_PTS
+    if timestamps is not None:
+        pts = np.asarray(timestamps, dtype=PTS_DTYPE)
+        if len(pts) != len(lengths):
+            raise ValueError(f"Got {len(pts)} timestamps for {len(lengths)} frames")
+        if np.any(np.diff(pts) < 0):
+            raise ValueError("Timestamps must not decrease")
+        flags |= INDEX_FLAG_PTS
+    header = header._replace(frame_count=len(lengths), flags=flags)
+    block_count = header.block_count
+    blocks = np.zeros(block_count, dtype=_block_dtype(header))
+    blocks['offset'] = offsets[::k]
+    padded = np.zeros(block_count * k, dtype='<u4')
+    padded[:len(lengths)] = lengths
+    blocks['lengths'] = padded.reshape(block_count, k)
+    parts = [pack_index_header(header), blocks.tobytes()]
+    if timestamps is not None:
+        padded_pts = np.zeros(block_count * k, dtype=PTS_DTYPE)
+        padded_pts[:len(pts)] = pts
+        parts += [pts[::k].tobytes(), padded_pts.tobytes()]
+    return b''.join(parts)
+
+
+def pack_index_header(header: IndexHeader) -> bytes:
+    """
+    Serialize a version 2 index header.
+    """
+    return INDEX_V2_HEADER.pack(
+        INDEX_V2_MAGIC, header.version, header.flags, header.frame_count,
+        header.block_frames, header.frame_header_size,
+        header.timebase_num, header.timebase_den, header.source_size,
+    )
+
+
+def time_to_ticks(header: IndexHeader, t: float) -> Fraction:
+    """
+    Convert a time in seconds to exact timebase units.
+
+    Results within a millionth of a tick of a whole number are snapped to
+    it, so times such as 0.3 or 1 / 30 land exactly on the matching
+    timestamp rather than just below it.
+
+    Raises
+    ------
+    RuntimeError
+        If the header has no timebase.
+
+    Examples
+    --------
+    >>> time_to_ticks(IndexHeader(0, timebase_num=1, timebase_den=30), 0.3)
+    Fraction(9, 1)
+    """
+    if not header.timebase_num or not header.timebase_den:
+        raise FrameFetchError("Index has no timebase", 422)
+    ticks = Fraction(t) * header.timebase_den / header.timebase_num
+    nearest = round(ticks)
+    if abs(ticks - nearest) < Fraction(1, 10**6):
+        return Fraction(nearest)
+    return ticks
+
+
+def locate_ticks(pts: np.ndarray, ticks: Fraction) -> int:
+    """
+    Return the position of the last timestamp at or before ticks in the
+    sorted array pts, or -1 if every timestamp is later.
+
+    Examples
+    --------
+    >>> locate_ticks(np.array([0, 3, 3, 7]), Fraction(5))
+    2
+    """
+    return int(np.searchsorted(pts, math.floor(ticks), side='right')) - 1
+
+
+class FrameIndex:
+    """
+    Read-only view of a binary frame index as a NumPy structured array.
+
+    Built from a local file the entries are memory-mapped, and built from
+    downloaded bytes they wrap the buffer directly, so no per-entry Python
+    objects are created and nothing is copied. Integer indexing returns a
+    single (offset, length) tuple; slices and integer arrays return
+    structured arrays of entries for vectorized batch lookups.
+
+    Version 2 indexes are detected by their header and decoded into the
+    same (offset, length) array with vectorized NumPy operations; the header
+    is kept on ``header`` (None for version 1), and stored presentation
+    timestamps on ``pts``, which enables lookups by time.
+
+    Parameters
+    ----------
+    entries : np.ndarray
+        Array with dtype INDEX_DTYPE.
+    header : Optional[IndexHeader], optional
+        The version 2 header, by default None
+    pts : Optional[np.ndarray], optional
+        Presentation timestamp of each frame in timebase units,
+        by default None
+
+    Examples
+    --------
+    >>> index = FrameIndex.from_bytes(np.array([(44, 10), (66, 20), (98, 30)], INDEX_DTYPE).tobytes())
+    >>> len(index)
+    3
+    >>> index[1]
+    (66, 20)
+    >>> index[[2, 0]]['offset'].tolist()
+    [98, 44]
+    """
+
+    def __init__(
+        self, entries: np.ndarray, header: Optional[IndexHeader] = None, pts: Optional[np.ndarray] = None
+    ) -> None:
+        if entries.dtype != INDEX_DTYPE:
+            raise ValueError(f"Expected index dtype {INDEX_DTYPE}, got {entries.dtype}")
+        if pts is not None and len(pts) != len(entries):
+            raise ValueError(f"Got {len(pts)} timestamps for {len(entries)} frames")
+        self.entries = entries
+        self.header = header
+        self.pts = pts
+
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, bytearray, memoryview]) -> "FrameIndex":
+        """
+        Wrap index bytes without copying them.
+
+        Parameters
+        ----------
+        data : bytes-like
+            The raw index file contents.
+
+        Returns
+        -------
+        FrameIndex
+            The index.
+
+        Raises
+        ------
+        ValueError
+            If data is not a valid index.
+        """
+        header = parse_index_header(data)
+        if header is not None:
+            view = memoryview(data)
+            blocks_start, blocks_end = header.block_range(0, header.block_count - 1)
+            entries = decode_blocks(header, view[blocks_start:blocks_end + 1])
+            pts = None
+            if header.has_pts:
+                pts_start = header.pts_range(0, 0)[0]
+                pts = np.frombuffer(view[pts_start:], dtype=PTS_DTYPE, count=header.frame_count)
+            return cls(entries, header, pts)
+        if len(data) % INDEX_DTYPE.itemsize:
+            raise ValueError(f"Index size {len(data)} is not a multiple of {INDEX_DTYPE.itemsize}")
+        return cls(np.frombuffer(data, dtype=INDEX_DTYPE))
+
+    @classmethod
+    def from_file(cls, index_path: str) -> "FrameIndex":
+        """
+        Memory-map a local version 1 index file, or decode a version 2 one.
+
+        Parameters
+        ----------
+        index_path : str
+            Path to the binary index file.
+
+        Returns
+        -------
+        FrameIndex
+            The index, backed by the page cache.
+
+        Raises
+        ------
+        ValueError
+            If the file is not a valid index.
+        """
+        with open(index_path, 'rb') as f:
+            if f.read(4) == INDEX_V2_MAGIC:
+                # Version 2 entries are delta-encoded and must be decoded
+                f.seek(0)
+                return cls.from_bytes(f.read())
+        size = os.path.getsize(index_path)
+        if size % INDEX_DTYPE.itemsize:
+            raise ValueError(f"Index size {size} is not a multiple of {INDEX_DTYPE.itemsize}")
+        if size == 0:
+            # mmap cannot map an empty file
+            return cls(np.empty(0, dtype=INDEX_DTYPE))
+        return cls(np.memmap(index_path, dtype=INDEX_DTYPE, mode='r'))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            offset, length = self.entries[key].tolist()
+            return offset, length
+        return self.entries[key]
+
+    @property
+    def offsets(self) -> np.ndarray:
+        """Frame byte offsets, as a view."""
+        return self.entries['offset']
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """Frame lengths in bytes, as a view."""
+        return self.entries['length']
+
+    @property
+    def nbytes(self) -> int:
+        return self.entries.nbytes
+
+    def entry(self, frame_num: int) -> Tuple[int, int]:
+        """
+        Look up the (offset, length) entry for a frame.
+
+        Parameters
+        ----------
+        frame_num : int
+            Frame number to look up.
+
+        Returns
+        -------
+        Tuple[int, int]
+            (offset, length) of the frame in bytes.
+
+        Raises
+        ------
+        RuntimeError
+            If the frame number is outside the index.
+        """
+        if not 0 <= frame_num < len(self):
+            raise FrameFetchError(f"Frame {frame_num} out of range for index of {len(self)} frames", 404)
+        return self[frame_num]
+
+    def _ticks(self, t: float) -> Fraction:
+        if self.pts is None:
+            raise FrameFetchError("Index has no timestamps; rebuild it as version 2", 422)
+        return time_to_ticks(self.header, t)
+
+    def frame_at_time(self, t: float) -> int:
+        """
+        Find the frame displayed at a time: the last frame whose timestamp
+        is at or before t. Works for variable frame rate streams.
+
+        Parameters
+        ----------
+        t : float
+            Time in seconds.
+
+        Returns
+        -------
+        int
+            Frame number.
+
+        Raises
+        ------
+        RuntimeError
+            If the index has no timestamps, or t is before the first frame.
+
+        Examples
+        --------
+        >>> data = pack_index_v2([(44, 1), (57, 1), (70, 1)], IndexHeader(0, timebase_num=1, timebase_den=10), [0, 5, 6])
+        >>> index = FrameIndex.from_bytes(data)
+        >>> index.frame_at_time(0.3), index.frame_at_time(0.5), index.frame_at_time(9)
+        (0, 1, 2)
+        """
+        frame_num = locate_ticks(self.pts, self._ticks(t))
+        if frame_num < 0:
+            raise FrameFetchError(f"No frame at time {t}", 404)
+        return frame_num
+
+    def frames_between(self, t0: float, t1: float) -> range:
+        """
+        Find the frames whose timestamps fall in [t0, t1).
+
+        Parameters
+        ----------
+        t0 : float
+            Start time in seconds, inclusive.
+        t1 : float
+            End time in seconds, exclusive.
+
+        Returns
+        -------
+        range
+            Frame numbers, possibly empty.
+
+        Raises
+        ------
+        RuntimeError
+            If the index has no timestamps.
+        """
+        first = np.searchsorted(self.pts, math.ceil(self._ticks(t0)), side='left')
+        last = np.searchsorted(self.pts, math.ceil(self._ticks(t1)), side='left')
+        return range(int(first), max(int(first), int(last)))
+
+    def entries_for(self, frame_nums: Sequence[int]) -> List[Tuple[int, int]]:
+        """
+        Look up the (offset, length) entries for a batch of frames at once.
+
+        Parameters
+        ----------
+        frame_nums : Sequence[int]
+            Frame numbers to look up.
+
+        Returns
+        -------
+        List[Tuple[int, int]]
+            (offset, length) for each of frame_nums, in the same order.
+
+        Raises
+        ------
+        RuntimeError
+            If any frame number is outside the index.
+        """
+        frame_nums = np.asarray(frame_nums, dtype=np.int64)
+        bad = (frame_nums < 0) | (frame_nums >= len(self))
+        if bad.any():
+            frame_num = int(frame_nums[bad][0])
+            raise FrameFetchError(f"Frame {frame_num} out of range for index of {len(self)} frames", 404)
+        return self.entries[frame_nums].tolist()
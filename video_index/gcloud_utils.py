@@ -1,28 +1,902 @@
 # video_index/gcloud_utils.py
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import StreamingResponse
-from typing import Optional
-import io
+import asyncio
+import os
+import re
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Dict, Literal, Optional, Tuple
 
-from .get_frame import get_frame_from_urls
+import anyio
+import httpx
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 
-app = FastAPI()
+from .async_get_frame import AsyncFrameClient
+from .catalog import Catalog, CatalogVideo
+from .clip import aiter_clip, aopen_clip, clip_frame_numbers
+from .coalesce import DEFAULT_MAX_GAP, pack_frame_record, parse_frame_list
+from .decode import MAX_IMAGE_SIZE, MEDIA_TYPES, DecoderBusy, DecoderPool, image_cache_key
+from .errors import FrameFetchError
+from .frame_cache import FrameCache
+from .gcs import is_gcs_url, parse_gcs_url
+from .index_cache import IndexCache, object_validator
+from .local_file import is_local_url, local_path
+from .metrics import CONTENT_TYPE, Counter, Gauge, Histogram, Registry
+from .prefetch import Prefetcher
+
+# Largest number of frames accepted by one /frames request.
+MAX_BATCH_FRAMES = 10000
+
+# Largest number of frames in one /clip response.
+MAX_CLIP_FRAMES = 100000
+
+# Size of the chunks a streamed frame is passed on in.
+STREAM_CHUNK_SIZE = 256 * 2**10
+
+# Paths reported separately in request metrics; others count as "other".
+METRIC_PATHS = ("/frame", "/frames", "/clip", "/stats", "/metrics")
+
+_client: Optional[AsyncFrameClient] = None
+_prefetcher: Optional[Prefetcher] = None
+_decoders: Optional[DecoderPool] = None
+_catalog: Optional[Catalog] = None
+
+registry = Registry()
+REQUESTS = Counter(
+    "video_index_http_requests_total", "HTTP responses by path and status code.", ["path", "status"], registry=registry
+)
+REQUEST_SECONDS = Histogram(
+    "video_index_http_request_duration_seconds",
+    "Time from receiving a request to sending the end of its response.",
+    ["path"],
+    registry=registry,
+)
+REQUESTS_IN_FLIGHT = Gauge("video_index_http_requests_in_flight", "Requests being handled.", ["path"], registry=registry)
+STAGE_SECONDS = Histogram(
+    "video_index_frame_stage_duration_seconds",
+    "Time /frame spends locating the frame (index), reading it (data), decoding it (decode) "
+    "and sending the response (send).",
+    ["stage"],
+    registry=registry,
+)
+UPSTREAM_REQUESTS = Counter(
+    "video_index_upstream_requests_total", "Requests made to upstream storage, retries included.", registry=registry
+)
+UPSTREAM_BYTES = Counter("video_index_upstream_bytes_total", "Bytes read from upstream storage.", registry=registry)
+UPSTREAM_IN_FLIGHT = Gauge(
+    "video_index_upstream_requests_in_flight", "Requests to upstream storage in progress.", registry=registry
+)
+SHARED_CALLS = Counter(
+    "video_index_shared_calls_total",
+    "Calls that joined an identical call in flight instead of making their own.",
+    ["component"],
+    registry=registry,
+)
+CACHE_HITS = Counter("video_index_cache_hits_total", "Cache lookups answered from the cache.", ["cache"], registry=registry)
+CACHE_MISSES = Counter("video_index_cache_misses_total", "Cache lookups that missed.", ["cache"], registry=registry)
+CACHE_HIT_RATIO = Gauge("video_index_cache_hit_ratio", "Fraction of cache lookups that hit.", ["cache"], registry=registry)
+CACHE_BYTES = Gauge("video_index_cache_bytes", "Bytes held by each cache.", ["cache"], registry=registry)
+PREFETCH_FRAMES = Counter(
+    "video_index_prefetch_frames_total",
+    "Frames read ahead (prefetched) and read ahead but dropped unused (wasted).",
+    ["outcome"],
+    registry=registry,
+)
+PREFETCH_ERRORS = Counter("video_index_prefetch_errors_total", "Read-aheads that failed.", registry=registry)
+PREFETCH_STREAMS = Gauge("video_index_prefetch_streams", "Viewer streams tracked by the read-ahead.", registry=registry)
+DECODER_WORKERS = Gauge("video_index_decoder_workers", "Running decoder worker processes.", registry=registry)
+DECODER_WAITING = Gauge("video_index_decoder_waiting", "Image requests waiting for a decoder worker.", registry=registry)
+
+
+def create_frame_client() -> AsyncFrameClient:
+    """
+    Build the server's upstream client from environment settings.
+
+    VIDEO_INDEX_INDEX_CACHE_BYTES
+        Byte budget for cached index files (default 256 MiB, 0 disables).
+    VIDEO_INDEX_INDEX_CACHE_TTL
+        Seconds before a cached index is revalidated (default 60).
+    VIDEO_INDEX_FRAME_CACHE_BYTES
+        Byte budget for cached frame payloads in memory (default 0, disabled).
+    VIDEO_INDEX_FRAME_CACHE_DIR
+        Directory for an on-disk frame cache shared between workers
+        (default unset, disabled).
+    VIDEO_INDEX_FRAME_CACHE_DISK_BYTES
+        Size cap for the on-disk frame cache (default 10 GiB).
+    """
+    index_cache_bytes = int(os.environ.get("VIDEO_INDEX_INDEX_CACHE_BYTES", 256 * 2**20))
+    index_cache = None
+    if index_cache_bytes > 0:
+        index_cache = IndexCache(
+            max_bytes=index_cache_bytes,
+            ttl=float(os.environ.get("VIDEO_INDEX_INDEX_CACHE_TTL", 60.0)),
+        )
+    frame_cache_bytes = int(os.environ.get("VIDEO_INDEX_FRAME_CACHE_BYTES", 0))
+    frame_cache_dir = os.environ.get("VIDEO_INDEX_FRAME_CACHE_DIR") or None
+    frame_cache = None
+    if frame_cache_bytes > 0 or frame_cache_dir:
+        frame_cache = FrameCache(
+            memory_bytes=frame_cache_bytes,
+            disk_dir=frame_cache_dir,
+            disk_bytes=int(os.environ.get("VIDEO_INDEX_FRAME_CACHE_DISK_BYTES", 10 * 2**30)),
+        )
+    return AsyncFrameClient(index_cache=index_cache, frame_cache=frame_cache)
+
+
+def stream_min_bytes() -> int:
+    """
+    Frames of at least VIDEO_INDEX_STREAM_MIN_BYTES (default 1 MiB) are
+    passed through from upstream in chunks by /frame instead of being read
+    whole, which keeps the memory a request holds bounded. Smaller frames
+    are read whole, so they can be cached and concurrent requests for the
+    same frame share one upstream read.
+    """
+    return int(os.environ.get("VIDEO_INDEX_STREAM_MIN_BYTES", 2**20))
+
+
+def get_frame_client() -> AsyncFrameClient:
+    """
+    Dependency returning the shared async client used to reach upstream storage.
+    """
+    global _client
+    if _client is None:
+        _client = create_frame_client()
+    return _client
+
+
+def get_prefetcher() -> Optional[Prefetcher]:
+    """
+    Dependency returning the shared read-ahead for sequential /frame
+    requests, or None if it is disabled.
+
+    VIDEO_INDEX_PREFETCH_FRAMES
+        Number of frames read ahead of a sequential viewer (default 8,
+        0 disables).
+    VIDEO_INDEX_PREFETCH_BYTES
+        Byte budget for read-ahead frames across all viewers
+        (default 64 MiB).
+    """
+    global _prefetcher
+    depth = int(os.environ.get("VIDEO_INDEX_PREFETCH_FRAMES", 8))
+    if depth <= 0:
+        return None
+    if _prefetcher is None:
+        _prefetcher = Prefetcher(
+            get_frame_client(),
+            depth=depth,
+            max_bytes=int(os.environ.get("VIDEO_INDEX_PREFETCH_BYTES", 64 * 2**20)),
+        )
+    return _prefetcher
+
+
+def get_decoder_pool() -> DecoderPool:
+    """
+    Dependency returning the shared pool of decoder workers for image
+    output from /frame. Workers are only started once an image is asked for.
+
+    VIDEO_INDEX_DECODER_WORKERS
+        Number of decoder worker processes (default the number of CPUs).
+    VIDEO_INDEX_DECODER_MAX_WAITING
+        Number of image requests allowed to wait for a worker before
+        further ones are refused with 503 (default 8 per worker).
+    VIDEO_INDEX_IMAGE_CACHE_BYTES
+        Byte budget for decoded images kept in memory (default 64 MiB,
+        0 disables).
+    """
+    global _decoders
+    if _decoders is None:
+        workers = int(os.environ.get("VIDEO_INDEX_DECODER_WORKERS", 0)) or None
+        max_waiting = os.environ.get("VIDEO_INDEX_DECODER_MAX_WAITING")
+        cache_bytes = int(os.environ.get("VIDEO_INDEX_IMAGE_CACHE_BYTES", 64 * 2**20))
+        _decoders = DecoderPool(
+            size=workers,
+            max_waiting=int(max_waiting) if max_waiting else None,
+            cache=FrameCache(memory_bytes=cache_bytes) if cache_bytes > 0 else None,
+        )
+    return _decoders
+
+
+def get_catalog() -> Optional[Catalog]:
+    """
+    Dependency returning the video catalog that /frame resolves video_id
+    against, or None if there is none.
+
+    VIDEO_INDEX_CATALOG
+        Path to a catalog written by ``video_index.catalog.build_catalog``
+        (default unset). It is memory-mapped once per process; restart the
+        server to pick up a rebuilt catalog.
+    """
+    global _catalog
+    path = os.environ.get("VIDEO_INDEX_CATALOG")
+    if not path:
+        return None
+    if _catalog is None or _catalog.path != path:
+        _catalog = Catalog(path)
+    return _catalog
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Stop read-ahead and decoders and release pooled upstream connections
+    global _client, _prefetcher, _decoders
+    prefetcher, _prefetcher = _prefetcher, None
+    if prefetcher is not None:
+        prefetcher.close()
+    decoders, _decoders = _decoders, None
+    if decoders is not None:
+        await decoders.aclose()
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+
+def collect_metrics() -> None:
+    """
+    Copy the counters of the shared client, read-ahead and decoder pool
+    into the metrics registry; components not started yet are skipped.
+    """
+    caches = {}
+    if _client is not None:
+        stats = _client.stats()
+        UPSTREAM_REQUESTS.set_total(stats["upstream_requests"])
+        UPSTREAM_BYTES.set_total(stats["upstream_bytes"])
+        UPSTREAM_IN_FLIGHT.set(stats["upstream_in_flight"])
+        SHARED_CALLS.set_total(stats["shared"], component="client")
+        caches["index"] = stats["index_cache"]
+        caches["frame"] = stats["frame_cache"]
+    if _prefetcher is not None:
+        stats = _prefetcher.stats()
+        PREFETCH_FRAMES.set_total(stats["prefetched"], outcome="prefetched")
+        PREFETCH_FRAMES.set_total(stats["wasted"], outcome="wasted")
+        PREFETCH_ERRORS.set_total(stats["errors"])
+        PREFETCH_STREAMS.set(stats["streams"])
+        caches["prefetch"] = stats
+    if _decoders is not None:
+        stats = _decoders.stats()
+        DECODER_WORKERS.set(stats["workers"])
+        DECODER_WAITING.set(stats["waiting"])
+        SHARED_CALLS.set_total(stats["shared"], component="decoder")
+        caches["image"] = stats["cache"]
+    for name, stats in caches.items():
+        if stats is None:
+            continue
+        hits, misses = stats["hits"], stats["misses"]
+        CACHE_HITS.set_total(hits, cache=name)
+        CACHE_MISSES.set_total(misses, cache=name)
+        CACHE_HIT_RATIO.set(hits / (hits + misses) if hits + misses else 0.0, cache=name)
+        nbytes = stats["bytes"] if "bytes" in stats else stats["memory_bytes"] + stats["disk_bytes"]
+        CACHE_BYTES.set(nbytes, cache=name)
+
+
+registry.add_collector(collect_metrics)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting requests and their status codes, timing them
+    and tracking how many are in flight, per path in METRIC_PATHS. For
+    /frame it also times the send stage, from the start of the response to
+    the end of its body.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"] if scope["path"] in METRIC_PATHS else "other"
+        start = time.perf_counter()
+        status = 500
+        sending = None
+
+        async def send_wrapper(message) -> None:
+            nonlocal status, sending
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                sending = time.perf_counter()
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc(path=path)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            end = time.perf_counter()
+            REQUESTS_IN_FLIGHT.dec(path=path)
+            REQUESTS.inc(path=path, status=status)
+            REQUEST_SECONDS.observe(end - start, path=path)
+            if path == "/frame" and sending is not None:
+                STAGE_SECONDS.observe(end - sending, stage="send")
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+
+def error_status(e: Exception) -> int:
+    """
+    HTTP status for a failure to serve a frame: 404 when the frame or
+    object does not exist, 422 when the request cannot be answered from the
+    video, 503 while decoders are busy, 504 when upstream timed out, 502
+    when upstream failed or returned inconsistent data, and 500 for
+    anything else.
+
+    Examples
+    --------
+    >>> error_status(FrameFetchError("Failed to fetch frame bytes: 416", 416))
+    404
+    >>> error_status(FrameFetchError("Failed to fetch frame bytes: 403", 403))
+    502
+    >>> error_status(FrameFetchError("Index has no timestamps", 422))
+    422
+    >>> error_status(ValueError("bad"))
+    500
+    """
+    if isinstance(e, DecoderBusy):
+        return 503
+    if isinstance(e, (httpx.TimeoutException, asyncio.TimeoutError)):
+        return 504
+    if isinstance(e, FrameFetchError):
+        if e.not_found:
+            return 404
+        # Upstream refusals (401, 403, ...) are the server's problem, not the client's
+        return 422 if e.status_code == 422 else 502
+    if isinstance(e, httpx.TransportError):
+        return 502
+    return 500
+
+
+def check_local_access(*urls: str) -> None:
+    """
+    Reject local file URLs unless they are inside VIDEO_INDEX_LOCAL_ROOT.
+
+    Serving local files is disabled unless VIDEO_INDEX_LOCAL_ROOT is set,
+    so a public server cannot be made to read arbitrary files.
+
+    Raises
+    ------
+    HTTPException
+        403 if any of urls is a local path outside the allowed root.
+    """
+    root = os.environ.get("VIDEO_INDEX_LOCAL_ROOT")
+    for url in urls:
+        if not is_local_url(url):
+            continue
+        if not root:
+            raise HTTPException(status_code=403, detail="Local files are not served")
+        try:
+            path = os.path.realpath(local_path(url))
+        except ValueError as e:
+            raise HTTPException(status_code=403, detail=str(e))
+        allowed = os.path.realpath(root)
+        if os.path.commonpath([path, allowed]) != allowed:
+            raise HTTPException(status_code=403, detail="Local file is outside the served root")
+
+
+def check_gcs_access(*urls: str) -> None:
+    """
+    Reject ``gs://`` URLs unless their bucket is in VIDEO_INDEX_GCS_BUCKETS.
+
+    Cloud Storage objects are read with the server's own credentials, so
+    without this a client could read any object the service account can,
+    private buckets included. VIDEO_INDEX_GCS_BUCKETS is a comma-separated
+    list of bucket names, or ``*`` for any bucket; unset, none are served.
+
+    Raises
+    ------
+    HTTPException
+        403 if any of urls is a ``gs://`` URL outside the allowed buckets.
+    """
+    allowed = {b.strip() for b in os.environ.get("VIDEO_INDEX_GCS_BUCKETS", "").split(",") if b.strip()}
+    for url in urls:
+        if not is_gcs_url(url):
+            continue
+        try:
+            bucket = parse_gcs_url(url)[0]
+        except ValueError as e:
+            raise HTTPException(status_code=403, detail=str(e))
+        if "*" not in allowed and bucket not in allowed:
+            raise HTTPException(status_code=403, detail=f"Bucket {bucket} is not served")
+
+
+def resolve_video(
+    video_url: Optional[str], index_url: Optional[str], video_id: Optional[str], catalog: Optional[Catalog]
+) -> Tuple[str, str, Optional[CatalogVideo]]:
+    """
+    Resolve the video a request names, either by video_url and index_url
+    or by video_id in the catalog.
+
+    URLs are checked with check_local_access and check_gcs_access. Catalog
+    videos are trusted, so they are served without VIDEO_INDEX_LOCAL_ROOT
+    or VIDEO_INDEX_GCS_BUCKETS; they are
+    returned with an empty index_url and their CatalogVideo, whose index
+    answers lookups instead of index_url.
+
+    Raises
+    ------
+    HTTPException
+        422 unless exactly one form is given or if there is no catalog,
+        404 for an unknown video_id, 403 for a local or ``gs://`` URL not
+        served.
+    """
+    if video_id is not None:
+        if video_url is not None or index_url is not None:
+            raise HTTPException(status_code=422, detail="Pass either video_id or video_url and index_url")
+        if catalog is None:
+            raise HTTPException(status_code=422, detail="No video catalog is loaded")
+        try:
+            video = catalog.video(video_id)
+        except FrameFetchError as e:
+            raise HTTPException(status_code=error_status(e), detail=str(e))
+        return video.video_url, "", video
+    if video_url is None or index_url is None:
+        raise HTTPException(status_code=422, detail="Pass video_url and index_url, or video_id")
+    check_local_access(video_url, index_url)
+    check_gcs_access(video_url, index_url)
+    return video_url, index_url, None
+
+
+class LocalFrameResponse(Response):
+    """
+    Response that sends a byte range of a local file without passing it
+    through Python when the server allows.
+
+    Servers implementing the ASGI zero-copy send extension
+    (``http.response.zerocopysend``) are handed the open file, offset and
+    count to send with sendfile(2). Otherwise the range is read in chunks
+    with ``os.pread`` in a worker thread.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file.
+    offset : int
+        First byte to send.
+    length : int
+        Number of bytes to send.
+    media_type : Optional[str], optional
+        Content type, by default None
+    status_code : int, optional
+        Response status, by default 200
+    headers : Optional[Dict[str, str]], optional
+        Extra response headers, by default None
+    """
+
+    chunk_size = 1 << 20
+
+    def __init__(
+        self,
+        path: str,
+        offset: int,
+        length: int,
+        media_type: Optional[str] = None,
+        status_code: int = 200,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers({**(headers or {}), "content-length": str(length)})
+
+    async def __call__(self, scope, receive, send) -> None:
+        with open(self.path, 'rb') as f:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f,
+                    "offset": self.offset,
+                    "count": self.length,
+                    "more_body": False,
+                })
+                return
+            offset, remaining = self.offset, self.length
+            while remaining:
+                chunk = await anyio.to_thread.run_sync(
+                    os.pread, f.fileno(), min(self.chunk_size, remaining), offset
+                )
+                if not chunk:
+                    break  # file truncated after the size check
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": bool(remaining)})
+            if remaining:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def frame_etag(validator: str, offset: int, length: int, variant: str = "") -> str:
+    """
+    Build the ETag of a frame from the version of its video object (see
+    ``AsyncFrameClient.object_validator``), its position in the file and,
+    for a decoded image, the image variant.
+
+    Examples
+    --------
+    >>> frame_etag("1700000000000000", 44, 10)
+    '"1700000000000000-2c-a"'
+    >>> frame_etag("1700000000000000", 44, 10, "png-320x0")
+    '"1700000000000000-2c-a-png-320x0"'
+    """
+    suffix = f"-{variant}" if variant else ""
+    return f'"{validator}-{offset:x}-{length:x}{suffix}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether an If-None-Match header matches etag, using the weak
+    comparison HTTP specifies for it.
+
+    Examples
+    --------
+    >>> etag_matches('"a", W/"b"', '"b"'), etag_matches('"a"', '"b"'), etag_matches('*', '"b"')
+    (True, False, True)
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    etag = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def parse_byte_range(value: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a Range header asking for part of a length byte payload.
+
+    Only a single byte range is honoured; a missing or malformed header, or
+    one asking for several ranges, yields None and the whole payload is
+    served, as HTTP allows.
+
+    Returns
+    -------
+    Optional[Tuple[int, int]]
+        Inclusive (start, end) of the range, or None.
+
+    Raises
+    ------
+    ValueError
+        If the range lies entirely past the end of the payload.
+
+    Examples
+    --------
+    >>> parse_byte_range("bytes=2-5", 10), parse_byte_range("bytes=8-", 10), parse_byte_range("bytes=-3", 10)
+    ((2, 5), (8, 9), (7, 9))
+    >>> parse_byte_range("bytes=0-1,4-5", 10) is None
+    True
+    """
+    match = re.fullmatch(r"\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*", value or "")
+    if match is None or not (match.group(1) or match.group(2)):
+        return None
+    if not match.group(1):
+        suffix = int(match.group(2))
+        if suffix == 0 or length == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(0, length - suffix), length - 1
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else None
+    if end is not None and end < start:
+        return None
+    if start >= length:
+        raise ValueError("Unsatisfiable range")
+    return start, length - 1 if end is None else min(end, length - 1)
+
+
+def caching_headers(etag: str) -> Dict[str, str]:
+    """
+    Response headers letting clients and CDNs cache a frame.
+
+    A frame ETag names one version of the video object, so the response
+    is marked immutable. VIDEO_INDEX_FRAME_MAX_AGE sets how many seconds
+    it may be cached (default one year); lower it if videos are
+    overwritten in place and served by URL without a generation.
+    """
+    max_age = int(os.environ.get("VIDEO_INDEX_FRAME_MAX_AGE", 365 * 24 * 3600))
+    return {"etag": etag, "cache-control": f"public, max-age={max_age}, immutable"}
+
+
+async def stream_frame_response(
+    client: AsyncFrameClient,
+    video_url: str,
+    frame_position: Tuple[int, int],
+    byte_range: Tuple[int, int],
+    status_code: int,
+    headers: Dict[str, str],
+) -> StreamingResponse:
+    """
+    Pass the inclusive byte_range of a frame at frame_position (offset,
+    length) in video_url through from upstream in STREAM_CHUNK_SIZE
+    chunks, so a large frame is never held in memory whole. The ETag and
+    caching headers are filled in from the upstream response's validator.
+
+    Raises
+    ------
+    RuntimeError
+        If the upstream read fails before any of the body is sent.
+    """
+    offset, length = frame_position[0] + byte_range[0], byte_range[1] - byte_range[0] + 1
+    stack = AsyncExitStack()
+    try:
+        resp = await stack.enter_async_context(client.open_range(video_url, offset, offset + length - 1))
+        if resp.status_code != 206:
+            raise FrameFetchError(f"Failed to fetch frame bytes: {resp.status_code}", resp.status_code)
+        if int(resp.headers.get("content-length", length)) != length:
+            raise FrameFetchError(f"Frame data size mismatch: expected {length} got {resp.headers['content-length']}")
+    except BaseException:
+        await stack.aclose()
+        raise
+    validator = object_validator(resp.headers)
+    client.object_validators.store(video_url, validator)
+    if validator is not None:
+        headers.update(caching_headers(frame_etag(validator, *frame_position)))
+
+    async def body():
+        async with stack:
+            sent = 0
+            async for chunk in resp.aiter_bytes(STREAM_CHUNK_SIZE):
+                sent += len(chunk)
+                yield chunk
+            if sent != length:
+                # Too late for an error status; fail the connection instead
+                raise RuntimeError(f"Frame data size mismatch: expected {length} got {sent}")
+
+    headers["content-length"] = str(length)
+    return StreamingResponse(body(), status_code=status_code, headers=headers, media_type="video/AV1")
 
 
 @app.get("/frame")
 async def serve_frame(
+    request: Request,
+    video_url: Optional[str] = Query(None, description="URL to the AV1 intra-only video file"),
+    index_url: Optional[str] = Query(None, description="URL to the binary frame index file"),
+    video_id: Optional[str] = Query(None, description="Id of the video in the catalog, instead of the URLs"),
+    frame: Optional[int] = Query(None, ge=0, description="Frame number to retrieve"),
+    t: Optional[float] = Query(None, ge=0, description="Time in seconds of the frame to retrieve"),
+    session: Optional[str] = Query(None, description="Viewer id for read-ahead, by default the client address"),
+    format: Literal["raw", "jpeg", "png"] = Query("raw", description="raw AV1, or an image decoded from it"),
+    width: Optional[int] = Query(None, ge=1, le=MAX_IMAGE_SIZE, description="Image width, by default kept"),
+    height: Optional[int] = Query(None, ge=1, le=MAX_IMAGE_SIZE, description="Image height, by default kept"),
+    client: AsyncFrameClient = Depends(get_frame_client),
+    prefetcher: Optional[Prefetcher] = Depends(get_prefetcher),
+    decoders: DecoderPool = Depends(get_decoder_pool),
+    catalog: Optional[Catalog] = Depends(get_catalog),
+):
+    """
+    Serve a single raw AV1 frame from video_url at the given frame number,
+    or the frame displayed at time t, using the binary index file at
+    index_url. Lookups by time need a version 2 index with timestamps.
+
+    Instead of the two URLs, a video can be named by its video_id in the
+    catalog (see get_catalog and resolve_video), which resolves the frame
+    from the memory-mapped catalog without reading an index from storage.
+
+    Local videos (``file://`` URLs or paths under VIDEO_INDEX_LOCAL_ROOT)
+    are sent straight from disk with a LocalFrameResponse. Remote frames
+    go through the read-ahead, so a viewer stepping through frames one by
+    one finds the next frames already fetched, and frames of at least
+    stream_min_bytes are passed through from upstream in chunks.
+    ``gs://`` URLs are only served from buckets listed in
+    VIDEO_INDEX_GCS_BUCKETS (see check_gcs_access).
+
+    Responses carry a Content-Length and, once the video's version is
+    known, an ETag and immutable Cache-Control (see caching_headers).
+    If-None-Match is answered with 304, and a single byte Range of the
+    frame (subject to If-Range) with 206.
+
+    With format jpeg or png the frame is decoded by the DecoderPool and
+    returned as an image, optionally resized to width and/or height
+    (keeping the aspect ratio if only one is given). Decoded images are
+    cached; 503 is returned while too many are waiting for a decoder.
+
+    Other failures are answered with the status chosen by error_status,
+    such as 404 for a frame past the end of the index.
+    """
+    if (frame is None) == (t is None):
+        raise HTTPException(status_code=422, detail="Pass exactly one of frame and t")
+    image = format != "raw"
+    if not image and (width or height):
+        raise HTTPException(status_code=422, detail="width and height need an image format")
+    variant = f"{format}-{width or 0}x{height or 0}" if image else ""
+    video_url, index_url, video = resolve_video(video_url, index_url, video_id, catalog)
+    local = is_local_url(video_url)
+    if session is None:
+        session = request.client.host if request.client else ""
+    data = None
+    try:
+        with STAGE_SECONDS.time(stage="index"):
+            if video is not None:
+                if frame is None:
+                    frame = video.frame_at_time(t)
+                offset, length = video.entry(frame)
+            else:
+                if frame is None:
+                    frame = await client.frame_at_time(index_url, t)
+                offset, length = await client.fetch_index_entry(index_url, frame)
+            validator = await client.object_validator(video_url)
+        if validator is not None:
+            etag = frame_etag(validator, offset, length, variant)
+            if etag_matches(request.headers.get("if-none-match"), etag):
+                # Answered without reading the frame
+                return Response(status_code=304, headers=caching_headers(etag))
+        if image:
+            key = image_cache_key(video_url, offset, length, format, width or 0, height or 0)
+            body = await decoders.cached(key)
+            if body is None:
+                with STAGE_SECONDS.time(stage="data"):
+                    if not local and prefetcher is not None:
+                        data = await prefetcher.take(video_url, index_url, frame, session, video)
+                    if data is None:
+                        data = await client.fetch_frame_data(video_url, offset, length)
+                with STAGE_SECONDS.time(stage="decode"):
+                    body = await decoders.decode(data, format, width or 0, height or 0, key=key)
+            if validator is None:
+                validator = await client.object_validator(video_url)
+            headers = caching_headers(frame_etag(validator, offset, length, variant)) if validator else {}
+            return Response(body, headers=headers, media_type=MEDIA_TYPES[format])
+        if local:
+            path = local_path(video_url)
+            size = os.path.getsize(path)
+            if offset + length > size:
+                raise FrameFetchError(f"Frame data size mismatch: expected {length} got {max(0, size - offset)}")
+        else:
+            with STAGE_SECONDS.time(stage="data"):
+                if prefetcher is not None:
+                    data = await prefetcher.take(video_url, index_url, frame, session, video)
+                if data is None:
+                    data = await client.cached_frame_data(video_url, offset, length)
+                if data is None and (length < stream_min_bytes() or is_gcs_url(video_url)):
+                    data = await client.fetch_frame_data(video_url, offset, length)
+                    if validator is None:
+                        # Learned from the read just made
+                        validator = await client.object_validator(video_url)
+    except Exception as e:
+        raise HTTPException(status_code=error_status(e), detail=str(e))
+
+    headers = {"accept-ranges": "bytes"}
+    etag = None
+    if validator is not None:
+        etag = frame_etag(validator, offset, length)
+        headers.update(caching_headers(etag))
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or (etag is not None and if_range.strip() == etag):
+        try:
+            byte_range = parse_byte_range(request.headers.get("range"), length)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{length}"})
+    status_code = 200
+    if byte_range is not None:
+        status_code = 206
+        headers["content-range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{length}"
+    else:
+        byte_range = (0, length - 1)
+    start, end = byte_range
+
+    if local:
+        return LocalFrameResponse(
+            path, offset + start, end - start + 1, media_type="video/AV1", status_code=status_code, headers=headers
+        )
+    if data is not None:
+        body = data if status_code == 200 else data[start:end + 1]
+        return Response(body, status_code=status_code, headers=headers, media_type="video/AV1")
+    try:
+        # Streaming reads upstream while sending, so only the wait for the
+        # upstream response counts as the data stage
+        with STAGE_SECONDS.time(stage="data"):
+            return await stream_frame_response(client, video_url, (offset, length), byte_range, status_code, headers)
+    except Exception as e:
+        raise HTTPException(status_code=error_status(e), detail=str(e))
+
+
+@app.get("/frames")
+async def serve_frames(
     video_url: str = Query(..., description="URL to the AV1 intra-only video file"),
     index_url: str = Query(..., description="URL to the binary frame index file"),
-    frame: int = Query(..., ge=0, description="Frame number to retrieve"),
+    frames: str = Query(..., description="Comma-separated frame numbers and ranges, e.g. 1,5,10-20"),
+    max_gap: int = Query(DEFAULT_MAX_GAP, ge=0, description="Largest gap in bytes merged into one Range read"),
+    client: AsyncFrameClient = Depends(get_frame_client),
 ):
     """
-    Serve a single raw AV1 frame from video_url at the given frame number,
-    using the binary index file at index_url.
+    Serve several raw AV1 frames in one response.
+
+    Nearby frames are fetched from video_url with shared, coalesced Range
+    reads. The body is a sequence of records, each a 16-byte header of two
+    little-endian uint64 (frame number, payload length) followed by the
+    payload, in ascending offset order with each distinct frame sent once.
+    See ``video_index.coalesce.iter_frame_records`` for a parser.
     """
     try:
-        frame_bytes = get_frame_from_urls(video_url, index_url, frame)
+        frame_nums = parse_frame_list(frames)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if len(frame_nums) > MAX_BATCH_FRAMES:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_BATCH_FRAMES} frames per request")
+    check_local_access(video_url, index_url)
+    check_gcs_access(video_url, index_url)
+
+    records = client.iter_frames(video_url, index_url, frame_nums, max_gap)
+    try:
+        # Fetch the index and first read up front so failures become an error status
+        first = await records.__anext__()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        await records.aclose()
+        raise HTTPException(status_code=error_status(e), detail=str(e))
+
+    async def body():
+        try:
+            frame_num, payload = first
+            yield pack_frame_record(frame_num, payload)
+            yield payload
+            async for frame_num, payload in records:
+                yield pack_frame_record(frame_num, payload)
+                yield payload
+        finally:
+            await records.aclose()
+
+    return StreamingResponse(body(), media_type="application/octet-stream")
+
 
-    return StreamingResponse(io.BytesIO(frame_bytes), media_type="video/AV1")
+@app.get("/clip")
+async def serve_clip(
+    video_url: Optional[str] = Query(None, description="URL to the AV1 intra-only IVF video file"),
+    index_url: Optional[str] = Query(None, description="URL to the binary frame index file"),
+    video_id: Optional[str] = Query(None, description="Id of the video in the catalog, instead of the URLs"),
+    start: int = Query(..., ge=0, description="First frame of the clip"),
+    end: int = Query(..., ge=0, description="Last frame of the clip, inclusive"),
+    step: int = Query(1, ge=1, description="Take every step-th frame"),
+    max_gap: int = Query(DEFAULT_MAX_GAP, ge=0, description="Largest gap in bytes merged into one Range read"),
+    client: AsyncFrameClient = Depends(get_frame_client),
+    catalog: Optional[Catalog] = Depends(get_catalog),
+):
+    """
+    Serve frames start to end (inclusive) of a video, every step-th
+    frame, as a playable IVF file, without re-encoding.
 
+    The clip's header is the source's with the frame count replaced, its
+    frames keep their source timestamps rebased to start at zero, and the
+    payloads are passed through from a single Range read of the source (or
+    one per group of frames more than max_gap apart) in chunks, so memory
+    use does not grow with the clip. See ``video_index.clip``.
+    """
+    try:
+        frame_count = len(clip_frame_numbers(start, end, step))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if frame_count > MAX_CLIP_FRAMES:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_CLIP_FRAMES} frames per clip")
+    video_url, index_url, video = resolve_video(video_url, index_url, video_id, catalog)
+    try:
+        clip = await aopen_clip(client, video_url, index_url, start, end, step, max_gap, index=video)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=error_status(e), detail=str(e))
+    headers = {
+        "content-length": str(clip.size),
+        "content-disposition": f'attachment; filename="clip_{start}_{end}.ivf"',
+    }
+    return StreamingResponse(aiter_clip(client, video_url, clip), headers=headers, media_type="video/x-ivf")
+
+
+@app.get("/stats")
+async def serve_stats(prefetcher: Optional[Prefetcher] = Depends(get_prefetcher)):
+    """
+    Report server counters as JSON, currently the read-ahead hit rate and
+    buffer usage (see ``Prefetcher.stats``).
+    """
+    return {"prefetch": prefetcher.stats() if prefetcher is not None else None}
+
+
+@app.get("/metrics")
+async def serve_metrics():
+    """
+    Report server metrics in the Prometheus text format: request counts,
+    latencies and in-flight requests per path; /frame latency per stage;
+    upstream requests and bytes; and the counters of the caches, read-ahead
+    and decoder pool.
+    """
+    return Response(registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,246 @@
+# video_index/gcs.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+from google.api_core import exceptions as gcs_exceptions
+from google.cloud import storage
+
+from .errors import FrameFetchError
+from .frame_index import FrameIndex
+from .index_cache import CachedIndex, IndexCache
+
+# Number of objects whose pinned generation is remembered.
+MAX_PINNED_OBJECTS = 4096
+
+
+def is_gcs_url(url: str) -> bool:
+    """
+    Whether url names a Cloud Storage object (``gs://bucket/object``).
+
+    Examples
+    --------
+    >>> is_gcs_url("gs://bucket/videos/v.ivf"), is_gcs_url("https://example.com/v.ivf")
+    (True, False)
+    """
+    return urlparse(url).scheme == "gs"
+
+
+def parse_gcs_url(url: str) -> Tuple[str, str, Optional[int]]:
+    """
+    Split a ``gs://bucket/object[#generation]`` URL.
+
+    Parameters
+    ----------
+    url : str
+        The URL. A ``#generation`` suffix, as printed by ``gsutil ls -a``,
+        pins a specific object generation.
+
+    Returns
+    -------
+    Tuple[str, str, Optional[int]]
+        (bucket, object name, generation or None).
+
+    Raises
+    ------
+    ValueError
+        If url is not a valid ``gs://`` object URL.
+
+    Examples
+    --------
+    >>> parse_gcs_url("gs://bucket/videos/v.ivf#1700000000000000")
+    ('bucket', 'videos/v.ivf', 1700000000000000)
+    """
+    parsed = urlparse(url)
+    name = parsed.path.lstrip("/")
+    if parsed.scheme != "gs" or not parsed.netloc or not name:
+        raise ValueError(f"Not a gs://bucket/object URL: {url}")
+    generation = int(parsed.fragment) if parsed.fragment else None
+    return parsed.netloc, name, generation
+
+
+class GcsBackend:
+    """
+    Reads frames and indexes from Cloud Storage with one long-lived
+    ``storage.Client``, whose authorized session pools connections and
+    works with private buckets using application default credentials.
+
+    Every object is pinned to the generation seen when it was first read,
+    and all reads of it ask for that generation until the pin is older than
+    ``ttl`` seconds. A video and the index it was cached with therefore stay
+    in step even if both are overwritten meanwhile; when a changed index
+    is downloaded, all pins are dropped so videos are re-pinned to match.
+    Indexes are downloaded whole into an IndexCache and revalidated by
+    generation.
+
+    Setting ``STORAGE_EMULATOR_HOST`` points the client at a local
+    emulator without credentials.
+
+    Parameters
+    ----------
+    client : Optional[storage.Client], optional
+        Client to use, by default one created on first use
+    index_cache : Optional[IndexCache], optional
+        Cache for downloaded indexes, by default a new IndexCache
+    ttl : float, optional
+        Seconds a pinned generation is trusted before it is looked up
+        again, by default the index cache's ttl
+    """
+
+    def __init__(
+        self,
+        client: Optional[storage.Client] = None,
+        index_cache: Optional[IndexCache] = None,
+        ttl: Optional[float] = None,
+    ) -> None:
+        self._client = client
+        self._client_lock = threading.Lock()
+        self.index_cache = index_cache if index_cache is not None else IndexCache()
+        self.ttl = self.index_cache.ttl if ttl is None else ttl
+        self._pins: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._pins_lock = threading.Lock()
+
+    @property
+    def client(self) -> storage.Client:
+        """The shared storage client, created on first use."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = storage.Client()
+        return self._client
+
+    def close(self) -> None:
+        """Close the client's pooled connections."""
+        if self._client is not None:
+            self._client.close()
+
+    def _blob(self, bucket: str, name: str, generation: Optional[int] = None) -> storage.Blob:
+        return self.client.bucket(bucket).blob(name, generation=generation)
+
+    def _pin(self, url: str, generation: int) -> None:
+        with self._pins_lock:
+            self._pins[url] = (generation, time.monotonic())
+            self._pins.move_to_end(url)
+            while len(self._pins) > MAX_PINNED_OBJECTS:
+                self._pins.popitem(last=False)
+
+    def _unpin(self, url: str) -> None:
+        with self._pins_lock:
+            self._pins.pop(url, None)
+
+    def generation(self, url: str, refresh: bool = False) -> int:
+        """
+        Return the generation reads of url are pinned to, looking up the
+        object's current generation if it is not pinned or the pin expired.
+
+        Parameters
+        ----------
+        url : str
+            ``gs://`` URL of the object.
+        refresh : bool, optional
+            Look up the current generation even if the pin is fresh,
+            by default False
+
+        Returns
+        -------
+        int
+            The object generation.
+
+        Raises
+        ------
+        RuntimeError
+            If the object does not exist or cannot be read.
+        """
+        bucket, name, generation = parse_gcs_url(url)
+        if generation is not None:
+            return generation
+        with self._pins_lock:
+            pin = self._pins.get(url)
+        if pin is not None and not refresh and time.monotonic() - pin[1] < self.ttl:
+            return pin[0]
+        try:
+            blob = self.client.bucket(bucket).get_blob(name)
+        except gcs_exceptions.GoogleAPICallError as e:
+            raise FrameFetchError(f"Failed to look up {url}: {e}", e.code) from e
+        if blob is None:
+            raise FrameFetchError(f"Object not found: {url}", 404)
+        self._pin(url, blob.generation)
+        return blob.generation
+
+    def download(self, url: str, start: Optional[int] = None, end: Optional[int] = None) -> bytes:
+        """
+        Download the inclusive byte range [start, end] of the pinned
+        generation of url, or the whole object.
+
+        Raises
+        ------
+        RuntimeError
+            If the pinned generation no longer exists or the read fails.
+            The pin is dropped, so a retry reads the current generation.
+        """
+        bucket, name, _ = parse_gcs_url(url)
+        generation = self.generation(url)
+        try:
+            return self._blob(bucket, name, generation).download_as_bytes(
+                start=start, end=end, checksum=None
+            )
+        except gcs_exceptions.RequestRangeNotSatisfiable:
+            return b""
+        except gcs_exceptions.GoogleAPICallError as e:
+            self._unpin(url)
+            raise FrameFetchError(f"Failed to read {url} generation {generation}: {e}", e.code) from e
+
+    def read_range(self, url: str, offset: int, length: int) -> bytes:
+        """
+        Read length bytes at offset from the pinned generation of url.
+        """
+        if length <= 0:
+            return b""
+        return self.download(url, offset, offset + length - 1)
+
+    def load_index(self, url: str, min_frames: int = 0) -> CachedIndex:
+        """
+        Load a whole index through the index cache.
+
+        A fresh cached index is returned as is. A stale one, or one with
+        fewer than min_frames entries, is revalidated by comparing
+        generations and only downloaded again if the object changed.
+
+        Parameters
+        ----------
+        url : str
+            ``gs://`` URL of the index.
+        min_frames : int, optional
+            Number of entries the caller needs, by default 0
+
+        Returns
+        -------
+        CachedIndex
+            The current index.
+
+        Raises
+        ------
+        RuntimeError
+            If the index cannot be read.
+        """
+        cache = self.index_cache
+        cached = cache.lookup(url, min_frames)
+        if cache.is_usable(cached, min_frames):
+            return cached
+        generation = self.generation(url, refresh=True)
+        if cached is not None and cached.generation == str(generation):
+            cache.mark_validated(cached)
+            return cached
+        if cached is not None:
+            # The index was replaced; re-pin videos so they match the new one
+            with self._pins_lock:
+                self._pins.clear()
+        return cache.store(url, CachedIndex(self.download(url), generation=str(generation)))
+
+    def open_index(self, url: str, min_frames: int = 0) -> FrameIndex:
+        """
+        Return the FrameIndex of a ``gs://`` index, see load_index.
+        """
+        return self.load_index(url, min_frames).index
@@ -1,9 +1,52 @@
 # video_index/get_frame.py
 import struct
-from typing import Optional, Tuple
+import threading
+from fractions import Fraction
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
 from urllib.parse import urlparse, parse_qs, unquote
 
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .coalesce import (
+    DEFAULT_MAX_GAP,
+    CoalescedRead,
+    plan_coalesced_reads,
+    split_coalesced_read,
+)
+from .errors import FrameFetchError
+from .frame_cache import FrameCache, frame_cache_key
+from .frame_index import (
+    INDEX_V2_HEADER_SIZE,
+    PTS_DTYPE,
+    IndexHeader,
+    decode_blocks,
+    locate_ticks,
+    parse_index_header,
+    time_to_ticks,
+)
+from .index_cache import (
+    CachedIndex,
+    IndexCache,
+    IndexFormats,
+    content_range_total,
+    is_unchanged,
+    remaining_chunks,
+    response_validators,
+    revalidation_headers,
+)
+from .gcs import GcsBackend, is_gcs_url
+from .local_file import is_local_url, local_path, open_local_index, read_local_range
+from .singleflight import SingleFlight
+from .tracing import traced
+
+# Upstream statuses worth retrying: rate limiting and transient server errors.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# (connect, read) timeout in seconds.
+DEFAULT_TIMEOUT = (3.05, 30.0)
 
 
 def parse_frame_from_url(url: str) -> Optional[int]:
@@ -43,7 +86,927 @@ def parse_frame_from_url(url: str) -> Optional[int]:
     return None
 
 
-def fetch_frame_index_entry(index_url: str, frame_num: int) -> Tuple[int, int]:
+def index_entry_range(frame_num: int) -> Tuple[int, int]:
+    """
+    Return the inclusive byte range of a frame's entry in the binary index.
+
+    Parameters
+    ----------
+    frame_num : int
+        Frame number to look up.
+
+    Returns
+    -------
+    Tuple[int, int]
+        (byte_start, byte_end) of the 16-byte entry.
+
+    Examples
+    --------
+    >>> index_entry_range(2)
+    (32, 47)
+    """
+    # Each entry is 16 bytes (2x uint64), so calculate range
+    byte_start = frame_num * 16
+    return byte_start, byte_start + 15
+
+
+def unpack_index_entry(data: bytes) -> Tuple[int, int]:
+    """
+    Unpack a 16-byte binary index entry.
+
+    Parameters
+    ----------
+    data : bytes
+        The raw entry bytes.
+
+    Returns
+    -------
+    Tuple[int, int]
+        (offset, length) of the frame in bytes.
+
+    Raises
+    ------
+    RuntimeError
+        If data is not exactly one entry long.
+
+    Examples
+    --------
+    >>> unpack_index_entry(struct.pack('<QQ', 44, 10))
+    (44, 10)
+    """
+    if len(data) != 16:
+        raise FrameFetchError(f"Index entry size mismatch: expected 16 got {len(data)}")
+    offset, length = struct.unpack('<QQ', data)
+    return offset, length
+
+
+def unpack_index_entries(data: bytes, first_frame: int, frame_nums: Sequence[int]) -> List[Tuple[int, int]]:
+    """
+    Unpack the entries for several frames from a contiguous slice of the index.
+
+    Parameters
+    ----------
+    data : bytes
+        Index bytes starting at the entry of first_frame.
+    first_frame : int
+        Frame number of the first entry in data.
+    frame_nums : Sequence[int]
+        Frame numbers to unpack.
+
+    Returns
+    -------
+    List[Tuple[int, int]]
+        (offset, length) for each of frame_nums, in the same order.
+
+    Raises
+    ------
+    RuntimeError
+        If a frame lies outside data.
+
+    Examples
+    --------
+    >>> data = struct.pack('<QQQQ', 44, 10, 66, 20)
+    >>> unpack_index_entries(data, 4, [5, 4])
+    [(66, 20), (44, 10)]
+    """
+    entries = []
+    for frame_num in frame_nums:
+        pos = (frame_num - first_frame) * 16
+        if pos < 0 or pos + 16 > len(data):
+            raise FrameFetchError(f"Frame {frame_num} is not in the fetched index range", 404)
+        entries.append(struct.unpack_from('<QQ', data, pos))
+    return entries
+
+
+def parse_index_probe(status_code: int, content: bytes) -> Optional[IndexHeader]:
+    """
+    Detect the index format from a read of its first INDEX_V2_HEADER_SIZE bytes.
+
+    Parameters
+    ----------
+    status_code : int
+        Status of the probe response.
+    content : bytes
+        Body of the probe response.
+
+    Returns
+    -------
+    Optional[IndexHeader]
+        The version 2 header, or None for a version 1 index.
+
+    Raises
+    ------
+    RuntimeError
+        If the probe failed or the header is invalid.
+
+    Examples
+    --------
+    >>> parse_index_probe(206, struct.pack('<QQ', 44, 10)) is None
+    True
+    """
+    if status_code == 416:
+        # An empty version 1 index has no satisfiable range
+        return None
+    if status_code not in (200, 206):
+        raise FrameFetchError(f"Failed to fetch index header: {status_code}", status_code)
+    try:
+        return parse_index_header(content[:INDEX_V2_HEADER_SIZE])
+    except ValueError as e:
+        raise RuntimeError(str(e)) from e
+
+
+def index_entries_range(header: Optional[IndexHeader], first_frame: int, last_frame: int) -> Tuple[int, int]:
+    """
+    Return the inclusive byte range of the index holding the entries of
+    frames first_frame..last_frame.
+
+    For a version 1 index (header None) this is the fixed-width entries
+    themselves; for version 2 it is the whole blocks containing them.
+
+    Parameters
+    ----------
+    header : Optional[IndexHeader]
+        The version 2 header, or None for version 1.
+    first_frame : int
+        Lowest frame number needed.
+    last_frame : int
+        Highest frame number needed.
+
+    Returns
+    -------
+    Tuple[int, int]
+        (byte_start, byte_end) to read.
+
+    Raises
+    ------
+    RuntimeError
+        If a frame is outside a version 2 index.
+
+    Examples
+    --------
+    >>> index_entries_range(None, 2, 3)
+    (32, 63)
+    >>> index_entries_range(IndexHeader(200, block_frames=64), 70, 130)
+    (328, 855)
+    """
+    if header is None:
+        return index_entry_range(first_frame)[0], index_entry_range(last_frame)[1]
+    if first_frame < 0 or last_frame >= header.frame_count:
+        bad = first_frame if first_frame < 0 else last_frame
+        raise FrameFetchError(f"Frame {bad} out of range for index of {header.frame_count} frames", 404)
+    return header.block_range(first_frame // header.block_frames, last_frame // header.block_frames)
+
+
+def decode_index_entries(
+    header: Optional[IndexHeader], data: bytes, first_frame: int, frame_nums: Sequence[int]
+) -> List[Tuple[int, int]]:
+    """
+    Decode the entries for several frames from a read of
+    ``index_entries_range(header, first_frame, max(frame_nums))``.
+
+    Parameters
+    ----------
+    header : Optional[IndexHeader]
+        The version 2 header, or None for version 1.
+    data : bytes
+        The bytes read.
+    first_frame : int
+        The first_frame the range was computed for.
+    frame_nums : Sequence[int]
+        Frame numbers to decode.
+
+    Returns
+    -------
+    List[Tuple[int, int]]
+        (offset, length) for each of frame_nums, in the same order.
+
+    Raises
+    ------
+    RuntimeError
+        If a frame lies outside data.
+    """
+    if header is None:
+        return unpack_index_entries(data, first_frame, frame_nums)
+    first_block = first_frame // header.block_frames
+    entries = decode_blocks(header, data, first_block)
+    base = first_block * header.block_frames
+    result = []
+    for frame_num in frame_nums:
+        pos = frame_num - base
+        if pos < 0 or pos >= len(entries):
+            raise FrameFetchError(f"Frame {frame_num} is not in the fetched index range", 404)
+        offset, length = entries[pos].tolist()
+        result.append((offset, length))
+    return result
+
+
+def index_time_ticks(header: Optional[IndexHeader], t: float) -> Fraction:
+    """
+    Convert a time in seconds to timebase units of an index with timestamps.
+
+    Raises
+    ------
+    RuntimeError
+        If the index has no timestamps or no frames.
+    """
+    if header is None or not header.has_pts:
+        raise FrameFetchError("Index has no timestamps; rebuild it as version 2", 422)
+    if not header.frame_count:
+        raise FrameFetchError(f"No frame at time {t}", 404)
+    return time_to_ticks(header, t)
+
+
+def locate_block(data: bytes, ticks: Fraction, t: float) -> int:
+    """
+    Find the block holding the frame at ticks from the per-block timestamp table.
+
+    Raises
+    ------
+    RuntimeError
+        If every block starts after ticks.
+    """
+    block = locate_ticks(np.frombuffer(data, dtype=PTS_DTYPE), ticks)
+    if block < 0:
+        raise FrameFetchError(f"No frame at time {t}", 404)
+    return block
+
+
+def locate_frame_in_block(header: IndexHeader, data: bytes, block: int, ticks: Fraction) -> int:
+    """
+    Find the frame at ticks from the timestamps of one block.
+
+    Examples
+    --------
+    >>> header = IndexHeader(3, block_frames=2, flags=1)
+    >>> locate_frame_in_block(header, np.array([10, 0], dtype=PTS_DTYPE).tobytes(), 1, Fraction(12))
+    2
+    """
+    first_frame = block * header.block_frames
+    count = min(header.block_frames, header.frame_count - first_frame)
+    pts = np.frombuffer(data, dtype=PTS_DTYPE, count=count)
+    return first_frame + max(locate_ticks(pts, ticks), 0)
+
+
+def check_frame_data(content: bytes, length: int) -> bytes:
+    """
+    Check that a fetched frame payload has the expected length.
+
+    Parameters
+    ----------
+    content : bytes
+        The fetched frame bytes.
+    length : int
+        Expected length in bytes.
+
+    Returns
+    -------
+    bytes
+        content, unchanged.
+
+    Raises
+    ------
+    RuntimeError
+        If the payload is incomplete.
+    """
+    if len(content) != length:
+        raise FrameFetchError(f"Frame data size mismatch: expected {length} got {len(content)}")
+    return content
+
+
+class FrameClient:
+    """
+    Reusable client for fetching frames over HTTP Range requests.
+
+    The client owns a single ``requests.Session`` whose connection pool keeps
+    TCP/TLS connections to the bucket alive between calls, so consecutive
+    frame fetches do not each pay a fresh handshake. Transient upstream
+    failures (429 and 5xx) are retried with exponential backoff, honouring
+    ``Retry-After`` when the server sends it.
+
+    ``file://`` URLs and plain paths are read straight from disk instead:
+    frame data with ``os.pread`` and indexes through a memory map.
+
+    Parameters
+    ----------
+    pool_connections : int, optional
+        Number of per-host connection pools to cache, by default 10
+    pool_maxsize : int, optional
+        Maximum number of connections kept alive per host, by default 32
+    timeout : float or Tuple[float, float], optional
+        Request timeout in seconds, either a single value or a
+        (connect, read) tuple, by default (3.05, 30.0)
+    max_retries : int, optional
+        Number of retries on connection errors and retryable statuses,
+        by default 3
+    backoff_factor : float, optional
+        Backoff factor between retries, by default 0.2
+    keep_alive : bool, optional
+        Keep connections open between requests, by default True
+    index_cache : Optional[IndexCache], optional
+        Cache of whole index files; when given, index entries are served
+        from the cached index instead of a Range read per frame,
+        by default None
+    frame_cache : Optional[FrameCache], optional
+        Cache of frame payloads consulted before reading from upstream,
+        by default None
+    gcs : Optional[GcsBackend], optional
+        Backend for ``gs://`` URLs, by default one created on first use
+        that shares index_cache
+
+    Notes
+    -----
+    Without an index cache, the first lookup in each index reads its first
+    64 bytes to tell version 1 indexes from version 2; the result is
+    remembered per index URL.
+
+    Concurrent calls needing the same index download, index entry or
+    frame payload share one upstream request rather than each making
+    their own, whether or not a cache is configured.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 32,
+        timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+        max_retries: int = 3,
+        backoff_factor: float = 0.2,
+        keep_alive: bool = True,
+        index_cache: Optional[IndexCache] = None,
+        frame_cache: Optional[FrameCache] = None,
+        gcs: Optional[GcsBackend] = None,
+    ) -> None:
+        self.timeout = timeout
+        self.index_cache = index_cache
+        self.frame_cache = frame_cache
+        self.index_formats = IndexFormats()
+        self._gcs = gcs
+        self._flights = SingleFlight()
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+
+    @property
+    def gcs(self) -> GcsBackend:
+        """Backend for ``gs://`` URLs, created on first use."""
+        if self._gcs is None:
+            self._gcs = GcsBackend(index_cache=self.index_cache)
+        return self._gcs
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        self.session.close()
+        if self._gcs is not None:
+            self._gcs.close()
+
+    def __enter__(self) -> "FrameClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def get_range(
+        self, url: str, byte_start: int, byte_end: int, headers: Optional[dict] = None, **kwargs
+    ) -> requests.Response:
+        """
+        Issue a GET for the inclusive byte range [byte_start, byte_end] of url.
+
+        Parameters
+        ----------
+        url : str
+            URL of the object to read.
+        byte_start : int
+            First byte to read.
+        byte_end : int
+            Last byte to read (inclusive).
+        headers : Optional[dict], optional
+            Extra request headers, by default None
+
+        Returns
+        -------
+        requests.Response
+            The upstream response.
+        """
+        headers = {**(headers or {}), 'Range': f'bytes={byte_start}-{byte_end}'}
+        return self.session.get(url, headers=headers, timeout=self.timeout, **kwargs)
+
+    def load_index(self, index_url: str, min_frames: int = 0) -> CachedIndex:
+        """
+        Load a whole index file through the client's index cache.
+
+        A fresh cached index is returned without contacting upstream. A stale
+        one, or one with fewer than min_frames entries (an index that may
+        have grown since, such as a live recording's), is revalidated with a
+        conditional request and only downloaded again if it changed. Large
+        indexes are downloaded in chunk_size Range requests pinned to the
+        first response's ETag.
+
+        Parameters
+        ----------
+        index_url : str
+            URL to the binary index file.
+        min_frames : int, optional
+            Number of entries the caller needs, by default 0
+
+        Returns
+        -------
+        CachedIndex
+            The current index.
+
+        Raises
+        ------
+        RuntimeError
+            If the client has no index cache, or the index cannot be fetched.
+        """
+        cache = self.index_cache
+        if cache is None:
+            raise RuntimeError("FrameClient has no index cache")
+        cached = cache.lookup(index_url, min_frames)
+        if cache.is_usable(cached, min_frames):
+            return cached
+        return self._flights.do(("index", index_url), lambda: self._load_index(index_url, cached))
+
+    @traced("video_index.load_index")
+    def _load_index(self, index_url: str, cached: Optional[CachedIndex]) -> CachedIndex:
+        cache = self.index_cache
+        resp = self.get_range(index_url, 0, cache.chunk_size - 1, headers=revalidation_headers(cached))
+        if resp.status_code == 304 or (resp.status_code in (200, 206) and is_unchanged(cached, resp.headers)):
+            cache.mark_validated(cached)
+            return cached
+        if resp.status_code == 200:
+            data = resp.content
+        elif resp.status_code == 206:
+            etag, _ = response_validators(resp.headers)
+            pin = {'If-Match': etag} if etag else None
+            total = content_range_total(resp.headers.get('Content-Range'))
+            if total is None:
+                raise RuntimeError("Index response is missing the object size")
+            chunks = [resp.content]
+            for byte_start, byte_end in remaining_chunks(len(resp.content), total, cache.chunk_size):
+                part = self.get_range(index_url, byte_start, byte_end, headers=pin)
+                if part.status_code != 206:
+                    raise FrameFetchError(f"Failed to fetch index range bytes: {part.status_code}", part.status_code)
+                chunks.append(part.content)
+            data = b''.join(chunks)
+        elif resp.status_code == 416:
+            # An empty index has no satisfiable range
+            data = b''
+        else:
+            raise FrameFetchError(f"Failed to fetch index: {resp.status_code}", resp.status_code)
+
+        etag, generation = response_validators(resp.headers)
+        return cache.store(index_url, CachedIndex(data, etag, generation))
+
+    def index_header(self, index_url: str) -> Optional[IndexHeader]:
+        """
+        Return the version 2 header of an index, or None for version 1,
+        probing upstream the first time index_url is seen.
+
+        Parameters
+        ----------
+        index_url : str
+            URL to the binary index file.
+
+        Returns
+        -------
+        Optional[IndexHeader]
+            The header, or None for a version 1 index.
+
+        Raises
+        ------
+        RuntimeError
+            If the probe fails.
+        """
+        if is_local_url(index_url):
+            return open_local_index(local_path(index_url)).header
+        if is_gcs_url(index_url):
+            return self.gcs.open_index(index_url).header
+        known, header = self.index_formats.lookup(index_url)
+        if not known:
+            header = self._flights.do(("probe", index_url), lambda: self._probe_index(index_url))
+        return header
+
+    def _probe_index(self, index_url: str) -> Optional[IndexHeader]:
+        resp = self.get_range(index_url, 0, INDEX_V2_HEADER_SIZE - 1)
+        header = parse_index_probe(resp.status_code, resp.content)
+        self.index_formats.store(index_url, header)
+        return header
+
+    def frame_count(self, index_url: str) -> int:
+        """
+        Return the number of frames in an index.
+
+        Version 2 indexes record it in their header; for version 1 it is
+        read from the index size with a one-byte Range request, unless the
+        index is cached or local.
+
+        Parameters
+        ----------
+        index_url : str
+            URL to the binary index file.
+
+        Returns
+        -------
+        int
+            Number of frames.
+
+        Raises
+        ------
+        RuntimeError
+            If the index cannot be fetched.
+        """
+        if is_local_url(index_url):
+            return len(open_local_index(local_path(index_url)))
+        if is_gcs_url(index_url):
+            return len(self.gcs.open_index(index_url))
+        if self.index_cache is not None:
+            return len(self.load_index(index_url))
+        header = self.index_header(index_url)
+        if header is not None:
+            return header.frame_count
+        resp = self.get_range(index_url, 0, 0)
+        if resp.status_code == 416:
+            # An empty index has no satisfiable range
+            return 0
+        if resp.status_code != 206:
+            raise FrameFetchError(f"Failed to fetch index range bytes: {resp.status_code}", resp.status_code)
+        total = content_range_total(resp.headers.get('Content-Range'))
+        if total is None:
+            raise RuntimeError("Index response is missing the object size")
+        return total // 16
+
+    @traced("video_index.fetch_index_entry")
+    def fetch_index_entry(self, index_url: str, frame_num: int) -> Tuple[int, int]:
+        """
+        Fetch the binary index entry (offset, length) for the given frame number.
+
+        Parameters
+        ----------
+        index_url : str
+            URL to the binary index file.
+        frame_num : int
+            Frame number to fetch.
+
+        Returns
+        -------
+        Tuple[int, int]
+            (offset, length) of the frame in bytes.
+
+        Raises
+        ------
+        RuntimeError
+            If unable to fetch or parse the index entry.
+        """
+        if is_local_url(index_url):
+            return open_local_index(local_path(index_url)).entry(frame_num)
+        return self._flights.do(
+            ("entry", index_url, frame_num), lambda: self._fetch_index_entry(index_url, frame_num)
+        )
+
+    def _fetch_index_entry(self, index_url: str, frame_num: int) -> Tuple[int, int]:
+        if is_gcs_url(index_url):
+            return self.gcs.open_index(index_url, frame_num + 1).entry(frame_num)
+        if self.index_cache is not None:
+            return self.load_index(index_url, frame_num + 1).entry(frame_num)
+
+        header = self.index_header(index_url)
+        byte_start, byte_end = index_entries_range(header, frame_num, frame_num)
+        resp = self.get_range(index_url, byte_start, byte_end)
+        if resp.status_code != 206:
+            raise FrameFetchError(f"Failed to fetch index range bytes: {resp.status_code}", resp.status_code)
+
+        if header is None:
+            return unpack_index_entry(resp.content)
+        return decode_index_entries(header, resp.content, frame_num, [frame_num])[0]
+
+    @traced("video_index.frame_at_time")
+    def frame_at_time(self, index_url: str, t: float) -> int:
+        """
+        Find the frame displayed at time t from a version 2 index with timestamps.
+
+        With an index cache the lookup is a binary search of the cached
+        index; without one it costs two small Range reads: the timestamp of
+        each block's first frame, then the timestamps of one block.
+
+        Parameters
+        ----------
+        index_url : str
+            URL to the binary index file.
+        t : float
+            Time in seconds.
+
+        Returns
+        -------
+        int
+            The last frame whose timestamp is at or before t.
+
+        Raises
+        ------
+        RuntimeError
+            If the index has no timestamps, t is before the first frame,
+            or the index cannot be fetched.
+        """
+        if is_local_url(index_url):
+            return open_local_index(local_path(index_url)).frame_at_time(t)
+        if is_gcs_url(index_url):
+            return self.gcs.open_index(index_url).frame_at_time(t)
+        if self.index_cache is not None:
+            return self.load_index(index_url).index.frame_at_time(t)
+
+        header = self.index_header(index_url)
+        ticks = index_time_ticks(header, t)
+        resp = self.get_range(index_url, *header.pts_table_range())
+        if resp.status_code != 206:
+            raise FrameFetchError(f"Failed to fetch index range bytes: {resp.status_code}", resp.status_code)
+        block = locate_block(resp.content, ticks, t)
+        resp = self.get_range(index_url, *header.pts_range(block, block))
+        if resp.status_code != 206:
+            raise FrameFetchError(f"Failed to fetch index range bytes: {resp.status_code}", resp.status_code)
+        return locate_frame_in_block(header, resp.content, block, ticks)
+
+    @traced("video_index.fetch_frame_data")
+    def fetch_frame_data(self, video_url: str, offset: int, length: int) -> bytes:
+        """
+        Fetch the frame bytes from the video using HTTP Range requests.
+
+        Parameters
+        ----------
+        video_url : str
+            URL to the video file.
+        offset : int
+            Byte offset where the frame starts.
+        length : int
+            Length in bytes of the frame.
+
+        Returns
+        -------
+        bytes
+            The raw frame bytes.
+
+        Raises
+        ------
+        RuntimeError
+            If the request fails or returns incomplete data.
+        """
+        if is_local_url(video_url):
+            return check_frame_data(read_local_range(local_path(video_url), offset, length), length)
+        key = frame_cache_key(video_url, offset, length)
+        if self.frame_cache is not None:
+            cached = self.frame_cache.get(key)
+            if cached is not None:
+                return cached
+        return self._flights.do(("frame",) + key, lambda: self._fetch_frame_data(video_url, offset, length))
+
+    def _fetch_frame_data(self, video_url: str, offset: int, length: int) -> bytes:
+        cache = self.frame_cache
+        if is_gcs_url(video_url):
+            content = check_frame_data(self.gcs.read_range(video_url, offset, length), length)
+        else:
+            resp = self.get_range(video_url, offset, offset + length - 1, stream=True)
+
+            if resp.status_code != 206:
+                raise FrameFetchError(f"Failed to fetch frame bytes: {resp.status_code}", resp.status_code)
+
+            content = check_frame_data(resp.content, length)
+        if cache is not None:
+            cache.put(frame_cache_key(video_url, offset, length), content)
+        return content
+
+    @traced("video_index.get_frame")
+    def get_frame(self, video_url: str, index_url: str, frame_num: int) -> bytes:
+        """
+        Get a frame's raw bytes from a video and its index URL.
+
+        Parameters
+        ----------
+        video_url : str
+            URL to the AV1 intra-only video file.
+        index_url : str
+            URL to the binary index file.
+        frame_num : int
+            The frame number to fetch.
+
+        Returns
+        -------
+        bytes
+            Raw frame bytes.
+        """
+        offset, length = self.fetch_index_entry(index_url, frame_num)
+        return self.fetch_frame_data(video_url, offset, length)
+
+    @traced("video_index.fetch_index_entries")
+    def fetch_index_entries(self, index_url: str, frame_nums: Sequence[int]) -> List[Tuple[int, int]]:
+        """
+        Fetch the index entries for several frames with a single Range read.
+
+        Parameters
+        ----------
+        index_url : str
+            URL to the binary index file.
+        frame_nums : Sequence[int]
+            Frame numbers to fetch.
+
+        Returns
+        -------
+        List[Tuple[int, int]]
+            (offset, length) for each of frame_nums, in the same order.
+
+        Raises
+        ------
+        RuntimeError
+            If unable to fetch or parse the index entries.
+        """
+        if not frame_nums:
+            return []
+        if is_local_url(index_url):
+            return open_local_index(local_path(index_url)).entries_for(frame_nums)
+        if is_gcs_url(index_url):
+            return self.gcs.open_index(index_url, max(frame_nums) + 1).entries_for(frame_nums)
+        if self.index_cache is not None:
+            cached = self.load_index(index_url, max(frame_nums) + 1)
+            return cached.index.entries_for(frame_nums)
+
+        header = self.index_header(index_url)
+        first, last = min(frame_nums), max(frame_nums)
+        resp = self.get_range(index_url, *index_entries_range(header, first, last))
+        if resp.status_code != 206:
+            raise FrameFetchError(f"Failed to fetch index range bytes: {resp.status_code}", resp.status_code)
+        return decode_index_entries(header, resp.content, first, frame_nums)
+
+    @traced("video_index.read_coalesced")
+    def read_coalesced(self, video_url: str, read: CoalescedRead) -> Dict[int, bytes]:
+        """
+        Fetch one planned coalesced read and split it into frames.
+
+        Frames read from a remote video are added to the frame cache.
+
+        Parameters
+        ----------
+        video_url : str
+            URL to the video file.
+        read : CoalescedRead
+            The planned read.
+
+        Returns
+        -------
+        Dict[int, bytes]
+            Raw frame bytes keyed by frame number.
+        """
+        if is_local_url(video_url):
+            return dict(split_coalesced_read(read, read_local_range(local_path(video_url), read.start, read.length)))
+        if is_gcs_url(video_url):
+            data = self.gcs.read_range(video_url, read.start, read.length)
+        else:
+            resp = self.get_range(video_url, read.start, read.start + read.length - 1)
+            if resp.status_code != 206:
+                raise FrameFetchError(f"Failed to fetch frame bytes: {resp.status_code}", resp.status_code)
+            data = resp.content
+        frames = dict(split_coalesced_read(read, data))
+        if self.frame_cache is not None:
+            for frame_num, offset, length in read.frames:
+                self.frame_cache.put(frame_cache_key(video_url, offset, length), frames[frame_num])
+        return frames
+
+    def iter_frames(
+        self,
+        video_url: str,
+        index_url: str,
+        frame_nums: Sequence[int],
+        max_gap: int = DEFAULT_MAX_GAP,
+    ) -> Iterator[Tuple[int, bytes]]:
+        """
+        Fetch several frames, coalescing nearby frames into shared Range reads.
+
+        Frames are yielded in ascending byte offset order and each distinct
+        frame number is yielded once. Only one coalesced read is held in
+        memory at a time.
+
+        Parameters
+        ----------
+        video_url : str
+            URL to the AV1 intra-only video file.
+        index_url : str
+            URL to the binary index file.
+        frame_nums : Sequence[int]
+            Frame numbers to fetch.
+        max_gap : int, optional
+            Largest number of unwanted bytes to read between two frames
+            rather than issuing a separate request, by default 1 MiB
+
+        Yields
+        ------
+        Tuple[int, bytes]
+            (frame_num, raw frame bytes).
+        """
+        entries = self.fetch_index_entries(index_url, frame_nums)
+        frames = sorted(
+            {(n, offset, length) for n, (offset, length) in zip(frame_nums, entries)},
+            key=lambda f: (f[1], f[0]),
+        )
+        cached: Dict[int, bytes] = {}
+        if self.frame_cache is not None:
+            for frame_num, offset, length in frames:
+                data = self.frame_cache.get(frame_cache_key(video_url, offset, length))
+                if data is not None:
+                    cached[frame_num] = data
+        reads = iter(plan_coalesced_reads([f for f in frames if f[0] not in cached], max_gap))
+
+        fetched: Dict[int, bytes] = {}
+        for frame_num, offset, length in frames:
+            if frame_num in cached:
+                yield frame_num, cached[frame_num]
+                continue
+            if frame_num not in fetched:
+                # Reads are planned in offset order, so the next one holds this frame
+                read = next(reads)
+                fetched = self.read_coalesced(video_url, read)
+            yield frame_num, fetched[frame_num]
+
+    def get_frames(
+        self,
+        video_url: str,
+        index_url: str,
+        frame_nums: Sequence[int],
+        max_gap: int = DEFAULT_MAX_GAP,
+    ) -> List[bytes]:
+        """
+        Fetch several frames, coalescing nearby frames into shared Range reads.
+
+        Parameters
+        ----------
+        video_url : str
+            URL to the AV1 intra-only video file.
+        index_url : str
+            URL to the binary index file.
+        frame_nums : Sequence[int]
+            Frame numbers to fetch.
+        max_gap : int, optional
+            Largest number of unwanted bytes to read between two frames
+            rather than issuing a separate request, by default 1 MiB
+
+        Returns
+        -------
+        List[bytes]
+            Raw frame bytes for each of frame_nums, in the same order.
+        """
+        frames = dict(self.iter_frames(video_url, index_url, frame_nums, max_gap))
+        return [frames[frame_num] for frame_num in frame_nums]
+
+
+_default_client: Optional[FrameClient] = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client() -> FrameClient:
+    """
+    Return the module-level FrameClient, creating it on first use.
+
+    Returns
+    -------
+    FrameClient
+        The shared client used by the module-level fetch functions.
+    """
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = FrameClient()
+    return _default_client
+
+
+def set_default_client(client: Optional[FrameClient]) -> None:
+    """
+    Replace the module-level FrameClient.
+
+    Parameters
+    ----------
+    client : Optional[FrameClient]
+        The client to use from now on, or None to lazily create a new
+        default client on next use.
+    """
+    global _default_client
+    with _default_client_lock:
+        _default_client = client
+
+
+def fetch_frame_index_entry(
+    index_url: str, frame_num: int, client: Optional[FrameClient] = None
+) -> Tuple[int, int]:
     """
     Fetch the binary index entry (offset, length) for the given frame number.
     
@@ -53,6 +1016,8 @@ def fetch_frame_index_entry(index_url: str, frame_num: int) -> Tuple[int, int]:
         URL to the binary index file.
     frame_num : int
         Frame number to fetch.
+    client : Optional[FrameClient], optional
+        Client to fetch with, by default the module-level client
         
     Returns
     -------
@@ -64,23 +1029,13 @@ def fetch_frame_index_entry(index_url: str, frame_num: int) -> Tuple[int, int]:
     RuntimeError
         If unable to fetch or parse the index entry.
     """
-    # Each entry is 16 bytes (2x uint64), so calculate range
-    byte_start = frame_num * 16
-    byte_end = byte_start + 15
-    
-    headers = {'Range': f'bytes={byte_start}-{byte_end}'}
-    resp = requests.get(index_url, headers=headers)
-    if resp.status_code != 206:
-        raise RuntimeError(f"Failed to fetch index range bytes: {resp.status_code}")
-    
-    if len(resp.content) != 16:
-        raise RuntimeError(f"Index entry size mismatch: expected 16 got {len(resp.content)}")
-    
-    offset, length = struct.unpack('<QQ', resp.content)
-    return offset, length
+    client = client or get_default_client()
+    return client.fetch_index_entry(index_url, frame_num)
 
 
-def fetch_frame_data(video_url: str, offset: int, length: int) -> bytes:
+def fetch_frame_data(
+    video_url: str, offset: int, length: int, client: Optional[FrameClient] = None
+) -> bytes:
     """
     Fetch the frame bytes from the video using HTTP Range requests.
     
@@ -92,6 +1047,8 @@ def fetch_frame_data(video_url: str, offset: int, length: int) -> bytes:
         Byte offset where the frame starts.
     length : int
         Length in bytes of the frame.
+    client : Optional[FrameClient], optional
+        Client to fetch with, by default the module-level client
         
     Returns
     -------
@@ -103,22 +1060,13 @@ def fetch_frame_data(video_url: str, offset: int, length: int) -> bytes:
     RuntimeError
         If the request fails or returns incomplete data.
     """
-    byte_start = offset
-    byte_end = offset + length - 1
-    headers = {'Range': f'bytes={byte_start}-{byte_end}'}
-    resp = requests.get(video_url, headers=headers, stream=True)
-    
-    if resp.status_code != 206:
-        raise RuntimeError(f"Failed to fetch frame bytes: {resp.status_code}")
-    
-    content = resp.content
-    if len(content) != length:
-        raise RuntimeError(f"Frame data size mismatch: expected {length} got {len(content)}")
-    
-    return content
+    client = client or get_default_client()
+    return client.fetch_frame_data(video_url, offset, length)
 
 
-def get_frame_from_urls(video_url: str, index_url: str, frame_num: int) -> bytes:
+def get_frame_from_urls(
+    video_url: str, index_url: str, frame_num: int, client: Optional[FrameClient] = None
+) -> bytes:
     """
     Get a frame's raw bytes from a video and its index URL.
    
@@ -137,13 +1085,51 @@ def get_frame_from_urls(video_url: str, index_url: str, frame_num: int) -> bytes
         URL to the binary index file.
     frame_num : int
         The frame number to fetch.
+    client : Optional[FrameClient], optional
+        Client to fetch with, by default the module-level client
         
     Returns
     -------
     bytes
         Raw frame bytes.
     """
-    offset, length = fetch_frame_index_entry(index_url, frame_num)
-    frame_bytes = fetch_frame_data(video_url, offset, length)
-    return frame_bytes
+    client = client or get_default_client()
+    return client.get_frame(video_url, index_url, frame_num)
 
+
+def get_frames_from_urls(
+    video_url: str,
+    index_url: str,
+    frame_nums: Sequence[int],
+    max_gap: int = DEFAULT_MAX_GAP,
+    client: Optional[FrameClient] = None,
+) -> List[bytes]:
+    """
+    Get several frames' raw bytes from a video and its index URL.
+
+    The index entries are read with one Range request, and frames that are
+    adjacent or within max_gap bytes of each other share a video Range read.
+
+    frames = get_frames_from_urls(video_url, index_url, range(100, 200))
+
+    Parameters
+    ----------
+    video_url : str
+        URL to the AV1 intra-only video file.
+    index_url : str
+        URL to the binary index file.
+    frame_nums : Sequence[int]
+        The frame numbers to fetch.
+    max_gap : int, optional
+        Largest number of unwanted bytes to read between two frames rather
+        than issuing a separate request, by default 1 MiB
+    client : Optional[FrameClient], optional
+        Client to fetch with, by default the module-level client
+
+    Returns
+    -------
+    List[bytes]
+        Raw frame bytes for each of frame_nums, in the same order.
+    """
+    client = client or get_default_client()
+    return client.get_frames(video_url, index_url, list(frame_nums), max_gap)
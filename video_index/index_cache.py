@@ -0,0 +1,362 @@
+# video_index/index_cache.py
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, Mapping, Optional, Tuple
+
+from .frame_index import FrameIndex, IndexHeader
+
+
+class CachedIndex:
+    """
+    A whole binary index file held in memory, parsed as a FrameIndex, with
+    the validators needed to revalidate it against upstream.
+
+    Parameters
+    ----------
+    data : bytes
+        The raw index file contents.
+    etag : Optional[str]
+        The ETag the object was served with, if any.
+    generation : Optional[str]
+        The GCS object generation (``x-goog-generation``), if any.
+    """
+
+    def __init__(self, data: bytes, etag: Optional[str] = None, generation: Optional[str] = None) -> None:
+        self.data = data
+        self.index = FrameIndex.from_bytes(data)
+        self.etag = etag
+        self.generation = generation
+        self.validated_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def nbytes(self) -> int:
+        if self.index.header is not None:
+            # Version 2 entries are decoded into a separate array
+            return len(self.data) + self.index.nbytes
+        return len(self.data)
+
+    def entry(self, frame_num: int) -> Tuple[int, int]:
+        """
+        Look up the (offset, length) entry for a frame.
+
+        Parameters
+        ----------
+        frame_num : int
+            Frame number to look up.
+
+        Returns
+        -------
+        Tuple[int, int]
+            (offset, length) of the frame in bytes.
+
+        Raises
+        ------
+        RuntimeError
+            If the frame number is outside the index.
+
+        Examples
+        --------
+        >>> CachedIndex(struct.pack('<QQQQ', 44, 10, 66, 20)).entry(1)
+        (66, 20)
+        """
+        return self.index.entry(frame_num)
+
+
+class IndexCache:
+    """
+    Byte-bounded LRU cache of whole index files, keyed by index URL.
+
+    Entries older than ``ttl`` seconds are stale and must be revalidated
+    upstream (by ETag or object generation) before they are trusted again.
+    The cache is safe to share between threads. Lookups that find a fresh,
+    long enough entry, answered without contacting upstream, count as hits
+    and the rest (downloads and revalidations) as misses.
+
+    Parameters
+    ----------
+    max_bytes : int, optional
+        Total size of cached index data, by default 256 MiB
+    ttl : float, optional
+        Seconds an entry is trusted before revalidation, by default 60
+    chunk_size : int, optional
+        Size of each Range request used to download a large index,
+        by default 8 MiB
+    """
+
+    def __init__(self, max_bytes: int = 256 * 2**20, ttl: float = 60.0, chunk_size: int = 8 * 2**20) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.chunk_size = chunk_size
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, CachedIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, index_url: str, min_frames: int = 0) -> Optional[CachedIndex]:
+        """
+        Return the cached index for index_url, fresh or stale, or None.
+
+        The lookup counts as a hit if the entry is usable as it is (see
+        is_usable) and a miss otherwise.
+        """
+        with self._lock:
+            cached = self._entries.get(index_url)
+            if cached is not None:
+                self._entries.move_to_end(index_url)
+            if self.is_usable(cached, min_frames):
+                self.hits += 1
+            else:
+                self.misses += 1
+            return cached
+
+    def is_fresh(self, cached: CachedIndex) -> bool:
+        """
+        Whether cached can be used without revalidating it upstream.
+        """
+        return time.monotonic() - cached.validated_at < self.ttl
+
+    def is_usable(self, cached: Optional[CachedIndex], min_frames: int = 0) -> bool:
+        """
+        Whether cached is fresh and has at least min_frames entries, so it
+        can be used without contacting upstream.
+        """
+        return cached is not None and self.is_fresh(cached) and len(cached) >= min_frames
+
+    def mark_validated(self, cached: CachedIndex) -> None:
+        """
+        Record that upstream confirmed cached is still current.
+        """
+        cached.validated_at = time.monotonic()
+
+    def store(self, index_url: str, cached: CachedIndex) -> CachedIndex:
+        """
+        Insert or replace the index for index_url, evicting least recently
+        used entries to stay within max_bytes.
+
+        Indexes larger than max_bytes are returned without being cached.
+        """
+        if cached.nbytes > self.max_bytes:
+            return cached
+        with self._lock:
+            old = self._entries.pop(index_url, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._entries[index_url] = cached
+            self.nbytes += cached.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        return cached
+
+    def invalidate(self, index_url: str) -> None:
+        """
+        Drop index_url from the cache.
+        """
+        with self._lock:
+            old = self._entries.pop(index_url, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return hit/miss counters and the cache's size.
+
+        Returns
+        -------
+        Dict[str, int]
+            hits, misses, bytes and entries.
+        """
+        return {"hits": self.hits, "misses": self.misses, "bytes": self.nbytes, "entries": len(self._entries)}
+
+
+class IndexFormats:
+    """
+    Bounded LRU memo of the format of each index URL, so the header probe
+    that tells version 1 from version 2 indexes is made once per index
+    rather than once per lookup. Safe to share between threads.
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        Number of index URLs remembered, by default 4096
+
+    Examples
+    --------
+    >>> formats = IndexFormats()
+    >>> formats.lookup("http://i")
+    (False, None)
+    >>> formats.store("http://i", None)
+    >>> formats.lookup("http://i")
+    (True, None)
+    """
+
+    def __init__(self, max_entries: int = 4096) -> None:
+        self.max_entries = max_entries
+        self._headers: "OrderedDict[str, Optional[IndexHeader]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, index_url: str) -> Tuple[bool, Optional[IndexHeader]]:
+        """
+        Return (known, header); header is None for a version 1 index.
+        """
+        with self._lock:
+            if index_url not in self._headers:
+                return False, None
+            self._headers.move_to_end(index_url)
+            return True, self._headers[index_url]
+
+    def store(self, index_url: str, header: Optional[IndexHeader]) -> None:
+        """
+        Remember the header of index_url, or None for a version 1 index.
+        """
+        with self._lock:
+            self._headers[index_url] = header
+            self._headers.move_to_end(index_url)
+            while len(self._headers) > self.max_entries:
+                self._headers.popitem(last=False)
+
+
+class ObjectValidators:
+    """
+    Bounded LRU memo of the last validator seen for each object URL (see
+    object_validator), so responses built from cached bytes can carry the
+    same ETag as ones read from upstream. Safe to share between threads.
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        Number of object URLs remembered, by default 4096
+
+    Examples
+    --------
+    >>> validators = ObjectValidators()
+    >>> validators.store("http://v", "1700000000000000")
+    >>> validators.lookup("http://v"), validators.lookup("http://w")
+    ('1700000000000000', None)
+    """
+
+    def __init__(self, max_entries: int = 4096) -> None:
+        self.max_entries = max_entries
+        self._validators: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, url: str) -> Optional[str]:
+        """
+        Return the last validator stored for url, if any.
+        """
+        with self._lock:
+            validator = self._validators.get(url)
+            if validator is not None:
+                self._validators.move_to_end(url)
+            return validator
+
+    def store(self, url: str, validator: Optional[str]) -> None:
+        """
+        Remember the validator of url; None is ignored.
+        """
+        if validator is None:
+            return
+        with self._lock:
+            self._validators[url] = validator
+            self._validators.move_to_end(url)
+            while len(self._validators) > self.max_entries:
+                self._validators.popitem(last=False)
+
+
+def response_validators(headers: Mapping[str, str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Extract the (etag, generation) validators from upstream response headers.
+
+    Parameters
+    ----------
+    headers : Mapping[str, str]
+        Case-insensitive response headers.
+
+    Returns
+    -------
+    Tuple[Optional[str], Optional[str]]
+        The ETag and ``x-goog-generation`` header values, if present.
+    """
+    return headers.get('ETag'), headers.get('x-goog-generation')
+
+
+def object_validator(headers: Mapping[str, str]) -> Optional[str]:
+    """
+    Return a string identifying the version of the object a response came
+    from: its ``x-goog-generation`` if present, otherwise its ETag without
+    quotes or weakness prefix.
+
+    Examples
+    --------
+    >>> object_validator({'ETag': 'W/"abc"'})
+    'abc'
+    >>> object_validator({'ETag': '"abc"', 'x-goog-generation': '17'})
+    '17'
+    """
+    etag, generation = response_validators(headers)
+    if generation is not None:
+        return generation
+    if etag is None:
+        return None
+    return etag.removeprefix('W/').strip('"') or None
+
+
+def revalidation_headers(cached: Optional[CachedIndex]) -> dict:
+    """
+    Conditional request headers for revalidating cached, if it has an ETag.
+    """
+    if cached is not None and cached.etag:
+        return {'If-None-Match': cached.etag}
+    return {}
+
+
+def is_unchanged(cached: Optional[CachedIndex], headers: Mapping[str, str]) -> bool:
+    """
+    Whether a full response with the given headers describes the same object
+    generation as cached, for upstreams that ignore If-None-Match.
+    """
+    if cached is None:
+        return False
+    etag, generation = response_validators(headers)
+    if generation is not None and cached.generation is not None:
+        return generation == cached.generation
+    return etag is not None and etag == cached.etag
+
+
+def content_range_total(value: Optional[str]) -> Optional[int]:
+    """
+    Parse the complete object size from a Content-Range header.
+
+    Examples
+    --------
+    >>> content_range_total('bytes 0-15/4096')
+    4096
+    >>> content_range_total('bytes 0-15/*') is None
+    True
+    """
+    if not value or '/' not in value:
+        return None
+    total = value.rsplit('/', 1)[1]
+    return int(total) if total.isdigit() else None
+
+
+def remaining_chunks(start: int, total: int, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    """
+    Yield inclusive (byte_start, byte_end) ranges covering [start, total).
+
+    Examples
+    --------
+    >>> list(remaining_chunks(4, 10, 4))
+    [(4, 7), (8, 9)]
+    """
+    for byte_start in range(start, total, chunk_size):
+        yield byte_start, min(byte_start + chunk_size, total) - 1
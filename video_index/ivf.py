@@ -0,0 +1,175 @@
+# video_index/ivf.py
+import struct
+from typing import BinaryIO, NamedTuple, Sequence
+
+IVF_SIGNATURE = b'DKIF'
+
+# IVF file header, 32 bytes:
+# signature, version, header size, fourcc, width, height,
+# timebase denominator, timebase numerator, frame count, unused
+IVF_HEADER = struct.Struct('<4sHH4sHHIII4x')
+IVF_HEADER_SIZE = IVF_HEADER.size
+
+# IVF frame header, 12 bytes: payload size, presentation timestamp
+IVF_FRAME_HEADER = struct.Struct('<IQ')
+IVF_FRAME_HEADER_SIZE = IVF_FRAME_HEADER.size
+
+# Byte offset of the frame count field within the file header
+IVF_FRAME_COUNT_OFFSET = 24
+
+
+class IvfHeader(NamedTuple):
+    """
+    Fields of the 32-byte IVF file header.
+
+    Timestamps in frame headers are in units of
+    timebase_num / timebase_den seconds.
+    """
+    fourcc: bytes
+    width: int
+    height: int
+    timebase_den: int
+    timebase_num: int
+    frame_count: int
+    version: int = 0
+
+
+def parse_ivf_header(data: bytes) -> IvfHeader:
+    """
+    Parse the 32-byte IVF file header.
+
+    Parameters
+    ----------
+    data : bytes
+        At least the first 32 bytes of the file.
+
+    Returns
+    -------
+    IvfHeader
+        The parsed header.
+
+    Raises
+    ------
+    ValueError
+        If data does not start with a valid IVF header.
+
+    Examples
+    --------
+    >>> header = IvfHeader(b'AV01', 640, 480, 30, 1, 2)
+    >>> parse_ivf_header(pack_ivf_header(header)) == header
+    True
+    """
+    if len(data) < IVF_HEADER_SIZE or data[0:4] != IVF_SIGNATURE:
+        raise ValueError("Not a valid IVF file")
+    (_, version, header_size, fourcc, width, height,
+     timebase_den, timebase_num, frame_count) = IVF_HEADER.unpack_from(data)
+    if header_size != IVF_HEADER_SIZE:
+        raise ValueError(f"Unsupported IVF header size {header_size}")
+    return IvfHeader(fourcc, width, height, timebase_den, timebase_num, frame_count, version)
+
+
+def pack_ivf_header(header: IvfHeader) -> bytes:
+    """
+    Serialize an IVF file header.
+
+    Parameters
+    ----------
+    header : IvfHeader
+        The header fields.
+
+    Returns
+    -------
+    bytes
+        The 32-byte header.
+    """
+    return IVF_HEADER.pack(
+        IVF_SIGNATURE, header.version, IVF_HEADER_SIZE, header.fourcc,
+        header.width, header.height, header.timebase_den, header.timebase_num,
+        header.frame_count,
+    )
+
+
+def pack_ivf_frame_header(frame_size: int, pts: int) -> bytes:
+    """
+    Serialize a 12-byte IVF frame header.
+
+    Examples
+    --------
+    >>> pack_ivf_frame_header(10, 1)
+    b'\\n\\x00\\x00\\x00\\x01\\x00\\x00\\x00\\x00\\x00\\x00\\x00'
+    """
+    return IVF_FRAME_HEADER.pack(frame_size, pts)
+
+
+def _copy_exact(src: BinaryIO, dst: BinaryIO, size: int, buffer_size: int = 1 << 20) -> None:
+    while size:
+        chunk = src.read(min(size, buffer_size))
+        if not chunk:
+            raise ValueError("IVF file ended inside a frame")
+        dst.write(chunk)
+        size -= len(chunk)
+
+
+def concat_ivf_files(segment_paths: Sequence[str], output_path: str) -> int:
+    """
+    Concatenate IVF files of the same stream into one IVF file.
+
+    The output header is the first segment's header with the frame count
+    fixed up. Frame payloads are copied unchanged and timestamps are rebased
+    so they continue across segment boundaries, so the result has the same
+    structure as a single encode of the whole stream.
+
+    Parameters
+    ----------
+    segment_paths : Sequence[str]
+        IVF files to join, in order.
+    output_path : str
+        Path to write the joined IVF file.
+
+    Returns
+    -------
+    int
+        Number of frames written.
+
+    Raises
+    ------
+    ValueError
+        If a segment is not a valid IVF file or its stream parameters differ
+        from the first segment's.
+    """
+    frame_count = 0
+    header = None
+    pts_base = 0
+    with open(output_path, 'wb') as out:
+        out.write(b'\x00' * IVF_HEADER_SIZE)
+        for path in segment_paths:
+            with open(path, 'rb') as f:
+                segment_header = parse_ivf_header(f.read(IVF_HEADER_SIZE))
+                if header is None:
+                    header = segment_header
+                elif segment_header[:5] != header[:5]:
+                    raise ValueError(f"IVF segment {path} does not match the first segment's stream")
+
+                first_pts = last_pts = None
+                frame_duration = 1
+                while True:
+                    frame_header = f.read(IVF_FRAME_HEADER_SIZE)
+                    if len(frame_header) < IVF_FRAME_HEADER_SIZE:
+                        break  # EOF
+                    frame_size, pts = IVF_FRAME_HEADER.unpack(frame_header)
+                    if first_pts is None:
+                        first_pts = pts
+                    else:
+                        frame_duration = pts - last_pts
+                    last_pts = pts
+                    out.write(pack_ivf_frame_header(frame_size, pts - first_pts + pts_base))
+                    _copy_exact(f, out, frame_size)
+                    frame_count += 1
+                if last_pts is not None:
+                    pts_base += last_pts - first_pts + frame_duration
+
+        if header is None:
+            raise ValueError("No IVF segments to concatenate")
+        out.seek(0)
+        out.write(pack_ivf_header(header._replace(frame_count=frame_count)))
+    return frame_count
@@ -0,0 +1,130 @@
+# video_index/local_file.py
+import os
+import threading
+from collections import OrderedDict
+from typing import Tuple
+from urllib.parse import unquote, urlparse
+
+from .errors import FrameFetchError
+from .frame_index import FrameIndex
+
+# Number of memory-mapped local indexes kept open.
+MAX_OPEN_INDEXES = 128
+
+_indexes: "OrderedDict[str, Tuple[Tuple[int, int], FrameIndex]]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def is_local_url(url: str) -> bool:
+    """
+    Whether url names a local file: a ``file://`` URL or a plain path.
+
+    Examples
+    --------
+    >>> is_local_url("file:///data/video.ivf"), is_local_url("/data/video.ivf")
+    (True, True)
+    >>> is_local_url("https://storage.googleapis.com/bucket/video.ivf")
+    False
+    """
+    return urlparse(url).scheme in ("", "file")
+
+
+def local_path(url: str) -> str:
+    """
+    Return the filesystem path of a ``file://`` URL or plain path.
+
+    Raises
+    ------
+    ValueError
+        If a ``file://`` URL names a remote host.
+
+    Examples
+    --------
+    >>> local_path("file:///data/my%20video.ivf")
+    '/data/my video.ivf'
+    >>> local_path("/data/video.ivf")
+    '/data/video.ivf'
+    """
+    parsed = urlparse(url)
+    if parsed.scheme != "file":
+        return url
+    if parsed.netloc not in ("", "localhost"):
+        raise ValueError(f"Not a local file URL: {url}")
+    return unquote(parsed.path)
+
+
+def read_local_range(path: str, offset: int, length: int) -> bytes:
+    """
+    Read length bytes at offset with a single ``pread``, without moving a
+    shared file position, so concurrent readers need no locking.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file.
+    offset : int
+        First byte to read.
+    length : int
+        Number of bytes to read.
+
+    Returns
+    -------
+    bytes
+        The bytes read; shorter than length only at end of file.
+
+    Raises
+    ------
+    RuntimeError
+        If the file cannot be read.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError as e:
+        raise FrameFetchError(f"Failed to open {path}: {e}", 404 if isinstance(e, FileNotFoundError) else None) from e
+    try:
+        return os.pread(fd, length, offset)
+    finally:
+        os.close(fd)
+
+
+def open_local_index(path: str) -> FrameIndex:
+    """
+    Return the FrameIndex of a local index file, memory-mapped once and
+    reused while the file's size and modification time are unchanged, so
+    an index that is still being appended to is re-mapped as it grows.
+
+    Parameters
+    ----------
+    path : str
+        Path to the binary index file.
+
+    Returns
+    -------
+    FrameIndex
+        The index.
+
+    Raises
+    ------
+    RuntimeError
+        If the index cannot be opened or parsed.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        raise FrameFetchError(f"Failed to open index {path}: {e}", 404 if isinstance(e, FileNotFoundError) else None) from e
+    version = (stat.st_size, stat.st_mtime_ns)
+    with _indexes_lock:
+        entry = _indexes.get(path)
+        if entry is not None and entry[0] == version:
+            _indexes.move_to_end(path)
+            return entry[1]
+    try:
+        index = FrameIndex.from_file(path)
+    except (OSError, ValueError) as e:
+        raise FrameFetchError(f"Failed to read index {path}: {e}") from e
+    with _indexes_lock:
+        _indexes[path] = (version, index)
+        _indexes.move_to_end(path)
+        while len(_indexes) > MAX_OPEN_INDEXES:
+            _indexes.popitem(last=False)
+    return index
@@ -0,0 +1,281 @@
+# video_index/metrics.py
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Latency histogram bucket bounds in seconds, from a cached frame to a slow
+# upstream read.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Content type of Registry.render output.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def format_value(value: float) -> str:
+    """
+    Format a sample value as Prometheus expects.
+
+    Examples
+    --------
+    >>> format_value(3), format_value(0.25), format_value(float("inf"))
+    ('3', '0.25', '+Inf')
+    """
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """
+    Format a label set, escaping values as the text format requires.
+
+    Examples
+    --------
+    >>> format_labels(("path", "status"), ("/frame", "200"))
+    '{path="/frame",status="200"}'
+    >>> format_labels((), ())
+    ''
+    >>> format_labels(("q",), ('a"b',))
+    '{q="a\\\\"b"}'
+    """
+    if not names:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+class _Metric:
+    """
+    A named metric family with a fixed set of label names.
+    """
+
+    type = "untyped"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Optional["Registry"] = None
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        try:
+            return tuple(str(labels[n]) for n in self.labelnames)
+        except KeyError as e:
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}") from e
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """
+        Yield (name suffix, formatted labels, value) for each sample.
+        """
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """
+        Return the family in the Prometheus text exposition format.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class Counter(_Metric):
+    """
+    A monotonically increasing total, per label set.
+
+    Examples
+    --------
+    >>> requests = Counter("requests_total", "Requests served.", ["status"])
+    >>> requests.inc(status=200); requests.inc(2, status=404)
+    >>> print(requests.render(), end="")
+    # HELP requests_total Requests served.
+    # TYPE requests_total counter
+    requests_total{status="200"} 1
+    requests_total{status="404"} 2
+    """
+
+    type = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: object) -> None:
+        """
+        Add amount to the total for labels.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels: object) -> None:
+        """
+        Set the total for labels, for counters that mirror a running
+        total kept by another object and copied in at scrape time.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels: object) -> float:
+        """
+        Return the total for labels.
+        """
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield "", format_labels(self.labelnames, key), value
+
+
+class Gauge(Counter):
+    """
+    A value that can go up and down, per label set.
+    """
+
+    type = "gauge"
+
+    def set(self, value: float, **labels: object) -> None:
+        """
+        Set the value for labels.
+        """
+        self.set_total(value, **labels)
+
+    def dec(self, amount: float = 1, **labels: object) -> None:
+        """
+        Subtract amount from the value for labels.
+        """
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """
+    Counts of observations in cumulative buckets, with their sum, per
+    label set.
+
+    Examples
+    --------
+    >>> latency = Histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    >>> latency.observe(0.05); latency.observe(0.5)
+    >>> print(latency.render(), end="")
+    # HELP latency_seconds Latency.
+    # TYPE latency_seconds histogram
+    latency_seconds_bucket{le="0.1"} 1
+    latency_seconds_bucket{le="1"} 2
+    latency_seconds_bucket{le="+Inf"} 2
+    latency_seconds_sum 0.55
+    latency_seconds_count 2
+    """
+
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        """
+        Record one observation for labels.
+        """
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            counts, total = entry
+            counts[i] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels: object) -> Iterator[None]:
+        """
+        Observe the seconds taken by a block, whether or not it raises.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: object) -> int:
+        """
+        Return the number of observations for labels.
+        """
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        with self._lock:
+            items = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+        names = self.labelnames + ("le",)
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", format_labels(names, key + (format_value(bound),)), cumulative
+            labels = format_labels(self.labelnames, key)
+            yield "_sum", labels, round(total, 9)
+            yield "_count", labels, cumulative
+
+
+class Registry:
+    """
+    A set of metrics rendered together for a ``/metrics`` endpoint.
+
+    Collectors registered with add_collector are called before each render,
+    to copy in values kept elsewhere (such as a cache's hit counts).
+
+    Examples
+    --------
+    >>> registry = Registry()
+    >>> frames = Gauge("frames", "Frames buffered.", registry=registry)
+    >>> registry.add_collector(lambda: frames.set(7))
+    >>> print(registry.render(), end="")
+    # HELP frames Frames buffered.
+    # TYPE frames gauge
+    frames 7
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> None:
+        """
+        Add a metric; its name must not already be registered.
+        """
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """
+        Call collector before each render.
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        Run the collectors and return every metric in the Prometheus text
+        exposition format (version 0.0.4).
+        """
+        for collector in self._collectors:
+            collector()
+        return "".join(metric.render() for metric in self._metrics.values())
@@ -0,0 +1,292 @@
+# video_index/prefetch.py
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .async_get_frame import AsyncFrameClient
+from .coalesce import DEFAULT_MAX_READ, plan_coalesced_reads
+
+StreamKey = Tuple[str, str, str]
+
+# Number of (video, index, session) access streams tracked at once.
+MAX_STREAMS = 4096
+
+
+class _Stream:
+    """
+    Access pattern and read-ahead buffer of one (video, index, session).
+    """
+
+    __slots__ = (
+        "video_url", "index_url", "index", "last", "step", "run", "next", "frames", "pending", "nbytes", "task",
+        "exhausted",
+    )
+
+    def __init__(self, video_url: str, index_url: str, index: Any = None) -> None:
+        self.video_url = video_url
+        self.index_url = index_url
+        self.index = index
+        self.last: Optional[int] = None
+        self.step = 0
+        self.run = 0
+        self.next: Optional[int] = None
+        self.frames: Dict[int, bytes] = {}
+        self.pending: Set[int] = set()
+        self.nbytes = 0
+        self.task: Optional[asyncio.Task] = None
+        self.exhausted = False
+
+
+class Prefetcher:
+    """
+    Detects sequential access to a video and reads the following frames
+    ahead of the caller.
+
+    Every request is attributed to a stream identified by (video_url,
+    index_url, session). Once a stream has asked for min_run consecutive
+    frames in the same direction (n, n+1, n+2... or n, n-1, n-2...), the
+    next depth frames in that direction are fetched in the background with
+    one index read and one coalesced Range read, and refilled whenever
+    fewer than half of them remain. A request that breaks the run cancels
+    the stream's read-ahead and drops what it buffered.
+
+    Buffered and in-flight frames of all streams share a byte budget; when
+    it is full, the least recently used streams are dropped first.
+
+    Parameters
+    ----------
+    client : AsyncFrameClient
+        Client used for all upstream reads.
+    depth : int, optional
+        Number of frames read ahead of a sequential stream, by default 8
+    max_bytes : int, optional
+        Byte budget for read-ahead frames across all streams,
+        by default 64 MiB
+    min_run : int, optional
+        Number of consecutive frames that make a run sequential,
+        by default 2
+    max_streams : int, optional
+        Number of streams tracked, by default MAX_STREAMS
+    """
+
+    def __init__(
+        self,
+        client: AsyncFrameClient,
+        depth: int = 8,
+        max_bytes: int = 64 * 2**20,
+        min_run: int = 2,
+        max_streams: int = MAX_STREAMS,
+    ) -> None:
+        self.client = client
+        self.depth = depth
+        self.max_bytes = max_bytes
+        self.min_run = min_run
+        self.max_streams = max_streams
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.wasted = 0
+        self.errors = 0
+        self._streams: "OrderedDict[StreamKey, _Stream]" = OrderedDict()
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Fraction of frame requests served from read-ahead.
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Return the read-ahead counters.
+
+        Returns
+        -------
+        Dict[str, float]
+            hits, misses and hit_rate of frame requests; prefetched and
+            wasted (dropped unused) frame counts; failed read-aheads;
+            buffered bytes and tracked streams.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "prefetched": self.prefetched,
+            "wasted": self.wasted,
+            "errors": self.errors,
+            "bytes": self.nbytes,
+            "streams": len(self._streams),
+        }
+
+    async def get_frame(self, video_url: str, index_url: str, frame_num: int, session: str = "") -> bytes:
+        """
+        Get a frame's raw bytes, from read-ahead when available, and
+        record the access for pattern detection.
+
+        Parameters
+        ----------
+        video_url : str
+            URL to the AV1 intra-only video file.
+        index_url : str
+            URL to the binary index file.
+        frame_num : int
+            The frame number to fetch.
+        session : str, optional
+            Identifies the viewer, so interleaved viewers of one video are
+            tracked separately, by default ""
+
+        Returns
+        -------
+        bytes
+            Raw frame bytes.
+        """
+        data = await self.take(video_url, index_url, frame_num, session)
+        if data is None:
+            data = await self.client.get_frame(video_url, index_url, frame_num)
+        return data
+
+    async def take(
+        self, video_url: str, index_url: str, frame_num: int, session: str = "", index: Any = None
+    ) -> Optional[bytes]:
+        """
+        Record an access to a frame and return its bytes if they were read
+        ahead, waiting for a read-ahead already fetching them. The caller
+        fetches the frame itself on None.
+
+        Parameters are as for get_frame, and index optionally an index
+        already at hand (anything with an ``entries_for(frame_nums)``
+        method, such as a FrameIndex or CatalogVideo), which read-ahead
+        then uses instead of reading index_url.
+
+        Returns
+        -------
+        Optional[bytes]
+            Raw frame bytes, or None if the frame was not read ahead.
+        """
+        stream = self._stream((video_url, index_url, session), index)
+        data = stream.frames.pop(frame_num, None)
+        if data is None and frame_num in stream.pending:
+            # Wait for the read-ahead already fetching this frame, without
+            # cancelling it if this request is cancelled
+            await asyncio.wait([stream.task])
+            data = stream.frames.pop(frame_num, None)
+        if data is not None:
+            self._release(stream, len(data))
+            self.hits += 1
+        else:
+            self.misses += 1
+        self._observe(stream, frame_num)
+        return data
+
+    def close(self) -> None:
+        """
+        Cancel all read-ahead and drop buffered frames.
+        """
+        for stream in self._streams.values():
+            self._reset(stream)
+        self._streams.clear()
+
+    def _stream(self, key: StreamKey, index: Any = None) -> _Stream:
+        stream = self._streams.get(key)
+        if stream is None:
+            stream = self._streams[key] = _Stream(key[0], key[1], index)
+            while len(self._streams) > self.max_streams:
+                _, evicted = self._streams.popitem(last=False)
+                self._reset(evicted)
+        self._streams.move_to_end(key)
+        return stream
+
+    def _release(self, stream: _Stream, nbytes: int) -> None:
+        stream.nbytes -= nbytes
+        self.nbytes -= nbytes
+
+    def _reset(self, stream: _Stream) -> None:
+        """
+        Cancel a stream's read-ahead and drop its buffered frames.
+        """
+        if stream.task is not None:
+            stream.task.cancel()
+            stream.task = None
+        self.wasted += len(stream.frames)
+        stream.frames.clear()
+        stream.pending.clear()
+        self._release(stream, stream.nbytes)
+        stream.next = None
+        stream.exhausted = False
+
+    def _observe(self, stream: _Stream, frame_num: int) -> None:
+        step = 0 if stream.last is None else frame_num - stream.last
+        if step == 0 and stream.last is not None:
+            return  # a repeated request neither extends nor breaks the run
+        stream.last = frame_num
+        if step in (1, -1) and (stream.step == 0 or step == stream.step):
+            stream.run += 1
+            stream.step = step
+        else:
+            self._reset(stream)
+            stream.run = 1
+            stream.step = 0
+            return
+        if stream.run < self.min_run or self.depth <= 0 or stream.exhausted:
+            return
+        if stream.next is None:
+            stream.next = frame_num + step
+        ahead = (stream.next - frame_num) * step - 1
+        if stream.task is None and ahead <= self.depth // 2:
+            frame_nums = [n for n in range(stream.next, stream.next + step * self.depth, step) if n >= 0]
+            if frame_nums:
+                stream.next = frame_nums[-1] + step
+                stream.pending = set(frame_nums)
+                stream.task = asyncio.ensure_future(self._read_ahead(stream, frame_nums))
+
+    def _reserve(self, stream: _Stream, nbytes: int) -> bool:
+        """
+        Make room for nbytes of read-ahead, dropping the least recently
+        used other streams if needed.
+        """
+        for other in list(self._streams.values()):
+            if self.nbytes + nbytes <= self.max_bytes:
+                break
+            if other is not stream and other.nbytes:
+                self._reset(other)
+        if self.nbytes + nbytes > self.max_bytes:
+            return False
+        stream.nbytes += nbytes
+        self.nbytes += nbytes
+        return True
+
+    async def _read_ahead(self, stream: _Stream, frame_nums: List[int]) -> None:
+        task = asyncio.current_task()
+        reserved = 0
+        try:
+            if stream.index is not None:
+                entries = stream.index.entries_for(frame_nums)
+            else:
+                entries = await self.client.fetch_index_entries(stream.index_url, frame_nums)
+            frames = [(n, offset, length) for n, (offset, length) in zip(frame_nums, entries)]
+            size = sum(length for _, _, length in frames)
+            if not self._reserve(stream, size):
+                return
+            reserved = size
+            # Consecutive frames are adjacent, so this is normally a single read
+            for read in plan_coalesced_reads(frames, max_read=max(size, DEFAULT_MAX_READ)):
+                data = await self.client.read_coalesced(stream.video_url, read)
+                for frame_num, payload in data.items():
+                    stream.frames[frame_num] = payload
+                    reserved -= len(payload)
+                    self.prefetched += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Typically past the end of the video; stop reading ahead
+            # until the run is broken
+            stream.exhausted = True
+            self.errors += 1
+        finally:
+            if stream.task is task:
+                # Not reset meanwhile, so still holding its reservation
+                stream.task = None
+                stream.pending.clear()
+                self._release(stream, reserved)
@@ -0,0 +1,128 @@
+# video_index/singleflight.py
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time across threads; callers that
+    arrive while a call for their key is in flight wait for it and share
+    its result or exception instead of starting their own.
+
+    Nothing is kept once the call returns, so later callers start a fresh
+    call; caching results is left to the caller.
+
+    Examples
+    --------
+    >>> flights = SingleFlight()
+    >>> flights.do("key", lambda: 42)
+    42
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """
+        Return fn(), or the result of the call for key already in flight.
+
+        Parameters
+        ----------
+        key : Hashable
+            Identifies calls that produce the same result.
+        fn : Callable[[], T]
+            The call to make if none is in flight.
+
+        Returns
+        -------
+        T
+            The call's result. Its exception is raised in every caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """
+    Asyncio version of SingleFlight for one event loop.
+
+    The call runs in its own task, so a caller that is cancelled does not
+    cancel the call for the others waiting on it.
+
+    Examples
+    --------
+    >>> async def fetch():
+    ...     return 42
+    >>> asyncio.run(AsyncSingleFlight().do("key", fetch))
+    42
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Return await fn(), or the result of the call for key already in
+        flight.
+
+        Parameters
+        ----------
+        key : Hashable
+            Identifies calls that produce the same result.
+        fn : Callable[[], Awaitable[T]]
+            Makes the call if none is in flight.
+
+        Returns
+        -------
+        T
+            The call's result. Its exception is raised in every caller.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = asyncio.ensure_future(fn())
+            call.add_done_callback(lambda f: self._finish(key, f))
+        else:
+            self.shared += 1
+        return await asyncio.shield(call)
+
+    def _finish(self, key: Hashable, call: asyncio.Future) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.cancelled():
+            # Mark the exception retrieved even if every caller went away
+            call.exception()
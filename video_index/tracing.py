@@ -0,0 +1,165 @@
+# video_index/tracing.py
+import functools
+import inspect
+import time
+from typing import Any, Callable
+
+# Installed by set_tracer; None disables tracing.
+_tracer: Any = None
+
+# Attribute types OpenTelemetry accepts; others are left out of spans.
+_ATTRIBUTE_TYPES = (str, int, float, bool)
+
+
+class _NoopSpan:
+    """
+    Span returned while tracing is disabled.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _CallbackSpan:
+    """
+    Span timing a call for a callback tracer.
+    """
+
+    __slots__ = ("callback", "name", "attributes", "start")
+
+    def __init__(self, callback: Callable, name: str, attributes: dict) -> None:
+        self.callback = callback
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> "_CallbackSpan":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.callback(self.name, self.attributes, time.perf_counter() - self.start, exc)
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+
+def set_tracer(tracer: Any) -> None:
+    """
+    Install the tracer receiving a span for each traced client call, or
+    None to disable tracing (the default).
+
+    Parameters
+    ----------
+    tracer : Any
+        Either an OpenTelemetry ``Tracer`` (anything with a
+        ``start_as_current_span`` method), whose spans then nest under the
+        caller's current span, or a callable
+        ``callback(name, attributes, seconds, error)`` called as each
+        traced call finishes, with error the exception it raised or None.
+        The callback runs on the calling thread or event loop, so it
+        should be quick and must not raise.
+
+    Examples
+    --------
+    >>> calls = []
+    >>> set_tracer(lambda name, attributes, seconds, error: calls.append((name, attributes, error)))
+    >>> with span("video_index.example", frame=3) as s:
+    ...     s.set_attribute("bytes", 10)
+    >>> set_tracer(None)
+    >>> calls
+    [('video_index.example', {'frame': 3, 'bytes': 10}, None)]
+    """
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer() -> Any:
+    """
+    Return the installed tracer, or None if tracing is disabled.
+    """
+    return _tracer
+
+
+def span(name: str, **attributes: Any):
+    """
+    Open a span named name around a block, for use as a context manager.
+    The span has a ``set_attribute(key, value)`` method for results known
+    only at the end.
+
+    While tracing is disabled this returns a shared no-op span, so
+    instrumented code costs a function call.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NOOP_SPAN
+    if hasattr(tracer, "start_as_current_span"):
+        return tracer.start_as_current_span(
+            name, attributes={k: v for k, v in attributes.items() if isinstance(v, _ATTRIBUTE_TYPES)}
+        )
+    return _CallbackSpan(tracer, name, attributes)
+
+
+def traced(name: str) -> Callable[[Callable], Callable]:
+    """
+    Decorate a function or coroutine function to run in a span named
+    name, with its arguments as attributes (other than ``self``) and, when
+    it returns bytes, their length as the ``bytes`` attribute.
+
+    The wrapper calls straight through while tracing is disabled.
+
+    Examples
+    --------
+    >>> @traced("video_index.read")
+    ... def read(url, length):
+    ...     return b"x" * length
+    >>> set_tracer(lambda name, attributes, seconds, error: print(name, attributes))
+    >>> _ = read("http://v", length=4)
+    video_index.read {'url': 'http://v', 'length': 4, 'bytes': 4}
+    >>> set_tracer(None)
+    """
+
+    def decorate(fn: Callable) -> Callable:
+        names = list(inspect.signature(fn).parameters)
+        skip = 1 if names[:1] == ["self"] else 0
+        params = names[skip:]
+
+        def attributes(args: tuple, kwargs: dict) -> dict:
+            return {**dict(zip(params, args[skip:])), **kwargs}
+
+        def finish(s: Any, result: Any) -> Any:
+            if isinstance(result, bytes):
+                s.set_attribute("bytes", len(result))
+            return result
+
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if _tracer is None:
+                    return await fn(*args, **kwargs)
+                with span(name, **attributes(args, kwargs)) as s:
+                    return finish(s, await fn(*args, **kwargs))
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return fn(*args, **kwargs)
+            with span(name, **attributes(args, kwargs)) as s:
+                return finish(s, fn(*args, **kwargs))
+
+        return wrapper
+
+    return decorate